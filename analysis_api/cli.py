@@ -0,0 +1,610 @@
+"""
+Command line tools for analysing tracks offline, without the per-request overhead of the HTTP API.
+
+Usage: python -m analysis_api.cli backfill TRACKS_FILE [--format {jsonl,csv}] [--concurrency N] [--chunk-size N]
+                                          [--checkpoint PATH] [--db-path PATH] [--fake-model]
+       python -m analysis_api.cli batch-refresh TRACKS_FILE [--format {jsonl,csv}] [--tag-dominant-emotions N]
+                                               [--local-dir PATH] [--db-path PATH] [--fake-model]
+
+The tracks file holds one track per JSON line, or per CSV row, with `track_id` and `lyrics` fields. Model settings are
+read from the environment as for the API, unless `--fake-model` is given. The tokens used are added to the daily totals
+in the database, and once the daily token budget in the settings is used up, the command stops or waits until the
+budget resets, depending on the budget policy.
+
+`backfill` makes an online model call per missing profile, while `batch-refresh` submits all missing profiles, and
+then the tags for each track's dominant emotions, as Vertex AI batch prediction jobs. Batch prediction is cheaper for
+large runs such as the nightly catalogue refresh, but a job can take hours to finish. With `--local-dir`, jobs are run
+locally instead, with their files written to the given directory.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from json import JSONDecodeError
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator
+
+import aiosqlite
+import pydantic
+from loguru import logger
+
+from analysis_api.models import EmotionalProfileRequest, EmotionalProfile
+from analysis_api.services.batch_prediction import BatchPredictionService, LocalBatchPredictionBackend, \
+    VertexBatchPredictionBackend, BatchPredictionBackend, BatchPredictionException
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_backends.gemini import GeminiModelBackend
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.model_service import ModelService, ModelServiceException, PromptType, \
+    TokenBudgetExhaustedException
+from analysis_api.services.storage.storage_service import StorageService, StorageServiceException, StorageProfile, \
+    configure_connection, initialise_db
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
+
+
+def read_tracks(path: Path, file_format: str) -> Iterator[dict]:
+    """
+    Streams the track records in a JSONL or CSV file, one at a time.
+
+    Parameters
+    ----------
+    path : Path
+        The path of the file.
+    file_format : str
+        The format of the file, either "jsonl" or "csv".
+
+    Yields
+    ------
+    dict
+        The next record in the file. Blank lines in a JSONL file are skipped, and lines that are not valid JSON or not
+        a JSON object are yielded as empty records so that they are counted as failures without stopping the backfill.
+    """
+
+    with open(path, newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            yield from csv.DictReader(file)
+            return
+
+        for line in file:
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except JSONDecodeError as e:
+                logger.error(f"Skipping line that is not valid JSON - {e}")
+                yield {}
+                continue
+
+            if not isinstance(record, dict):
+                logger.error(f"Skipping line that is not a JSON object - {line.strip()[:100]}")
+                yield {}
+                continue
+
+            yield record
+
+
+@dataclass
+class Checkpoint:
+    """
+    The progress of a previous backfill of the same file.
+
+    Attributes
+    ----------
+    records : int
+        The number of records from the start of the file that were processed, with their results committed.
+    failed : list of int
+        The positions in the file of the processed records that failed, which are retried when the backfill resumes.
+    """
+
+    records: int = 0
+    failed: list[int] = field(default_factory=list)
+
+
+def load_checkpoint(path: Path) -> Checkpoint:
+    """
+    Returns the progress of a previous backfill of the same file, or an empty checkpoint if there is none.
+
+    Parameters
+    ----------
+    path : Path
+        The path of the checkpoint file.
+
+    Returns
+    -------
+    Checkpoint
+        The number of records processed and the positions of those that failed.
+    """
+
+    if not path.exists():
+        return Checkpoint()
+
+    checkpoint = json.loads(path.read_text())
+
+    return Checkpoint(records=checkpoint["records"], failed=checkpoint.get("failed", []))
+
+
+def save_checkpoint(path: Path, checkpoint: Checkpoint):
+    """
+    Records the progress of a backfill, replacing the checkpoint file atomically.
+
+    Parameters
+    ----------
+    path : Path
+        The path of the checkpoint file.
+    checkpoint : Checkpoint
+        The number of records processed and the positions of those that failed.
+    """
+
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text(json.dumps({"records": checkpoint.records, "failed": checkpoint.failed}))
+    os.replace(temp_path, path)
+
+
+@dataclass
+class BackfillStats:
+    """
+    The progress of a backfill.
+
+    Attributes
+    ----------
+    records : int
+        The number of records processed, including records skipped after resuming from a checkpoint. Failed records
+        retried after resuming are only counted once.
+    generated : int
+        The number of tracks whose profiles were generated and stored.
+    already_stored : int
+        The number of tracks whose profiles were already stored.
+    failed : int
+        The number of records that were invalid or whose profiles could not be generated.
+    started_at : float
+        The time the backfill started.
+    """
+
+    records: int = 0
+    generated: int = 0
+    already_stored: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def throughput(self) -> float:
+        """The number of tracks processed per second since the backfill started."""
+
+        processed = self.generated + self.already_stored + self.failed
+        return processed / max(time.perf_counter() - self.started_at, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.records} records, {self.generated} generated, {self.already_stored} already stored, "
+            f"{self.failed} failed, {self.throughput:.1f} tracks/s"
+        )
+
+
+def _chunks(records: Iterable[tuple[int, dict]], size: int) -> Iterator[list[tuple[int, dict]]]:
+    chunk = []
+
+    for record in records:
+        chunk.append(record)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+async def _generate_profile(model_service: ModelService, lyrics: str) -> dict[str, float]:
+    data = await model_service.agenerate_response(
+        lyrics,
+        priority=Priority.BATCH,
+        usage_key=UsageKey(endpoint="backfill_profile")
+    )
+    emotional_profile_data = json.loads(data)
+
+    # the profile is validated before it is stored, as the API would refuse to serve it otherwise
+    EmotionalProfile(**emotional_profile_data)
+
+    return emotional_profile_data
+
+
+async def _backfill_chunk(
+        records: list[tuple[int, dict]],
+        model_service: ModelService,
+        storage_service: StorageService,
+        semaphore: asyncio.Semaphore,
+        stats: BackfillStats
+) -> list[int]:
+    # returns the positions of the records that failed
+    failed = []
+    positions = []
+    requests = []
+
+    for position, record in records:
+        try:
+            requests.append(EmotionalProfileRequest(**record))
+            positions.append(position)
+        except pydantic.ValidationError as e:
+            logger.error(f"Skipping invalid record - {e}")
+            stats.failed += 1
+            failed.append(position)
+
+    lyrics_hashes = [hash_lyrics(request.lyrics) for request in requests]
+    stored_profiles = await storage_service.retrieve_profiles(list(set(lyrics_hashes)))
+
+    # tracks that share lyrics share a single model call
+    lyrics_to_generate = {
+        lyrics_hash: request.lyrics
+        for request, lyrics_hash in zip(requests, lyrics_hashes)
+        if lyrics_hash not in stored_profiles
+    }
+    budget_exhausted: TokenBudgetExhaustedException | None = None
+
+    async def generate(lyrics_hash: str, lyrics: str) -> tuple[str, dict[str, float] | None]:
+        nonlocal budget_exhausted
+
+        async with semaphore:
+            try:
+                return lyrics_hash, await _generate_profile(model_service, lyrics)
+            except TokenBudgetExhaustedException as e:
+                budget_exhausted = e
+                return lyrics_hash, None
+            except (ModelServiceException, JSONDecodeError, TypeError, pydantic.ValidationError) as e:
+                logger.error(f"Failed to generate emotional profile for lyrics hash: {lyrics_hash} - {e}")
+                return lyrics_hash, None
+
+    generated = await asyncio.gather(*(generate(h, lyrics) for h, lyrics in lyrics_to_generate.items()))
+    profiles = {lyrics_hash: profile for lyrics_hash, profile in generated if profile is not None}
+    tracks = {}
+
+    for position, request, lyrics_hash in zip(positions, requests, lyrics_hashes):
+        if lyrics_hash in stored_profiles:
+            stats.already_stored += 1
+        elif lyrics_hash in profiles:
+            stats.generated += 1
+        else:
+            stats.failed += 1
+            failed.append(position)
+            continue
+
+        tracks[request.track_id] = lyrics_hash
+
+    await storage_service.store_bulk(profiles=profiles, tracks=tracks)
+
+    # the profiles generated before the budget ran out are kept, but the chunk is not checkpointed
+    if budget_exhausted is not None:
+        raise budget_exhausted
+
+    return failed
+
+
+async def backfill(
+        records: Iterable[dict],
+        model_service: ModelService,
+        storage_service: StorageService,
+        concurrency: int = 16,
+        chunk_size: int = 500,
+        checkpoint_path: Path | None = None
+) -> BackfillStats:
+    """
+    Generates and stores the emotional profile of every track in the records that does not already have one.
+
+    Records are processed in chunks. For each chunk, stored profiles are looked up in a single query, the missing
+    profiles are generated with at most `concurrency` model calls in flight, and the results are written in a single
+    transaction. Once a chunk is committed, the checkpoint is updated, so a backfill that is interrupted resumes after
+    the last committed chunk. Records that fail are logged and counted but do not stop the backfill. Their positions
+    are kept in the checkpoint, so running the backfill again retries them along with the records it had not reached.
+    Once a backfill completes without failures, the checkpoint is removed, so the next run of the same file starts
+    from the beginning.
+
+    Parameters
+    ----------
+    records : Iterable[dict]
+        The track records, each with `track_id` and `lyrics` fields.
+    model_service : ModelService
+        The model service used to generate emotional profiles.
+    storage_service : StorageService
+        The storage service the profiles are stored with.
+    concurrency : int, optional
+        The maximum number of model calls in flight at once, by default 16.
+    chunk_size : int, optional
+        The number of records processed and committed at once, by default 500.
+    checkpoint_path : Path, optional
+        The path of the checkpoint file. If it exists, records that a previous run completed, other than those that
+        failed, are skipped.
+
+    Returns
+    -------
+    BackfillStats
+        The number of records processed, generated, already stored and failed.
+
+    Raises
+    ------
+    StorageServiceException
+        If the database cannot be read or written, in which case the backfill stops at the last committed chunk.
+    TokenBudgetExhaustedException
+        If the daily token budget is used up and the model service rejects calls once it is, in which case the backfill
+        stops at the last committed chunk.
+    """
+
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path is not None else Checkpoint()
+    failed = set(checkpoint.failed)
+    stats = BackfillStats(records=checkpoint.records - len(failed))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    if checkpoint.records:
+        logger.info(f"Resuming from checkpoint after {checkpoint.records} records, retrying {len(failed)} failed.")
+
+    # the records the checkpoint covers are skipped, apart from the failed records, which are retried
+    records_to_process = (
+        (position, record)
+        for position, record in enumerate(records)
+        if position >= checkpoint.records or position in failed
+    )
+
+    for chunk in _chunks(records_to_process, chunk_size):
+        chunk_failed = await _backfill_chunk(chunk, model_service, storage_service, semaphore, stats)
+        stats.records += len(chunk)
+
+        failed.difference_update(position for position, _ in chunk)
+        failed.update(chunk_failed)
+        checkpoint = Checkpoint(records=max(checkpoint.records, chunk[-1][0] + 1), failed=sorted(failed))
+
+        if checkpoint_path is not None:
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        logger.info(f"Backfill progress: {stats}")
+
+    if checkpoint_path is not None and not failed:
+        checkpoint_path.unlink(missing_ok=True)
+
+    return stats
+
+
+def create_cli_model_services(
+        fake_model: bool,
+        usage_tracker: TokenUsageTracker | None = None
+) -> dict[PromptType, ModelService]:
+    """
+    Builds the model service for each prompt.
+
+    Parameters
+    ----------
+    fake_model : bool
+        Whether to use a fake model that generates deterministic responses offline instead of the model backend in the
+        settings.
+    usage_tracker : TokenUsageTracker, optional
+        The tracker shared by all model services, which accounts for the tokens used by model calls and guards the
+        daily token budget.
+
+    Returns
+    -------
+    dict[PromptType, ModelService]
+        The ModelService instance for each prompt.
+    """
+
+    if fake_model:
+        from analysis_api.services.data_service import MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA
+        from analysis_api.services.model_backends.fake import FakeModelBackend
+
+        return {
+            prompt_type: ModelService(
+                backend=FakeModelBackend(prompt_type),
+                model="fake",
+                prompt_template="",
+                response_schema=(
+                    MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA if prompt_type is PromptType.EMOTIONAL_MULTI_TAGS else None
+                ),
+                usage_tracker=usage_tracker
+            )
+            for prompt_type in PromptType
+        }
+
+    from google import genai
+
+    from analysis_api.main import create_model_backends, create_model_services
+
+    settings = _settings()
+
+    if settings.model_backend == "gemini":
+        genai_client = genai.Client(vertexai=True, project=settings.gcp_project_id, location=settings.gcp_location)
+    else:
+        genai_client = None
+
+    return create_model_services(
+        settings,
+        create_model_backends(settings, genai_client),
+        usage_tracker=usage_tracker
+    )
+
+
+def _settings():
+    from analysis_api.settings import Settings
+
+    return Settings()
+
+
+def _tracks_file_format(args: argparse.Namespace) -> str:
+    return args.format or ("csv" if args.tracks_file.suffix.lower() == ".csv" else "jsonl")
+
+
+@asynccontextmanager
+async def _open_storage_service(db_path: str | None, fake_model: bool) -> AsyncIterator[StorageService]:
+    # the fake model is used without settings, so the default tuning is applied to the database given
+    if fake_model and db_path is not None:
+        storage_profile = StorageProfile()
+    else:
+        settings = _settings()
+        storage_profile = settings.storage_profile
+        db_path = db_path if db_path is not None else settings.db_path
+
+    async with aiosqlite.connect(db_path) as db:
+        await configure_connection(db, storage_profile)
+        await initialise_db(db, storage_profile=storage_profile)
+
+        yield StorageService(db)
+
+
+@asynccontextmanager
+async def _usage_tracker(storage_service: StorageService, fake_model: bool) -> AsyncIterator[TokenUsageTracker]:
+    # the fake model is used without settings, so it has no token budget
+    if fake_model:
+        usage_tracker = TokenUsageTracker(storage_service=storage_service)
+    else:
+        settings = _settings()
+        usage_tracker = TokenUsageTracker(
+            storage_service=storage_service,
+            daily_token_budget=settings.model_daily_token_budget,
+            on_budget_exhausted=settings.model_token_budget_exhausted_policy,
+            flush_interval_seconds=settings.model_usage_flush_interval_seconds
+        )
+
+    await usage_tracker.start()
+
+    try:
+        yield usage_tracker
+    finally:
+        await usage_tracker.stop()
+
+
+@contextmanager
+def _model_services(
+        fake_model: bool,
+        usage_tracker: TokenUsageTracker | None = None
+) -> Iterator[dict[PromptType, ModelService]]:
+    model_services = create_cli_model_services(fake_model, usage_tracker)
+
+    try:
+        yield model_services
+    finally:
+        # flush any recording of the model calls
+        for model_backend in {model_service.backend for model_service in model_services.values()}:
+            model_backend.close()
+
+
+async def run_backfill(args: argparse.Namespace) -> BackfillStats:
+    checkpoint_path = args.checkpoint or args.tracks_file.with_name(f"{args.tracks_file.name}.checkpoint")
+
+    async with (
+        _open_storage_service(args.db_path, args.fake_model) as storage_service,
+        _usage_tracker(storage_service, args.fake_model) as usage_tracker
+    ):
+        with _model_services(args.fake_model, usage_tracker) as model_services:
+            stats = await backfill(
+                read_tracks(args.tracks_file, _tracks_file_format(args)),
+                model_service=model_services[PromptType.EMOTIONAL_PROFILE],
+                storage_service=storage_service,
+                concurrency=args.concurrency,
+                chunk_size=args.chunk_size,
+                checkpoint_path=checkpoint_path
+            )
+
+    logger.info(f"Backfill complete: {stats}")
+
+    return stats
+
+
+async def run_batch_refresh(args: argparse.Namespace):
+    async with (
+        _open_storage_service(args.db_path, args.fake_model) as storage_service,
+        _usage_tracker(storage_service, args.fake_model) as usage_tracker
+    ):
+        with _model_services(args.fake_model, usage_tracker) as model_services:
+            await _batch_refresh(args, model_services, storage_service)
+
+
+async def _batch_refresh(
+        args: argparse.Namespace,
+        model_services: dict[PromptType, ModelService],
+        storage_service: StorageService
+):
+    tracks = []
+
+    for record in read_tracks(args.tracks_file, _tracks_file_format(args)):
+        try:
+            tracks.append(EmotionalProfileRequest(**record))
+        except pydantic.ValidationError as e:
+            logger.error(f"Skipping invalid record - {e}")
+
+    if args.local_dir is not None:
+        backend: BatchPredictionBackend = LocalBatchPredictionBackend(args.local_dir)
+    else:
+        settings = _settings()
+        model_backend = model_services[PromptType.EMOTIONAL_PROFILE].backend
+
+        if settings.batch_prediction_gcs_uri is None:
+            raise BatchPredictionException("BATCH_PREDICTION_GCS_URI must be set to run Vertex AI batch prediction")
+
+        if not isinstance(model_backend, GeminiModelBackend):
+            raise BatchPredictionException("Vertex AI batch prediction requires the gemini model backend")
+
+        backend = VertexBatchPredictionBackend(
+            client=model_backend.client,
+            gcs_uri=settings.batch_prediction_gcs_uri,
+            poll_interval_seconds=settings.batch_prediction_poll_interval_seconds
+        )
+
+    batch_prediction_service = BatchPredictionService(backend, model_services, storage_service)
+    profile_stats = await batch_prediction_service.refresh_profiles(tracks)
+    logger.info(f"Emotional profiles: {profile_stats}")
+
+    if args.tag_dominant_emotions > 0:
+        tag_stats = await batch_prediction_service.refresh_tags(tracks, args.tag_dominant_emotions)
+        logger.info(f"Emotional tags: {tag_stats}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m analysis_api.cli",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = subparsers.add_parser("backfill", help="Store the emotional profiles of the tracks in a file.")
+    backfill_parser.add_argument("tracks_file", type=Path)
+    backfill_parser.add_argument("--format", choices=["jsonl", "csv"], help="Inferred from the file extension.")
+    backfill_parser.add_argument("--concurrency", type=int, default=16, help="Model calls in flight at once.")
+    backfill_parser.add_argument("--chunk-size", type=int, default=500, help="Records committed at once.")
+    backfill_parser.add_argument("--checkpoint", type=Path, help="Defaults to TRACKS_FILE.checkpoint.")
+    backfill_parser.add_argument("--db-path", help="Defaults to the DB_PATH setting.")
+    backfill_parser.add_argument("--fake-model", action="store_true", help="Generate fake profiles offline.")
+    backfill_parser.set_defaults(run=run_backfill)
+
+    batch_refresh_parser = subparsers.add_parser(
+        "batch-refresh",
+        help="Store the emotional profiles and tags of the tracks in a file using batch prediction."
+    )
+    batch_refresh_parser.add_argument("tracks_file", type=Path)
+    batch_refresh_parser.add_argument("--format", choices=["jsonl", "csv"], help="Inferred from the file extension.")
+    batch_refresh_parser.add_argument("--tag-dominant-emotions", type=int, default=0, help="Emotions tagged per track.")
+    batch_refresh_parser.add_argument("--local-dir", type=Path, help="Run jobs locally, writing files here.")
+    batch_refresh_parser.add_argument("--db-path", help="Defaults to the DB_PATH setting.")
+    batch_refresh_parser.add_argument("--fake-model", action="store_true", help="Generate fake results offline.")
+    batch_refresh_parser.set_defaults(run=run_batch_refresh)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch-refresh" and args.fake_model and args.local_dir is None:
+        parser.error("--fake-model requires --local-dir, as Vertex AI batch prediction cannot use a fake model")
+
+    logger.remove()
+    logger.add(sys.stderr, format="{time} {level} {message}", level="INFO")
+
+    try:
+        asyncio.run(args.run(args))
+    except (StorageServiceException, BatchPredictionException, TokenBudgetExhaustedException) as e:
+        logger.error(f"{args.command} stopped - {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,24 @@
+import math
+from contextlib import AsyncExitStack
 from functools import lru_cache
-from typing import Annotated
+from typing import Annotated, Callable
 
 import aiosqlite
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request
 from google import genai
 
 from analysis_api.services.data_service import DataService
-from analysis_api.services.model_service import ModelService
+from analysis_api.services.deadline import Deadline
+from analysis_api.services.job_service import JobService
+from analysis_api.services.model_service import ModelService, PromptType
+from analysis_api.services.single_flight import SingleFlight
+from analysis_api.services.storage.cache import LRUCache
+from analysis_api.services.storage.cached_storage_service import CachedStorageService
+from analysis_api.services.storage.connection_pool import ConnectionPool
 from analysis_api.services.storage.storage_service import StorageService
+from analysis_api.services.storage.write_behind import WriteBehindWriter
 from analysis_api.settings import Settings
+from analysis_api.tracing import start_span
 
 
 @lru_cache
@@ -30,122 +40,243 @@ def get_settings() -> Settings:
 SettingsDependency = Annotated[Settings, Depends(get_settings)]
 
 
-def get_genai_client(request: Request) -> genai.Client:
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+"""The request header through which a client can set the time in seconds it is willing to wait for a response."""
+
+
+def _request_deadline(request: Request, default_timeout_seconds: float, max_timeout_seconds: float) -> Deadline:
+    header = request.headers.get(REQUEST_TIMEOUT_HEADER)
+
+    if header is None:
+        return Deadline(min(default_timeout_seconds, max_timeout_seconds))
+
+    try:
+        timeout_seconds = float(header)
+    except ValueError:
+        timeout_seconds = math.nan
+
+    if not math.isfinite(timeout_seconds) or timeout_seconds <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{REQUEST_TIMEOUT_HEADER} must be a positive number of seconds, got '{header}'"
+        )
+
+    return Deadline(min(timeout_seconds, max_timeout_seconds))
+
+
+def get_request_deadline(request: Request, settings: SettingsDependency) -> Deadline:
     """
-    Retrieves the GenAI client from the FastAPI application state.
+    Creates the deadline by which a single-track request must be served.
+
+    The deadline is taken from the X-Request-Timeout header if it is set, otherwise the default timeout for
+    single-track requests is used. Either way, it is capped at the maximum timeout.
 
     Parameters
     ----------
     request : Request
         The FastAPI request object.
+    settings : Settings
+        The application settings instance.
 
     Returns
     -------
-    genai.Client
-        The GenAI client instance stored in the application state.
+    Deadline
+        The deadline of the request, starting now.
+
+    Raises
+    ------
+    HTTPException
+        If the X-Request-Timeout header is not a positive number, a 400 error is raised.
     """
 
-    return request.app.state.genai_client
+    return _request_deadline(request, settings.request_timeout_seconds, settings.request_max_timeout_seconds)
 
 
-GenaiClientDependency = Annotated[genai.Client, Depends(get_genai_client)]
+RequestDeadlineDependency = Annotated[Deadline, Depends(get_request_deadline)]
 
 
-def get_model_prompt(request: Request) -> str:
+def get_batch_request_deadline(request: Request, settings: SettingsDependency) -> Deadline:
     """
-    Determines the appropriate model prompt based on the request path.
+    Creates the deadline by which a batch request must be served.
 
-    The prompt is selected based on whether the request is for an emotional profile or emotional tags.
+    The deadline is taken from the X-Request-Timeout header if it is set, otherwise the default timeout for batch
+    requests is used. Either way, it is capped at the maximum timeout.
 
     Parameters
     ----------
     request : Request
         The FastAPI request object.
+    settings : Settings
+        The application settings instance.
 
     Returns
     -------
-    str
-        The prompt template to be used for this route.
+    Deadline
+        The deadline of the request, starting now.
 
     Raises
     ------
-    Exception
-        If the request path does not match expected endpoints.
+    HTTPException
+        If the X-Request-Timeout header is not a positive number, a 400 error is raised.
     """
 
-    if "profile" in request.url.path:
-        prompt = request.app.state.model_emotional_profile_prompt
-    elif "tags" in request.url.path:
-        prompt = request.app.state.model_emotional_tagging_prompt
-    else:
-        raise Exception("Invalid path")
+    return _request_deadline(request, settings.batch_request_timeout_seconds, settings.request_max_timeout_seconds)
 
-    return prompt
 
+BatchRequestDeadlineDependency = Annotated[Deadline, Depends(get_batch_request_deadline)]
 
-ModelPromptDependency = Annotated[str, Depends(get_model_prompt)]
 
+def get_genai_client(request: Request) -> genai.Client | None:
+    """
+    Retrieves the GenAI client from the FastAPI application state.
 
-def get_model_service(
-        settings: SettingsDependency,
-        model_prompt: ModelPromptDependency,
-        genai_client: GenaiClientDependency
-) -> ModelService:
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    genai.Client or None
+        The GenAI client instance stored in the application state, or None if the model backend is not Gemini.
+    """
+
+    return request.app.state.genai_client
+
+
+GenaiClientDependency = Annotated[genai.Client | None, Depends(get_genai_client)]
+
+
+def get_model_service_provider(request: Request) -> Callable[[PromptType], ModelService]:
     """
-    Creates and returns a ModelService instance.
+    Returns a callable that retrieves a prebuilt ModelService from the FastAPI application state.
 
-    The model service is responsible for generating responses using a specified AI model.
+    A ModelService is built for each prompt when the application starts. The returned callable looks it up only when
+    called, so requests served from storage never resolve a model service.
 
     Parameters
     ----------
-    settings : Settings
-        The application settings instance.
-    model_prompt : str
-        The prompt for the model.
-    genai_client : genai.Client
-        The GenAI client used for interacting with the model.
+    request : Request
+        The FastAPI request object.
 
     Returns
     -------
-    ModelService
-        The configured ModelService instance.
+    Callable[[PromptType], ModelService]
+        A callable returning the ModelService instance for a given prompt.
     """
 
-    return ModelService(
-        client=genai_client,
-        model=settings.model_name,
-        prompt_template=model_prompt,
-        temp=settings.model_temp,
-        top_p=settings.model_top_p,
-        max_output_tokens=settings.model_max_output_tokens
-    )
+    def provide_model_service(prompt_type: PromptType) -> ModelService:
+        return request.app.state.model_services[prompt_type]
 
+    return provide_model_service
 
-ModelServiceDependency = Annotated[ModelService, Depends(get_model_service)]
 
+ModelServiceProviderDependency = Annotated[
+    Callable[[PromptType], ModelService],
+    Depends(get_model_service_provider)
+]
 
-async def get_db_conn(settings: SettingsDependency):
-    """Dependency to get an async database connection."""
 
-    db = await aiosqlite.connect(settings.db_path)
+def get_connection_pool(request: Request) -> ConnectionPool:
+    """
+    Retrieves the database connection pool from the FastAPI application state.
+
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    ConnectionPool
+        The connection pool stored in the application state.
+    """
+
+    return request.app.state.connection_pool
+
+
+ConnectionPoolDependency = Annotated[ConnectionPool, Depends(get_connection_pool)]
+
+
+async def get_db_conn(connection_pool: ConnectionPoolDependency):
+    """Dependency to borrow a reader connection from the pool for the duration of the request."""
+
+    async with AsyncExitStack() as stack:
+        # only the wait for a connection is traced, not the request that holds it
+        with start_span("dependency get_db_conn"):
+            db = await stack.enter_async_context(connection_pool.reader())
 
-    try:
         yield db  # Provide connection to route handlers
-    finally:
-        await db.close()
 
 
 DBConnectionDependency = Annotated[aiosqlite.Connection, Depends(get_db_conn)]
 
 
-def get_storage_service(db_conn: DBConnectionDependency) -> StorageService:
+def get_result_cache(request: Request) -> LRUCache | None:
+    """
+    Retrieves the in-memory result cache from the FastAPI application state.
+
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    LRUCache or None
+        The result cache stored in the application state, or None if caching is disabled.
+    """
+
+    return request.app.state.result_cache
+
+
+ResultCacheDependency = Annotated[LRUCache | None, Depends(get_result_cache)]
+
+
+def get_write_behind(request: Request) -> WriteBehindWriter | None:
     """
-    Retrieves the storage service from the FastAPI application state.
+    Retrieves the background writer from the FastAPI application state.
+
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    WriteBehindWriter or None
+        The background writer stored in the application state, or None if inserts are written immediately.
+    """
+
+    return request.app.state.write_behind
+
+
+WriteBehindDependency = Annotated[WriteBehindWriter | None, Depends(get_write_behind)]
+
+
+def get_storage_service(
+        db_conn: DBConnectionDependency,
+        connection_pool: ConnectionPoolDependency,
+        result_cache: ResultCacheDependency,
+        write_behind: WriteBehindDependency
+) -> StorageService:
+    """
+    Creates and returns a StorageService instance.
+
+    Reads go through the reader connection borrowed for the request, while writes go through the pool's shared writer
+    connection, or are queued on the background writer if it is enabled. If caching is enabled, the storage service
+    serves results from the in-memory cache before falling back to the database.
 
     Parameters
     ----------
     db_conn : DBConnectionDependency
-        The connection to the database.
+        The reader connection borrowed from the pool.
+    connection_pool : ConnectionPool
+        The application-wide connection pool.
+    result_cache : LRUCache or None
+        The application-wide result cache, or None if caching is disabled.
+    write_behind : WriteBehindWriter or None
+        The application-wide background writer, or None if inserts are written immediately.
 
     Returns
     -------
@@ -153,13 +284,56 @@ def get_storage_service(db_conn: DBConnectionDependency) -> StorageService:
         The configured StorageService instance.
     """
 
-    return StorageService(db_conn)
+    with start_span("dependency get_storage_service"):
+        if result_cache is not None:
+            return CachedStorageService(
+                db_conn,
+                cache=result_cache,
+                write_db=connection_pool.writer,
+                write_behind=write_behind,
+                write_lock=connection_pool.write_lock
+            )
+
+        return StorageService(
+            db_conn,
+            write_db=connection_pool.writer,
+            write_behind=write_behind,
+            write_lock=connection_pool.write_lock
+        )
 
 
 StorageServiceDependency = Annotated[StorageService, Depends(get_storage_service)]
 
 
-def get_data_service(model_service: ModelServiceDependency, storage_service: StorageServiceDependency) -> DataService:
+def get_single_flight(request: Request) -> SingleFlight:
+    """
+    Retrieves the SingleFlight instance from the FastAPI application state.
+
+    The instance is shared by all requests so that concurrent cache misses for the same data are coalesced.
+
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    SingleFlight
+        The SingleFlight instance stored in the application state.
+    """
+
+    return request.app.state.single_flight
+
+
+SingleFlightDependency = Annotated[SingleFlight, Depends(get_single_flight)]
+
+
+def get_data_service(
+        settings: SettingsDependency,
+        model_service_provider: ModelServiceProviderDependency,
+        storage_service: StorageServiceDependency,
+        single_flight: SingleFlightDependency
+) -> DataService:
     """
     Creates and returns a DataService instance.
 
@@ -167,10 +341,15 @@ def get_data_service(model_service: ModelServiceDependency, storage_service: Sto
 
     Parameters
     ----------
-    model_service : ModelService
-        The model service instance responsible for generating responses.
+    settings : Settings
+        The application settings instance.
+    model_service_provider : Callable[[PromptType], ModelService]
+        Returns the application-wide model service instance responsible for generating responses for a prompt. It is
+        only called on a storage miss.
     storage_service : StorageService
         The storage service instance responsible for persisting data.
+    single_flight : SingleFlight
+        The application-wide SingleFlight instance used to coalesce concurrent cache misses.
 
     Returns
     -------
@@ -178,7 +357,36 @@ def get_data_service(model_service: ModelServiceDependency, storage_service: Sto
         The configured DataService instance.
     """
 
-    return DataService(model_service=model_service, storage_service=storage_service)
+    with start_span("dependency get_data_service"):
+        return DataService(
+            model_service_provider=model_service_provider,
+            storage_service=storage_service,
+            single_flight=single_flight,
+            batch_max_concurrency=settings.batch_max_concurrency
+        )
 
 
 DataServiceDependency = Annotated[DataService, Depends(get_data_service)]
+
+
+def get_job_service(request: Request) -> JobService:
+    """
+    Retrieves the JobService instance from the FastAPI application state.
+
+    The instance is shared by all requests so that jobs submitted by one request can be polled by another.
+
+    Parameters
+    ----------
+    request : Request
+        The FastAPI request object.
+
+    Returns
+    -------
+    JobService
+        The JobService instance stored in the application state.
+    """
+
+    return request.app.state.job_service
+
+
+JobServiceDependency = Annotated[JobService, Depends(get_job_service)]
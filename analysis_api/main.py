@@ -1,15 +1,41 @@
 import sys
+import time
 from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Callable
 
-import aiosqlite
+from anyio import to_thread
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from loguru import logger
 from google import genai
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from analysis_api.services.storage.storage_service import initialise_db
+from analysis_api.dependencies import get_storage_service
+from analysis_api.metrics import HTTP_REQUEST_SECONDS, THREAD_POOL_THREADS_IN_USE, THREAD_POOL_QUEUE_DEPTH, \
+    RESULT_CACHE_ENTRIES, RESULT_CACHE_SIZE_BYTES
+from analysis_api.services.circuit_breaker import CircuitBreaker
+from analysis_api.services.data_service import MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA, DataService
+from analysis_api.services.job_service import JobService
+from analysis_api.services.model_backends.base import ModelBackend
+from analysis_api.services.model_backends.fake import FakeModelBackend
+from analysis_api.services.model_backends.gemini import GeminiModelBackend
+from analysis_api.services.model_backends.replay import ReplayModelBackend, RecordingModelBackend, RecordingWriter
+from analysis_api.services.model_limiter import ModelCallLimiter
+from analysis_api.services.model_service import ModelService, PromptType
+from analysis_api.services.single_flight import SingleFlight
+from analysis_api.services.storage.cache import LRUCache
+from analysis_api.services.storage.connection_pool import ConnectionPool
+from analysis_api.services.storage.storage_service import initialise_db, StorageService
+from analysis_api.services.storage.write_behind import WriteBehindWriter
+from analysis_api.services.token_usage import TokenUsageTracker
 from analysis_api.settings import Settings
-from analysis_api.routers import emotions
+from analysis_api.tracing import FileSpanExporter, set_tracer_provider, start_span
+from analysis_api.routers import emotions, jobs
 
 
 def initialise_logger():
@@ -18,35 +44,339 @@ def initialise_logger():
     logger.add(sys.stderr, format="{time} {level} {message}", level="ERROR")
 
 
+def create_model_backends(settings: Settings, genai_client: genai.Client | None) -> dict[PromptType, ModelBackend]:
+    """
+    Builds the model backend for each prompt selected by the `model_backend` setting.
+
+    The fake and replay backends make no network calls, so the whole service can be run and load tested offline. If
+    `model_record_path` is set, the calls made to the selected backend are recorded there, to be replayed later.
+
+    Parameters
+    ----------
+    settings : Settings
+        The application settings instance.
+    genai_client : genai.Client or None
+        The GenAI client used for interacting with the model, which is only required by the Gemini backend.
+
+    Returns
+    -------
+    dict[PromptType, ModelBackend]
+        The ModelBackend instance for each prompt.
+
+    Raises
+    ------
+    ValueError
+        If the settings required by the selected backend are missing.
+    """
+
+    if settings.model_backend == "fake":
+        # the fake generates responses in the structure each prompt asks for, so each prompt has its own
+        model_backends = {
+            prompt_type: FakeModelBackend(
+                prompt_type,
+                latency_seconds=settings.model_fake_latency_seconds,
+                latency_jitter_seconds=settings.model_fake_latency_jitter_seconds,
+                error_rate=settings.model_fake_error_rate,
+                error_code=settings.model_fake_error_code
+            )
+            for prompt_type in PromptType
+        }
+    elif settings.model_backend == "replay":
+        if settings.model_replay_path is None:
+            raise ValueError("MODEL_REPLAY_PATH must be set to use the replay model backend")
+
+        backend = ReplayModelBackend(settings.model_replay_path, speedup=settings.model_replay_speedup)
+        model_backends = {prompt_type: backend for prompt_type in PromptType}
+    else:
+        if genai_client is None:
+            raise ValueError("A GenAI client is required to use the Gemini model backend")
+
+        backend = GeminiModelBackend(genai_client)
+        model_backends = {prompt_type: backend for prompt_type in PromptType}
+
+    if settings.model_record_path is not None:
+        # all prompts are recorded to the same file, through a single writer
+        writer = RecordingWriter(settings.model_record_path, record_prompts=settings.model_record_prompts)
+        model_backends = {
+            prompt_type: RecordingModelBackend(backend, writer) for prompt_type, backend in model_backends.items()
+        }
+
+    return model_backends
+
+
+def create_model_services(
+        settings: Settings,
+        model_backends: dict[PromptType, ModelBackend],
+        limiter: ModelCallLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        usage_tracker: TokenUsageTracker | None = None
+) -> dict[PromptType, ModelService]:
+    """
+    Builds a ModelService for each prompt, to be shared by all requests, which retries transient errors under the
+    retry policy in the settings.
+
+    Parameters
+    ----------
+    settings : Settings
+        The application settings instance.
+    model_backends : dict[PromptType, ModelBackend]
+        The model backend for each prompt, as built by `create_model_backends`.
+    limiter : ModelCallLimiter, optional
+        The limiter shared by all model services, which bounds the number of concurrent model calls.
+    circuit_breaker : CircuitBreaker, optional
+        The circuit breaker shared by all model services, which rejects model calls while the model backend is failing.
+    usage_tracker : TokenUsageTracker, optional
+        The tracker shared by all model services, which accounts for the tokens used by model calls and guards the
+        daily token budget.
+
+    Returns
+    -------
+    dict[PromptType, ModelService]
+        The ModelService instance for each prompt.
+    """
+
+    prompt_file_names = {
+        PromptType.EMOTIONAL_PROFILE: settings.model_emotional_profile_prompt_file_name,
+        PromptType.EMOTIONAL_TAGS: settings.model_emotional_tagging_prompt_file_name,
+        PromptType.EMOTIONAL_MULTI_TAGS: settings.model_emotional_multi_tagging_prompt_file_name
+    }
+    response_schemas = {PromptType.EMOTIONAL_MULTI_TAGS: MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA}
+    model_services = {}
+
+    for prompt_type, prompt_file_name in prompt_file_names.items():
+        with open(settings.model_prompts_path / prompt_file_name) as prompt_file:
+            prompt = prompt_file.read()
+
+        model_services[prompt_type] = ModelService(
+            backend=model_backends[prompt_type],
+            model=settings.model_name,
+            prompt_template=prompt,
+            temp=settings.model_temp,
+            top_p=settings.model_top_p,
+            max_output_tokens=settings.model_max_output_tokens,
+            response_schema=response_schemas.get(prompt_type),
+            limiter=limiter,
+            retry_policy=settings.retry_policy,
+            circuit_breaker=circuit_breaker,
+            usage_tracker=usage_tracker
+        )
+
+    return model_services
+
+
+def create_tracer_provider(settings: Settings) -> TracerProvider | None:
+    """
+    Builds the tracer provider that exports spans with the exporter selected by the `tracing_exporter` setting.
+
+    Traces are sampled at `tracing_sample_ratio`, unless the caller has already decided whether the trace is sampled,
+    so a request followed from the gateway is traced end to end.
+
+    Parameters
+    ----------
+    settings : Settings
+        The application settings instance.
+
+    Returns
+    -------
+    TracerProvider or None
+        The tracer provider, or None if tracing is disabled.
+
+    Raises
+    ------
+    ValueError
+        If the file exporter is selected without a file path.
+    """
+
+    if settings.tracing_exporter == "none":
+        return None
+
+    exporter: SpanExporter
+
+    if settings.tracing_exporter == "otlp":
+        # only imported when used, as the OTLP exporter pulls in protobuf
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        # without an endpoint, the exporter falls back to the standard OTEL_EXPORTER_OTLP_* environment variables
+        exporter = OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    elif settings.tracing_exporter == "file":
+        if settings.tracing_file_path is None:
+            raise ValueError("TRACING_FILE_PATH must be set to use the file trace exporter")
+
+        exporter = FileSpanExporter(settings.tracing_file_path)
+    else:
+        exporter = ConsoleSpanExporter()
+
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBasedTraceIdRatio(settings.tracing_sample_ratio)
+    )
+    tracer_provider.add_span_processor(BatchSpanProcessor(exporter))
+
+    return tracer_provider
+
+
+def create_data_service_factory(
+        app: FastAPI,
+        settings: Settings
+) -> Callable[[], AsyncContextManager[DataService]]:
+    """
+    Creates a factory for data services used outside a request, such as by background jobs.
+
+    Each data service is built from the application-wide services in the same way as for a request, borrowing a reader
+    connection from the pool for as long as the returned context is open.
+
+    Parameters
+    ----------
+    app : FastAPI
+        The application, whose state holds the services shared by all requests.
+    settings : Settings
+        The application settings instance.
+
+    Returns
+    -------
+    Callable[[], AsyncContextManager[DataService]]
+        A callable returning a context manager that provides a data service.
+    """
+
+    @asynccontextmanager
+    async def data_service_factory() -> AsyncIterator[DataService]:
+        async with app.state.connection_pool.reader() as db:
+            yield DataService(
+                model_service_provider=app.state.model_services.__getitem__,
+                storage_service=get_storage_service(
+                    db_conn=db,
+                    connection_pool=app.state.connection_pool,
+                    result_cache=app.state.result_cache,
+                    write_behind=app.state.write_behind
+                ),
+                single_flight=app.state.single_flight,
+                batch_max_concurrency=settings.batch_max_concurrency
+            )
+
+    return data_service_factory
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     settings = Settings()
 
     initialise_logger()
 
-    # initialise database
-    db = await aiosqlite.connect(settings.db_path)
-    await initialise_db(db)
-    await db.close()
+    # initialise tracing, which records nothing unless an exporter is configured
+    tracer_provider = create_tracer_provider(settings)
+    set_tracer_provider(tracer_provider)
+
+    # initialise database and connection pool
+    storage_profile = settings.storage_profile
+    connection_pool = ConnectionPool(
+        db_path=settings.db_path,
+        size=settings.db_pool_size,
+        storage_profile=storage_profile
+    )
+    await connection_pool.open()
+    await initialise_db(connection_pool.writer, storage_profile=storage_profile)
+    app.state.connection_pool = connection_pool
+
+    # initialise background writer, which batches inserts on the writer connection
+    if settings.write_behind_enabled:
+        write_behind = WriteBehindWriter(
+            storage_service=StorageService(connection_pool.writer, write_lock=connection_pool.write_lock),
+            max_batch_size=settings.write_behind_max_batch_size,
+            flush_interval_seconds=settings.write_behind_flush_interval_seconds,
+            max_queue_size=settings.write_behind_max_queue_size
+        )
+        await write_behind.start()
+    else:
+        write_behind = None
+
+    app.state.write_behind = write_behind
+
+    # initialise in-memory cache in front of the database, disabled if it cannot hold any entries
+    if settings.cache_max_entries > 0 and settings.cache_max_bytes > 0:
+        app.state.result_cache = LRUCache(
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes,
+            ttl_seconds=settings.cache_ttl_seconds
+        )
+    else:
+        app.state.result_cache = None
 
-    # initialise prompts
-    prompts_path = settings.model_prompts_path
+    # initialise genai client, which is only needed when requests are sent to Gemini
+    if settings.model_backend == "gemini":
+        app.state.genai_client = genai.Client(
+            vertexai=True,
+            project=settings.gcp_project_id,
+            location=settings.gcp_location
+        )
+    else:
+        app.state.genai_client = None
 
-    with open(prompts_path / settings.model_emotional_profile_prompt_file_name) as emotional_profile_prompt_file:
-        app.state.model_emotional_profile_prompt = emotional_profile_prompt_file.read()
+    # initialise a model service for each prompt, shared by all requests, behind a shared concurrency limit
+    app.state.model_call_limiter = ModelCallLimiter(max_concurrency=settings.model_max_concurrency)
 
-    with open(prompts_path / settings.model_emotional_tagging_prompt_file_name) as emotional_tagging_prompt_file:
-        app.state.model_emotional_tagging_prompt = emotional_tagging_prompt_file.read()
+    # while the circuit breaker is open, only stored results are served and misses fail fast
+    if settings.model_circuit_breaker_enabled:
+        app.state.model_circuit_breaker = CircuitBreaker(
+            failure_rate_threshold=settings.model_circuit_breaker_failure_rate_threshold,
+            minimum_calls=settings.model_circuit_breaker_minimum_calls,
+            window_size=settings.model_circuit_breaker_window_size,
+            open_seconds=settings.model_circuit_breaker_open_seconds
+        )
+    else:
+        app.state.model_circuit_breaker = None
+
+    # account for the tokens used by model calls, persisting daily totals and holding back batch work over budget
+    usage_tracker = TokenUsageTracker(
+        storage_service=StorageService(connection_pool.writer, write_lock=connection_pool.write_lock),
+        daily_token_budget=settings.model_daily_token_budget,
+        on_budget_exhausted=settings.model_token_budget_exhausted_policy,
+        flush_interval_seconds=settings.model_usage_flush_interval_seconds
+    )
+    await usage_tracker.start()
+    app.state.usage_tracker = usage_tracker
 
-    # initialise genai client
-    app.state.genai_client = genai.Client(
-        vertexai=True,
-        project=settings.gcp_project_id,
-        location=settings.gcp_location
+    app.state.model_backends = create_model_backends(settings, app.state.genai_client)
+    app.state.model_services = create_model_services(
+        settings,
+        app.state.model_backends,
+        limiter=app.state.model_call_limiter,
+        circuit_breaker=app.state.model_circuit_breaker,
+        usage_tracker=usage_tracker
     )
 
+    # initialise single flight for coalescing concurrent cache misses
+    app.state.single_flight = SingleFlight()
+
+    # initialise job service for filling storage in the background
+    job_service = JobService(
+        data_service_factory=create_data_service_factory(app, settings),
+        chunk_size=settings.job_chunk_size,
+        max_concurrent_jobs=settings.job_max_concurrent_jobs,
+        max_retained_jobs=settings.job_max_retained_jobs
+    )
+    app.state.job_service = job_service
+
     yield
 
+    await job_service.stop()
+
+    # flush any recording of the model calls
+    for model_backend in set(app.state.model_backends.values()):
+        model_backend.close()
+
+    # write all queued results and token usage before closing the connections
+    if write_behind is not None:
+        await write_behind.stop()
+
+    await usage_tracker.stop()
+
+    # export any spans still queued
+    if tracer_provider is not None:
+        set_tracer_provider(None)
+        tracer_provider.shutdown()
+
+    await connection_pool.close()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -56,7 +386,42 @@ def health_check():
     return {"status": "running"}
 
 
+@app.get("/health/db")
+async def db_health_check(request: Request):
+    """Checks that the database connection pool can serve reads and writes."""
+
+    if not await request.app.state.connection_pool.health_check():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """
+    Exposes Prometheus metrics, such as per-route request latency, the time spent in each stage of a request, the
+    storage and result cache hit ratios, the model call queue depth and wait time and the tokens used by model
+    calls.
+
+    The thread pool and result cache gauges are read when the metrics are scraped, so this endpoint is async and does
+    not itself occupy a worker thread.
+    """
+
+    thread_limiter = to_thread.current_default_thread_limiter().statistics()
+    THREAD_POOL_THREADS_IN_USE.set(thread_limiter.borrowed_tokens)
+    THREAD_POOL_QUEUE_DEPTH.set(thread_limiter.tasks_waiting)
+
+    result_cache = getattr(request.app.state, "result_cache", None)
+
+    if result_cache is not None:
+        RESULT_CACHE_ENTRIES.set(len(result_cache))
+        RESULT_CACHE_SIZE_BYTES.set(result_cache.size_bytes)
+
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 app.include_router(emotions.router)
+app.include_router(jobs.router)
 
 
 @app.exception_handler(Exception)
@@ -72,7 +437,15 @@ async def global_exception_handler(request: Request, e: Exception):
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Middleware to log all incoming requests."""
+    """
+    Middleware to log all incoming requests and record their latency.
+
+    Latency is labelled by the matched route template, such as /jobs/{job_id}, so the metric does not grow a series
+    per URL. Streamed responses are timed until their headers are sent.
+
+    Each request is also traced as a server span, continuing the trace in the request's traceparent header if it has
+    one, so that spans recorded while serving it are part of the caller's trace.
+    """
 
     ip_addr = request.client.host
     port = request.client.port
@@ -83,5 +456,28 @@ async def log_requests(request: Request, call_next):
 
     logger.info(log_message)
 
-    response = await call_next(request)
+    started = time.perf_counter()
+
+    with start_span(
+            req_method,
+            kind=trace.SpanKind.SERVER,
+            context=propagate.extract(request.headers),
+            attributes={"http.request.method": req_method, "url.path": url.path}
+    ) as span:
+        response = await call_next(request)
+
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        span.update_name(f"{req_method} {route_path}")
+        span.set_attributes({"http.route": route_path, "http.response.status_code": response.status_code})
+
+        if response.status_code >= 500:
+            span.set_status(trace.StatusCode.ERROR)
+
+    HTTP_REQUEST_SECONDS.labels(
+        method=req_method,
+        route=route_path,
+        status=str(response.status_code)
+    ).observe(time.perf_counter() - started)
+
     return response
@@ -0,0 +1,105 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+MODEL_CALLS_IN_FLIGHT = Gauge(
+    "model_calls_in_flight",
+    "The number of model calls currently holding a concurrency slot."
+)
+MODEL_CALL_QUEUE_DEPTH = Gauge(
+    "model_call_queue_depth",
+    "The number of model calls waiting for a concurrency slot.",
+    ["priority"]
+)
+MODEL_CALL_QUEUE_WAIT_SECONDS = Histogram(
+    "model_call_queue_wait_seconds",
+    "The time model calls spent waiting for a concurrency slot.",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+MODEL_CALL_ATTEMPT_SECONDS = Histogram(
+    "model_call_attempt_seconds",
+    "The latency of each attempt of a model call, including attempts that are retried.",
+    ["outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+MODEL_CALL_RETRIES = Counter(
+    "model_call_retries",
+    "The number of model call attempts that failed with a retryable error and were retried.",
+    ["status_code"]
+)
+MODEL_CIRCUIT_BREAKER_STATE = Gauge(
+    "model_circuit_breaker_state",
+    "The state of the circuit breaker around the model backend: 0 closed, 1 open, 2 half-open."
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "The latency of each HTTP request, labelled by the route template rather than the URL.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+REQUEST_STAGE_SECONDS = Histogram(
+    "request_stage_seconds",
+    "The time spent in each stage of serving a request: storage_lookup, model_call, json_parsing, "
+    "response_validation and storage_store.",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+STORAGE_LOOKUPS = Counter(
+    "storage_lookups",
+    "The number of results looked up in storage, by kind and whether they were found, for the storage hit ratio.",
+    ["kind", "result"]
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "result_cache_lookups",
+    "The number of lookups in the in-process result cache, by whether a live entry was found.",
+    ["result"]
+)
+RESULT_CACHE_REMOVALS = Counter(
+    "result_cache_removals",
+    "The number of entries removed from the in-process result cache, by reason: evicted to stay within its bounds or "
+    "expired.",
+    ["reason"]
+)
+RESULT_CACHE_ENTRIES = Gauge(
+    "result_cache_entries",
+    "The number of entries held by the in-process result cache, as of the last scrape."
+)
+RESULT_CACHE_SIZE_BYTES = Gauge(
+    "result_cache_size_bytes",
+    "The approximate total size of the values held by the in-process result cache, as of the last scrape."
+)
+THREAD_POOL_THREADS_IN_USE = Gauge(
+    "thread_pool_threads_in_use",
+    "The number of worker threads running sync endpoints and dependencies, as of the last scrape."
+)
+THREAD_POOL_QUEUE_DEPTH = Gauge(
+    "thread_pool_queue_depth",
+    "The number of sync endpoints and dependencies waiting for a worker thread, as of the last scrape."
+)
+DB_CONNECTION_WAIT_SECONDS = Histogram(
+    "db_connection_wait_seconds",
+    "The time spent waiting for a reader connection from the connection pool.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+MODEL_TOKENS = Counter(
+    "model_tokens",
+    "The number of tokens used by model calls, by endpoint, emotion and type: prompt, output or total.",
+    ["endpoint", "emotion", "type"]
+)
+MODEL_PROMPT_TOKENS = Histogram(
+    "model_prompt_tokens",
+    "The number of prompt tokens sent in each model call.",
+    ["endpoint"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+)
+MODEL_TOKENS_USED_TODAY = Gauge(
+    "model_tokens_used_today",
+    "The total number of tokens used by model calls since midnight UTC, which counts towards the daily token budget."
+)
+MODEL_TOKEN_BUDGET_REJECTIONS = Counter(
+    "model_token_budget_rejections",
+    "The number of non-interactive model calls rejected because the daily token budget was used up."
+)
+MODEL_TOKEN_BUDGET_WAITING = Gauge(
+    "model_token_budget_waiting",
+    "The number of non-interactive model calls queued until the daily token budget resets."
+)
@@ -120,6 +120,42 @@ class EmotionalProfileResponse(EmotionalProfileRequest):
     emotional_profile: EmotionalProfile
 
 
+MAX_BATCH_SIZE = 100
+"""The maximum number of tracks that can be analysed in a single batch request."""
+
+
+EmotionalProfileBatchRequest = Annotated[
+    list[EmotionalProfileRequest],
+    Field(min_length=1, max_length=MAX_BATCH_SIZE)
+]
+"""
+Type alias for a batch of emotional profile requests.
+
+Ensures that a batch contains between 1 and MAX_BATCH_SIZE requests.
+"""
+
+
+class EmotionalProfileBatchResult(BaseModel):
+    """
+    The result for a single track in a batch emotional profile request.
+
+    Exactly one of `emotional_profile` and `error` is set.
+
+    Attributes
+    ----------
+    track_id : str
+        The unique identifier for the track.
+    emotional_profile : EmotionalProfileResponse or None
+        The emotional profile response for the track, if it was retrieved successfully.
+    error : str or None
+        A description of the failure, if the emotional profile could not be retrieved.
+    """
+
+    track_id: str
+    emotional_profile: EmotionalProfileResponse | None = None
+    error: str | None = None
+
+
 class Emotion(Enum):
     """
     Enum representing possible emotions in a song's lyrics.
@@ -196,3 +232,86 @@ class EmotionalTagsResponse(EmotionalTagsRequest):
     """
 
     pass
+
+
+class MultiEmotionalTagsRequest(AnalysisRequestBase):
+    """
+    Request model for retrieving emotional tags in a track's lyrics for several emotions at once.
+
+    Attributes
+    ----------
+    emotions : list of Emotion
+        The emotions to identify and tag within the lyrics. Each emotion is tagged separately.
+    """
+
+    emotions: Annotated[list[Emotion], Field(min_length=1)]
+
+
+MAX_PRECOMPUTE_JOB_SIZE = 10_000
+"""The maximum number of tracks that can be submitted in a single precompute job."""
+
+
+class PrecomputeJobRequest(BaseModel):
+    """
+    Request model for a background job that stores the emotional profiles of several tracks ahead of time.
+
+    Attributes
+    ----------
+    tracks : list of EmotionalProfileRequest
+        The tracks to analyse, between 1 and MAX_PRECOMPUTE_JOB_SIZE of them.
+    tag_dominant_emotions : int
+        The number of dominant emotions in each track's profile to also store emotional tags for, by default 0.
+    """
+
+    tracks: Annotated[list[EmotionalProfileRequest], Field(min_length=1, max_length=MAX_PRECOMPUTE_JOB_SIZE)]
+    tag_dominant_emotions: Annotated[int, Field(ge=0, le=len(Emotion))] = 0
+
+
+class JobStatus(Enum):
+    """
+    Enum representing the status of a background job.
+
+    Attributes
+    ----------
+    QUEUED : str
+        The job is waiting for a running job to finish.
+    RUNNING : str
+        The job is being processed.
+    COMPLETED : str
+        Every track in the job has been processed, although some may have failed.
+    FAILED : str
+        The job was stopped by an error before every track was processed.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PrecomputeJob(BaseModel):
+    """
+    The progress of a background precompute job.
+
+    Attributes
+    ----------
+    job_id : str
+        The unique identifier for the job.
+    status : JobStatus
+        The status of the job.
+    total : int
+        The number of tracks in the job.
+    completed : int
+        The number of tracks whose results have been stored, or were already stored.
+    failed : int
+        The number of tracks whose results could not be stored.
+    error : str or None
+        A description of the error that stopped the job, if it failed.
+    """
+
+    job_id: str
+    status: JobStatus = JobStatus.QUEUED
+    total: int
+    completed: int = 0
+    failed: int = 0
+    error: str | None = None
@@ -1,17 +1,82 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, TypeVar
 
-from analysis_api.dependencies import DataServiceDependency
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from analysis_api.dependencies import DataServiceDependency, RequestDeadlineDependency, BatchRequestDeadlineDependency
 from analysis_api.models import EmotionalProfileRequest, EmotionalTagsRequest, EmotionalTagsResponse, \
-    EmotionalProfileResponse
-from analysis_api.services.data_service import DataServiceException
+    EmotionalProfileResponse, EmotionalProfileBatchRequest, EmotionalProfileBatchResult, MultiEmotionalTagsRequest
+from analysis_api.services.data_service import DataServiceException, DataServiceUnavailableException, \
+    DataServiceTimeoutException
+from analysis_api.services.deadline import Deadline
 
 router = APIRouter(prefix="/emotions")
 
+T = TypeVar("T")
+
+
+async def _serve_within_deadline(http_request: Request, deadline: Deadline, work: Awaitable[T]) -> T:
+    """
+    Awaits the work for a request, cancelling it if the deadline expires or the client disconnects.
+
+    Parameters
+    ----------
+    http_request : Request
+        The FastAPI request object, used to detect the client disconnecting.
+    deadline : Deadline
+        The deadline of the request.
+    work : Awaitable[T]
+        The work to be done for the request.
+
+    Returns
+    -------
+    T
+        The result of the work.
+
+    Raises
+    ------
+    HTTPException
+        If the deadline expires or the model call times out, a 504 error is raised. If the client disconnects, a 499
+        error is raised, which is never received but ends the request.
+    """
+
+    async def wait_for_disconnect():
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+
+    try:
+        async with deadline.scope():
+            task = asyncio.ensure_future(work)
+            disconnected = asyncio.ensure_future(wait_for_disconnect())
+
+            try:
+                await asyncio.wait((task, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                disconnected.cancel()
+                task.cancel()
+                # the work is left to unwind before the request ends. A model call it shares with other requests carries
+                # on for them, and is cancelled by the single-flight layer once no request is waiting on it.
+                await asyncio.wait((task,))
+
+            if task.cancelled():
+                logger.info(f"Client disconnected, cancelled request for {http_request.url.path}")
+                raise HTTPException(status_code=499, detail="Client closed request")
+
+            return task.result()
+    except (TimeoutError, DataServiceTimeoutException):
+        logger.warning(f"Request deadline of {deadline.timeout_seconds}s exceeded for {http_request.url.path}")
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
 
 @router.post("/profile")
 async def get_emotional_profile(
         request: EmotionalProfileRequest,
-        data_service: DataServiceDependency
+        data_service: DataServiceDependency,
+        http_request: Request,
+        deadline: RequestDeadlineDependency
 ) -> EmotionalProfileResponse:
     """
     Retrieves the emotional profile of a given track.
@@ -25,6 +90,10 @@ async def get_emotional_profile(
         The request containing the track ID and lyrics to analyze.
     data_service : DataServiceDependency
         The data service dependency responsible for retrieving the emotional profile.
+    http_request : Request
+        The FastAPI request object, used to cancel the request if the client disconnects.
+    deadline : RequestDeadlineDependency
+        The deadline by which the request must be served.
 
     Returns
     -------
@@ -34,12 +103,67 @@ async def get_emotional_profile(
     Raises
     ------
     HTTPException
-        If a DataServiceException occurs, a 500 error is raised.
+        If the model service is unavailable and the result is not stored, a 503 error is raised. If the deadline
+        expires, a 504 error is raised. If any other DataServiceException occurs, a 500 error is raised.
     """
 
     try:
-        emotional_profile = await data_service.get_emotional_profile(request)
+        emotional_profile = await _serve_within_deadline(
+            http_request,
+            deadline,
+            data_service.get_emotional_profile(request)
+        )
         return emotional_profile
+    except DataServiceUnavailableException as e:
+        print(e)
+        raise HTTPException(status_code=503, detail="Model service unavailable, only stored results can be served")
+    except DataServiceException as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+
+@router.post("/profiles")
+async def get_emotional_profiles(
+        requests: EmotionalProfileBatchRequest,
+        data_service: DataServiceDependency,
+        http_request: Request,
+        deadline: BatchRequestDeadlineDependency
+) -> list[EmotionalProfileBatchResult]:
+    """
+    Retrieves the emotional profiles of several tracks in a single request.
+
+    Each result contains either the emotional profile of the track or an error describing why it could not be
+    retrieved, so a failure for one track does not fail the whole batch.
+
+    Parameters
+    ----------
+    requests : EmotionalProfileBatchRequest
+        The requests containing the track IDs and lyrics to analyze.
+    data_service : DataServiceDependency
+        The data service dependency responsible for retrieving the emotional profiles.
+    http_request : Request
+        The FastAPI request object, used to cancel the request if the client disconnects.
+    deadline : BatchRequestDeadlineDependency
+        The deadline by which the whole batch must be served.
+
+    Returns
+    -------
+    list[EmotionalProfileBatchResult]
+        A result for each request, in the same order as the requests.
+
+    Raises
+    ------
+    HTTPException
+        If the deadline expires, a 504 error is raised. If a DataServiceException occurs, a 500 error is raised.
+    """
+
+    try:
+        emotional_profiles = await _serve_within_deadline(
+            http_request,
+            deadline,
+            data_service.get_emotional_profiles(requests)
+        )
+        return emotional_profiles
     except DataServiceException as e:
         print(e)
         raise HTTPException(status_code=500, detail="Something went wrong")
@@ -48,7 +172,9 @@ async def get_emotional_profile(
 @router.post("/tags")
 async def get_emotional_tags(
         request: EmotionalTagsRequest,
-        data_service: DataServiceDependency
+        data_service: DataServiceDependency,
+        http_request: Request,
+        deadline: RequestDeadlineDependency
 ) -> EmotionalTagsResponse:
     """
     Retrieves emotional tags for the lyrics of a given track based on a specified emotion.
@@ -62,6 +188,10 @@ async def get_emotional_tags(
        The request containing the track ID, lyrics, and the emotion to analyze.
     data_service : DataServiceDependency
        The data service dependency responsible for retrieving or generating the emotional tags.
+    http_request : Request
+       The FastAPI request object, used to cancel the request if the client disconnects.
+    deadline : RequestDeadlineDependency
+       The deadline by which the request must be served.
 
     Returns
     -------
@@ -71,12 +201,137 @@ async def get_emotional_tags(
     Raises
     ------
     HTTPException
-       If a DataServiceException occurs, a 500 error is raised.
+       If the model service is unavailable and the result is not stored, a 503 error is raised. If the deadline
+       expires, a 504 error is raised. If any other DataServiceException occurs, a 500 error is raised.
     """
 
     try:
-        emotional_tags = await data_service.get_emotional_tags(request)
+        emotional_tags = await _serve_within_deadline(
+            http_request,
+            deadline,
+            data_service.get_emotional_tags(request)
+        )
         return emotional_tags
+    except DataServiceUnavailableException as e:
+        print(e)
+        raise HTTPException(status_code=503, detail="Model service unavailable, only stored results can be served")
+    except DataServiceException as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+
+def _server_sent_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/tags/stream")
+async def stream_emotional_tags(
+        request: EmotionalTagsRequest,
+        data_service: DataServiceDependency,
+        deadline: RequestDeadlineDependency
+) -> StreamingResponse:
+    """
+    Streams emotional tags for the lyrics of a given track based on a specified emotion, as server-sent events.
+
+    The tagged lyrics are forwarded as they are generated, in `chunk` events with a `lyrics` field. Once generation has
+    finished, a `done` event carries the complete EmotionalTagsResponse. If an error occurs or the deadline expires, an
+    `error` event is sent and the stream ends.
+
+    Parameters
+    ----------
+    request : EmotionalTagsRequest
+       The request containing the track ID, lyrics, and the emotion to analyze.
+    data_service : DataServiceDependency
+       The data service dependency responsible for retrieving or generating the emotional tags.
+    deadline : RequestDeadlineDependency
+       The deadline by which the whole stream must be served.
+
+    Returns
+    -------
+    StreamingResponse
+       A `text/event-stream` response containing the emotional tags applied to the lyrics.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        stream = data_service.stream_emotional_tags(request)
+
+        try:
+            while True:
+                # the deadline is only enforced while waiting for the next item, never across a yield
+                async with deadline.scope():
+                    item = await anext(stream, None)
+
+                if item is None:
+                    break
+
+                if isinstance(item, EmotionalTagsResponse):
+                    yield _server_sent_event("done", item.model_dump(mode="json"))
+                else:
+                    yield _server_sent_event("chunk", {"lyrics": item})
+        except (TimeoutError, DataServiceTimeoutException):
+            logger.warning(f"Request deadline of {deadline.timeout_seconds}s exceeded for streamed emotional tags")
+            yield _server_sent_event("error", {"detail": "Request deadline exceeded", "status_code": 504})
+        except DataServiceUnavailableException as e:
+            print(e)
+            yield _server_sent_event(
+                "error",
+                {"detail": "Model service unavailable, only stored results can be served", "status_code": 503}
+            )
+        except DataServiceException as e:
+            print(e)
+            yield _server_sent_event("error", {"detail": "Something went wrong"})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/tags/multi")
+async def get_multi_emotional_tags(
+        request: MultiEmotionalTagsRequest,
+        data_service: DataServiceDependency,
+        http_request: Request,
+        deadline: RequestDeadlineDependency
+) -> list[EmotionalTagsResponse]:
+    """
+    Retrieves emotional tags for the lyrics of a given track based on several emotions.
+
+    Each emotion is tagged separately, with phrases that correspond to the emotion surrounded by span tags. Tags that
+    have not been generated before are generated together in a single model call.
+
+    Parameters
+    ----------
+    request : MultiEmotionalTagsRequest
+       The request containing the track ID, lyrics, and the emotions to analyze.
+    data_service : DataServiceDependency
+       The data service dependency responsible for retrieving or generating the emotional tags.
+    http_request : Request
+       The FastAPI request object, used to cancel the request if the client disconnects.
+    deadline : RequestDeadlineDependency
+       The deadline by which the request must be served.
+
+    Returns
+    -------
+    list[EmotionalTagsResponse]
+       A response for each requested emotion containing the emotional tags applied to the lyrics.
+
+    Raises
+    ------
+    HTTPException
+       If the model service is unavailable and the result is not stored, a 503 error is raised. If the deadline
+       expires, a 504 error is raised. If any other DataServiceException occurs, a 500 error is raised.
+    """
+
+    try:
+        emotional_tags = await _serve_within_deadline(
+            http_request,
+            deadline,
+            data_service.get_multi_emotional_tags(request)
+        )
+        return emotional_tags
+    except DataServiceUnavailableException as e:
+        print(e)
+        raise HTTPException(status_code=503, detail="Model service unavailable, only stored results can be served")
     except DataServiceException as e:
         print(e)
         raise HTTPException(status_code=500, detail="Something went wrong")
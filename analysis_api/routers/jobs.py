@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException
+
+from analysis_api.dependencies import JobServiceDependency
+from analysis_api.models import PrecomputeJobRequest, PrecomputeJob
+
+router = APIRouter(prefix="/jobs")
+
+
+@router.post("/precompute", status_code=202)
+async def submit_precompute_job(request: PrecomputeJobRequest, job_service: JobServiceDependency) -> PrecomputeJob:
+    """
+    Submits a background job that stores the emotional profiles of several tracks ahead of time.
+
+    The job runs after the response is sent, skipping tracks whose results are already stored. If
+    `tag_dominant_emotions` is set, the emotional tags for that many of the dominant emotions in each track's profile
+    are also stored. Its progress can be polled with the returned job ID.
+
+    Parameters
+    ----------
+    request : PrecomputeJobRequest
+        The request containing the tracks to analyse and the number of dominant emotions to tag.
+    job_service : JobServiceDependency
+        The job service dependency responsible for running the job.
+
+    Returns
+    -------
+    PrecomputeJob
+        The submitted job, including its ID.
+    """
+
+    return job_service.submit(request)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, job_service: JobServiceDependency) -> PrecomputeJob:
+    """
+    Retrieves the progress of a background job.
+
+    Parameters
+    ----------
+    job_id : str
+        The unique identifier for the job.
+    job_service : JobServiceDependency
+        The job service dependency responsible for running the job.
+
+    Returns
+    -------
+    PrecomputeJob
+        The job, including its status and the number of tracks processed so far.
+
+    Raises
+    ------
+    HTTPException
+        If no job with the ID is known, a 404 error is raised.
+    """
+
+    job = job_service.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    return job
@@ -0,0 +1,610 @@
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from json import JSONDecodeError
+from pathlib import Path
+from typing import AsyncIterator, Callable, Mapping
+from urllib.parse import quote
+
+import pydantic
+from google import genai
+from google.genai import types, errors
+from loguru import logger
+
+from analysis_api.models import EmotionalProfileRequest, EmotionalProfile
+from analysis_api.services.data_service import multi_emotional_tags_model_input
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.model_service import ModelService, ModelServiceException, PromptType, \
+    TokenBudgetExhaustedException
+from analysis_api.services.storage.storage_service import StorageService
+from analysis_api.services.token_usage import UsageKey
+
+
+class BatchPredictionException(Exception):
+    """Base exception for errors encountered while running a batch prediction job."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class BatchPredictionBackend(ABC):
+    """
+    Runs batch prediction jobs, each of which generates a response for every request in an input file.
+
+    Output lines follow the Vertex AI batch prediction format: each holds the `request` it answers, and either its
+    `response` or a non-empty `status` describing why it failed.
+
+    Methods
+    -------
+    submit(model_service: ModelService, requests: list[dict], display_name: str) -> str
+        Submits a job for the requests and returns its name.
+    wait(job_name: str)
+        Waits for the job to finish.
+    results(job_name: str) -> AsyncIterator[dict]
+        Yields each line of the job's output.
+    """
+
+    @abstractmethod
+    async def submit(self, model_service: ModelService, requests: list[dict], display_name: str) -> str:
+        """
+        Submits a job for the requests and returns its name.
+
+        Parameters
+        ----------
+        model_service : ModelService
+            The model service the requests were built by, whose model answers them.
+        requests : list of dict
+            The requests, as built by `ModelService.batch_request`.
+        display_name : str
+            A unique, human-readable name for the job.
+
+        Returns
+        -------
+        str
+            The name of the job.
+        """
+
+    @abstractmethod
+    async def wait(self, job_name: str):
+        """
+        Waits for the job to finish.
+
+        Parameters
+        ----------
+        job_name : str
+            The name of the job.
+
+        Raises
+        ------
+        BatchPredictionException
+            If the job fails or is cancelled.
+        """
+
+    @abstractmethod
+    def results(self, job_name: str) -> AsyncIterator[dict]:
+        """
+        Yields each line of the job's output.
+
+        Parameters
+        ----------
+        job_name : str
+            The name of the job.
+
+        Yields
+        ------
+        dict
+            The next output line, holding the `request` and its `response` or failure `status`.
+        """
+
+
+class LocalBatchPredictionBackend(BatchPredictionBackend):
+    """
+    A stand-in for Vertex AI batch prediction that runs jobs locally.
+
+    Input and output files are written to a local directory in the Vertex AI format, and each request is answered with
+    an online call through the model service's backend. With the fake or replay backend this runs offline, so the batch
+    path can be tested end to end.
+
+    Attributes
+    ----------
+    directory : Path
+        The directory that job files are written to.
+    concurrency : int
+        The maximum number of requests answered at once.
+    """
+
+    def __init__(self, directory: Path, concurrency: int = 16):
+        """
+        Parameters
+        ----------
+        directory : Path
+            The directory that job files are written to.
+        concurrency : int, optional
+            The maximum number of requests answered at once, by default 16.
+        """
+
+        self.directory = directory
+        self.concurrency = concurrency
+        self._model_services: dict[str, ModelService] = {}
+
+    async def submit(self, model_service: ModelService, requests: list[dict], display_name: str) -> str:
+        job_directory = self.directory / display_name
+        job_directory.mkdir(parents=True, exist_ok=True)
+
+        with open(job_directory / "input.jsonl", "w", encoding="utf-8") as file:
+            file.writelines(json.dumps({"request": request}) + "\n" for request in requests)
+
+        self._model_services[display_name] = model_service
+
+        return display_name
+
+    async def _answer(self, model_service: ModelService, request: dict) -> dict:
+        try:
+            res = await model_service.backend.agenerate_content(
+                model=model_service.model,
+                contents=[types.Content.model_validate(content) for content in request["contents"]],
+                config=model_service.config
+            )
+        except errors.APIError as e:
+            return {"request": request, "status": str(e)}
+
+        response = {"candidates": [{"content": {"role": "model", "parts": [{"text": res.text}]}}]}
+
+        if res.usage_metadata is not None:
+            response["usageMetadata"] = res.usage_metadata.model_dump(mode="json", by_alias=True, exclude_none=True)
+
+        return {"request": request, "response": response, "status": ""}
+
+    async def wait(self, job_name: str):
+        model_service = self._model_services.pop(job_name, None)
+
+        if model_service is None:
+            raise BatchPredictionException(f"Unknown batch prediction job: {job_name}")
+
+        job_directory = self.directory / job_name
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with open(job_directory / "input.jsonl", encoding="utf-8") as file:
+            requests = [json.loads(line)["request"] for line in file]
+
+        async def answer(request: dict) -> dict:
+            async with semaphore:
+                return await self._answer(model_service, request)
+
+        lines = await asyncio.gather(*(answer(request) for request in requests))
+
+        with open(job_directory / "predictions.jsonl", "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(line) + "\n" for line in lines)
+
+    async def results(self, job_name: str) -> AsyncIterator[dict]:
+        with open(self.directory / job_name / "predictions.jsonl", encoding="utf-8") as file:
+            for line in file:
+                yield json.loads(line)
+
+
+class VertexBatchPredictionBackend(BatchPredictionBackend):
+    """
+    Runs jobs with Vertex AI batch prediction, which is cheaper than online calls and not subject to their rate limits.
+
+    Input files are uploaded to, and output files read from, Cloud Storage under `gcs_uri`, using the application
+    default credentials.
+
+    Attributes
+    ----------
+    client : genai.Client
+        The GenAI client, which must be configured for Vertex AI.
+    gcs_uri : str
+        The Cloud Storage prefix that job files are written under, such as gs://bucket/batch-prediction.
+    poll_interval_seconds : float
+        The time between checks on the state of a running job.
+    """
+
+    TERMINAL_STATES = {
+        types.JobState.JOB_STATE_SUCCEEDED,
+        types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+        types.JobState.JOB_STATE_FAILED,
+        types.JobState.JOB_STATE_CANCELLED,
+        types.JobState.JOB_STATE_EXPIRED
+    }
+
+    def __init__(self, client: genai.Client, gcs_uri: str, poll_interval_seconds: float = 60.0):
+        """
+        Parameters
+        ----------
+        client : genai.Client
+            The GenAI client, which must be configured for Vertex AI.
+        gcs_uri : str
+            The Cloud Storage prefix that job files are written under, such as gs://bucket/batch-prediction.
+        poll_interval_seconds : float, optional
+            The time between checks on the state of a running job, by default 60.
+        """
+
+        self.client = client
+        self.gcs_uri = gcs_uri.rstrip("/")
+        self.poll_interval_seconds = poll_interval_seconds
+        self._session = None
+
+    def _storage_session(self):
+        if self._session is None:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+
+            credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/devstorage.read_write"])
+            self._session = AuthorizedSession(credentials)
+
+        return self._session
+
+    @staticmethod
+    def _split_gcs_uri(uri: str) -> tuple[str, str]:
+        bucket, _, name = uri.removeprefix("gs://").partition("/")
+        return bucket, name
+
+    def _upload(self, uri: str, data: bytes):
+        bucket, name = self._split_gcs_uri(uri)
+        res = self._storage_session().post(
+            f"https://storage.googleapis.com/upload/storage/v1/b/{bucket}/o",
+            params={"uploadType": "media", "name": name},
+            data=data,
+            headers={"Content-Type": "application/jsonl"}
+        )
+        res.raise_for_status()
+
+    def _list(self, prefix_uri: str) -> list[str]:
+        bucket, prefix = self._split_gcs_uri(prefix_uri)
+        uris = []
+        params = {"prefix": prefix}
+
+        while True:
+            res = self._storage_session().get(f"https://storage.googleapis.com/storage/v1/b/{bucket}/o", params=params)
+            res.raise_for_status()
+            listing = res.json()
+            uris.extend(f"gs://{bucket}/{item['name']}" for item in listing.get("items", []))
+
+            if "nextPageToken" not in listing:
+                return uris
+
+            params["pageToken"] = listing["nextPageToken"]
+
+    def _download(self, uri: str) -> bytes:
+        bucket, name = self._split_gcs_uri(uri)
+        res = self._storage_session().get(
+            f"https://storage.googleapis.com/storage/v1/b/{bucket}/o/{quote(name, safe='')}",
+            params={"alt": "media"}
+        )
+        res.raise_for_status()
+        return res.content
+
+    async def submit(self, model_service: ModelService, requests: list[dict], display_name: str) -> str:
+        input_uri = f"{self.gcs_uri}/{display_name}/input.jsonl"
+        data = "".join(json.dumps({"request": request}) + "\n" for request in requests).encode("utf-8")
+
+        await asyncio.to_thread(self._upload, input_uri, data)
+
+        job = await self.client.aio.batches.create(
+            model=model_service.model,
+            src=input_uri,
+            config=types.CreateBatchJobConfig(display_name=display_name, dest=f"{self.gcs_uri}/{display_name}/output")
+        )
+        logger.info(f"Submitted batch prediction job {job.name} for {len(requests)} requests.")
+
+        return job.name
+
+    async def wait(self, job_name: str):
+        while True:
+            job = await self.client.aio.batches.get(name=job_name)
+
+            if job.state in self.TERMINAL_STATES:
+                break
+
+            await asyncio.sleep(self.poll_interval_seconds)
+
+        if job.state not in (types.JobState.JOB_STATE_SUCCEEDED, types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED):
+            raise BatchPredictionException(f"Batch prediction job {job_name} ended in state {job.state} - {job.error}")
+
+    async def results(self, job_name: str) -> AsyncIterator[dict]:
+        job = await self.client.aio.batches.get(name=job_name)
+        output_uris = await asyncio.to_thread(self._list, job.dest.gcs_uri)
+
+        for uri in output_uris:
+            if not uri.endswith(".jsonl"):
+                continue
+
+            data = await asyncio.to_thread(self._download, uri)
+
+            for line in data.decode("utf-8").splitlines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+@dataclass
+class BatchPredictionStats:
+    """
+    The outcome of a batch prediction refresh.
+
+    Attributes
+    ----------
+    already_stored : int
+        The number of results that were already stored, so were not requested.
+    requested : int
+        The number of results requested from the batch prediction job.
+    stored : int
+        The number of requested results that were stored.
+    failed : int
+        The number of requested results that failed or could not be parsed.
+    """
+
+    already_stored: int = 0
+    requested: int = 0
+    stored: int = 0
+    failed: int = 0
+
+
+class BatchPredictionService:
+    """
+    Service for generating results for many tracks with a batch prediction job rather than one online call each.
+
+    Only results that are not already stored are requested. A request is built for each distinct set of lyrics with
+    the same prompt as online calls, all requests are submitted as a single job, and once it finishes its output is
+    parsed and written through the storage service in bulk transactions. Each response is matched to its lyrics through
+    the request it repeats, so output lines may arrive in any order.
+
+    Attributes
+    ----------
+    backend : BatchPredictionBackend
+        The backend that runs batch prediction jobs.
+    model_services : Mapping[PromptType, ModelService]
+        The model service for each prompt, used to build requests and parse responses.
+    storage_service : StorageService
+        The storage service results are stored with.
+    write_batch_size : int
+        The number of results written in each transaction.
+
+    Methods
+    -------
+    refresh_profiles(tracks: list[EmotionalProfileRequest]) -> BatchPredictionStats
+        Generates and stores the emotional profiles of the tracks that do not have one.
+    refresh_tags(tracks: list[EmotionalProfileRequest], dominant_emotions: int) -> BatchPredictionStats
+        Generates and stores the emotional tags for the dominant emotions of each track that has a profile.
+    """
+
+    def __init__(
+            self,
+            backend: BatchPredictionBackend,
+            model_services: Mapping[PromptType, ModelService],
+            storage_service: StorageService,
+            write_batch_size: int = 500
+    ):
+        """
+        Parameters
+        ----------
+        backend : BatchPredictionBackend
+            The backend that runs batch prediction jobs.
+        model_services : Mapping[PromptType, ModelService]
+            The model service for each prompt, used to build requests and parse responses.
+        storage_service : StorageService
+            The storage service results are stored with.
+        write_batch_size : int, optional
+            The number of results written in each transaction, by default 500.
+        """
+
+        self.backend = backend
+        self.model_services = model_services
+        self.storage_service = storage_service
+        self.write_batch_size = write_batch_size
+
+    async def _run_job(
+            self,
+            model_service: ModelService,
+            inputs: list[str],
+            name: str,
+            usage_key: Callable[[str], UsageKey]
+    ) -> AsyncIterator[tuple[str, dict | str] | None]:
+        # yields the input and parsed response of each output line, or None if the request failed, accounting the
+        # tokens of each request to the usage key of its input
+        usage_tracker = model_service.usage_tracker
+
+        # a job is admitted as a whole, as its tokens are only known once it has finished
+        if usage_tracker is not None and not await usage_tracker.admit(Priority.BATCH):
+            raise TokenBudgetExhaustedException("Batch prediction job not submitted - daily token budget is used up")
+
+        display_name = f"{name}-{uuid.uuid4().hex[:8]}"
+        job_name = await self.backend.submit(
+            model_service,
+            [model_service.batch_request(input_data) for input_data in inputs],
+            display_name=display_name
+        )
+        await self.backend.wait(job_name)
+
+        async for line in self.backend.results(job_name):
+            if line.get("status") or "response" not in line:
+                logger.error(f"Batch prediction request failed - {line.get('status')}")
+                yield None
+                continue
+
+            try:
+                model_input = model_service.batch_input(line["request"])
+                data = model_service.parse_batch_response(line["response"], usage_key=usage_key(model_input))
+            except ModelServiceException as e:
+                logger.error(f"Failed to parse batch prediction response - {e}")
+                yield None
+                continue
+
+            yield model_input, data
+
+    async def refresh_profiles(self, tracks: list[EmotionalProfileRequest]) -> BatchPredictionStats:
+        """
+        Generates and stores the emotional profiles of the tracks that do not have one.
+
+        The lyrics hash of every track whose profile is stored afterwards is also recorded.
+
+        Parameters
+        ----------
+        tracks : list of EmotionalProfileRequest
+            The tracks, with their IDs and lyrics.
+
+        Returns
+        -------
+        BatchPredictionStats
+            The number of profiles already stored, requested, stored and failed.
+
+        Raises
+        ------
+        BatchPredictionException
+            If the batch prediction job fails.
+        TokenBudgetExhaustedException
+            If the daily token budget is used up and the usage tracker rejects calls once it is.
+        StorageServiceException
+            If the database cannot be read or written.
+        """
+
+        lyrics_by_hash = {hash_lyrics(track.lyrics): track.lyrics for track in tracks}
+        stored_profiles = await self.storage_service.retrieve_profiles(list(lyrics_by_hash))
+        missing = [lyrics for lyrics_hash, lyrics in lyrics_by_hash.items() if lyrics_hash not in stored_profiles]
+        stats = BatchPredictionStats(already_stored=len(stored_profiles), requested=len(missing))
+        stored_hashes = set(stored_profiles)
+
+        if missing:
+            profiles = {}
+            model_service = self.model_services[PromptType.EMOTIONAL_PROFILE]
+
+            async for result in self._run_job(
+                    model_service,
+                    missing,
+                    name="emotional-profiles",
+                    usage_key=lambda _: UsageKey(endpoint="batch_profile")
+            ):
+                if result is None:
+                    continue
+
+                lyrics, data = result
+
+                try:
+                    profile = json.loads(data)
+                    EmotionalProfile(**profile)
+                except (TypeError, JSONDecodeError, pydantic.ValidationError) as e:
+                    logger.error(f"Batch prediction returned an invalid emotional profile - {e}")
+                    continue
+
+                profiles[hash_lyrics(lyrics)] = profile
+
+                if len(profiles) >= self.write_batch_size:
+                    await self.storage_service.store_bulk(profiles=profiles)
+                    stored_hashes.update(profiles)
+                    stats.stored += len(profiles)
+                    profiles = {}
+
+            await self.storage_service.store_bulk(profiles=profiles)
+            stored_hashes.update(profiles)
+            stats.stored += len(profiles)
+            stats.failed = stats.requested - stats.stored
+
+        tracks_by_id = {
+            track.track_id: lyrics_hash
+            for track in tracks
+            if (lyrics_hash := hash_lyrics(track.lyrics)) in stored_hashes
+        }
+        await self.storage_service.store_bulk(tracks=tracks_by_id)
+
+        logger.info(f"Refreshed emotional profiles by batch prediction - {stats}")
+
+        return stats
+
+    @staticmethod
+    def _parse_multi_tags_input(model_input: str) -> tuple[list[str], str]:
+        # inverts multi_emotional_tags_model_input, returning the emotions to tag and the lyrics
+        emotions_line, _, lyrics = model_input.partition("\nLyrics: ")
+        return emotions_line.removeprefix("\nEmotions to Tag: ").split(", "), lyrics
+
+    @staticmethod
+    def _dominant_emotions(profile: dict[str, float], count: int) -> list[str]:
+        ranked = sorted(profile.items(), key=lambda item: item[1] or 0, reverse=True)
+        return [emotion for emotion, proportion in ranked[:count] if proportion]
+
+    async def refresh_tags(self, tracks: list[EmotionalProfileRequest], dominant_emotions: int) -> BatchPredictionStats:
+        """
+        Generates and stores the emotional tags for the dominant emotions of each track that has a profile.
+
+        The missing emotions of each set of lyrics are tagged in a single request with the multi-tagging prompt.
+        Tracks without a stored profile are skipped, so profiles should be refreshed first.
+
+        Parameters
+        ----------
+        tracks : list of EmotionalProfileRequest
+            The tracks, with their IDs and lyrics.
+        dominant_emotions : int
+            The number of emotions with the highest proportions in each profile to tag.
+
+        Returns
+        -------
+        BatchPredictionStats
+            The number of tags already stored, requested, stored and failed, counted per emotion.
+
+        Raises
+        ------
+        BatchPredictionException
+            If the batch prediction job fails.
+        TokenBudgetExhaustedException
+            If the daily token budget is used up and the usage tracker rejects calls once it is.
+        StorageServiceException
+            If the database cannot be read or written.
+        """
+
+        lyrics_by_hash = {hash_lyrics(track.lyrics): track.lyrics for track in tracks}
+        profiles = await self.storage_service.retrieve_profiles(list(lyrics_by_hash))
+        stats = BatchPredictionStats()
+        inputs = []
+
+        for lyrics_hash, profile in profiles.items():
+            emotions = self._dominant_emotions(profile, dominant_emotions)
+            stored_tags = await self.storage_service.retrieve_tags_for_emotions(lyrics_hash, emotions)
+            missing_emotions = [emotion for emotion in emotions if emotion not in stored_tags]
+            stats.already_stored += len(stored_tags)
+
+            if missing_emotions:
+                inputs.append(multi_emotional_tags_model_input(lyrics_by_hash[lyrics_hash], missing_emotions))
+                stats.requested += len(missing_emotions)
+
+        if not inputs:
+            return stats
+
+        tags = {}
+        model_service = self.model_services[PromptType.EMOTIONAL_MULTI_TAGS]
+
+        async for result in self._run_job(
+                model_service,
+                inputs,
+                name="emotional-tags",
+                usage_key=lambda model_input: UsageKey(
+                    endpoint="batch_multi_tags",
+                    emotions=tuple(self._parse_multi_tags_input(model_input)[0])
+                )
+        ):
+            if result is None:
+                continue
+
+            model_input, data = result
+            emotions, lyrics = self._parse_multi_tags_input(model_input)
+            lyrics_hash = hash_lyrics(lyrics)
+
+            for emotion in emotions:
+                if not isinstance(data, dict) or not isinstance(data.get(emotion), str):
+                    logger.error(f"Batch prediction response is missing tags for emotion: {emotion}")
+                    continue
+
+                tags[(lyrics_hash, emotion)] = data[emotion].replace("\\", "")
+
+            if len(tags) >= self.write_batch_size:
+                await self.storage_service.store_bulk(tags=tags)
+                stats.stored += len(tags)
+                tags = {}
+
+        await self.storage_service.store_bulk(tags=tags)
+        stats.stored += len(tags)
+        stats.failed = stats.requested - stats.stored
+
+        logger.info(f"Refreshed emotional tags by batch prediction - {stats}")
+
+        return stats
@@ -0,0 +1,158 @@
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Callable
+
+from loguru import logger
+
+from analysis_api.metrics import MODEL_CIRCUIT_BREAKER_STATE
+
+
+class CircuitState(IntEnum):
+    """The state of a circuit breaker, exported as the value of the circuit breaker state metric."""
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing backend once its error rate crosses a threshold, and lets them through again once it
+    recovers.
+
+    While closed, the outcome of each call is recorded in a rolling window. Once the window holds at least
+    `minimum_calls` outcomes and the proportion of failures reaches `failure_rate_threshold`, the breaker opens and
+    every call is rejected immediately. After `open_seconds`, the breaker half-opens and lets a single probe call
+    through: if it succeeds the breaker closes, otherwise it opens again.
+
+    Attributes
+    ----------
+    failure_rate_threshold : float
+        The proportion of failed calls in the window at which the breaker opens.
+    minimum_calls : int
+        The minimum number of calls in the window before the breaker can open.
+    window_size : int
+        The number of most recent calls whose outcome is considered.
+    open_seconds : float
+        The time the breaker stays open before letting a probe call through.
+    state : CircuitState
+        The current state of the breaker.
+
+    Methods
+    -------
+    allow_request() -> bool
+        Returns whether a call may be made, reserving the probe if the breaker is half-open.
+    record_success()
+        Records a call that succeeded.
+    record_failure()
+        Records a call that failed because of the backend.
+    record_ignored()
+        Records a call that ended without an outcome for the backend, such as a cancelled call.
+    """
+
+    def __init__(
+            self,
+            failure_rate_threshold: float = 0.5,
+            minimum_calls: int = 10,
+            window_size: int = 20,
+            open_seconds: float = 30.0,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Parameters
+        ----------
+        failure_rate_threshold : float, optional
+            The proportion of failed calls in the window at which the breaker opens, by default 0.5.
+        minimum_calls : int, optional
+            The minimum number of calls in the window before the breaker can open, by default 10.
+        window_size : int, optional
+            The number of most recent calls whose outcome is considered, by default 20.
+        open_seconds : float, optional
+            The time the breaker stays open before letting a probe call through, by default 30.
+        clock : Callable[[], float], optional
+            The clock used to time how long the breaker has been open, by default time.monotonic.
+        """
+
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_size = window_size
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        MODEL_CIRCUIT_BREAKER_STATE.set(self._state)
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(CircuitState.HALF_OPEN)
+
+        return self._state
+
+    def _transition(self, state: CircuitState):
+        if state is CircuitState.OPEN:
+            self._opened_at = self._clock()
+            logger.warning(f"Circuit breaker opened, rejecting calls for {self.open_seconds}s.")
+        elif state is CircuitState.CLOSED:
+            self._outcomes.clear()
+            logger.info("Circuit breaker closed.")
+
+        self._state = state
+        self._probe_in_flight = False
+        MODEL_CIRCUIT_BREAKER_STATE.set(state)
+
+    def allow_request(self) -> bool:
+        """
+        Returns whether a call may be made, reserving the probe if the breaker is half-open.
+
+        Every call that is allowed must be followed by exactly one of `record_success`, `record_failure` or
+        `record_ignored`.
+
+        Returns
+        -------
+        bool
+            True if the breaker is closed, or if it is half-open and no probe is in flight, otherwise False.
+        """
+
+        state = self.state
+
+        if state is CircuitState.CLOSED:
+            return True
+
+        if state is CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        return False
+
+    def record_success(self):
+        """Records a call that succeeded."""
+
+        if self._state is CircuitState.HALF_OPEN:
+            self._transition(CircuitState.CLOSED)
+        else:
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        """Records a call that failed because of the backend."""
+
+        if self._state is CircuitState.HALF_OPEN:
+            self._transition(CircuitState.OPEN)
+            return
+
+        self._outcomes.append(False)
+
+        if self._state is CircuitState.CLOSED and len(self._outcomes) >= self.minimum_calls:
+            failure_rate = self._outcomes.count(False) / len(self._outcomes)
+
+            if failure_rate >= self.failure_rate_threshold:
+                self._transition(CircuitState.OPEN)
+
+    def record_ignored(self):
+        """Records a call that ended without an outcome for the backend, such as a cancelled call."""
+
+        if self._state is CircuitState.HALF_OPEN:
+            self._probe_in_flight = False
@@ -1,13 +1,53 @@
 import asyncio
 import json
+from typing import AsyncIterator, Callable
 from loguru import logger
 
 import pydantic
 
+from analysis_api.metrics import STORAGE_LOOKUPS
 from analysis_api.models import EmotionalProfile, EmotionalProfileResponse, EmotionalTagsResponse, \
-    EmotionalProfileRequest, EmotionalTagsRequest
-from analysis_api.services.model_service import ModelService, ModelServiceException
+    EmotionalProfileRequest, EmotionalTagsRequest, EmotionalProfileBatchResult, MultiEmotionalTagsRequest, Emotion
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.model_service import ModelService, ModelServiceException, PromptType, \
+    ModelServiceUnavailableException
+from analysis_api.services.single_flight import SingleFlight
+from analysis_api.services.token_usage import UsageKey
 from analysis_api.services.storage.storage_service import StorageService, StorageServiceException
+from analysis_api.tracing import request_stage
+
+
+MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "response": {
+            "type": "OBJECT",
+            "properties": {emotion.value: {"type": "STRING"} for emotion in Emotion}
+        }
+    }
+}
+"""The response schema for tagging several emotions in one model call, keyed by emotion."""
+
+
+def multi_emotional_tags_model_input(lyrics: str, emotions: list[str]) -> str:
+    """
+    Builds the model input for tagging several emotions in the lyrics in one model call.
+
+    Parameters
+    ----------
+    lyrics : str
+        The lyrics of the song to analyze.
+    emotions : list of str
+        The emotions for which tags should be generated.
+
+    Returns
+    -------
+    str
+        The input passed to the emotional multi-tagging prompt.
+    """
+
+    return f"\nEmotions to Tag: {', '.join(emotions)}\nLyrics: {lyrics}"
 
 
 class DataServiceException(Exception):
@@ -17,6 +57,14 @@ class DataServiceException(Exception):
         super().__init__(message)
 
 
+class DataServiceUnavailableException(DataServiceException):
+    """Exception raised when a result is not in storage and the model is unavailable to generate it."""
+
+
+class DataServiceTimeoutException(DataServiceException):
+    """Exception raised when a result is not in storage and the model call to generate it times out."""
+
+
 class DataService:
     """
     Service for processing emotional analysis of song lyrics.
@@ -24,12 +72,20 @@ class DataService:
     This service interacts with a machine learning model to generate emotional profiles and emotional tags for song
     lyrics. It also utilises a storage service to store results, reducing redundant calls to the model
 
+    Results are stored against a hash of the normalised lyrics rather than the track ID, so tracks that share lyrics
+    reuse a single analysis. The lyrics hash of each track is also recorded, so a change to a track's lyrics is logged.
+
     Attributes
     ----------
-    model_service : ModelService
-        The service responsible for interacting with the machine learning model.
+    model_service_provider : Callable[[PromptType], ModelService]
+        Returns the service responsible for interacting with the machine learning model for a given prompt. It is only
+        called when a result is not in storage, so requests served from storage never resolve a model service.
     storage_service : StorageService
         The service responsible for storing and retrieving previously stored results return by the model.
+    single_flight : SingleFlight
+        Coalesces concurrent requests for the same data so that they share a single model call and write.
+    batch_max_concurrency : int
+        The maximum number of concurrent model calls made when processing a batch request.
 
     Methods
     -------
@@ -37,37 +93,137 @@ class DataService:
         Retrieves the emotional profile for a given track based on its lyrics.
         If the data exists in storage, it is retrieved; otherwise, it is generated using the model.
 
+    get_emotional_profiles(requests: list[EmotionalProfileRequest]) -> list[EmotionalProfileBatchResult]
+        Retrieves the emotional profiles for several tracks, returning a result or an error for each track.
+
     get_emotional_tags(request: EmotionalTagsRequest) -> EmotionalTagsResponse
         Retrieves emotional tags for a given track based on a specific emotion.
         If the data exists in storage, it is retrieved; otherwise, it is generated using the model.
+
+    stream_emotional_tags(request: EmotionalTagsRequest) -> AsyncIterator[str | EmotionalTagsResponse]
+        Streams emotional tags for a given track based on a specific emotion as they are generated.
+        If the data exists in storage, it is retrieved; otherwise, it is generated using the model.
+
+    get_multi_emotional_tags(request: MultiEmotionalTagsRequest, priority: Priority) -> list[EmotionalTagsResponse]
+        Retrieves emotional tags for a given track based on several emotions.
+        Tags that exist in storage are retrieved; the rest are generated together using a single model call.
     """
 
-    def __init__(self, model_service: ModelService, storage_service: StorageService):
+    def __init__(
+            self,
+            model_service_provider: Callable[[PromptType], ModelService],
+            storage_service: StorageService,
+            single_flight: SingleFlight | None = None,
+            batch_max_concurrency: int = 8
+    ):
         """
         Parameters
         ----------
-        model_service : ModelService
-            Instance of ModelService to handle generating and retrieving responses from the model.
+        model_service_provider : Callable[[PromptType], ModelService]
+            A callable returning the instance of ModelService to handle generating and retrieving responses from the
+            model for a given prompt. It is called lazily, only when a result must be generated.
         storage_service : StorageService
             Instance of StorageService to manage data storage.
+        single_flight : SingleFlight, optional
+            Instance of SingleFlight shared across requests to coalesce concurrent cache misses. If not provided, a
+            new instance is created, which only coalesces calls made through this DataService.
+        batch_max_concurrency : int, optional
+            The maximum number of concurrent model calls made when processing a batch request, by default 8.
         """
 
-        self.model_service = model_service
+        self.model_service_provider = model_service_provider
         self.storage_service = storage_service
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        self.batch_max_concurrency = batch_max_concurrency
 
-    async def _get_emotional_profile_data(self, track_id: str, lyrics: str) -> dict[str, float]:
+    async def _record_track(self, track_id: str, lyrics_hash: str):
         """
-        Retrieves or generates the emotional profile data for a given track.
-
-        If the data exists in storage, it is retrieved; otherwise, it is generated using the model and stored for future
-        use.
+        Records the hash of a track's lyrics, logging a warning if they have changed since the track was last seen.
 
         Parameters
         ----------
         track_id : str
             The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics.
+
+        Raises
+        ------
+        StorageServiceException
+            If there is an issue retrieving or storing data.
+        """
+
+        with request_stage("storage_lookup"):
+            stored_lyrics_hash = await self.storage_service.retrieve_track_lyrics_hash(track_id)
+
+        if stored_lyrics_hash == lyrics_hash:
+            return
+
+        if stored_lyrics_hash is not None:
+            logger.warning(f"Lyrics changed for track_id: {track_id} - {stored_lyrics_hash} -> {lyrics_hash}")
+
+        with request_stage("storage_store"):
+            await self.storage_service.store_track(track_id=track_id, lyrics_hash=lyrics_hash)
+
+    async def _record_tracks(self, tracks: dict[str, str]):
+        """
+        Records the hashes of several tracks' lyrics, logging a warning for each track whose lyrics have changed.
+
+        The stored lyrics hashes are retrieved with a single lookup, and the new and changed tracks are stored together.
+
+        Parameters
+        ----------
+        tracks : dict[str, str]
+            A dictionary mapping track IDs to the hashes of their normalised lyrics.
+
+        Raises
+        ------
+        StorageServiceException
+            If there is an issue retrieving or storing data.
+        """
+
+        with request_stage("storage_lookup"):
+            stored_lyrics_hashes = await self.storage_service.retrieve_tracks_lyrics_hashes(list(tracks))
+
+        changed_tracks = {}
+
+        for track_id, lyrics_hash in tracks.items():
+            stored_lyrics_hash = stored_lyrics_hashes.get(track_id)
+
+            if stored_lyrics_hash == lyrics_hash:
+                continue
+
+            if stored_lyrics_hash is not None:
+                logger.warning(f"Lyrics changed for track_id: {track_id} - {stored_lyrics_hash} -> {lyrics_hash}")
+
+            changed_tracks[track_id] = lyrics_hash
+
+        if changed_tracks:
+            with request_stage("storage_store"):
+                await self.storage_service.store_tracks(changed_tracks)
+
+    async def _get_emotional_profile_data(
+            self,
+            lyrics_hash: str,
+            lyrics: str,
+            priority: Priority = Priority.INTERACTIVE
+    ) -> dict[str, float]:
+        """
+        Retrieves or generates the emotional profile data for a given set of lyrics.
+
+        If the data exists in storage, it is retrieved; otherwise, it is generated using the model and stored for future
+        use. Concurrent calls for the same lyrics and priority share a single storage lookup, model call and write.
+        Calls at different priorities are not shared, so an interactive call is never held back with a batch call that
+        is waiting on the model call limiter or the daily token budget.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the normalised lyrics.
         lyrics : str
             The lyrics of the song to analyze.
+        priority : Priority, optional
+            The priority of the model call if the data must be generated, by default Priority.INTERACTIVE.
 
         Returns
         -------
@@ -84,14 +240,37 @@ class DataService:
             If there is an issue generating a response from the model.
         """
 
-        emotional_profile_data = await self.storage_service.retrieve_profile(track_id)
+        return await self.single_flight.do(
+            ("profile", lyrics_hash, priority),
+            lambda: self._retrieve_or_generate_profile_data(lyrics_hash=lyrics_hash, lyrics=lyrics, priority=priority)
+        )
+
+    async def _retrieve_or_generate_profile_data(
+            self,
+            lyrics_hash: str,
+            lyrics: str,
+            priority: Priority
+    ) -> dict[str, float]:
+        with request_stage("storage_lookup"):
+            emotional_profile_data = await self.storage_service.retrieve_profile(lyrics_hash)
 
         if emotional_profile_data is not None:
+            STORAGE_LOOKUPS.labels(kind="profile", result="hit").inc()
             return emotional_profile_data
 
-        data = await asyncio.to_thread(self.model_service.generate_response, lyrics)
-        emotional_profile_data = json.loads(data)
-        await self.storage_service.store_profile(track_id=track_id, profile=emotional_profile_data)
+        STORAGE_LOOKUPS.labels(kind="profile", result="miss").inc()
+        model_service = self.model_service_provider(PromptType.EMOTIONAL_PROFILE)
+        data = await model_service.agenerate_response(
+            lyrics,
+            priority=priority,
+            usage_key=UsageKey(endpoint="profile")
+        )
+
+        with request_stage("json_parsing"):
+            emotional_profile_data = json.loads(data)
+
+        with request_stage("storage_store"):
+            await self.storage_service.store_profile(lyrics_hash=lyrics_hash, profile=emotional_profile_data)
 
         return emotional_profile_data
 
@@ -113,6 +292,10 @@ class DataService:
 
         Raises
         ------
+        DataServiceUnavailableException
+            If the result is not in storage and the model service is unavailable.
+        DataServiceTimeoutException
+            If the result is not in storage and the model call to generate it times out.
         DataServiceException
             If an error occurs during retrieval, processing, or validation.
         """
@@ -120,17 +303,29 @@ class DataService:
         track_id = request.track_id
         lyrics = request.lyrics
 
+        lyrics_hash = hash_lyrics(lyrics)
+
         try:
-            emotional_profile_data = await self._get_emotional_profile_data(track_id=track_id, lyrics=lyrics)
+            await self._record_track(track_id=track_id, lyrics_hash=lyrics_hash)
+            emotional_profile_data = await self._get_emotional_profile_data(lyrics_hash=lyrics_hash, lyrics=lyrics)
 
-            emotional_profile = EmotionalProfile(**emotional_profile_data)
-            emotional_profile_response = EmotionalProfileResponse(
-                track_id=track_id,
-                emotional_profile=emotional_profile,
-                lyrics=lyrics
-            )
+            with request_stage("response_validation"):
+                emotional_profile = EmotionalProfile(**emotional_profile_data)
+                emotional_profile_response = EmotionalProfileResponse(
+                    track_id=track_id,
+                    emotional_profile=emotional_profile,
+                    lyrics=lyrics
+                )
 
             return emotional_profile_response
+        except ModelServiceUnavailableException as e:
+            message = f"Model service unavailable, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceUnavailableException(message)
+        except TimeoutError as e:
+            message = f"Model call timed out, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceTimeoutException(message)
         except (ModelServiceException, StorageServiceException) as e:
             message = f"Failed to retrieve emotional profile for track_id: {track_id}, lyrics: {lyrics} - {e}"
             print(message)
@@ -140,17 +335,104 @@ class DataService:
             print(message)
             raise DataServiceException(message)
 
-    async def _get_emotional_tags_data(self, track_id: str, lyrics: str, emotion: str) -> str:
+    async def get_emotional_profiles(
+            self,
+            requests: list[EmotionalProfileRequest]
+    ) -> list[EmotionalProfileBatchResult]:
         """
-        Retrieves or generates emotional tags for a given track based on a specific emotion.
+        Retrieves the emotional profiles for several tracks based on their lyrics.
+
+        All stored profiles are retrieved with a single storage lookup, so tracks that share lyrics share a profile, and
+        the tracks' lyrics hashes are recorded with a single lookup and write.
+        Profiles for the remaining tracks are generated using the model, with at most `batch_max_concurrency` model
+        calls in flight at once. These calls are made at batch priority, so interactive requests are served first when
+        the model is at capacity. A failure for one track does not fail the batch; it is reported in that track's result
+        instead.
+
+        Parameters
+        ----------
+        requests : list of EmotionalProfileRequest
+            Request objects containing track IDs and lyrics.
+
+        Returns
+        -------
+        list of EmotionalProfileBatchResult
+            A result for each request, in the same order as the requests.
+
+        Raises
+        ------
+        DataServiceException
+            If the stored profiles cannot be retrieved or the tracks cannot be recorded.
+        """
+
+        track_ids = [request.track_id for request in requests]
+        lyrics_hashes = [hash_lyrics(request.lyrics) for request in requests]
+
+        try:
+            await self._record_tracks(dict(zip(track_ids, lyrics_hashes)))
+
+            with request_stage("storage_lookup"):
+                stored_profiles = await self.storage_service.retrieve_profiles(lyrics_hashes)
+        except StorageServiceException as e:
+            message = f"Failed to retrieve emotional profiles for track_ids: {track_ids} - {e}"
+            print(message)
+            raise DataServiceException(message)
+
+        # misses are looked up again, and counted, when their profiles are generated
+        STORAGE_LOOKUPS.labels(kind="profile", result="hit").inc(
+            sum(lyrics_hash in stored_profiles for lyrics_hash in lyrics_hashes)
+        )
+
+        semaphore = asyncio.Semaphore(self.batch_max_concurrency)
+
+        async def get_result(request: EmotionalProfileRequest, lyrics_hash: str) -> EmotionalProfileBatchResult:
+            track_id = request.track_id
+            lyrics = request.lyrics
+
+            try:
+                emotional_profile_data = stored_profiles.get(lyrics_hash)
+
+                if emotional_profile_data is None:
+                    async with semaphore:
+                        emotional_profile_data = await self._get_emotional_profile_data(
+                            lyrics_hash=lyrics_hash,
+                            lyrics=lyrics,
+                            priority=Priority.BATCH
+                        )
+
+                with request_stage("response_validation"):
+                    emotional_profile_response = EmotionalProfileResponse(
+                        track_id=track_id,
+                        emotional_profile=EmotionalProfile(**emotional_profile_data),
+                        lyrics=lyrics
+                    )
+
+                return EmotionalProfileBatchResult(track_id=track_id, emotional_profile=emotional_profile_response)
+            except ModelServiceUnavailableException as e:
+                logger.error(f"Model service unavailable, cannot generate profile for track_id: {track_id} - {e}")
+                return EmotionalProfileBatchResult(track_id=track_id, error="Model service unavailable")
+            except TimeoutError as e:
+                logger.error(f"Model call timed out, cannot generate profile for track_id: {track_id} - {e}")
+                return EmotionalProfileBatchResult(track_id=track_id, error="Model call timed out")
+            except (ModelServiceException, StorageServiceException, pydantic.ValidationError) as e:
+                logger.error(f"Failed to retrieve emotional profile for track_id: {track_id} - {e}")
+                return EmotionalProfileBatchResult(track_id=track_id, error="Failed to retrieve emotional profile")
+
+        return list(await asyncio.gather(
+            *(get_result(request, lyrics_hash) for request, lyrics_hash in zip(requests, lyrics_hashes))
+        ))
+
+    async def _get_emotional_tags_data(self, lyrics_hash: str, lyrics: str, emotion: str) -> str:
+        """
+        Retrieves or generates emotional tags for a given set of lyrics based on a specific emotion.
 
         If the data exists in storage, it is retrieved; otherwise, it is generated using the model and stored for future
-        use.
+        use. Concurrent calls for the same lyrics and emotion share a single storage lookup, model call and write.
 
         Parameters
         ----------
-        track_id : str
-            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the normalised lyrics.
         lyrics : str
             The lyrics of the song to analyze.
         emotion : str
@@ -170,15 +452,28 @@ class DataService:
             If there is an issue generating a response from the model.
         """
 
-        emotional_tags_data = await self.storage_service.retrieve_tags(track_id=track_id, emotion=emotion)
+        return await self.single_flight.do(
+            ("tags", lyrics_hash, emotion),
+            lambda: self._retrieve_or_generate_tags_data(lyrics_hash=lyrics_hash, lyrics=lyrics, emotion=emotion)
+        )
+
+    async def _retrieve_or_generate_tags_data(self, lyrics_hash: str, lyrics: str, emotion: str) -> str:
+        with request_stage("storage_lookup"):
+            emotional_tags_data = await self.storage_service.retrieve_tags(lyrics_hash=lyrics_hash, emotion=emotion)
 
         if emotional_tags_data is not None:
+            STORAGE_LOOKUPS.labels(kind="tags", result="hit").inc()
             return emotional_tags_data
 
+        STORAGE_LOOKUPS.labels(kind="tags", result="miss").inc()
         model_input = f"\nEmotion to Tag: {emotion}\nLyrics: {lyrics}"
-        data = await asyncio.to_thread(self.model_service.generate_response, model_input)
+        data = await self.model_service_provider(PromptType.EMOTIONAL_TAGS).agenerate_response(
+            model_input,
+            usage_key=UsageKey(endpoint="tags", emotion=emotion)
+        )
         emotional_tags_data = data.replace("\\", "")
-        await self.storage_service.store_tags(track_id=track_id, emotion=emotion, tags=emotional_tags_data)
+        with request_stage("storage_store"):
+            await self.storage_service.store_tags(lyrics_hash=lyrics_hash, emotion=emotion, tags=emotional_tags_data)
 
         return emotional_tags_data
 
@@ -200,6 +495,10 @@ class DataService:
 
         Raises
         ------
+        DataServiceUnavailableException
+            If the result is not in storage and the model service is unavailable.
+        DataServiceTimeoutException
+            If the result is not in storage and the model call to generate it times out.
         DataServiceException
             If an error occurs during retrieval, processing, or validation.
         """
@@ -208,20 +507,32 @@ class DataService:
         lyrics = request.lyrics
         emotion = request.emotion
 
+        lyrics_hash = hash_lyrics(lyrics)
+
         try:
+            await self._record_track(track_id=track_id, lyrics_hash=lyrics_hash)
             emotional_tags_data = await self._get_emotional_tags_data(
-                track_id=track_id,
+                lyrics_hash=lyrics_hash,
                 lyrics=lyrics,
                 emotion=emotion.value
             )
 
-            emotional_tagging_response = EmotionalTagsResponse(
-                track_id=track_id,
-                emotion=emotion,
-                lyrics=emotional_tags_data
-            )
+            with request_stage("response_validation"):
+                emotional_tagging_response = EmotionalTagsResponse(
+                    track_id=track_id,
+                    emotion=emotion,
+                    lyrics=emotional_tags_data
+                )
 
             return emotional_tagging_response
+        except ModelServiceUnavailableException as e:
+            message = f"Model service unavailable, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceUnavailableException(message)
+        except TimeoutError as e:
+            message = f"Model call timed out, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceTimeoutException(message)
         except (ModelServiceException, StorageServiceException) as e:
             message = (
                 f"Failed to retrieve emotional tags for track_id: {track_id}, lyrics: {lyrics}, "
@@ -233,3 +544,269 @@ class DataService:
             message = f"Failed to create EmotionalTagsResponse object - {e}"
             print(message)
             raise DataServiceException(message)
+
+    @staticmethod
+    def _clean_streamed_tags(text: str) -> str:
+        # streamed responses are plain text, so the model may wrap the lyrics in quotes as the prompt asks for a string
+        text = text.strip()
+
+        if len(text) >= 2 and text[0] == text[-1] == '"':
+            text = text[1:-1]
+
+        return text.replace("\\", "")
+
+    async def stream_emotional_tags(self, request: EmotionalTagsRequest) -> AsyncIterator[str | EmotionalTagsResponse]:
+        """
+        Streams emotional tags for a given track based on a specific emotion as they are generated.
+
+        If the tags exist in storage, they are yielded as a single chunk. Otherwise, they are generated using the model
+        and each chunk is yielded as soon as it arrives; the full result is stored once the model has finished.
+
+        Parameters
+        ----------
+        request : EmotionalTagsRequest
+            Request object containing track ID, lyrics, and emotion.
+
+        Yields
+        ------
+        str or EmotionalTagsResponse
+            Chunks of the tagged lyrics as strings, followed by a final response object containing the complete
+            emotional tags.
+
+        Raises
+        ------
+        DataServiceUnavailableException
+            If the tags are not in storage and the model service is unavailable.
+        DataServiceTimeoutException
+            If the tags are not in storage and the model call to generate them times out.
+        DataServiceException
+            If an error occurs during retrieval, generation, storage, or validation.
+        """
+
+        track_id = request.track_id
+        lyrics = request.lyrics
+        emotion = request.emotion
+
+        lyrics_hash = hash_lyrics(lyrics)
+
+        try:
+            await self._record_track(track_id=track_id, lyrics_hash=lyrics_hash)
+            with request_stage("storage_lookup"):
+                emotional_tags_data = await self.storage_service.retrieve_tags(
+                    lyrics_hash=lyrics_hash,
+                    emotion=emotion.value
+                )
+
+            STORAGE_LOOKUPS.labels(kind="tags", result="hit" if emotional_tags_data is not None else "miss").inc()
+
+            if emotional_tags_data is not None:
+                yield emotional_tags_data
+            else:
+                model_input = f"\nEmotion to Tag: {emotion.value}\nLyrics: {lyrics}"
+                chunks = []
+
+                model_service = self.model_service_provider(PromptType.EMOTIONAL_TAGS)
+
+                async for chunk in model_service.agenerate_response_stream(
+                        model_input,
+                        usage_key=UsageKey(endpoint="tags_stream", emotion=emotion.value)
+                ):
+                    chunks.append(chunk)
+                    yield chunk
+
+                emotional_tags_data = self._clean_streamed_tags("".join(chunks))
+
+                with request_stage("storage_store"):
+                    await self.storage_service.store_tags(
+                        lyrics_hash=lyrics_hash,
+                        emotion=emotion.value,
+                        tags=emotional_tags_data
+                    )
+
+            yield EmotionalTagsResponse(track_id=track_id, emotion=emotion, lyrics=emotional_tags_data)
+        except ModelServiceUnavailableException as e:
+            message = f"Model service unavailable, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceUnavailableException(message)
+        except TimeoutError as e:
+            message = f"Model call timed out, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceTimeoutException(message)
+        except (ModelServiceException, StorageServiceException) as e:
+            message = (
+                f"Failed to stream emotional tags for track_id: {track_id}, lyrics: {lyrics}, "
+                f"emotion: {emotion.value} - {e}"
+            )
+            print(message)
+            raise DataServiceException(message)
+        except pydantic.ValidationError as e:
+            message = f"Failed to create EmotionalTagsResponse object - {e}"
+            print(message)
+            raise DataServiceException(message)
+
+    async def _get_multi_emotional_tags_data(
+            self,
+            lyrics_hash: str,
+            lyrics: str,
+            emotions: list[str],
+            priority: Priority = Priority.INTERACTIVE
+    ) -> dict[str, str]:
+        """
+        Retrieves or generates emotional tags for a given set of lyrics based on several emotions.
+
+        Tags that exist in storage are retrieved; tags for the remaining emotions are generated using a single model
+        call and stored as a separate entry per emotion for future use. Concurrent calls for the same lyrics, set of
+        emotions and priority share a single storage lookup, model call and write. Calls at different priorities are
+        not shared, so an interactive call is never held back with a background call.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the normalised lyrics.
+        lyrics : str
+            The lyrics of the song to analyze.
+        emotions : list of str
+            The emotions for which tags should be generated.
+        priority : Priority, optional
+            The priority of the model call if any tags must be generated, by default Priority.INTERACTIVE.
+
+        Returns
+        -------
+        dict[str, str]
+            A dictionary mapping each emotion to the original lyrics with certain phrases wrapped in <span> tags, where
+            the class names correspond to that emotion.
+
+        Raises
+        ------
+        StorageServiceException
+            If there is an issue retrieving or storing data.
+        ModelServiceException
+            If there is an issue generating a response from the model, or the response is missing an emotion.
+        """
+
+        unique_emotions = list(dict.fromkeys(emotions))
+
+        return await self.single_flight.do(
+            ("multi_tags", lyrics_hash, tuple(sorted(unique_emotions)), priority),
+            lambda: self._retrieve_or_generate_multi_tags_data(
+                lyrics_hash=lyrics_hash,
+                lyrics=lyrics,
+                emotions=unique_emotions,
+                priority=priority
+            )
+        )
+
+    async def _retrieve_or_generate_multi_tags_data(
+            self,
+            lyrics_hash: str,
+            lyrics: str,
+            emotions: list[str],
+            priority: Priority
+    ) -> dict[str, str]:
+        with request_stage("storage_lookup"):
+            emotional_tags_data = await self.storage_service.retrieve_tags_for_emotions(
+                lyrics_hash=lyrics_hash,
+                emotions=emotions
+            )
+
+        missing_emotions = [emotion for emotion in emotions if emotion not in emotional_tags_data]
+        STORAGE_LOOKUPS.labels(kind="tags", result="hit").inc(len(emotions) - len(missing_emotions))
+        STORAGE_LOOKUPS.labels(kind="tags", result="miss").inc(len(missing_emotions))
+
+        if not missing_emotions:
+            return emotional_tags_data
+
+        model_input = multi_emotional_tags_model_input(lyrics, missing_emotions)
+        model_service = self.model_service_provider(PromptType.EMOTIONAL_MULTI_TAGS)
+        data = await model_service.agenerate_response(
+            model_input,
+            priority=priority,
+            usage_key=UsageKey(endpoint="multi_tags", emotions=tuple(missing_emotions))
+        )
+
+        if not isinstance(data, dict) or any(emotion not in data for emotion in missing_emotions):
+            raise ModelServiceException(f"Model response is missing tags for emotions: {missing_emotions} - {data}")
+
+        with request_stage("storage_store"):
+            for emotion in missing_emotions:
+                tags = data[emotion].replace("\\", "")
+                await self.storage_service.store_tags(lyrics_hash=lyrics_hash, emotion=emotion, tags=tags)
+                emotional_tags_data[emotion] = tags
+
+        return emotional_tags_data
+
+    async def get_multi_emotional_tags(
+            self,
+            request: MultiEmotionalTagsRequest,
+            priority: Priority = Priority.INTERACTIVE
+    ) -> list[EmotionalTagsResponse]:
+        """
+        Retrieves emotional tags for a given track based on several emotions.
+
+        Tags that exist in storage are retrieved; the rest are generated together using a single model call, so the
+        lyrics are only sent to the model once.
+
+        Parameters
+        ----------
+        request : MultiEmotionalTagsRequest
+            Request object containing track ID, lyrics, and emotions.
+        priority : Priority, optional
+            The priority of the model call if any tags must be generated, by default Priority.INTERACTIVE. Background
+            work uses Priority.BATCH so that interactive requests are served first.
+
+        Returns
+        -------
+        list of EmotionalTagsResponse
+            A response object containing emotional tags for each requested emotion, in the order requested.
+
+        Raises
+        ------
+        DataServiceUnavailableException
+            If the result is not in storage and the model service is unavailable.
+        DataServiceTimeoutException
+            If the result is not in storage and the model call to generate it times out.
+        DataServiceException
+            If an error occurs during retrieval, processing, or validation.
+        """
+
+        track_id = request.track_id
+        lyrics = request.lyrics
+        emotions = request.emotions
+
+        lyrics_hash = hash_lyrics(lyrics)
+
+        try:
+            await self._record_track(track_id=track_id, lyrics_hash=lyrics_hash)
+            emotional_tags_data = await self._get_multi_emotional_tags_data(
+                lyrics_hash=lyrics_hash,
+                lyrics=lyrics,
+                emotions=[emotion.value for emotion in emotions],
+                priority=priority
+            )
+
+            with request_stage("response_validation"):
+                emotional_tagging_responses = [
+                    EmotionalTagsResponse(track_id=track_id, emotion=emotion, lyrics=emotional_tags_data[emotion.value])
+                    for emotion in emotions
+                ]
+
+            return emotional_tagging_responses
+        except ModelServiceUnavailableException as e:
+            message = f"Model service unavailable, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceUnavailableException(message)
+        except TimeoutError as e:
+            message = f"Model call timed out, cannot generate results for track_id: {track_id} - {e}"
+            print(message)
+            raise DataServiceTimeoutException(message)
+        except (ModelServiceException, StorageServiceException) as e:
+            message = (
+                f"Failed to retrieve emotional tags for track_id: {track_id}, lyrics: {lyrics}, "
+                f"emotions: {[emotion.value for emotion in emotions]} - {e}"
+            )
+            print(message)
+            raise DataServiceException(message)
+        except pydantic.ValidationError as e:
+            message = f"Failed to create EmotionalTagsResponse object - {e}"
+            print(message)
+            raise DataServiceException(message)
@@ -0,0 +1,169 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+_current_deadline: ContextVar["Deadline | None"] = ContextVar("current_deadline", default=None)
+
+
+class Deadline:
+    """
+    The point in time by which a request must have been served.
+
+    A deadline is enforced for a block of work with `scope`, which cancels the work once the deadline expires and makes
+    the deadline available to everything called within the block through `Deadline.current`. This lets the model
+    service bound each model call by the time the request has left, without the deadline being passed through every
+    layer in between.
+
+    Attributes
+    ----------
+    timeout_seconds : float
+        The time the request was given to be served.
+    expires_at : float
+        The clock time at which the deadline expires, or infinity if it has been lifted.
+    expired : bool
+        Whether the deadline has expired.
+
+    Methods
+    -------
+    remaining() -> float
+        Returns the time left before the deadline expires.
+    extend(timeout_seconds: float | None)
+        Moves the deadline later, including for work already enforcing it.
+    current() -> Deadline | None
+        Returns the deadline of the work currently running, if any.
+    scope() -> AsyncIterator[Deadline]
+        Enforces the deadline for the duration of the context.
+    """
+
+    def __init__(self, timeout_seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Parameters
+        ----------
+        timeout_seconds : float
+            The time the request is given to be served, starting now.
+        clock : Callable[[], float], optional
+            The clock used to measure the time left, by default time.monotonic.
+        """
+
+        self.timeout_seconds = timeout_seconds
+        self._clock = clock
+        self.expires_at = clock() + timeout_seconds
+        self._timeouts: list[asyncio.Timeout] = []
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def remaining(self) -> float:
+        """
+        Returns the time left before the deadline expires.
+
+        Returns
+        -------
+        float
+            The time left in seconds, or 0 if the deadline has expired.
+        """
+
+        return max(self.expires_at - self._clock(), 0.0)
+
+    def extend(self, timeout_seconds: float | None):
+        """
+        Moves the deadline later, including for work already enforcing it with `scope`.
+
+        The deadline is never brought forward, so extending it by less time than it has left does nothing.
+
+        Parameters
+        ----------
+        timeout_seconds : float or None
+            The time, starting now, the deadline should leave at least, or None to lift the deadline altogether.
+        """
+
+        expires_at = math.inf if timeout_seconds is None else self._clock() + timeout_seconds
+
+        if expires_at <= self.expires_at:
+            return
+
+        self.expires_at = expires_at
+        when = None if expires_at == math.inf else asyncio.get_running_loop().time() + self.remaining()
+
+        for timeout in self._timeouts:
+            timeout.reschedule(when)
+
+    @staticmethod
+    def current() -> "Deadline | None":
+        """
+        Returns the deadline of the work currently running, if any.
+
+        Returns
+        -------
+        Deadline or None
+            The deadline enforced by the innermost enclosing `scope`, or None if no deadline is enforced or it has
+            been lifted.
+        """
+
+        deadline = _current_deadline.get()
+
+        if deadline is None or deadline.expires_at == math.inf:
+            return None
+
+        return deadline
+
+    @asynccontextmanager
+    async def scope(self) -> AsyncIterator["Deadline"]:
+        """
+        Enforces the deadline for the duration of the context.
+
+        The work in the context is cancelled once the deadline expires, in which case a TimeoutError is raised on exit.
+        Tasks started within the context inherit the deadline, so it is still reported by `Deadline.current` in work
+        they carry on with.
+
+        Raises
+        ------
+        TimeoutError
+            If the deadline expires before the context exits.
+        """
+
+        token = _current_deadline.set(self)
+
+        try:
+            async with asyncio.timeout(None if self.expires_at == math.inf else self.remaining()) as timeout:
+                self._timeouts.append(timeout)
+
+                try:
+                    yield self
+                finally:
+                    self._timeouts.remove(timeout)
+        finally:
+            _current_deadline.reset(token)
+
+
+async def without_deadline(work: Awaitable[T]) -> T:
+    """
+    Awaits the work with no request deadline reported by `Deadline.current`.
+
+    A task inherits the deadline of the work that started it. Work started on behalf of something that has no deadline,
+    such as a coalesced model call joined by a background job, is run this way so that it is not cancelled when the
+    request that happened to start it runs out of time.
+
+    Parameters
+    ----------
+    work : Awaitable[T]
+        The work to be done.
+
+    Returns
+    -------
+    T
+        The result of the work.
+    """
+
+    token = _current_deadline.set(None)
+
+    try:
+        return await work
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,219 @@
+import asyncio
+import uuid
+from typing import AsyncContextManager, Callable
+
+from loguru import logger
+
+from analysis_api.models import PrecomputeJobRequest, PrecomputeJob, JobStatus, EmotionalProfileRequest, \
+    EmotionalProfileBatchResult, MultiEmotionalTagsRequest, Emotion
+from analysis_api.services.data_service import DataService, DataServiceException
+from analysis_api.services.model_limiter import Priority
+
+
+class JobService:
+    """
+    Service for running background jobs that store results ahead of time, so that later requests are served from
+    storage.
+
+    A precompute job stores the emotional profile of each of its tracks and, optionally, the emotional tags for the
+    dominant emotions in each profile. Tracks are processed in chunks through `DataService.get_emotional_profiles`, so
+    results that are already stored are skipped with a single lookup per chunk, and the number of model calls in flight
+    is bounded by the data service's batch concurrency. Model calls are made at batch priority, so interactive requests
+    are served first.
+
+    Jobs are held in memory, so they are lost if the application restarts. Only the most recent `max_retained_jobs`
+    finished jobs are kept for polling.
+
+    Attributes
+    ----------
+    data_service_factory : Callable[[], AsyncContextManager[DataService]]
+        Returns a context manager that provides a data service for processing a chunk of tracks.
+    chunk_size : int
+        The number of tracks processed at once.
+    max_concurrent_jobs : int
+        The maximum number of jobs running at once. Further jobs are queued.
+    max_retained_jobs : int
+        The maximum number of finished jobs kept for polling.
+
+    Methods
+    -------
+    submit(request: PrecomputeJobRequest) -> PrecomputeJob
+        Starts a precompute job in the background and returns it.
+    get(job_id: str) -> PrecomputeJob | None
+        Returns the job with the given ID, if it is known.
+    stop()
+        Cancels all jobs that have not finished.
+    """
+
+    def __init__(
+            self,
+            data_service_factory: Callable[[], AsyncContextManager[DataService]],
+            chunk_size: int = 50,
+            max_concurrent_jobs: int = 1,
+            max_retained_jobs: int = 1000
+    ):
+        """
+        Parameters
+        ----------
+        data_service_factory : Callable[[], AsyncContextManager[DataService]]
+            Returns a context manager that provides a data service for processing a chunk of tracks. A new data service
+            is used for each chunk, so a long job does not hold a database connection between chunks.
+        chunk_size : int, optional
+            The number of tracks processed at once, by default 50.
+        max_concurrent_jobs : int, optional
+            The maximum number of jobs running at once, by default 1. Further jobs are queued.
+        max_retained_jobs : int, optional
+            The maximum number of finished jobs kept for polling, by default 1000.
+        """
+
+        self.data_service_factory = data_service_factory
+        self.chunk_size = chunk_size
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_retained_jobs = max_retained_jobs
+        self._jobs: dict[str, PrecomputeJob] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrent_jobs)
+
+    def _evict_finished_jobs(self):
+        finished_job_ids = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+        ]
+
+        # jobs are held in submission order, so the oldest finished jobs are evicted first
+        for job_id in finished_job_ids[:max(len(finished_job_ids) - self.max_retained_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def submit(self, request: PrecomputeJobRequest) -> PrecomputeJob:
+        """
+        Starts a precompute job in the background and returns it.
+
+        Parameters
+        ----------
+        request : PrecomputeJobRequest
+            The request containing the tracks to analyse and the number of dominant emotions to tag.
+
+        Returns
+        -------
+        PrecomputeJob
+            The job, which is updated in place as it progresses.
+        """
+
+        self._evict_finished_jobs()
+
+        job = PrecomputeJob(job_id=str(uuid.uuid4()), total=len(request.tracks))
+        self._jobs[job.job_id] = job
+
+        task = asyncio.create_task(self._run(job, request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        logger.info(f"Submitted precompute job {job.job_id} for {job.total} tracks.")
+
+        return job
+
+    def get(self, job_id: str) -> PrecomputeJob | None:
+        """
+        Returns the job with the given ID, if it is known.
+
+        Parameters
+        ----------
+        job_id : str
+            The unique identifier for the job.
+
+        Returns
+        -------
+        PrecomputeJob or None
+            The job, or None if no job with the ID was submitted or it has been evicted.
+        """
+
+        return self._jobs.get(job_id)
+
+    async def stop(self):
+        """Cancels all jobs that have not finished."""
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @staticmethod
+    def _dominant_emotions(result: EmotionalProfileBatchResult, count: int) -> list[Emotion]:
+        emotional_profile = result.emotional_profile.emotional_profile.model_dump()
+        ranked = sorted(emotional_profile.items(), key=lambda item: item[1], reverse=True)
+
+        return [Emotion(emotion) for emotion, proportion in ranked[:count] if proportion > 0]
+
+    async def _store_dominant_emotional_tags(
+            self,
+            data_service: DataService,
+            requests: list[EmotionalProfileRequest],
+            results: list[EmotionalProfileBatchResult],
+            count: int
+    ) -> list[bool]:
+        semaphore = asyncio.Semaphore(data_service.batch_max_concurrency)
+
+        async def store_tags(request: EmotionalProfileRequest, result: EmotionalProfileBatchResult) -> bool:
+            if result.error is not None:
+                return False
+
+            emotions = self._dominant_emotions(result, count)
+
+            if not emotions:
+                return True
+
+            try:
+                async with semaphore:
+                    await data_service.get_multi_emotional_tags(
+                        MultiEmotionalTagsRequest(track_id=request.track_id, lyrics=request.lyrics, emotions=emotions),
+                        priority=Priority.BATCH
+                    )
+            except DataServiceException as e:
+                logger.error(f"Failed to store emotional tags for track_id: {request.track_id} - {e}")
+                return False
+
+            return True
+
+        return list(await asyncio.gather(*(store_tags(request, result) for request, result in zip(requests, results))))
+
+    async def _run(self, job: PrecomputeJob, request: PrecomputeJobRequest):
+        async with self._semaphore:
+            job.status = JobStatus.RUNNING
+            logger.info(f"Running precompute job {job.job_id}.")
+
+            try:
+                for start in range(0, len(request.tracks), self.chunk_size):
+                    chunk = request.tracks[start:start + self.chunk_size]
+
+                    async with self.data_service_factory() as data_service:
+                        results = await data_service.get_emotional_profiles(chunk)
+
+                        if request.tag_dominant_emotions > 0:
+                            succeeded = await self._store_dominant_emotional_tags(
+                                data_service,
+                                requests=chunk,
+                                results=results,
+                                count=request.tag_dominant_emotions
+                            )
+                        else:
+                            succeeded = [result.error is None for result in results]
+
+                    job.completed += sum(succeeded)
+                    job.failed += len(succeeded) - sum(succeeded)
+            except DataServiceException as e:
+                logger.error(f"Precompute job {job.job_id} failed - {e}")
+                job.status = JobStatus.FAILED
+                job.error = "Failed to retrieve stored emotional profiles"
+                return
+            except Exception as e:
+                logger.exception(f"Precompute job {job.job_id} failed unexpectedly - {e}")
+                job.status = JobStatus.FAILED
+                job.error = "Something went wrong"
+                return
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "Job was cancelled"
+                raise
+
+            job.status = JobStatus.COMPLETED
+            logger.info(f"Completed precompute job {job.job_id} - {job.completed} stored, {job.failed} failed.")
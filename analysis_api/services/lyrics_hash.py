@@ -0,0 +1,45 @@
+import hashlib
+import unicodedata
+
+
+def normalise_lyrics(lyrics: str) -> str:
+    """
+    Normalises lyrics so that copies of the same lyrics that differ only in formatting compare equal.
+
+    The lyrics are converted to Unicode NFC form, runs of whitespace within each line are collapsed to a single space,
+    and blank lines and leading or trailing whitespace are removed. Case and punctuation are preserved, as they can
+    change the emotion a phrase conveys.
+
+    Parameters
+    ----------
+    lyrics : str
+        The lyrics to normalise.
+
+    Returns
+    -------
+    str
+        The normalised lyrics.
+    """
+
+    lyrics = unicodedata.normalize("NFC", lyrics)
+    lines = (" ".join(line.split()) for line in lyrics.splitlines())
+
+    return "\n".join(line for line in lines if line)
+
+
+def hash_lyrics(lyrics: str) -> str:
+    """
+    Computes a content hash of the normalised lyrics, used as the storage key for analyses of those lyrics.
+
+    Parameters
+    ----------
+    lyrics : str
+        The lyrics to hash.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest of the normalised lyrics.
+    """
+
+    return hashlib.sha256(normalise_lyrics(lyrics).encode("utf-8")).hexdigest()
@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import httpx
+from google.genai import types, errors
+
+
+class ModelBackend(ABC):
+    """
+    The model that ModelService sends its requests to.
+
+    ModelService owns the prompt, retries, concurrency limits and response parsing, so a backend only makes a single
+    attempt at each call. Failed calls raise `errors.APIError`, as the GenAI client does, so they are retried and
+    counted by the circuit breaker in the same way whichever backend is used.
+
+    Methods
+    -------
+    generate_content(model: str, contents: list[types.Content], config: types.GenerateContentConfig)
+            -> types.GenerateContentResponse
+        Generates a response to the contents.
+    agenerate_content(model: str, contents: list[types.Content], config: types.GenerateContentConfig)
+            -> types.GenerateContentResponse
+        Asynchronously generates a response to the contents.
+    agenerate_content_stream(model: str, contents: list[types.Content], config: types.GenerateContentConfig)
+            -> AsyncIterator[types.GenerateContentResponse]
+        Asynchronously starts generating a response to the contents, returning an iterator over its chunks.
+    close()
+        Releases any resources held by the backend.
+    """
+
+    @abstractmethod
+    def generate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        """
+        Generates a response to the contents.
+
+        Parameters
+        ----------
+        model : str
+            The name of the model.
+        contents : list of types.Content
+            The prompt.
+        config : types.GenerateContentConfig
+            The generation settings.
+
+        Returns
+        -------
+        types.GenerateContentResponse
+            The response.
+
+        Raises
+        ------
+        errors.APIError
+            If the call fails.
+        """
+
+    @abstractmethod
+    async def agenerate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        """
+        Asynchronously generates a response to the contents.
+
+        Parameters
+        ----------
+        model : str
+            The name of the model.
+        contents : list of types.Content
+            The prompt.
+        config : types.GenerateContentConfig
+            The generation settings.
+
+        Returns
+        -------
+        types.GenerateContentResponse
+            The response.
+
+        Raises
+        ------
+        errors.APIError
+            If the call fails.
+        """
+
+    @abstractmethod
+    async def agenerate_content_stream(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        """
+        Asynchronously starts generating a response to the contents, returning an iterator over its chunks.
+
+        Errors raised while the call is started are raised here, before any chunk is returned, so the call can still
+        be retried.
+
+        Parameters
+        ----------
+        model : str
+            The name of the model.
+        contents : list of types.Content
+            The prompt.
+        config : types.GenerateContentConfig
+            The generation settings.
+
+        Returns
+        -------
+        AsyncIterator[types.GenerateContentResponse]
+            The chunks of the response, in order.
+
+        Raises
+        ------
+        errors.APIError
+            If the call fails.
+        """
+
+    def close(self):
+        """Releases any resources held by the backend, such as an open recording. Does nothing by default."""
+
+
+def prompt_text(contents: list[types.Content]) -> str:
+    """
+    Returns the text of a prompt.
+
+    Parameters
+    ----------
+    contents : list of types.Content
+        The prompt.
+
+    Returns
+    -------
+    str
+        The text of every part of the prompt, joined together.
+    """
+
+    return "".join(part.text or "" for content in contents for part in content.parts or [])
+
+
+def estimate_usage(prompt: str, text: str) -> types.GenerateContentResponseUsageMetadata:
+    """
+    Estimates the token counts of a call, for backends that do not call the model.
+
+    Parameters
+    ----------
+    prompt : str
+        The text of the prompt.
+    text : str
+        The text of the response.
+
+    Returns
+    -------
+    types.GenerateContentResponseUsageMetadata
+        The token counts, at roughly four characters per token as for Gemini models on English text.
+    """
+
+    prompt_tokens = -(-len(prompt) // 4)
+    output_tokens = -(-len(text) // 4)
+
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens
+    )
+
+
+def text_response(
+        text: str,
+        usage_metadata: types.GenerateContentResponseUsageMetadata | None = None
+) -> types.GenerateContentResponse:
+    """
+    Builds a response holding the text, as the model would return it.
+
+    Parameters
+    ----------
+    text : str
+        The text of the response.
+    usage_metadata : types.GenerateContentResponseUsageMetadata, optional
+        The token counts of the call, by default None.
+
+    Returns
+    -------
+    types.GenerateContentResponse
+        The response, with a single candidate holding the text.
+    """
+
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part.from_text(text=text)]))],
+        usage_metadata=usage_metadata
+    )
+
+
+async def text_response_stream(
+        text: str,
+        chunks: int = 4,
+        usage_metadata: types.GenerateContentResponseUsageMetadata | None = None
+) -> AsyncIterator[types.GenerateContentResponse]:
+    """
+    Yields the text as a streamed response, split into a few chunks as the model would stream it.
+
+    Parameters
+    ----------
+    text : str
+        The text of the response.
+    chunks : int, optional
+        The number of chunks the text is split into, by default 4.
+    usage_metadata : types.GenerateContentResponseUsageMetadata, optional
+        The token counts of the call, which are sent with the last chunk as the model does, by default None.
+
+    Yields
+    ------
+    types.GenerateContentResponse
+        The next chunk of the response.
+    """
+
+    size = max(-(-len(text) // chunks), 1)
+    starts = range(0, len(text), size)
+
+    for start in starts:
+        yield text_response(text[start:start + size], usage_metadata if start == starts[-1] else None)
+
+
+def api_error(code: int, message: str, headers: dict[str, str] | None = None) -> errors.APIError:
+    """
+    Builds the error the GenAI client would raise for a failed call.
+
+    The error is raised from a response through `errors.APIError.raise_for_response`, as the GenAI client does, rather
+    than constructed directly, since the constructor's arguments differ between versions of the client.
+
+    Parameters
+    ----------
+    code : int
+        The HTTP status code of the failure, which must not be 200.
+    message : str
+        The error message.
+    headers : dict of str to str, optional
+        The headers of the failed response, such as Retry-After, by default None.
+
+    Returns
+    -------
+    errors.APIError
+        A ClientError for 4xx codes, a ServerError for 5xx codes or an APIError otherwise.
+    """
+
+    response = httpx.Response(code, headers=headers, json={"error": {"code": code, "message": message}})
+
+    try:
+        errors.APIError.raise_for_response(response)
+    except errors.APIError as e:
+        return e.with_traceback(None)
+
+    raise ValueError(f"Status code {code} is not a failure")
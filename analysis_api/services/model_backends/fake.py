@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import AsyncIterator
+
+from google.genai import types
+
+from analysis_api.models import Emotion
+from analysis_api.services.model_backends.base import ModelBackend, prompt_text, text_response, \
+    text_response_stream, api_error, estimate_usage
+from analysis_api.services.model_service import PromptType
+
+
+class FakeModelBackend(ModelBackend):
+    """
+    A stand-in for the model that generates deterministic responses without network access.
+
+    Responses are derived from a hash of the prompt, so the same lyrics always produce the same result, and have the
+    structure the prompt asks for. A ModelService built with it behaves as it would against the real model, including
+    its retry, circuit breaker and concurrency handling, so the whole service can be run, tested and load tested
+    offline. Latency and errors can be injected to exercise those paths. Token counts are estimated from the lengths
+    of the prompt and response.
+
+    Attributes
+    ----------
+    prompt_type : PromptType
+        The prompt whose responses are generated.
+    latency_seconds : float
+        The minimum time each call takes.
+    latency_jitter_seconds : float
+        The upper bound of the random time added to each call.
+    error_rate : float
+        The proportion of calls that fail.
+    error_code : int
+        The HTTP status code of the injected errors.
+    """
+
+    def __init__(
+            self,
+            prompt_type: PromptType,
+            latency_seconds: float = 0.0,
+            latency_jitter_seconds: float = 0.0,
+            error_rate: float = 0.0,
+            error_code: int = 503,
+            seed: int | None = None
+    ):
+        """
+        Parameters
+        ----------
+        prompt_type : PromptType
+            The prompt whose responses are generated, which determines their structure.
+        latency_seconds : float, optional
+            The minimum time each call takes, by default 0.
+        latency_jitter_seconds : float, optional
+            The upper bound of the random time added to each call, by default 0.
+        error_rate : float, optional
+            The proportion of calls that fail, by default 0.
+        error_code : int, optional
+            The HTTP status code of the injected errors, by default 503, which is retried.
+        seed : int, optional
+            The seed of the random latency and errors, by default None, which seeds them randomly.
+        """
+
+        self.prompt_type = prompt_type
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _lyrics(prompt: str) -> str:
+        _, _, lyrics = prompt.rpartition("Lyrics: ")
+        return lyrics
+
+    def _response_data(self, prompt: str) -> str | dict:
+        if self.prompt_type is PromptType.EMOTIONAL_TAGS:
+            return self._lyrics(prompt)
+
+        if self.prompt_type is PromptType.EMOTIONAL_MULTI_TAGS:
+            return {emotion.value: self._lyrics(prompt) for emotion in Emotion}
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        weights = [digest[i] + 1 for i in range(len(Emotion))]
+        total = sum(weights)
+
+        return json.dumps({emotion.value: round(weight / total, 4) for emotion, weight in zip(Emotion, weights)})
+
+    def _response(self, contents: list[types.Content]) -> types.GenerateContentResponse:
+        prompt = prompt_text(contents)
+        text = json.dumps({"response": self._response_data(prompt)})
+
+        return text_response(text, estimate_usage(prompt, text))
+
+    def _latency(self) -> float:
+        return self.latency_seconds + self._random.uniform(0, self.latency_jitter_seconds)
+
+    def _raise_injected_error(self):
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            raise api_error(self.error_code, "Injected fake model error")
+
+    def generate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        time.sleep(self._latency())
+        self._raise_injected_error()
+
+        return self._response(contents)
+
+    async def agenerate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        await asyncio.sleep(self._latency())
+        self._raise_injected_error()
+
+        return self._response(contents)
+
+    async def agenerate_content_stream(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        await asyncio.sleep(self._latency())
+        self._raise_injected_error()
+
+        # streamed responses are plain text rather than JSON
+        prompt = prompt_text(contents)
+        data = self._response_data(prompt)
+        text = data if isinstance(data, str) else json.dumps(data)
+
+        return text_response_stream(text, usage_metadata=estimate_usage(prompt, text))
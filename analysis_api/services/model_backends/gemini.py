@@ -0,0 +1,51 @@
+from typing import AsyncIterator
+
+from google import genai
+from google.genai import types
+
+from analysis_api.services.model_backends.base import ModelBackend
+
+
+class GeminiModelBackend(ModelBackend):
+    """
+    Sends requests to Gemini through the GenAI client.
+
+    Attributes
+    ----------
+    client : genai.Client
+        The Google GenAI client used for API communication.
+    """
+
+    def __init__(self, client: genai.Client):
+        """
+        Parameters
+        ----------
+        client : genai.Client
+            The Google GenAI client used for API communication.
+        """
+
+        self.client = client
+
+    def generate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+    async def agenerate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        return await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+    async def agenerate_content_stream(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        return await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
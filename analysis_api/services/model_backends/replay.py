@@ -0,0 +1,382 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import AsyncIterator, IO
+
+from google.genai import types
+
+from analysis_api.services.model_backends.base import ModelBackend, prompt_text, text_response, \
+    text_response_stream, api_error, estimate_usage
+
+
+def hash_prompt(contents: list[types.Content]) -> str:
+    """
+    Returns the key a response to the prompt is recorded under.
+
+    Parameters
+    ----------
+    contents : list of types.Content
+        The prompt.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest of the text of the prompt.
+    """
+
+    return hashlib.sha256(prompt_text(contents).encode("utf-8")).hexdigest()
+
+
+def _open_recording(path: Path, mode: str) -> IO[str]:
+    # recordings ending in .gz are compressed, which shrinks the prompt template repeated on every line
+    if path.suffix == ".gz":
+        return gzip.open(path, f"{mode}t", encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+@dataclass
+class RecordedResponse:
+    """
+    A model call captured in a recording.
+
+    Attributes
+    ----------
+    prompt_hash : str
+        The hash of the prompt, as returned by `hash_prompt`.
+    text : str or None
+        The text of the response, or None if the call failed.
+    latency_seconds : float
+        The time the call took, until its last chunk for a streamed call.
+    prompt : str or None
+        The text of the prompt, or None if it was not recorded.
+    error_code : int or None
+        The HTTP status code of the failure, or None if the call succeeded.
+    started_at : float or None
+        The Unix time the call started, or None if it was not recorded.
+    stream : bool or None
+        Whether the response was streamed, or None if the kind of call was not recorded.
+    """
+
+    prompt_hash: str
+    text: str | None
+    latency_seconds: float = 0.0
+    prompt: str | None = None
+    error_code: int | None = None
+    started_at: float | None = None
+    stream: bool | None = None
+
+
+def load_recording(path: Path) -> list[RecordedResponse]:
+    """
+    Loads the model calls in a recording file.
+
+    Parameters
+    ----------
+    path : Path
+        The path of the recording, a JSONL file, gzip-compressed if its name ends in .gz, with one recorded call on
+        each line.
+
+    Returns
+    -------
+    list of RecordedResponse
+        The recorded calls, in the order they finished.
+    """
+
+    recorded = []
+
+    with _open_recording(path, "r") as file:
+        try:
+            for line in file:
+                if line.strip():
+                    recorded.append(RecordedResponse(**json.loads(line)))
+        except EOFError:
+            # a compressed recording cut off by a crash still holds every call flushed before it
+            pass
+
+    return recorded
+
+
+class RecordingWriter:
+    """
+    Appends recorded model calls to a recording file.
+
+    A single writer can be shared by several RecordingModelBackend instances, such as one per prompt, so their calls
+    are written to the same file without interleaving. Recordings are appended to, so a recording can be built up over
+    several runs.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the recording, gzip-compressed if its name ends in .gz.
+    record_prompts : bool
+        Whether the text of each prompt is recorded, which is needed to replay the traffic rather than just serve it.
+
+    Methods
+    -------
+    write(recorded: RecordedResponse)
+        Appends a recorded call to the recording.
+    close()
+        Flushes and closes the recording file.
+    """
+
+    def __init__(self, path: Path, record_prompts: bool = True):
+        """
+        Parameters
+        ----------
+        path : Path
+            The path of the recording, gzip-compressed if its name ends in .gz.
+        record_prompts : bool, optional
+            Whether the text of each prompt is recorded, by default True.
+        """
+
+        self.path = path
+        self.record_prompts = record_prompts
+        self._file = _open_recording(path, "a")
+        self._lock = threading.Lock()
+
+    def write(self, recorded: RecordedResponse):
+        """
+        Appends a recorded call to the recording.
+
+        Parameters
+        ----------
+        recorded : RecordedResponse
+            The recorded call.
+        """
+
+        if not self.record_prompts:
+            recorded.prompt = None
+
+        # sync calls may be made from worker threads, so lines are written whole
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(json.dumps(asdict(recorded), separators=(",", ":")) + "\n")
+                self._file.flush()
+
+    def close(self):
+        """Flushes and closes the recording file."""
+
+        with self._lock:
+            self._file.close()
+
+
+class RecordingModelBackend(ModelBackend):
+    """
+    Records the calls made to another backend, so they can be replayed later by a ReplayModelBackend.
+
+    Each call is recorded as it finishes, with its prompt hash, prompt, response text or error code, start time,
+    latency and whether it was streamed.
+
+    Attributes
+    ----------
+    backend : ModelBackend
+        The backend whose calls are recorded.
+    writer : RecordingWriter
+        The writer the calls are recorded with.
+    """
+
+    def __init__(self, backend: ModelBackend, writer: RecordingWriter):
+        """
+        Parameters
+        ----------
+        backend : ModelBackend
+            The backend whose calls are recorded.
+        writer : RecordingWriter
+            The writer the calls are recorded with.
+        """
+
+        self.backend = backend
+        self.writer = writer
+
+    def _record(self, contents: list[types.Content], started_at: float, started: float, stream: bool, **kwargs):
+        self.writer.write(
+            RecordedResponse(
+                prompt_hash=hash_prompt(contents),
+                latency_seconds=round(time.perf_counter() - started, 6),
+                prompt=prompt_text(contents),
+                started_at=started_at,
+                stream=stream,
+                **kwargs
+            )
+        )
+
+    def generate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        started_at, started = time.time(), time.perf_counter()
+
+        try:
+            res = self.backend.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            self._record(contents, started_at, started, stream=False, text=None, error_code=getattr(e, "code", None))
+            raise
+
+        self._record(contents, started_at, started, stream=False, text=res.text)
+        return res
+
+    async def agenerate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        started_at, started = time.time(), time.perf_counter()
+
+        try:
+            res = await self.backend.agenerate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            self._record(contents, started_at, started, stream=False, text=None, error_code=getattr(e, "code", None))
+            raise
+
+        self._record(contents, started_at, started, stream=False, text=res.text)
+        return res
+
+    async def agenerate_content_stream(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        started_at, started = time.time(), time.perf_counter()
+
+        try:
+            stream = await self.backend.agenerate_content_stream(model=model, contents=contents, config=config)
+        except Exception as e:
+            self._record(contents, started_at, started, stream=True, text=None, error_code=getattr(e, "code", None))
+            raise
+
+        async def chunks() -> AsyncIterator[types.GenerateContentResponse]:
+            text = []
+
+            try:
+                async for chunk in stream:
+                    text.append(chunk.text or "")
+                    yield chunk
+            except Exception as e:
+                self._record(contents, started_at, started, stream=True, text=None, error_code=getattr(e, "code", None))
+                raise
+
+            self._record(contents, started_at, started, stream=True, text="".join(text))
+
+        return chunks()
+
+    def close(self):
+        self.writer.close()
+        self.backend.close()
+
+
+class ReplayModelBackend(ModelBackend):
+    """
+    Serves recorded responses, so production traffic can be reproduced without network access.
+
+    Responses are looked up by a hash of the prompt and whether the call is streamed, so streamed and unary calls for
+    the same prompt are served from their own recorded calls. Calls recorded without their kind are served to calls of
+    either kind. If a prompt was recorded more than once, its recorded calls are served in turn, so retries after a
+    recorded failure play out as they did. Each call takes its recorded latency,
+    divided by `speedup`, so the service sees the latency distribution of the recorded traffic. A prompt without a
+    recorded response fails with a 404 error, which is not retried. Token counts are estimated from the lengths of the
+    prompt and response, as they are not recorded.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the recording the responses were loaded from.
+    speedup : float or None
+        The factor recorded latencies are divided by, or None to serve responses without delay.
+    responses : dict[tuple[str, bool | None], list[RecordedResponse]]
+        The recorded calls for each prompt, keyed by its prompt hash and whether the calls were streamed.
+    """
+
+    def __init__(self, path: Path, speedup: float | None = 1.0):
+        """
+        Parameters
+        ----------
+        path : Path
+            The path of the recording, as written by RecordingModelBackend.
+        speedup : float, optional
+            The factor recorded latencies are divided by, by default 1, which reproduces them. None serves responses
+            without delay.
+        """
+
+        self.path = path
+        self.speedup = speedup
+        self.responses: dict[tuple[str, bool | None], list[RecordedResponse]] = defaultdict(list)
+        self._served: dict[tuple[str, bool | None], int] = defaultdict(int)
+
+        for recorded in load_recording(path):
+            self.responses[(recorded.prompt_hash, recorded.stream)].append(recorded)
+
+    def _next(self, contents: list[types.Content], stream: bool) -> RecordedResponse:
+        prompt_hash = hash_prompt(contents)
+        key = (prompt_hash, stream)
+
+        if key not in self.responses:
+            # recordings made before the kind of call was recorded serve calls of either kind
+            key = (prompt_hash, None)
+
+        recorded = self.responses.get(key)
+
+        if not recorded:
+            kind = "streamed" if stream else "unary"
+            raise api_error(404, f"No recorded {kind} response for prompt hash: {prompt_hash}")
+
+        served = self._served[key]
+        self._served[key] += 1
+
+        return recorded[served % len(recorded)]
+
+    def _latency(self, recorded: RecordedResponse) -> float:
+        return recorded.latency_seconds / self.speedup if self.speedup is not None else 0.0
+
+    @staticmethod
+    def _text(recorded: RecordedResponse) -> str:
+        if recorded.text is None:
+            raise api_error(recorded.error_code or 500, "Replayed model error")
+
+        return recorded.text
+
+    def generate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        recorded = self._next(contents, stream=False)
+        time.sleep(self._latency(recorded))
+        text = self._text(recorded)
+
+        return text_response(text, estimate_usage(prompt_text(contents), text))
+
+    async def agenerate_content(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        recorded = self._next(contents, stream=False)
+        await asyncio.sleep(self._latency(recorded))
+        text = self._text(recorded)
+
+        return text_response(text, estimate_usage(prompt_text(contents), text))
+
+    async def agenerate_content_stream(
+            self,
+            model: str,
+            contents: list[types.Content],
+            config: types.GenerateContentConfig
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        recorded = self._next(contents, stream=True)
+        await asyncio.sleep(self._latency(recorded))
+        text = self._text(recorded)
+
+        return text_response_stream(text, usage_metadata=estimate_usage(prompt_text(contents), text))
@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator
+
+from analysis_api.metrics import MODEL_CALLS_IN_FLIGHT, MODEL_CALL_QUEUE_DEPTH, MODEL_CALL_QUEUE_WAIT_SECONDS
+
+
+class Priority(IntEnum):
+    """The priority of a model call. Lower values are given a concurrency slot first."""
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class ModelCallLimiter:
+    """
+    Limits the number of concurrent model calls, queueing the rest by priority.
+
+    Calls beyond `max_concurrency` wait in a priority queue rather than being sent to the model, where a burst would be
+    rejected with a rate limit error. When a slot is freed it is handed to the waiting call with the highest priority,
+    and calls with the same priority are served in the order they arrived, so interactive requests go ahead of batch
+    work without reordering requests of the same kind.
+
+    The number of calls in flight, the queue depth and the time spent queueing are exported as Prometheus metrics.
+
+    Attributes
+    ----------
+    max_concurrency : int
+        The maximum number of model calls in flight at once.
+    in_flight : int
+        The number of model calls currently holding a slot.
+    queue_depth : int
+        The number of model calls waiting for a slot.
+
+    Methods
+    -------
+    slot(priority: Priority) -> AsyncIterator[None]
+        Holds a concurrency slot for the duration of the context, waiting for one if none are free.
+    """
+
+    def __init__(self, max_concurrency: int):
+        """
+        Parameters
+        ----------
+        max_concurrency : int
+            The maximum number of model calls in flight at once.
+
+        Raises
+        ------
+        ValueError
+            If max_concurrency is less than 1.
+        """
+
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}.")
+
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(not future.done() for _, _, future in self._waiters)
+
+    async def _acquire(self, priority: Priority):
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            MODEL_CALLS_IN_FLIGHT.inc()
+            MODEL_CALL_QUEUE_WAIT_SECONDS.labels(priority=priority.name).observe(0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        queue_depth = MODEL_CALL_QUEUE_DEPTH.labels(priority=priority.name)
+        queue_depth.inc()
+        start = time.perf_counter()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the slot may have been handed over after the waiter was cancelled, in which case it is passed on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            queue_depth.dec()
+            MODEL_CALL_QUEUE_WAIT_SECONDS.labels(priority=priority.name).observe(time.perf_counter() - start)
+
+    def _release(self):
+        # the slot is handed directly to the next waiter, so in_flight only drops when nobody is waiting
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._in_flight -= 1
+        MODEL_CALLS_IN_FLIGHT.dec()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+        """
+        Holds a concurrency slot for the duration of the context, waiting for one if none are free.
+
+        Parameters
+        ----------
+        priority : Priority, optional
+            The priority of the model call, by default Priority.INTERACTIVE.
+        """
+
+        await self._acquire(priority)
+
+        try:
+            yield
+        finally:
+            self._release()
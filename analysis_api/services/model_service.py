@@ -1,9 +1,135 @@
+import asyncio
 import json
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum
 from json import JSONDecodeError
+from typing import AsyncIterator, Iterator
 from loguru import logger
 
-from google import genai
+import httpx
 from google.genai import types, errors
+from opentelemetry import trace
+from pydantic import BaseModel
+
+from analysis_api.metrics import MODEL_CALL_ATTEMPT_SECONDS, MODEL_CALL_RETRIES
+from analysis_api.services.circuit_breaker import CircuitBreaker
+from analysis_api.services.deadline import Deadline
+from analysis_api.services.model_backends.base import ModelBackend
+from analysis_api.services.model_limiter import ModelCallLimiter, Priority
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
+from analysis_api.tracing import request_stage
+
+
+DEFAULT_RESPONSE_SCHEMA = {"type": "OBJECT", "properties": {"response": {"type": "STRING"}}}
+"""The default response schema, under which the model returns its response as a single string."""
+
+
+class PromptType(str, Enum):
+    """The prompts used by the service, each of which has its own prebuilt ModelService."""
+
+    EMOTIONAL_PROFILE = "emotional_profile"
+    EMOTIONAL_TAGS = "emotional_tags"
+    EMOTIONAL_MULTI_TAGS = "emotional_multi_tags"
+
+
+class RetryPolicy(BaseModel):
+    """
+    The policy for retrying model calls that fail with a transient error.
+
+    Failed attempts are retried after an exponential backoff with full jitter, so that clients retrying after the same
+    failure do not retry in lockstep. If the error carries a Retry-After header, the retry waits at least that long.
+    No retry is made once `max_attempts` is reached or if it would start after `deadline_seconds` have elapsed since
+    the first attempt.
+
+    Attributes
+    ----------
+    retryable_status_codes : frozenset of int
+        The HTTP status codes of errors that are retried.
+    max_attempts : int
+        The maximum number of attempts, including the first. 1 disables retries.
+    initial_backoff_seconds : float
+        The upper bound of the backoff before the first retry.
+    max_backoff_seconds : float
+        The upper bound of the backoff before any retry, before the Retry-After header is applied.
+    backoff_multiplier : float
+        The factor the backoff bound grows by after each attempt.
+    deadline_seconds : float or None
+        The time after the first attempt beyond which no retry is started, or None for no deadline.
+
+    Methods
+    -------
+    retry_delay(error: errors.APIError, attempt: int, elapsed_seconds: float) -> float | None
+        Returns how long to wait before retrying a failed attempt, or None if it should not be retried.
+    """
+
+    retryable_status_codes: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+    max_attempts: int = 3
+    initial_backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 8.0
+    backoff_multiplier: float = 2.0
+    deadline_seconds: float | None = 30.0
+
+    @staticmethod
+    def _retry_after_seconds(error: errors.APIError) -> float | None:
+        headers = getattr(error.response, "headers", None)
+        retry_after = headers.get("Retry-After") if headers is not None else None
+
+        if retry_after is None:
+            return None
+
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+    def retry_delay(self, error: errors.APIError, attempt: int, elapsed_seconds: float) -> float | None:
+        """
+        Returns how long to wait before retrying a failed attempt, or None if it should not be retried.
+
+        Parameters
+        ----------
+        error : errors.APIError
+            The error raised by the failed attempt.
+        attempt : int
+            The number of the failed attempt, starting from 1.
+        elapsed_seconds : float
+            The time elapsed since the first attempt started.
+
+        Returns
+        -------
+        float or None
+            The number of seconds to wait before the next attempt, or None if the error is not retryable, the
+            maximum number of attempts has been made or the retry would start after the deadline.
+        """
+
+        if error.code not in self.retryable_status_codes or attempt >= self.max_attempts:
+            return None
+
+        backoff_bound = min(
+            self.initial_backoff_seconds * self.backoff_multiplier ** (attempt - 1),
+            self.max_backoff_seconds
+        )
+        delay = random.uniform(0, backoff_bound)
+        retry_after = self._retry_after_seconds(error)
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        if self.deadline_seconds is not None and elapsed_seconds + delay > self.deadline_seconds:
+            return None
+
+        return delay
 
 
 class ModelServiceException(Exception):
@@ -13,6 +139,18 @@ class ModelServiceException(Exception):
         super().__init__(message)
 
 
+class ModelServiceUnavailableException(ModelServiceException):
+    """Exception raised when a model call is rejected without being made because the model backend is unavailable."""
+
+
+class TokenBudgetExhaustedException(ModelServiceUnavailableException):
+    """Exception raised when a non-interactive model call is rejected because the daily token budget is used up."""
+
+
+DEFAULT_USAGE_KEY = UsageKey(endpoint="other")
+"""The key the tokens of a model call are accounted to if the caller does not give one."""
+
+
 class ModelService:
     """
     A service for interacting with a generative AI model to generate responses.
@@ -21,8 +159,8 @@ class ModelService:
     ----------
     SAFETY_SETTINGS : list of types.SafetySetting, class attribute
         Safety settings applied to filter harmful content from model responses.
-    client : genai.Client
-        The Google GenAI client used for API communication.
+    backend : ModelBackend
+        The model backend requests are sent to, such as Gemini or a local fake.
     model : str
         The name of the model used for generating responses.
     prompt_template : str
@@ -33,13 +171,40 @@ class ModelService:
         The nucleus sampling parameter controlling response diversity, by default 0.95.
     max_output_tokens : int, optional
         The maximum number of output tokens in the response, by default 1000.
+    response_schema : dict, optional
+        The schema the model response must follow, by default DEFAULT_RESPONSE_SCHEMA. The schema must have a
+        "response" property, which holds the data returned by `generate_response`.
+    limiter : ModelCallLimiter or None
+        The limiter shared by all model services, which bounds the number of concurrent async model calls. If None,
+        calls are not limited.
+    retry_policy : RetryPolicy or None
+        The policy for retrying model calls that fail with a transient error. If None, failed calls are not retried.
+    circuit_breaker : CircuitBreaker or None
+        The circuit breaker shared by all model services, which rejects calls while the model backend is failing. If
+        None, calls are always made.
+    usage_tracker : TokenUsageTracker or None
+        The tracker shared by all model services, which accounts for the tokens used by each call and guards the daily
+        token budget. If None, token usage is not tracked.
     config : types.GenerateContentConfig
         The configuration settings used when generating responses.
+    stream_config : types.GenerateContentConfig
+        The configuration settings used when streaming responses, which are plain text rather than JSON so that each
+        chunk can be forwarded as it arrives.
 
     Methods
     -------
-    generate_response(input_data: str) -> dict | str
+    generate_response(input_data: str, usage_key: UsageKey | None) -> dict | str
         Generates a response from the model based on the provided input data.
+    agenerate_response(input_data: str, priority: Priority, usage_key: UsageKey | None) -> dict | str
+        Asynchronously generates a response from the model based on the provided input data.
+    agenerate_response_stream(input_data: str, priority: Priority, usage_key: UsageKey | None) -> AsyncIterator[str]
+        Asynchronously generates a plain text response from the model, yielding it in chunks as it is generated.
+    batch_request(input_data: str) -> dict
+        Builds the request for the input data in the format of a batch prediction input file.
+    batch_input(request: dict) -> str
+        Recovers the input data from a request built by `batch_request`.
+    parse_batch_response(response: dict, usage_key: UsageKey | None) -> dict | str
+        Parses a response from a batch prediction output file.
     """
 
     SAFETY_SETTINGS = [
@@ -54,18 +219,23 @@ class ModelService:
 
     def __init__(
             self,
-            client: genai.Client,
+            backend: ModelBackend,
             model: str,
             prompt_template: str,
             temp: float = 0.0,
             top_p: float = 0.95,
-            max_output_tokens: int = 1000
+            max_output_tokens: int = 1000,
+            response_schema: dict | None = None,
+            limiter: ModelCallLimiter | None = None,
+            retry_policy: RetryPolicy | None = None,
+            circuit_breaker: CircuitBreaker | None = None,
+            usage_tracker: TokenUsageTracker | None = None
     ):
         """
         Parameters
         ----------
-        client : genai.Client
-            The Google GenAI client used for API communication.
+        backend : ModelBackend
+            The model backend requests are sent to, such as Gemini or a local fake.
         model : str
             The name of the model used for generating responses.
         prompt_template : str
@@ -76,15 +246,37 @@ class ModelService:
             The nucleus sampling parameter controlling response diversity, by default 0.95.
         max_output_tokens : int, optional
             The maximum number of output tokens in the response, by default 1000.
+        response_schema : dict, optional
+            The schema the model response must follow, by default DEFAULT_RESPONSE_SCHEMA.
+        limiter : ModelCallLimiter, optional
+            The limiter bounding the number of concurrent async model calls, by default None, which does not limit
+            them.
+        retry_policy : RetryPolicy, optional
+            The policy for retrying model calls that fail with a transient error, by default None, which does not retry
+            them.
+        circuit_breaker : CircuitBreaker, optional
+            The circuit breaker rejecting calls while the model backend is failing, by default None, which always makes
+            them.
+        usage_tracker : TokenUsageTracker, optional
+            The tracker accounting for the tokens used by each call and guarding the daily token budget, by default
+            None, which does not track them.
         """
 
-        self.client = client
+        self.backend = backend
         self.model = model
         self.prompt_template = prompt_template
         self.temp = temp
         self.top_p = top_p
         self.max_output_tokens = max_output_tokens
+        self.response_schema = response_schema if response_schema is not None else DEFAULT_RESPONSE_SCHEMA
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.usage_tracker = usage_tracker
         self.config = self._generate_content_config()
+        self.stream_config = self.config.model_copy(
+            update={"response_mime_type": "text/plain", "response_schema": None}
+        )
 
     def _generate_content_config(self) -> types.GenerateContentConfig:
         """
@@ -103,9 +295,195 @@ class ModelService:
             response_modalities=["TEXT"],
             safety_settings=self.SAFETY_SETTINGS,
             response_mime_type="application/json",
-            response_schema={"type": "OBJECT", "properties": {"response": {"type": "STRING"}}},
+            response_schema=self.response_schema,
         )
 
+    def _slot(self, priority: Priority):
+        return self.limiter.slot(priority) if self.limiter is not None else nullcontext()
+
+    @staticmethod
+    def _attempt_config(config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+        deadline = Deadline.current()
+
+        if deadline is None:
+            return config
+
+        if deadline.expired:
+            raise TimeoutError("Request deadline exceeded before the model call was made")
+
+        # the HTTP call is bounded by the time the request has left, so a stuck call does not outlive the request
+        timeout_ms = max(int(deadline.remaining() * 1000), 1)
+        return config.model_copy(update={"http_options": types.HttpOptions(timeout=timeout_ms)})
+
+    def _retry_delay(
+            self,
+            error: errors.APIError,
+            attempt: int,
+            started: float,
+            attempt_started: float
+    ) -> float | None:
+        MODEL_CALL_ATTEMPT_SECONDS.labels(outcome="error").observe(time.perf_counter() - attempt_started)
+
+        if self.retry_policy is None:
+            return None
+
+        delay = self.retry_policy.retry_delay(error, attempt=attempt, elapsed_seconds=time.perf_counter() - started)
+        deadline = Deadline.current()
+
+        if delay is not None and deadline is not None and delay >= deadline.remaining():
+            logger.warning(f"Model call attempt {attempt} failed, no time left to retry before the deadline - {error}")
+            return None
+
+        if delay is not None:
+            MODEL_CALL_RETRIES.labels(status_code=str(error.code)).inc()
+            logger.warning(f"Model call attempt {attempt} failed, retrying in {delay:.2f}s - {error}")
+
+        return delay
+
+    def _generate_content_with_retry(self, contents: list[types.Content]) -> types.GenerateContentResponse:
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            attempt_started = time.perf_counter()
+
+            try:
+                res = self.backend.generate_content(
+                    model=self.model,
+                    contents=contents,
+                    config=self._attempt_config(self.config)
+                )
+            except errors.APIError as e:
+                delay = self._retry_delay(e, attempt=attempt, started=started, attempt_started=attempt_started)
+
+                if delay is None:
+                    raise
+
+                time.sleep(delay)
+                continue
+
+            MODEL_CALL_ATTEMPT_SECONDS.labels(outcome="success").observe(time.perf_counter() - attempt_started)
+            return res
+
+    async def _agenerate_content_with_retry(
+            self,
+            contents: list[types.Content],
+            priority: Priority
+    ) -> types.GenerateContentResponse:
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            attempt += 1
+
+            # the concurrency slot is released while backing off, so other calls can use it
+            async with self._slot(priority):
+                attempt_started = time.perf_counter()
+
+                try:
+                    res = await self.backend.agenerate_content(
+                        model=self.model,
+                        contents=contents,
+                        config=self._attempt_config(self.config)
+                    )
+                except errors.APIError as e:
+                    delay = self._retry_delay(e, attempt=attempt, started=started, attempt_started=attempt_started)
+
+                    if delay is None:
+                        raise
+                else:
+                    MODEL_CALL_ATTEMPT_SECONDS.labels(outcome="success").observe(time.perf_counter() - attempt_started)
+                    return res
+
+            await asyncio.sleep(delay)
+
+    async def _agenerate_content_stream_with_retry(
+            self,
+            contents: list[types.Content],
+            priority: Priority,
+            usage_key: UsageKey | None
+    ) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        attempt = 0
+        yielded = False
+
+        while True:
+            attempt += 1
+            delay = None
+
+            try:
+                async with self._slot(priority):
+                    attempt_started = time.perf_counter()
+                    stream = await self.backend.agenerate_content_stream(
+                        model=self.model,
+                        contents=contents,
+                        config=self._attempt_config(self.stream_config)
+                    )
+
+                    usage_metadata = None
+
+                    async for chunk in stream:
+                        # the token counts are sent with the last chunk
+                        usage_metadata = chunk.usage_metadata or usage_metadata
+
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+
+                    self._record_usage(usage_key, usage_metadata)
+                    MODEL_CALL_ATTEMPT_SECONDS.labels(outcome="success").observe(time.perf_counter() - attempt_started)
+                    return
+            except errors.APIError as e:
+                # chunks already forwarded cannot be taken back, so the stream is only retried before the first one
+                if not yielded:
+                    delay = self._retry_delay(e, attempt=attempt, started=started, attempt_started=attempt_started)
+
+                if delay is None:
+                    raise
+
+            await asyncio.sleep(delay)
+
+    async def _admit(self, priority: Priority):
+        if self.usage_tracker is not None and not await self.usage_tracker.admit(priority):
+            raise TokenBudgetExhaustedException("Model service unavailable - daily token budget is used up")
+
+    def _record_usage(
+            self,
+            usage_key: UsageKey | None,
+            usage_metadata: types.GenerateContentResponseUsageMetadata | None
+    ):
+        if self.usage_tracker is not None:
+            self.usage_tracker.record(usage_key or DEFAULT_USAGE_KEY, usage_metadata)
+
+    @contextmanager
+    def _circuit(self) -> Iterator[None]:
+        if self.circuit_breaker is None:
+            yield
+            return
+
+        if not self.circuit_breaker.allow_request():
+            raise ModelServiceUnavailableException("Model service unavailable - circuit breaker is open")
+
+        try:
+            yield
+        except errors.APIError as e:
+            # client errors say nothing about the health of the backend
+            if e.code is None or e.code == 429 or e.code >= 500:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_ignored()
+            raise
+        except (TimeoutError, httpx.TimeoutException):
+            # a backend that hangs or is very slow is failing, even though it never returns an error
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            self.circuit_breaker.record_ignored()
+            raise
+        else:
+            self.circuit_breaker.record_success()
+
     @staticmethod
     def _generate_contents(prompt: str) -> list[types.Content]:
         """
@@ -127,6 +505,21 @@ class ModelService:
 
         return contents
 
+    @staticmethod
+    def _set_usage_attributes(span: trace.Span, response: types.GenerateContentResponse):
+        # the token counts are only known once the call has finished, so they are added to the span afterwards
+        usage = response.usage_metadata
+
+        if usage is None:
+            return
+
+        attributes = {
+            "gen_ai.usage.input_tokens": usage.prompt_token_count,
+            "gen_ai.usage.output_tokens": usage.candidates_token_count,
+            "gen_ai.usage.total_tokens": usage.total_token_count
+        }
+        span.set_attributes({key: value for key, value in attributes.items() if value is not None})
+
     @staticmethod
     def _parse_model_response(response: types.GenerateContentResponse) -> dict | str:
         """
@@ -150,7 +543,8 @@ class ModelService:
         """
 
         try:
-            json_response = json.loads(response.text)
+            with request_stage("json_parsing"):
+                json_response = json.loads(response.text)
         except JSONDecodeError as e:
             message = f"res.text is not valid JSON: {response.text} - {e}"
             print(message)
@@ -168,7 +562,111 @@ class ModelService:
 
         return response_data
 
-    def generate_response(self, input_data: str) -> dict | str:
+    def batch_request(self, input_data: str) -> dict:
+        """
+        Builds the request for the input data in the format of a batch prediction input file.
+
+        The request uses the same prompt and generation settings as `generate_response`, so a batch prediction returns
+        the same kind of response as an online call.
+
+        Parameters
+        ----------
+        input_data : str
+            The text input for which a response is to be generated.
+
+        Returns
+        -------
+        dict
+            The GenerateContentRequest as a JSON-serialisable dictionary.
+        """
+
+        contents = self._generate_contents(f"{self.prompt_template}\n{input_data}")
+
+        return {
+            "contents": [content.model_dump(mode="json", exclude_none=True) for content in contents],
+            "generationConfig": {
+                "temperature": self.temp,
+                "topP": self.top_p,
+                "maxOutputTokens": self.max_output_tokens,
+                "responseMimeType": "application/json",
+                "responseSchema": self.response_schema
+            },
+            "safetySettings": [setting.model_dump(mode="json", exclude_none=True) for setting in self.SAFETY_SETTINGS]
+        }
+
+    def batch_input(self, request: dict) -> str:
+        """
+        Recovers the input data from a request built by `batch_request`.
+
+        Batch prediction output files repeat each request alongside its response, so the input data identifies which
+        result a response belongs to.
+
+        Parameters
+        ----------
+        request : dict
+            The request, as repeated in a batch prediction output file.
+
+        Returns
+        -------
+        str
+            The input data the request was built from.
+
+        Raises
+        ------
+        ModelServiceException
+            If the request was not built from this service's prompt.
+        """
+
+        try:
+            prompt = "".join(part["text"] for content in request["contents"] for part in content["parts"])
+        except (KeyError, TypeError) as e:
+            raise ModelServiceException(f"Batch request has no text contents - {e}")
+
+        prefix = f"{self.prompt_template}\n"
+
+        if not prompt.startswith(prefix):
+            raise ModelServiceException("Batch request was not built from this prompt")
+
+        return prompt[len(prefix):]
+
+    def parse_batch_response(self, response: dict, usage_key: UsageKey | None = None) -> dict | str:
+        """
+        Parses a response from a batch prediction output file.
+
+        The tokens used by the request are accounted to `usage_key`, as for a call made through the service.
+
+        Parameters
+        ----------
+        response : dict
+            The GenerateContentResponse, as written to a batch prediction output file.
+        usage_key : UsageKey, optional
+            What the tokens used by the request are accounted to, by default None, which accounts them to
+            DEFAULT_USAGE_KEY.
+
+        Returns
+        -------
+        dict or str
+            The parsed response content, as returned by `generate_response`.
+
+        Raises
+        ------
+        ModelServiceException
+            If the response cannot be parsed or contains an error.
+        """
+
+        try:
+            res = types.GenerateContentResponse.model_validate(response)
+        except ValueError as e:
+            raise ModelServiceException(f"Batch response is not a valid GenerateContentResponse - {e}")
+
+        if res.text is None:
+            raise ModelServiceException(f"Batch response has no text: {response}")
+
+        self._record_usage(usage_key, res.usage_metadata)
+
+        return self._parse_model_response(res)
+
+    def generate_response(self, input_data: str, usage_key: UsageKey | None = None) -> dict | str:
         """
         Generates a response from the model based on the provided input data.
 
@@ -176,6 +674,9 @@ class ModelService:
         ----------
         input_data : str
             The text input for which a response is to be generated.
+        usage_key : UsageKey, optional
+            What the tokens used by the call are accounted to, by default None, which accounts them to
+            DEFAULT_USAGE_KEY.
 
         Returns
         -------
@@ -184,19 +685,146 @@ class ModelService:
 
         Raises
         ------
+        ModelServiceUnavailableException
+            If the circuit breaker is open, in which case the model is not called.
         ModelServiceException
             If an error occurs while communicating with the model API or parsing the response.
+        TimeoutError
+            If the request deadline expires before or during the model call.
         """
 
         prompt = f"{self.prompt_template}\n{input_data}"
         contents = self._generate_contents(prompt)
 
         try:
-            res = self.client.models.generate_content(model=self.model, contents=contents, config=self.config)
+            with self._circuit(), request_stage("model_call", **{"gen_ai.request.model": self.model}) as span:
+                res = self._generate_content_with_retry(contents)
+                self._set_usage_attributes(span, res)
+                self._record_usage(usage_key, res.usage_metadata)
             print(f"{res = }")
         except errors.APIError as e:
             message = f"Model API error - {e}"
             print(message)
             raise ModelServiceException(message)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f"Model call timed out - {e}") from e
 
         return self._parse_model_response(res)
+
+    async def agenerate_response(
+            self,
+            input_data: str,
+            priority: Priority = Priority.INTERACTIVE,
+            usage_key: UsageKey | None = None
+    ) -> dict | str:
+        """
+        Asynchronously generates a response from the model based on the provided input data.
+
+        Uses the backend's native async interface, so in-flight calls do not occupy a worker thread. If a limiter
+        is set, each attempt waits for a concurrency slot first. Transient errors are retried under the retry policy. If
+        the call is made under a request deadline, each attempt is given the time the request has left. Once the daily
+        token budget is used up, non-interactive calls are rejected or queued under the usage tracker's policy.
+
+        Parameters
+        ----------
+        input_data : str
+            The text input for which a response is to be generated.
+        priority : Priority, optional
+            The priority of the call when waiting for a concurrency slot, by default Priority.INTERACTIVE.
+        usage_key : UsageKey, optional
+            What the tokens used by the call are accounted to, by default None, which accounts them to
+            DEFAULT_USAGE_KEY.
+
+        Returns
+        -------
+        dict or str
+            The model-generated response, either as a dictionary (if JSON) or as a string.
+
+        Raises
+        ------
+        ModelServiceUnavailableException
+            If the circuit breaker is open, or if the call is not interactive and the daily token budget is used up, in
+            which case the model is not called.
+        ModelServiceException
+            If an error occurs while communicating with the model API or parsing the response.
+        TimeoutError
+            If the request deadline expires before or during the model call.
+        """
+
+        prompt = f"{self.prompt_template}\n{input_data}"
+        contents = self._generate_contents(prompt)
+
+        try:
+            await self._admit(priority)
+
+            with self._circuit(), request_stage("model_call", **{"gen_ai.request.model": self.model}) as span:
+                res = await self._agenerate_content_with_retry(contents, priority=priority)
+                self._set_usage_attributes(span, res)
+                self._record_usage(usage_key, res.usage_metadata)
+        except errors.APIError as e:
+            message = f"Model API error - {e}"
+            print(message)
+            raise ModelServiceException(message)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f"Model call timed out - {e}") from e
+
+        return self._parse_model_response(res)
+
+    async def agenerate_response_stream(
+            self,
+            input_data: str,
+            priority: Priority = Priority.INTERACTIVE,
+            usage_key: UsageKey | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Asynchronously generates a plain text response from the model, yielding it in chunks as it is generated.
+
+        If a limiter is set, the stream holds a concurrency slot until it is exhausted or closed. A failed stream is
+        only retried if it fails before its first chunk is yielded. The tokens used are recorded once the stream is
+        exhausted.
+
+        Parameters
+        ----------
+        input_data : str
+            The text input for which a response is to be generated.
+        priority : Priority, optional
+            The priority of the call when waiting for a concurrency slot, by default Priority.INTERACTIVE.
+        usage_key : UsageKey, optional
+            What the tokens used by the call are accounted to, by default None, which accounts them to
+            DEFAULT_USAGE_KEY.
+
+        Yields
+        ------
+        str
+            The next chunk of the model-generated response.
+
+        Raises
+        ------
+        ModelServiceUnavailableException
+            If the circuit breaker is open, or if the call is not interactive and the daily token budget is used up, in
+            which case the model is not called.
+        ModelServiceException
+            If an error occurs while communicating with the model API.
+        TimeoutError
+            If the request deadline expires before or during the model call.
+        """
+
+        prompt = f"{self.prompt_template}\n{input_data}"
+        contents = self._generate_contents(prompt)
+
+        try:
+            await self._admit(priority)
+
+            with self._circuit():
+                async for chunk in self._agenerate_content_stream_with_retry(
+                        contents,
+                        priority=priority,
+                        usage_key=usage_key
+                ):
+                    yield chunk
+        except errors.APIError as e:
+            message = f"Model API error - {e}"
+            print(message)
+            raise ModelServiceException(message)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f"Model call timed out - {e}") from e
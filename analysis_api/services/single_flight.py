@@ -0,0 +1,124 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from analysis_api.services.deadline import Deadline, without_deadline
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    deadline: Deadline | None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single in-flight execution.
+
+    The first caller for a key starts the work in its own task; every caller that arrives while that task is still
+    running awaits the same task instead of starting a duplicate. Once the task completes, the key is released so that
+    subsequent calls start afresh.
+
+    The shared task is shielded from cancellation, so a single caller giving up (for example, a client disconnecting)
+    does not cancel the work for the other callers waiting on it. Once every caller has given up, the task is
+    cancelled.
+
+    The shared task runs under its own deadline, the latest of the deadlines of the callers waiting on it, so it is
+    bounded without failing callers that joined it with more time left than the caller that started it. If any caller
+    has no deadline, neither does the shared task.
+
+    Attributes
+    ----------
+    in_flight : int
+        The number of keys that currently have work in flight.
+
+    Methods
+    -------
+    do(key: Hashable, fn: Callable[[], Awaitable[T]]) -> T
+        Runs fn for the key, or joins the call already in flight for the key.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _release(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _done(self, key: Hashable, call: _Call):
+        self._release(key, call)
+
+        # mark the exception as retrieved in case every caller was cancelled before the task finished
+        if not call.task.cancelled():
+            call.task.exception()
+
+    @staticmethod
+    async def _run(fn: Callable[[], Awaitable[T]], deadline: Deadline | None) -> T:
+        if deadline is None:
+            return await without_deadline(fn())
+
+        async with deadline.scope():
+            return await fn()
+
+    def _start(self, key: Hashable, fn: Callable[[], Awaitable[T]], caller_deadline: Deadline | None) -> _Call:
+        deadline = Deadline(caller_deadline.remaining()) if caller_deadline is not None else None
+        call = _Call(task=asyncio.ensure_future(self._run(fn, deadline)), deadline=deadline)
+        self._calls[key] = call
+        call.task.add_done_callback(lambda _: self._done(key, call))
+
+        return call
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs fn for the key, or joins the call already in flight for the key.
+
+        The deadline of the shared call is extended to the caller's deadline if it is later, or lifted if the caller
+        has none.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key identifying the unit of work.
+        fn : Callable[[], Awaitable[T]]
+            A zero-argument callable returning the awaitable that performs the work. It is only invoked if no call is
+            already in flight for the key.
+
+        Returns
+        -------
+        T
+            The result of the shared call.
+
+        Raises
+        ------
+        TimeoutError
+            If the deadline of the shared call expires before it completes.
+        Exception
+            Any exception raised by the shared call is raised to every caller waiting on it.
+        """
+
+        caller_deadline = Deadline.current()
+        call = self._calls.get(key)
+
+        if call is None:
+            call = self._start(key, fn, caller_deadline)
+        elif call.deadline is not None:
+            call.deadline.extend(caller_deadline.remaining() if caller_deadline is not None else None)
+
+        call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+
+            if call.waiters == 0 and not call.task.done():
+                # nobody is left waiting for the result, so the key is released for callers starting afresh
+                self._release(key, call)
+                call.task.cancel()
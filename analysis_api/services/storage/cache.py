@@ -0,0 +1,173 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from analysis_api.metrics import RESULT_CACHE_LOOKUPS, RESULT_CACHE_REMOVALS
+
+
+class LRUCache:
+    """
+    An in-process least-recently-used cache bounded by entry count and approximate size in bytes.
+
+    Entries can optionally expire after a fixed time-to-live. When adding an entry would exceed either bound, the least
+    recently used entries are evicted until it fits.
+
+    Hits, misses, evictions and expirations are counted on the instance and exported as Prometheus metrics.
+
+    Attributes
+    ----------
+    max_entries : int
+        The maximum number of entries held by the cache.
+    max_bytes : int
+        The maximum approximate total size of the cached values, in bytes.
+    ttl_seconds : float or None
+        The number of seconds after which an entry expires, or None if entries never expire.
+    hits : int
+        The number of lookups that found a live entry.
+    misses : int
+        The number of lookups that found no entry or an expired entry.
+    evictions : int
+        The number of entries evicted to stay within the bounds.
+    expirations : int
+        The number of entries dropped because their time-to-live had elapsed.
+
+    Methods
+    -------
+    get(key: Hashable) -> Any | None
+        Retrieves the value for a key, or None if it is not cached.
+    set(key: Hashable, value: Any)
+        Adds or replaces the value for a key.
+    clear()
+        Removes all entries from the cache.
+    """
+
+    def __init__(
+            self,
+            max_entries: int,
+            max_bytes: int,
+            ttl_seconds: float | None = None,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Parameters
+        ----------
+        max_entries : int
+            The maximum number of entries held by the cache.
+        max_bytes : int
+            The maximum approximate total size of the cached values, in bytes.
+        ttl_seconds : float, optional
+            The number of seconds after which an entry expires, by default None, meaning entries never expire.
+        clock : Callable[[], float], optional
+            The monotonic clock used to expire entries, by default time.monotonic.
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        """The approximate total size of the cached values, in bytes."""
+
+        return self._bytes
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+
+        return sys.getsizeof(value)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Retrieves the value for a key, or None if it is not cached.
+
+        A successful lookup marks the entry as most recently used.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key to look up.
+
+        Returns
+        -------
+        Any or None
+            The cached value, or None if the key is not cached or its entry has expired.
+        """
+
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        value, _, expires_at = entry
+
+        if expires_at is not None and self._clock() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            RESULT_CACHE_REMOVALS.labels(reason="expired").inc()
+            RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        RESULT_CACHE_LOOKUPS.labels(result="hit").inc()
+
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Adds or replaces the value for a key, evicting least recently used entries if required.
+
+        Values larger than `max_bytes` are not cached.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key to store the value under.
+        value : Any
+            The value to cache. None cannot be cached, as it denotes a miss.
+        """
+
+        size = self._estimate_size(value)
+
+        if key in self._entries:
+            self._remove(key)
+
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        while self._entries and (len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+            RESULT_CACHE_REMOVALS.labels(reason="evicted").inc()
+
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+
+    def clear(self):
+        """Removes all entries from the cache."""
+
+        self._entries.clear()
+        self._bytes = 0
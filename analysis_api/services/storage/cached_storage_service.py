@@ -0,0 +1,183 @@
+import asyncio
+
+import aiosqlite
+
+from analysis_api.services.storage.cache import LRUCache
+from analysis_api.services.storage.storage_service import StorageService
+from analysis_api.services.storage.write_behind import WriteBehindWriter
+
+
+class CachedStorageService(StorageService):
+    """
+    A StorageService that serves profiles, tags and tracks from an in-process cache before falling back to the database.
+
+    Results retrieved from or stored in the database are added to the cache, so repeated lookups for popular tracks are
+    served without any I/O. The cache is shared by all requests, while the database connections are per request.
+
+    Attributes
+    ----------
+    cache : LRUCache
+        The cache shared by all requests.
+    """
+
+    def __init__(
+            self,
+            db: aiosqlite.Connection,
+            cache: LRUCache,
+            write_db: aiosqlite.Connection | None = None,
+            write_behind: WriteBehindWriter | None = None,
+            write_lock: asyncio.Lock | None = None
+    ):
+        """
+        Parameters
+        ----------
+        db : aiosqlite.Connection
+            The SQLite database connection.
+        cache : LRUCache
+            The cache shared by all requests.
+        write_db : aiosqlite.Connection, optional
+            A separate SQLite database connection to use for inserts. If not provided, `db` is used for both reads and
+            writes.
+        write_behind : WriteBehindWriter, optional
+            A background writer to queue inserts on. If not provided, inserts are written immediately.
+        write_lock : asyncio.Lock, optional
+            The lock serialising transactions on `write_db`. If not provided, a new lock is created.
+        """
+
+        super().__init__(db, write_db=write_db, write_behind=write_behind, write_lock=write_lock)
+        self.cache = cache
+
+    @staticmethod
+    def _profile_key(lyrics_hash: str) -> tuple[str, str]:
+        return "profile", lyrics_hash
+
+    @staticmethod
+    def _tags_key(lyrics_hash: str, emotion: str) -> tuple[str, str, str]:
+        return "tags", lyrics_hash, emotion
+
+    @staticmethod
+    def _track_key(track_id: str) -> tuple[str, str]:
+        return "track", track_id
+
+    async def store_profile(self, lyrics_hash: str, profile: dict[str, float]):
+        await super().store_profile(lyrics_hash=lyrics_hash, profile=profile)
+        self.cache.set(self._profile_key(lyrics_hash), dict(profile))
+
+    async def retrieve_profile(self, lyrics_hash: str) -> dict | None:
+        profile = self.cache.get(self._profile_key(lyrics_hash))
+
+        if profile is not None:
+            return dict(profile)
+
+        profile = await super().retrieve_profile(lyrics_hash)
+
+        if profile is not None:
+            self.cache.set(self._profile_key(lyrics_hash), dict(profile))
+
+        return profile
+
+    async def retrieve_profiles(self, lyrics_hashes: list[str]) -> dict[str, dict]:
+        profiles = {}
+        uncached_lyrics_hashes = []
+
+        for lyrics_hash in dict.fromkeys(lyrics_hashes):
+            profile = self.cache.get(self._profile_key(lyrics_hash))
+
+            if profile is not None:
+                profiles[lyrics_hash] = dict(profile)
+            else:
+                uncached_lyrics_hashes.append(lyrics_hash)
+
+        if uncached_lyrics_hashes:
+            stored_profiles = await super().retrieve_profiles(uncached_lyrics_hashes)
+
+            for lyrics_hash, profile in stored_profiles.items():
+                self.cache.set(self._profile_key(lyrics_hash), dict(profile))
+
+            profiles.update(stored_profiles)
+
+        return profiles
+
+    async def store_tags(self, lyrics_hash: str, emotion: str, tags: str):
+        await super().store_tags(lyrics_hash=lyrics_hash, emotion=emotion, tags=tags)
+        self.cache.set(self._tags_key(lyrics_hash, emotion), tags)
+
+    async def retrieve_tags(self, lyrics_hash: str, emotion: str) -> str | None:
+        tags = self.cache.get(self._tags_key(lyrics_hash, emotion))
+
+        if tags is not None:
+            return tags
+
+        tags = await super().retrieve_tags(lyrics_hash=lyrics_hash, emotion=emotion)
+
+        if tags is not None:
+            self.cache.set(self._tags_key(lyrics_hash, emotion), tags)
+
+        return tags
+
+    async def retrieve_tags_for_emotions(self, lyrics_hash: str, emotions: list[str]) -> dict[str, str]:
+        tags_by_emotion = {}
+        uncached_emotions = []
+
+        for emotion in dict.fromkeys(emotions):
+            tags = self.cache.get(self._tags_key(lyrics_hash, emotion))
+
+            if tags is not None:
+                tags_by_emotion[emotion] = tags
+            else:
+                uncached_emotions.append(emotion)
+
+        if uncached_emotions:
+            stored_tags = await super().retrieve_tags_for_emotions(lyrics_hash=lyrics_hash, emotions=uncached_emotions)
+
+            for emotion, tags in stored_tags.items():
+                self.cache.set(self._tags_key(lyrics_hash, emotion), tags)
+
+            tags_by_emotion.update(stored_tags)
+
+        return tags_by_emotion
+
+    async def store_track(self, track_id: str, lyrics_hash: str):
+        await super().store_track(track_id=track_id, lyrics_hash=lyrics_hash)
+        self.cache.set(self._track_key(track_id), lyrics_hash)
+
+    async def retrieve_track_lyrics_hash(self, track_id: str) -> str | None:
+        lyrics_hash = self.cache.get(self._track_key(track_id))
+
+        if lyrics_hash is not None:
+            return lyrics_hash
+
+        lyrics_hash = await super().retrieve_track_lyrics_hash(track_id)
+
+        if lyrics_hash is not None:
+            self.cache.set(self._track_key(track_id), lyrics_hash)
+
+        return lyrics_hash
+
+    async def store_tracks(self, tracks: dict[str, str]):
+        await super().store_tracks(tracks)
+
+        for track_id, lyrics_hash in tracks.items():
+            self.cache.set(self._track_key(track_id), lyrics_hash)
+
+    async def retrieve_tracks_lyrics_hashes(self, track_ids: list[str]) -> dict[str, str]:
+        lyrics_hashes = {}
+        uncached_track_ids = []
+
+        for track_id in dict.fromkeys(track_ids):
+            lyrics_hash = self.cache.get(self._track_key(track_id))
+
+            if lyrics_hash is not None:
+                lyrics_hashes[track_id] = lyrics_hash
+            else:
+                uncached_track_ids.append(track_id)
+
+        if uncached_track_ids:
+            stored_lyrics_hashes = await super().retrieve_tracks_lyrics_hashes(uncached_track_ids)
+
+            for track_id, lyrics_hash in stored_lyrics_hashes.items():
+                self.cache.set(self._track_key(track_id), lyrics_hash)
+
+            lyrics_hashes.update(stored_lyrics_hashes)
+
+        return lyrics_hashes
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+from loguru import logger
+
+from analysis_api.metrics import DB_CONNECTION_WAIT_SECONDS
+from analysis_api.services.storage.storage_service import StorageProfile, configure_connection
+
+
+class ConnectionPoolException(Exception):
+    """Exception raised when the connection pool is used incorrectly or cannot provide a connection."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class ConnectionPool:
+    """
+    An application-scoped pool of long-lived SQLite connections.
+
+    The pool holds a fixed number of read-only connections, which are borrowed for the duration of a request and then
+    returned, plus a single writer connection shared by all requests. SQLite only allows one writer at a time, so
+    funnelling all writes through one connection avoids lock contention between pooled connections. Transactions on
+    the writer must be made while holding `write_lock`, since a commit or rollback applies to every statement executed
+    on the connection since the last one.
+
+    Each connection to a file database is a separate aiosqlite background thread, so reusing them avoids the thread
+    spawn and file open that connect-per-request incurs. Note that every connection to ":memory:" opens its own,
+    independent database, so the pool should be used with a file database.
+
+    Attributes
+    ----------
+    db_path : str
+        The path of the SQLite database file.
+    size : int
+        The number of reader connections held by the pool.
+    storage_profile : StorageProfile or None
+        The SQLite tuning applied to every connection when it is opened.
+    write_lock : asyncio.Lock
+        The lock serialising transactions on the writer connection.
+
+    Methods
+    -------
+    open()
+        Opens the writer and reader connections.
+    close()
+        Closes all connections held by the pool.
+    reader() -> AsyncIterator[aiosqlite.Connection]
+        Borrows a reader connection for the duration of the context.
+    health_check() -> bool
+        Checks that the writer and a reader connection can execute queries.
+    """
+
+    def __init__(self, db_path: str, size: int = 5, storage_profile: StorageProfile | None = None):
+        """
+        Parameters
+        ----------
+        db_path : str
+            The path of the SQLite database file.
+        size : int, optional
+            The number of reader connections held by the pool, by default 5.
+        storage_profile : StorageProfile, optional
+            The SQLite tuning applied to every connection when it is opened, by default None, which leaves SQLite's
+            defaults in place.
+        """
+
+        if size < 1:
+            raise ConnectionPoolException(f"Pool size must be at least 1, got {size}.")
+
+        self.db_path = db_path
+        self.size = size
+        self.storage_profile = storage_profile
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle_readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self.write_lock = asyncio.Lock()
+
+    @property
+    def writer(self) -> aiosqlite.Connection:
+        """The connection used for all writes to the database."""
+
+        if self._writer is None:
+            raise ConnectionPoolException("Connection pool is not open.")
+
+        return self._writer
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+
+        if self.storage_profile is not None:
+            await configure_connection(conn, self.storage_profile)
+
+        return conn
+
+    async def _connect_reader(self) -> aiosqlite.Connection:
+        conn = await self._connect()
+        await conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    async def open(self):
+        """Opens the writer and reader connections."""
+
+        self._writer = await self._connect()
+
+        for _ in range(self.size):
+            conn = await self._connect_reader()
+            self._readers.append(conn)
+            self._idle_readers.put_nowait(conn)
+
+        logger.info(f"Opened connection pool for {self.db_path} with {self.size} readers.")
+
+    async def close(self):
+        """Closes all connections held by the pool."""
+
+        for conn in self._readers:
+            await conn.close()
+
+        if self._writer is not None:
+            await self._writer.close()
+
+        self._readers = []
+        self._idle_readers = asyncio.Queue()
+        self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrows a reader connection for the duration of the context.
+
+        If all reader connections are in use, waits until one is returned to the pool. The wait is recorded in the
+        `db_connection_wait_seconds` metric.
+
+        Yields
+        ------
+        aiosqlite.Connection
+            A read-only connection to the database.
+        """
+
+        if self._writer is None:
+            raise ConnectionPoolException("Connection pool is not open.")
+
+        wait_started = time.perf_counter()
+        conn = await self._idle_readers.get()
+        DB_CONNECTION_WAIT_SECONDS.observe(time.perf_counter() - wait_started)
+
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+
+    async def health_check(self) -> bool:
+        """
+        Checks that the writer and a reader connection can execute queries.
+
+        Returns
+        -------
+        bool
+            True if both connections are usable, otherwise False.
+        """
+
+        try:
+            await self.writer.execute("SELECT 1;")
+
+            async with self.reader() as conn:
+                await conn.execute("SELECT 1;")
+
+            return True
+        except (aiosqlite.Error, ConnectionPoolException, ValueError) as e:
+            logger.error(f"Database health check failed - {e}")
+            return False
@@ -1,19 +1,110 @@
+import asyncio
+from typing import Literal, TYPE_CHECKING
+
 import aiosqlite
 from loguru import logger
-        
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from analysis_api.services.storage.write_behind import WriteBehindWriter
+
+PROFILE_EMOTIONS = (
+    "joy",
+    "sadness",
+    "anger",
+    "fear",
+    "love",
+    "hope",
+    "nostalgia",
+    "loneliness",
+    "confidence",
+    "despair",
+    "excitement",
+    "mystery",
+    "defiance",
+    "gratitude",
+    "spirituality"
+)
+"""The emotion columns of the Profile table, in column order."""
+
+SQLITE_MAX_VARIABLES = 500
+"""The maximum number of bound parameters used in a single query, kept below SQLite's compile-time limit."""
+
+
+class StorageProfile(BaseModel):
+    """
+    SQLite tuning applied to the database and to every connection.
 
-async def initialise_db(db: aiosqlite.Connection):
+    Attributes
+    ----------
+    journal_mode : str
+        The journal mode of the database. WAL lets readers proceed concurrently with a writer and avoids rewriting the
+        whole rollback journal on every commit. The journal mode is persisted in the database file.
+    synchronous : str
+        How often SQLite syncs to disk. NORMAL is durable against application crashes in WAL mode and only syncs at
+        checkpoints rather than on every commit.
+    mmap_size : int
+        The maximum number of bytes of the database file read through memory-mapped I/O.
+    cache_size : int
+        The page cache size of each connection. Negative values are in KiB, positive values in pages.
+    busy_timeout_ms : int
+        How long a connection waits for a lock before failing with "database is locked", in milliseconds.
+    """
+
+    journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -64_000
+    busy_timeout_ms: int = 5000
+
+
+async def configure_connection(db: aiosqlite.Connection, storage_profile: StorageProfile):
+    """
+    Applies the per-connection settings of a storage profile to a connection.
+
+    Parameters
+    ----------
+    db : aiosqlite.Connection
+        The SQLite database connection.
+    storage_profile : StorageProfile
+        The storage profile to apply.
+
+    Raises
+    ------
+    aiosqlite.Error
+        If an error occurs while applying the settings.
+    """
+
+    await db.executescript(f"""
+        PRAGMA synchronous = {storage_profile.synchronous};
+        PRAGMA mmap_size = {int(storage_profile.mmap_size)};
+        PRAGMA cache_size = {int(storage_profile.cache_size)};
+        PRAGMA busy_timeout = {int(storage_profile.busy_timeout_ms)};
+    """)
+
+
+async def initialise_db(db: aiosqlite.Connection, storage_profile: StorageProfile | None = None):
     """
     Creates the required database tables if they do not exist.
 
-    This function initializes the database by creating two tables:
-    - `Profile`: Stores emotional attributes for a track.
-    - `Tags`: Stores tags associated with a track.
+    This function initializes the database by creating four tables:
+    - `Profile`: Stores emotional attributes for a set of lyrics, keyed by the lyrics hash.
+    - `Tags`: Stores tags associated with a set of lyrics, keyed by the lyrics hash and emotion.
+    - `Track`: Maps each track to the hash of its lyrics, so tracks with identical lyrics share one analysis.
+    - `ModelUsage`: Stores the number of model calls and tokens used each day, by endpoint and emotion.
+
+    Databases created before results were keyed by lyrics hash have their `Profile` and `Tags` tables renamed to
+    `Profile_v1` and `Tags_v1`, as their rows cannot be re-keyed without the lyrics.
+
+    If a storage profile is given, its journal mode is set on the database and its per-connection settings are applied
+    to `db` first.
 
     Parameters
     ----------
     db : aiosqlite.Connection
         The SQLite database connection.
+    storage_profile : StorageProfile, optional
+        The storage profile to apply, by default None, which leaves SQLite's defaults in place.
 
     Raises
     ------
@@ -21,9 +112,23 @@ async def initialise_db(db: aiosqlite.Connection):
         If an error occurs while creating the table.
     """
 
+    if storage_profile is not None:
+        await db.execute(f"PRAGMA journal_mode = {storage_profile.journal_mode};")
+        await configure_connection(db, storage_profile)
+
+    async with db.execute("PRAGMA table_info(Profile);") as cursor:
+        profile_column_names = {col[1] for col in await cursor.fetchall()}
+
+    if "track_id" in profile_column_names:
+        logger.warning("Renaming Profile and Tags tables keyed by track_id to Profile_v1 and Tags_v1.")
+        await db.executescript("""
+            ALTER TABLE Profile RENAME TO Profile_v1;
+            ALTER TABLE Tags RENAME TO Tags_v1;
+        """)
+
     await db.executescript("""
         CREATE TABLE IF NOT EXISTS Profile (
-            track_id TEXT PRIMARY KEY,
+            lyrics_hash TEXT PRIMARY KEY,
             joy REAL, 
             sadness REAL, 
             anger REAL, 
@@ -42,10 +147,26 @@ async def initialise_db(db: aiosqlite.Connection):
         );
 
         CREATE TABLE IF NOT EXISTS Tags (
-            track_id TEXT,
+            lyrics_hash TEXT,
             emotion TEXT,
             tags TEXT,
-            PRIMARY KEY (track_id, emotion)
+            PRIMARY KEY (lyrics_hash, emotion)
+        );
+
+        CREATE TABLE IF NOT EXISTS Track (
+            track_id TEXT PRIMARY KEY,
+            lyrics_hash TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS ModelUsage (
+            day TEXT,
+            endpoint TEXT,
+            emotion TEXT,
+            calls INTEGER NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            output_tokens INTEGER NOT NULL,
+            total_tokens INTEGER NOT NULL,
+            PRIMARY KEY (day, endpoint, emotion)
         );
     """)
 
@@ -67,57 +188,111 @@ class StorageService:
     """
     Provides methods to store and retrieve track-related data from an SQLite database.
 
-    This service manages two types of data:
-    - `Profile`: Stores various emotional attributes associated with a track.
-    - `Tags`: Stores descriptive tags for a track.
+    This service manages four types of data:
+    - `Profile`: Stores various emotional attributes associated with a set of lyrics.
+    - `Tags`: Stores descriptive tags for a set of lyrics.
+    - `Track`: Stores the hash of the lyrics of a track.
+    - `ModelUsage`: Stores the number of model calls and tokens used each day.
+
+    Profiles and tags are keyed by the hash of the normalised lyrics rather than by track ID, so tracks that share
+    lyrics (remasters, regional releases, compilations) share a single analysis.
 
     Attributes
     ----------
     db : aiosqlite.Connection
         The SQLite database connection used for executing queries.
+    write_db : aiosqlite.Connection
+        The SQLite database connection used for executing inserts. Defaults to `db`.
+    write_lock : asyncio.Lock
+        The lock held for the whole of each transaction on `write_db`, so that transactions from other services that
+        share the connection cannot commit or roll back each other's statements.
+    write_behind : WriteBehindWriter or None
+        If set, inserts are queued to be written in the background instead of being written immediately.
 
     Methods
     -------
-    store_profile(track_id: str, profile: dict)
-        Stores a track's emotional profile in the database.
-    retrieve_profile(track_id: str) -> dict | None
-        Retrieves a track's emotional profile from the database.
-    store_tags(track_id: str, tags: str)
-        Stores tags associated with a track in the database.
-    retrieve_tags(track_id: str) -> str | None
-        Retrieves tags associated with a track from the database.
+    store_profile(lyrics_hash: str, profile: dict)
+        Stores the emotional profile of a set of lyrics in the database.
+    retrieve_profile(lyrics_hash: str) -> dict | None
+        Retrieves the emotional profile of a set of lyrics from the database.
+    retrieve_profiles(lyrics_hashes: list[str]) -> dict[str, dict]
+        Retrieves the emotional profiles of several sets of lyrics from the database.
+    store_tags(lyrics_hash: str, emotion: str, tags: str)
+        Stores tags associated with a set of lyrics in the database.
+    retrieve_tags(lyrics_hash: str, emotion: str) -> str | None
+        Retrieves tags associated with a set of lyrics from the database.
+    retrieve_tags_for_emotions(lyrics_hash: str, emotions: list[str]) -> dict[str, str]
+        Retrieves tags associated with a set of lyrics for several emotions from the database.
+    store_track(track_id: str, lyrics_hash: str)
+        Stores the hash of a track's lyrics in the database.
+    retrieve_track_lyrics_hash(track_id: str) -> str | None
+        Retrieves the hash of a track's lyrics from the database.
+    store_tracks(tracks: dict[str, str])
+        Stores the hashes of several tracks' lyrics in the database.
+    retrieve_tracks_lyrics_hashes(track_ids: list[str]) -> dict[str, str]
+        Retrieves the hashes of several tracks' lyrics from the database.
+    store_bulk(profiles: dict[str, dict[str, float]], tags: dict[tuple[str, str], str], tracks: dict[str, str])
+        Stores several profiles, tags and tracks in the database in a single transaction.
+    store_model_usage(usage: dict[tuple[str, str, str], tuple[int, int, int, int]])
+        Adds the number of model calls and tokens used to the totals stored in the database.
+    retrieve_model_usage(day: str) -> dict[tuple[str, str], tuple[int, int, int, int]]
+        Retrieves the number of model calls and tokens used on a day from the database.
     """
 
-    def __init__(self, db: aiosqlite.Connection):
+    def __init__(
+            self,
+            db: aiosqlite.Connection,
+            write_db: aiosqlite.Connection | None = None,
+            write_behind: "WriteBehindWriter | None" = None,
+            write_lock: asyncio.Lock | None = None
+    ):
         """
         Attributes
         ----------
         db : aiosqlite.Connection
             The SQLite database connection.
+        write_db : aiosqlite.Connection, optional
+            A separate SQLite database connection to use for inserts, for example the writer connection of a
+            ConnectionPool. If not provided, `db` is used for both reads and writes.
+        write_behind : WriteBehindWriter, optional
+            A background writer to queue inserts on. If provided, `store_profile` and `store_tags` return as soon as
+            the data is queued, and retrievals also consult the data waiting to be written.
+        write_lock : asyncio.Lock, optional
+            The lock serialising transactions on `write_db`, for example the write lock of a ConnectionPool. It must
+            be shared by every service writing through the same connection. If not provided, a new lock is created,
+            which only serialises the transactions of this service.
         """
 
         self.db = db
+        self.write_db = write_db if write_db is not None else db
+        self.write_behind = write_behind
+        self.write_lock = write_lock if write_lock is not None else asyncio.Lock()
 
-    async def store_profile(self, track_id: str, profile: dict[str, float]):
+    async def store_profile(self, lyrics_hash: str, profile: dict[str, float]):
         """
-        Stores a track's emotional profile in the database.
+        Stores the emotional profile of a set of lyrics in the database.
 
         Parameters
         ----------
-        track_id : str
-            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
         profile : dict
             A dictionary containing emotional attributes as keys and their values as floats.
 
         Raises
         ------
         StorageServiceException
-            If the track ID already exists or if a database error occurs.
+            If the lyrics hash already exists or if a database error occurs. Not raised if the profile is queued on a
+            background writer, which ignores profiles that already exist.
         """
 
+        if self.write_behind is not None:
+            await self.write_behind.enqueue_profile(lyrics_hash=lyrics_hash, profile=profile)
+            return
+
         insert_statement = f"""
             INSERT INTO Profile (
-                track_id, 
+                lyrics_hash, 
                 joy, 
                 sadness, 
                 anger, 
@@ -137,31 +312,32 @@ class StorageService:
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
         """
 
-        data_to_insert = (track_id, *profile.values())
+        data_to_insert = (lyrics_hash, *profile.values())
 
-        try:
-            await self.db.execute(insert_statement, data_to_insert)
-            await self.db.commit()
-        except aiosqlite.IntegrityError:
-            raise StorageServiceException(f"Track ID '{track_id}' already exists.")
-        except aiosqlite.OperationalError as e:
-            raise StorageServiceException(f"Database operation failed - {e}")
-        except aiosqlite.DatabaseError as e:
-            raise StorageServiceException(f"Unexpected database error - {e}")
+        async with self.write_lock:
+            try:
+                await self.write_db.execute(insert_statement, data_to_insert)
+                await self.write_db.commit()
+            except aiosqlite.IntegrityError:
+                raise StorageServiceException(f"Lyrics hash '{lyrics_hash}' already exists.")
+            except aiosqlite.OperationalError as e:
+                raise StorageServiceException(f"Database operation failed - {e}")
+            except aiosqlite.DatabaseError as e:
+                raise StorageServiceException(f"Unexpected database error - {e}")
 
-    async def retrieve_profile(self, track_id: str) -> dict | None:
+    async def retrieve_profile(self, lyrics_hash: str) -> dict | None:
         """
-        Retrieves a track's emotional profile from the database.
+        Retrieves the emotional profile of a set of lyrics from the database.
 
         Parameters
         ----------
-        track_id : str
-            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
 
         Returns
         -------
         dict or None
-            A dictionary containing the track's emotional attributes if found, otherwise None.
+            A dictionary containing the emotional attributes of the lyrics if found, otherwise None.
 
         Raises
         ------
@@ -169,13 +345,19 @@ class StorageService:
             If a database error occurs.
         """
 
+        if self.write_behind is not None:
+            pending_profile = self.write_behind.pending_profile(lyrics_hash)
+
+            if pending_profile is not None:
+                return pending_profile
+
         select_query = f"""
             SELECT * FROM Profile 
-            WHERE track_id = ?;
+            WHERE lyrics_hash = ?;
         """
 
         try:
-            cursor = await self.db.execute(select_query, (track_id,))
+            cursor = await self.db.execute(select_query, (lyrics_hash,))
             row = await cursor.fetchone()
 
             if row is None:
@@ -191,14 +373,74 @@ class StorageService:
         except aiosqlite.DatabaseError as e:
             raise StorageServiceException(f"Unexpected database error - {e}")
 
-    async def store_tags(self, track_id: str, emotion: str, tags: str):
+    async def retrieve_profiles(self, lyrics_hashes: list[str]) -> dict[str, dict]:
         """
-        Stores tags associated with a track in the database.
+        Retrieves the emotional profiles of several sets of lyrics from the database.
+
+        The profiles are fetched with `WHERE lyrics_hash IN (...)` queries, batched to stay within SQLite's limit on
+        bound parameters, rather than one query per set of lyrics.
 
         Parameters
         ----------
-        track_id : str
-            The unique identifier for the track.
+        lyrics_hashes : list of str
+            The hashes of the tracks' normalised lyrics.
+
+        Returns
+        -------
+        dict[str, dict]
+            A dictionary mapping each found lyrics hash to its emotional attributes. Lyrics hashes that are not found
+            are omitted.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        unique_lyrics_hashes = list(dict.fromkeys(lyrics_hashes))
+        profiles = {}
+
+        if self.write_behind is not None:
+            for lyrics_hash in unique_lyrics_hashes:
+                pending_profile = self.write_behind.pending_profile(lyrics_hash)
+
+                if pending_profile is not None:
+                    profiles[lyrics_hash] = pending_profile
+
+            unique_lyrics_hashes = [
+                lyrics_hash for lyrics_hash in unique_lyrics_hashes if lyrics_hash not in profiles
+            ]
+
+        try:
+            for i in range(0, len(unique_lyrics_hashes), SQLITE_MAX_VARIABLES):
+                batch = unique_lyrics_hashes[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" for _ in batch)
+                select_query = f"""
+                    SELECT * FROM Profile 
+                    WHERE lyrics_hash IN ({placeholders});
+                """
+
+                cursor = await self.db.execute(select_query, batch)
+                rows = await cursor.fetchall()
+                emotion_names = [description[0] for description in cursor.description][1:]
+
+                for lyrics_hash, *emotions in rows:
+                    profiles[lyrics_hash] = dict(zip(emotion_names, emotions))
+
+            return profiles
+        except aiosqlite.OperationalError as e:
+            raise StorageServiceException(f"Database operation failed - {e}")
+        except aiosqlite.DatabaseError as e:
+            raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def store_tags(self, lyrics_hash: str, emotion: str, tags: str):
+        """
+        Stores tags associated with a set of lyrics in the database.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
         emotion : str
             The emotion the tags represent.
         tags : str
@@ -210,34 +452,42 @@ class StorageService:
         Raises
         ------
         StorageServiceException
-            If the track ID already exists or if a database error occurs.
+            If the lyrics hash and emotion already exist or if a database error occurs. Not raised if the tags are
+            queued on a background writer, which ignores tags that already exist.
         """
 
+        if self.write_behind is not None:
+            await self.write_behind.enqueue_tags(lyrics_hash=lyrics_hash, emotion=emotion, tags=tags)
+            return
+
         insert_statement = f"""
-            INSERT INTO Tags (track_id, emotion, tags)
+            INSERT INTO Tags (lyrics_hash, emotion, tags)
             VALUES (?, ?, ?);
         """
 
-        data_to_insert = (track_id, emotion, tags)
-
-        try:
-            await self.db.execute(insert_statement, data_to_insert)
-            await self.db.commit()
-        except aiosqlite.IntegrityError:
-            raise StorageServiceException(f"Entry already exists with track ID '{track_id}' and emotion '{emotion}'.")
-        except aiosqlite.OperationalError as e:
-            raise StorageServiceException(f"Database operation failed - {e}")
-        except aiosqlite.DatabaseError as e:
-            raise StorageServiceException(f"Unexpected database error - {e}")
-
-    async def retrieve_tags(self, track_id: str, emotion: str) -> str | None:
+        data_to_insert = (lyrics_hash, emotion, tags)
+
+        async with self.write_lock:
+            try:
+                await self.write_db.execute(insert_statement, data_to_insert)
+                await self.write_db.commit()
+            except aiosqlite.IntegrityError:
+                raise StorageServiceException(
+                    f"Entry already exists with lyrics hash '{lyrics_hash}' and emotion '{emotion}'."
+                )
+            except aiosqlite.OperationalError as e:
+                raise StorageServiceException(f"Database operation failed - {e}")
+            except aiosqlite.DatabaseError as e:
+                raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def retrieve_tags(self, lyrics_hash: str, emotion: str) -> str | None:
         """
-        Retrieves tags associated with a track from the database.
+        Retrieves tags associated with a set of lyrics from the database.
 
         Parameters
         ----------
-        track_id : str
-            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
         emotion : str
             The emotion to retrieve tags for.
 
@@ -255,14 +505,20 @@ class StorageService:
             If a database error occurs.
         """
 
+        if self.write_behind is not None:
+            pending_tags = self.write_behind.pending_tags(lyrics_hash=lyrics_hash, emotion=emotion)
+
+            if pending_tags is not None:
+                return pending_tags
+
         select_query = f"""
             SELECT * FROM Tags 
-            WHERE track_id = ?
+            WHERE lyrics_hash = ?
             AND emotion = ?;
         """
 
         try:
-            cursor = await self.db.execute(select_query, (track_id, emotion))
+            cursor = await self.db.execute(select_query, (lyrics_hash, emotion))
             row = await cursor.fetchone()
             print(f"{row = }")
             tags = row[-1] if row else None
@@ -272,3 +528,367 @@ class StorageService:
             raise StorageServiceException(f"Database operation failed - {e}")
         except aiosqlite.DatabaseError as e:
             raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def retrieve_tags_for_emotions(self, lyrics_hash: str, emotions: list[str]) -> dict[str, str]:
+        """
+        Retrieves tags associated with a set of lyrics for several emotions from the database.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+        emotions : list of str
+            The emotions to retrieve tags for.
+
+        Returns
+        -------
+        dict[str, str]
+            A dictionary mapping each found emotion to the emotional tags for the track. Emotions without stored tags
+            are omitted.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        unique_emotions = list(dict.fromkeys(emotions))
+        tags_by_emotion = {}
+
+        if self.write_behind is not None:
+            for emotion in unique_emotions:
+                pending_tags = self.write_behind.pending_tags(lyrics_hash=lyrics_hash, emotion=emotion)
+
+                if pending_tags is not None:
+                    tags_by_emotion[emotion] = pending_tags
+
+            unique_emotions = [emotion for emotion in unique_emotions if emotion not in tags_by_emotion]
+
+            if not unique_emotions:
+                return tags_by_emotion
+
+        placeholders = ", ".join("?" for _ in unique_emotions)
+        select_query = f"""
+            SELECT emotion, tags FROM Tags 
+            WHERE lyrics_hash = ?
+            AND emotion IN ({placeholders});
+        """
+
+        try:
+            cursor = await self.db.execute(select_query, (lyrics_hash, *unique_emotions))
+            rows = await cursor.fetchall()
+            tags_by_emotion.update(rows)
+
+            return tags_by_emotion
+        except aiosqlite.OperationalError as e:
+            raise StorageServiceException(f"Database operation failed - {e}")
+        except aiosqlite.DatabaseError as e:
+            raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def store_track(self, track_id: str, lyrics_hash: str):
+        """
+        Stores the hash of a track's lyrics in the database.
+
+        If the track is already stored, its lyrics hash is replaced, since a track's lyrics may be corrected after it
+        was first analysed.
+
+        Parameters
+        ----------
+        track_id : str
+            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        if self.write_behind is not None:
+            await self.write_behind.enqueue_track(track_id=track_id, lyrics_hash=lyrics_hash)
+            return
+
+        insert_statement = """
+            INSERT OR REPLACE INTO Track (track_id, lyrics_hash)
+            VALUES (?, ?);
+        """
+
+        async with self.write_lock:
+            try:
+                await self.write_db.execute(insert_statement, (track_id, lyrics_hash))
+                await self.write_db.commit()
+            except aiosqlite.OperationalError as e:
+                raise StorageServiceException(f"Database operation failed - {e}")
+            except aiosqlite.DatabaseError as e:
+                raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def retrieve_track_lyrics_hash(self, track_id: str) -> str | None:
+        """
+        Retrieves the hash of a track's lyrics from the database.
+
+        Parameters
+        ----------
+        track_id : str
+            The unique identifier for the track.
+
+        Returns
+        -------
+        str or None
+            The hash of the track's normalised lyrics if found, otherwise None.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        if self.write_behind is not None:
+            pending_lyrics_hash = self.write_behind.pending_track(track_id=track_id)
+
+            if pending_lyrics_hash is not None:
+                return pending_lyrics_hash
+
+        select_query = """
+            SELECT lyrics_hash FROM Track 
+            WHERE track_id = ?;
+        """
+
+        try:
+            cursor = await self.db.execute(select_query, (track_id,))
+            row = await cursor.fetchone()
+
+            return row[0] if row else None
+        except aiosqlite.OperationalError as e:
+            raise StorageServiceException(f"Database operation failed - {e}")
+        except aiosqlite.DatabaseError as e:
+            raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def store_tracks(self, tracks: dict[str, str]):
+        """
+        Stores the hashes of several tracks' lyrics in the database.
+
+        The tracks are written in a single transaction, or queued together if inserts are written in the background.
+        Tracks that are already stored have their lyrics hash replaced.
+
+        Parameters
+        ----------
+        tracks : dict[str, str]
+            A dictionary mapping track IDs to the hashes of their lyrics.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs, in which case no track is stored.
+        """
+
+        if self.write_behind is not None:
+            for track_id, lyrics_hash in tracks.items():
+                await self.write_behind.enqueue_track(track_id=track_id, lyrics_hash=lyrics_hash)
+
+            return
+
+        if tracks:
+            await self.store_bulk(tracks=tracks)
+
+    async def retrieve_tracks_lyrics_hashes(self, track_ids: list[str]) -> dict[str, str]:
+        """
+        Retrieves the hashes of several tracks' lyrics from the database.
+
+        The lyrics hashes are fetched with `WHERE track_id IN (...)` queries, batched to stay within SQLite's limit on
+        bound parameters, rather than one query per track.
+
+        Parameters
+        ----------
+        track_ids : list of str
+            The unique identifiers for the tracks.
+
+        Returns
+        -------
+        dict[str, str]
+            A dictionary mapping each found track ID to the hash of its lyrics. Track IDs that are not found are
+            omitted.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        unique_track_ids = list(dict.fromkeys(track_ids))
+        lyrics_hashes = {}
+
+        if self.write_behind is not None:
+            for track_id in unique_track_ids:
+                pending_lyrics_hash = self.write_behind.pending_track(track_id=track_id)
+
+                if pending_lyrics_hash is not None:
+                    lyrics_hashes[track_id] = pending_lyrics_hash
+
+            unique_track_ids = [track_id for track_id in unique_track_ids if track_id not in lyrics_hashes]
+
+        try:
+            for i in range(0, len(unique_track_ids), SQLITE_MAX_VARIABLES):
+                batch = unique_track_ids[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" for _ in batch)
+                select_query = f"""
+                    SELECT track_id, lyrics_hash FROM Track 
+                    WHERE track_id IN ({placeholders});
+                """
+
+                cursor = await self.db.execute(select_query, batch)
+
+                for track_id, lyrics_hash in await cursor.fetchall():
+                    lyrics_hashes[track_id] = lyrics_hash
+
+            return lyrics_hashes
+        except aiosqlite.OperationalError as e:
+            raise StorageServiceException(f"Database operation failed - {e}")
+        except aiosqlite.DatabaseError as e:
+            raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def store_bulk(
+            self,
+            profiles: dict[str, dict[str, float]] | None = None,
+            tags: dict[tuple[str, str], str] | None = None,
+            tracks: dict[str, str] | None = None
+    ):
+        """
+        Stores several profiles, tags and tracks in the database in a single transaction.
+
+        Profiles and tags that already exist are left unchanged rather than raising an error, since results for the
+        same lyrics are interchangeable. Tracks that already exist have their lyrics hash replaced.
+
+        Parameters
+        ----------
+        profiles : dict[str, dict[str, float]], optional
+            A dictionary mapping lyrics hashes to their emotional profiles.
+        tags : dict[tuple[str, str], str], optional
+            A dictionary mapping (lyrics hash, emotion) pairs to their emotional tags.
+        tracks : dict[str, str], optional
+            A dictionary mapping track IDs to the hashes of their lyrics.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs, in which case nothing is stored.
+        """
+
+        profile_columns = ", ".join(("lyrics_hash", *PROFILE_EMOTIONS))
+        profile_placeholders = ", ".join("?" for _ in range(len(PROFILE_EMOTIONS) + 1))
+        profile_insert_statement = f"""
+            INSERT OR IGNORE INTO Profile ({profile_columns})
+            VALUES ({profile_placeholders});
+        """
+        tags_insert_statement = """
+            INSERT OR IGNORE INTO Tags (lyrics_hash, emotion, tags)
+            VALUES (?, ?, ?);
+        """
+
+        track_insert_statement = """
+            INSERT OR REPLACE INTO Track (track_id, lyrics_hash)
+            VALUES (?, ?);
+        """
+
+        profile_rows = [
+            (lyrics_hash, *(profile.get(emotion) for emotion in PROFILE_EMOTIONS))
+            for lyrics_hash, profile in (profiles or {}).items()
+        ]
+        tags_rows = [(lyrics_hash, emotion, value) for (lyrics_hash, emotion), value in (tags or {}).items()]
+        track_rows = list((tracks or {}).items())
+
+        async with self.write_lock:
+            try:
+                if profile_rows:
+                    await self.write_db.executemany(profile_insert_statement, profile_rows)
+
+                if tags_rows:
+                    await self.write_db.executemany(tags_insert_statement, tags_rows)
+
+                if track_rows:
+                    await self.write_db.executemany(track_insert_statement, track_rows)
+
+                await self.write_db.commit()
+            except aiosqlite.OperationalError as e:
+                await self.write_db.rollback()
+                raise StorageServiceException(f"Database operation failed - {e}")
+            except aiosqlite.DatabaseError as e:
+                await self.write_db.rollback()
+                raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def store_model_usage(self, usage: dict[tuple[str, str, str], tuple[int, int, int, int]]):
+        """
+        Adds the number of model calls and tokens used to the totals stored in the database.
+
+        Usage is always written immediately on the writer connection, even if a background writer is set.
+
+        Parameters
+        ----------
+        usage : dict[tuple[str, str, str], tuple[int, int, int, int]]
+            A dictionary mapping (day, endpoint, emotion) keys to the number of calls, prompt tokens, output tokens and
+            total tokens to add. Days are ISO dates in UTC.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs, in which case nothing is stored.
+        """
+
+        upsert_statement = """
+            INSERT INTO ModelUsage (day, endpoint, emotion, calls, prompt_tokens, output_tokens, total_tokens)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, endpoint, emotion) DO UPDATE SET
+                calls = calls + excluded.calls,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                output_tokens = output_tokens + excluded.output_tokens,
+                total_tokens = total_tokens + excluded.total_tokens;
+        """
+
+        rows = [(*key, *totals) for key, totals in usage.items()]
+
+        async with self.write_lock:
+            try:
+                await self.write_db.executemany(upsert_statement, rows)
+                await self.write_db.commit()
+            except aiosqlite.OperationalError as e:
+                await self.write_db.rollback()
+                raise StorageServiceException(f"Database operation failed - {e}")
+            except aiosqlite.DatabaseError as e:
+                await self.write_db.rollback()
+                raise StorageServiceException(f"Unexpected database error - {e}")
+
+    async def retrieve_model_usage(self, day: str) -> dict[tuple[str, str], tuple[int, int, int, int]]:
+        """
+        Retrieves the number of model calls and tokens used on a day from the database.
+
+        Parameters
+        ----------
+        day : str
+            The day as an ISO date in UTC.
+
+        Returns
+        -------
+        dict[tuple[str, str], tuple[int, int, int, int]]
+            A dictionary mapping (endpoint, emotion) keys to the number of calls, prompt tokens, output tokens and total
+            tokens used on the day.
+
+        Raises
+        ------
+        StorageServiceException
+            If a database error occurs.
+        """
+
+        select_query = """
+            SELECT endpoint, emotion, calls, prompt_tokens, output_tokens, total_tokens FROM ModelUsage
+            WHERE day = ?;
+        """
+
+        try:
+            cursor = await self.db.execute(select_query, (day,))
+            rows = await cursor.fetchall()
+
+            return {(endpoint, emotion): tuple(totals) for endpoint, emotion, *totals in rows}
+        except aiosqlite.OperationalError as e:
+            raise StorageServiceException(f"Database operation failed - {e}")
+        except aiosqlite.DatabaseError as e:
+            raise StorageServiceException(f"Unexpected database error - {e}")
@@ -0,0 +1,268 @@
+import asyncio
+
+from loguru import logger
+
+from analysis_api.services.storage.storage_service import StorageService, StorageServiceException
+
+_STOP = object()
+_TIMED_OUT = object()
+
+
+class WriteBehindWriter:
+    """
+    Writes profiles, tags and tracks to the database in the background, in batches.
+
+    Results are queued by request handlers, which return as soon as the result is queued, and a single background task
+    writes them in one transaction per batch. A batch is flushed when it reaches `max_batch_size` items or when
+    `flush_interval_seconds` has elapsed since its first item was queued, whichever comes first.
+
+    Results that are queued but not yet written can be looked up, so a request arriving between queueing and the
+    commit still finds them.
+
+    Attributes
+    ----------
+    storage_service : StorageService
+        The storage service, on the writer connection, used to write each batch.
+    max_batch_size : int
+        The maximum number of results written in a single transaction.
+    flush_interval_seconds : float
+        The maximum time a queued result waits before its batch is written.
+
+    Methods
+    -------
+    start()
+        Starts the background writer task.
+    stop()
+        Writes all queued results and stops the background writer task.
+    enqueue_profile(lyrics_hash: str, profile: dict[str, float])
+        Queues the emotional profile of a set of lyrics to be written.
+    enqueue_tags(lyrics_hash: str, emotion: str, tags: str)
+        Queues tags associated with a set of lyrics to be written.
+    enqueue_track(track_id: str, lyrics_hash: str)
+        Queues the hash of a track's lyrics to be written.
+    pending_profile(lyrics_hash: str) -> dict | None
+        Retrieves a queued emotional profile that has not been written yet.
+    pending_tags(lyrics_hash: str, emotion: str) -> str | None
+        Retrieves queued tags that have not been written yet.
+    pending_track(track_id: str) -> str | None
+        Retrieves a queued lyrics hash that has not been written yet.
+    """
+
+    def __init__(
+            self,
+            storage_service: StorageService,
+            max_batch_size: int = 100,
+            flush_interval_seconds: float = 0.05,
+            max_queue_size: int = 10_000
+    ):
+        """
+        Parameters
+        ----------
+        storage_service : StorageService
+            The storage service, on the writer connection, used to write each batch.
+        max_batch_size : int, optional
+            The maximum number of results written in a single transaction, by default 100.
+        flush_interval_seconds : float, optional
+            The maximum time a queued result waits before its batch is written, by default 0.05.
+        max_queue_size : int, optional
+            The maximum number of queued results, by default 10,000. Once reached, queueing waits for the writer to
+            catch up.
+        """
+
+        self.storage_service = storage_service
+        self.max_batch_size = max_batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._pending_profiles: dict[str, dict[str, float]] = {}
+        self._pending_tags: dict[tuple[str, str], str] = {}
+        self._pending_tracks: dict[str, str] = {}
+        self._getter: asyncio.Future | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def queue_size(self) -> int:
+        """The number of results waiting to be picked up by the background writer task."""
+
+        return self._queue.qsize()
+
+    async def start(self):
+        """Starts the background writer task."""
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Writes all queued results and stops the background writer task."""
+
+        if self._task is None:
+            return
+
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue_profile(self, lyrics_hash: str, profile: dict[str, float]):
+        """
+        Queues the emotional profile of a set of lyrics to be written.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+        profile : dict
+            A dictionary containing emotional attributes as keys and their values as floats.
+        """
+
+        self._pending_profiles[lyrics_hash] = profile
+        await self._queue.put(("profile", lyrics_hash, profile))
+
+    async def enqueue_tags(self, lyrics_hash: str, emotion: str, tags: str):
+        """
+        Queues tags associated with a set of lyrics to be written.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+        emotion : str
+            The emotion the tags represent.
+        tags : str
+            The emotional tags for the track.
+        """
+
+        self._pending_tags[(lyrics_hash, emotion)] = tags
+        await self._queue.put(("tags", (lyrics_hash, emotion), tags))
+
+    async def enqueue_track(self, track_id: str, lyrics_hash: str):
+        """
+        Queues the hash of a track's lyrics to be written.
+
+        Parameters
+        ----------
+        track_id : str
+            The unique identifier for the track.
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+        """
+
+        self._pending_tracks[track_id] = lyrics_hash
+        await self._queue.put(("track", track_id, lyrics_hash))
+
+    def pending_profile(self, lyrics_hash: str) -> dict | None:
+        """
+        Retrieves a queued emotional profile that has not been written yet.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+
+        Returns
+        -------
+        dict or None
+            The queued emotional profile, or None if no profile is waiting to be written for the lyrics.
+        """
+
+        profile = self._pending_profiles.get(lyrics_hash)
+
+        return dict(profile) if profile is not None else None
+
+    def pending_tags(self, lyrics_hash: str, emotion: str) -> str | None:
+        """
+        Retrieves queued tags that have not been written yet.
+
+        Parameters
+        ----------
+        lyrics_hash : str
+            The hash of the track's normalised lyrics, as returned by `hash_lyrics`.
+        emotion : str
+            The emotion the tags represent.
+
+        Returns
+        -------
+        str or None
+            The queued tags, or None if no tags are waiting to be written for the lyrics and emotion.
+        """
+
+        return self._pending_tags.get((lyrics_hash, emotion))
+
+    def pending_track(self, track_id: str) -> str | None:
+        """
+        Retrieves a queued lyrics hash that has not been written yet.
+
+        Parameters
+        ----------
+        track_id : str
+            The unique identifier for the track.
+
+        Returns
+        -------
+        str or None
+            The queued lyrics hash, or None if no lyrics hash is waiting to be written for the track.
+        """
+
+        return self._pending_tracks.get(track_id)
+
+    async def _get(self, timeout: float | None = None):
+        # the getter is kept across timeouts rather than cancelled, so that an item is never lost to a cancellation
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self._queue.get())
+
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+
+        if not done:
+            return _TIMED_OUT
+
+        item = self._getter.result()
+        self._getter = None
+
+        return item
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._get()
+
+            if item is _STOP:
+                break
+
+            batch = [item]
+            flush_at = loop.time() + self.flush_interval_seconds
+
+            while len(batch) < self.max_batch_size:
+                item = await self._get(timeout=max(flush_at - loop.time(), 0))
+
+                if item is _TIMED_OUT:
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            await self._write(batch)
+
+    async def _write(self, batch: list[tuple]):
+        profiles = {key: value for kind, key, value in batch if kind == "profile"}
+        tags = {key: value for kind, key, value in batch if kind == "tags"}
+        tracks = {key: value for kind, key, value in batch if kind == "track"}
+
+        try:
+            await self.storage_service.store_bulk(profiles=profiles, tags=tags, tracks=tracks)
+        except StorageServiceException as e:
+            logger.error(f"Failed to write {len(batch)} queued results - {e}")
+        finally:
+            for lyrics_hash, profile in profiles.items():
+                if self._pending_profiles.get(lyrics_hash) is profile:
+                    del self._pending_profiles[lyrics_hash]
+
+            for key, value in tags.items():
+                if self._pending_tags.get(key) is value:
+                    del self._pending_tags[key]
+
+            for track_id, lyrics_hash in tracks.items():
+                if self._pending_tracks.get(track_id) is lyrics_hash:
+                    del self._pending_tracks[track_id]
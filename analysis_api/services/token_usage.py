@@ -0,0 +1,317 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from google.genai import types
+from loguru import logger
+
+from analysis_api.metrics import MODEL_TOKENS, MODEL_PROMPT_TOKENS, MODEL_TOKENS_USED_TODAY, \
+    MODEL_TOKEN_BUDGET_REJECTIONS, MODEL_TOKEN_BUDGET_WAITING
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.storage.storage_service import StorageService, StorageServiceException
+
+
+@dataclass(frozen=True)
+class UsageKey:
+    """
+    What the tokens used by a model call are accounted to.
+
+    A call that tags several emotions at once has its tokens split evenly across them, and counts as a call for each of
+    them, so the token totals per emotion add up to the tokens used.
+
+    Attributes
+    ----------
+    endpoint : str
+        The kind of request the call was made for, such as profile, tags, multi_tags or batch_profile.
+    emotion : str
+        The emotion the call tagged, or an empty string if it tagged none.
+    emotions : tuple of str
+        The emotions the call tagged, if it tagged several. If set, `emotion` is ignored.
+    """
+
+    endpoint: str
+    emotion: str = ""
+    emotions: tuple[str, ...] = ()
+
+
+@dataclass
+class TokenUsage:
+    """
+    The number of model calls and the tokens they used.
+
+    Attributes
+    ----------
+    calls : int
+        The number of calls.
+    prompt_tokens : int
+        The number of tokens in the prompts.
+    output_tokens : int
+        The number of tokens in the responses.
+    total_tokens : int
+        The total number of tokens billed, which can include tokens not counted in the prompt or response.
+    """
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _split(tokens: int, parts: int) -> list[int]:
+    # the remainder goes to the first parts, so the shares add up to the tokens
+    share, remainder = divmod(tokens, parts)
+    return [share + (i < remainder) for i in range(parts)]
+
+
+class TokenUsageTracker:
+    """
+    Accounts for the tokens used by model calls and guards the daily token budget.
+
+    The token counts of each call are taken from the usage metadata of its response. They are exported as Prometheus
+    metrics and added to daily totals per endpoint and emotion, which are written to the `ModelUsage` table in the
+    background every `flush_interval_seconds`.
+
+    Once the tokens used since midnight UTC reach `daily_token_budget`, non-interactive calls are either rejected or
+    queued until the budget resets at midnight UTC, depending on `on_budget_exhausted`. Interactive calls are never
+    held back, but their tokens count towards the budget.
+
+    The budget is a soft limit. A call's tokens are only known once it completes, so calls admitted while the budget
+    still had room can take the tokens used past it. The overshoot is bounded by the number of concurrent model calls
+    times the tokens a single call can use, its prompt plus `model_max_output_tokens`.
+
+    Attributes
+    ----------
+    storage_service : StorageService or None
+        The storage service, on the writer connection, used to persist the daily totals, or None to only export
+        metrics.
+    daily_token_budget : int or None
+        The number of tokens non-interactive calls may use each day, or None for no limit.
+    on_budget_exhausted : Literal["reject", "queue"]
+        Whether non-interactive calls are rejected or queued once the budget is used up.
+    flush_interval_seconds : float
+        The time between writes of the daily totals.
+    tokens_used_today : int
+        The total number of tokens used since midnight UTC.
+
+    Methods
+    -------
+    start()
+        Loads the tokens already used today and starts writing the daily totals in the background.
+    stop()
+        Writes the remaining daily totals and stops the background task.
+    record(key: UsageKey, usage_metadata: types.GenerateContentResponseUsageMetadata | None)
+        Accounts for the tokens used by a model call.
+    budget_exhausted() -> bool
+        Returns whether the daily token budget is used up.
+    admit(priority: Priority) -> bool
+        Checks whether a call may be made under the daily token budget, queueing it if configured to.
+    flush()
+        Writes the daily totals accumulated since the last write.
+    """
+
+    def __init__(
+            self,
+            storage_service: StorageService | None = None,
+            daily_token_budget: int | None = None,
+            on_budget_exhausted: Literal["reject", "queue"] = "reject",
+            flush_interval_seconds: float = 10.0
+    ):
+        """
+        Parameters
+        ----------
+        storage_service : StorageService, optional
+            The storage service, on the writer connection, used to persist the daily totals, by default None, which
+            only exports metrics.
+        daily_token_budget : int, optional
+            The number of tokens non-interactive calls may use each day, by default None, which sets no limit.
+        on_budget_exhausted : Literal["reject", "queue"], optional
+            Whether non-interactive calls are rejected or queued once the budget is used up, by default "reject".
+        flush_interval_seconds : float, optional
+            The time between writes of the daily totals, by default 10.
+        """
+
+        self.storage_service = storage_service
+        self.daily_token_budget = daily_token_budget
+        self.on_budget_exhausted = on_budget_exhausted
+        self.flush_interval_seconds = flush_interval_seconds
+        self._day = _today()
+        self._tokens_used_today = 0
+        self._pending: dict[tuple[str, str, str], TokenUsage] = defaultdict(TokenUsage)
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def tokens_used_today(self) -> int:
+        self._roll_over()
+        return self._tokens_used_today
+
+    def _roll_over(self):
+        today = _today()
+
+        if today != self._day:
+            self._day = today
+            self._tokens_used_today = 0
+            MODEL_TOKENS_USED_TODAY.set(0)
+
+    async def start(self):
+        """Loads the tokens already used today, so the budget holds across restarts, and starts the background task."""
+
+        if self.storage_service is None or self._task is not None:
+            return
+
+        try:
+            usage = await self.storage_service.retrieve_model_usage(self._day)
+            self._tokens_used_today += sum(total_tokens for *_, total_tokens in usage.values())
+            MODEL_TOKENS_USED_TODAY.set(self._tokens_used_today)
+        except StorageServiceException as e:
+            logger.error(f"Failed to load today's model token usage - {e}")
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Writes the remaining daily totals and stops the background task."""
+
+        if self._task is not None:
+            # the task is left to finish a write in progress rather than cancelled, which would lose its totals
+            self._stopping.set()
+            await self._task
+            self._task = None
+            self._stopping.clear()
+
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                async with asyncio.timeout(self.flush_interval_seconds):
+                    await self._stopping.wait()
+                    return
+            except TimeoutError:
+                await self.flush()
+
+    def record(self, key: UsageKey, usage_metadata: types.GenerateContentResponseUsageMetadata | None):
+        """
+        Accounts for the tokens used by a model call.
+
+        Parameters
+        ----------
+        key : UsageKey
+            What the tokens are accounted to. If it names several emotions, the tokens are split evenly across them.
+        usage_metadata : types.GenerateContentResponseUsageMetadata or None
+            The usage metadata of the response, or None if the backend did not report any, in which case nothing is
+            recorded.
+        """
+
+        if usage_metadata is None:
+            return
+
+        prompt_tokens = usage_metadata.prompt_token_count or 0
+        output_tokens = usage_metadata.candidates_token_count or 0
+        total_tokens = usage_metadata.total_token_count or prompt_tokens + output_tokens
+
+        MODEL_PROMPT_TOKENS.labels(endpoint=key.endpoint).observe(prompt_tokens)
+
+        self._roll_over()
+        self._tokens_used_today += total_tokens
+        MODEL_TOKENS_USED_TODAY.set(self._tokens_used_today)
+
+        emotions = key.emotions or (key.emotion,)
+        shares = zip(
+            emotions,
+            _split(prompt_tokens, len(emotions)),
+            _split(output_tokens, len(emotions)),
+            _split(total_tokens, len(emotions))
+        )
+
+        for emotion, prompt_share, output_share, total_share in shares:
+            MODEL_TOKENS.labels(endpoint=key.endpoint, emotion=emotion, type="prompt").inc(prompt_share)
+            MODEL_TOKENS.labels(endpoint=key.endpoint, emotion=emotion, type="output").inc(output_share)
+            MODEL_TOKENS.labels(endpoint=key.endpoint, emotion=emotion, type="total").inc(total_share)
+
+            usage = self._pending[(self._day, key.endpoint, emotion)]
+            usage.calls += 1
+            usage.prompt_tokens += prompt_share
+            usage.output_tokens += output_share
+            usage.total_tokens += total_share
+
+    def budget_exhausted(self) -> bool:
+        """
+        Returns whether the daily token budget is used up.
+
+        Returns
+        -------
+        bool
+            True if a budget is set and the tokens used today have reached it.
+        """
+
+        return self.daily_token_budget is not None and self.tokens_used_today >= self.daily_token_budget
+
+    async def admit(self, priority: Priority) -> bool:
+        """
+        Checks whether a call may be made under the daily token budget.
+
+        Interactive calls are always admitted. Once the budget is used up, non-interactive calls are rejected, or, if
+        `on_budget_exhausted` is "queue", wait until the budget resets at midnight UTC. A queued call under a request
+        deadline fails when the deadline expires.
+
+        Only the tokens of completed calls are checked against the budget, and no tokens are reserved for the call
+        being admitted, so calls in flight when the budget runs out can use tokens past it.
+
+        Parameters
+        ----------
+        priority : Priority
+            The priority of the call.
+
+        Returns
+        -------
+        bool
+            True if the call may be made, False if it is rejected.
+        """
+
+        if priority is Priority.INTERACTIVE or not self.budget_exhausted():
+            return True
+
+        if self.on_budget_exhausted == "reject":
+            MODEL_TOKEN_BUDGET_REJECTIONS.inc()
+            return False
+
+        MODEL_TOKEN_BUDGET_WAITING.inc()
+
+        try:
+            while self.budget_exhausted():
+                midnight = datetime.fromisoformat(self._day).replace(tzinfo=timezone.utc) + timedelta(days=1)
+                await asyncio.sleep(max((midnight - datetime.now(timezone.utc)).total_seconds(), 0))
+        finally:
+            MODEL_TOKEN_BUDGET_WAITING.dec()
+
+        return True
+
+    async def flush(self):
+        """Writes the daily totals accumulated since the last write, keeping them to retry later if the write fails."""
+
+        if self.storage_service is None or not self._pending:
+            return
+
+        pending = self._pending
+        self._pending = defaultdict(TokenUsage)
+
+        try:
+            await self.storage_service.store_model_usage({
+                key: (usage.calls, usage.prompt_tokens, usage.output_tokens, usage.total_tokens)
+                for key, usage in pending.items()
+            })
+        except StorageServiceException as e:
+            logger.error(f"Failed to write model token usage - {e}")
+
+            for key, usage in pending.items():
+                retained = self._pending[key]
+                retained.calls += usage.calls
+                retained.prompt_tokens += usage.prompt_tokens
+                retained.output_tokens += usage.output_tokens
+                retained.total_tokens += usage.total_tokens
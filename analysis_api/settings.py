@@ -1,12 +1,26 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from analysis_api.services.model_service import RetryPolicy
+from analysis_api.services.storage.storage_service import StorageProfile
+
 
 class Settings(BaseSettings):
     gcp_project_id: str
     gcp_location: str
 
+    model_backend: Literal["gemini", "fake", "replay"] = "gemini"
+    model_fake_latency_seconds: float = 0.0
+    model_fake_latency_jitter_seconds: float = 0.0
+    model_fake_error_rate: float = 0.0
+    model_fake_error_code: int = 503
+    model_replay_path: Path | None = None
+    model_replay_speedup: float | None = 1.0
+    model_record_path: Path | None = None
+    model_record_prompts: bool = True
+
     model_name: str
     model_temp: float
     model_top_p: float
@@ -15,7 +29,83 @@ class Settings(BaseSettings):
     model_prompts_path: Path
     model_emotional_profile_prompt_file_name: str
     model_emotional_tagging_prompt_file_name: str
+    model_emotional_multi_tagging_prompt_file_name: str = "emotional_multi_tagging_prompt.txt"
+    model_max_concurrency: int = 16
+    model_retry_status_codes: list[int] = [429, 500, 502, 503, 504]
+    model_retry_max_attempts: int = 3
+    model_retry_initial_backoff_seconds: float = 0.5
+    model_retry_max_backoff_seconds: float = 8.0
+    model_retry_backoff_multiplier: float = 2.0
+    model_retry_deadline_seconds: float | None = 30.0
+    model_circuit_breaker_enabled: bool = True
+    model_circuit_breaker_failure_rate_threshold: float = 0.5
+    model_circuit_breaker_minimum_calls: int = 10
+    model_circuit_breaker_window_size: int = 20
+    model_circuit_breaker_open_seconds: float = 30.0
+    # a soft limit checked before each call, which calls already in flight can overshoot
+    model_daily_token_budget: int | None = None
+    model_token_budget_exhausted_policy: Literal["reject", "queue"] = "reject"
+    model_usage_flush_interval_seconds: float = 10.0
+
+    batch_max_concurrency: int = 8
+
+    request_timeout_seconds: float = 30.0
+    batch_request_timeout_seconds: float = 120.0
+    request_max_timeout_seconds: float = 300.0
+
+    job_chunk_size: int = 50
+    job_max_concurrent_jobs: int = 1
+    job_max_retained_jobs: int = 1000
+
+    batch_prediction_gcs_uri: str | None = None
+    batch_prediction_poll_interval_seconds: float = 60.0
 
     db_path: str
+    db_pool_size: int = 5
+    db_journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    db_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    db_mmap_size: int = 256 * 1024 * 1024
+    db_cache_size: int = -64_000
+    db_busy_timeout_ms: int = 5000
+
+    write_behind_enabled: bool = True
+    write_behind_max_batch_size: int = 100
+    write_behind_flush_interval_seconds: float = 0.05
+    write_behind_max_queue_size: int = 10_000
+
+    cache_max_entries: int = 10_000
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_ttl_seconds: float | None = None
+
+    tracing_exporter: Literal["none", "otlp", "file", "console"] = "none"
+    tracing_otlp_endpoint: str | None = None
+    tracing_file_path: Path | None = None
+    tracing_sample_ratio: float = 1.0
+    tracing_service_name: str = "themes-service"
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+
+    @property
+    def storage_profile(self) -> StorageProfile:
+        """The SQLite tuning applied to the database and to every pooled connection."""
+
+        return StorageProfile(
+            journal_mode=self.db_journal_mode,
+            synchronous=self.db_synchronous,
+            mmap_size=self.db_mmap_size,
+            cache_size=self.db_cache_size,
+            busy_timeout_ms=self.db_busy_timeout_ms
+        )
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """The policy for retrying model calls that fail with a transient error."""
+
+        return RetryPolicy(
+            retryable_status_codes=frozenset(self.model_retry_status_codes),
+            max_attempts=self.model_retry_max_attempts,
+            initial_backoff_seconds=self.model_retry_initial_backoff_seconds,
+            max_backoff_seconds=self.model_retry_max_backoff_seconds,
+            backoff_multiplier=self.model_retry_backoff_multiplier,
+            deadline_seconds=self.model_retry_deadline_seconds
+        )
@@ -0,0 +1,130 @@
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Sequence
+
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.util.types import AttributeValue
+
+from analysis_api.metrics import REQUEST_STAGE_SECONDS
+
+_tracer: trace.Tracer = trace.NoOpTracer()
+
+
+def set_tracer_provider(tracer_provider: TracerProvider | None):
+    """
+    Sets the provider the service's spans are created with.
+
+    Until a provider is set, spans are not recorded, although a trace context received from the caller is still
+    passed on to any spans created within it.
+
+    Parameters
+    ----------
+    tracer_provider : TracerProvider or None
+        The provider, or None to stop recording spans.
+    """
+
+    global _tracer
+
+    if tracer_provider is None:
+        _tracer = trace.NoOpTracer()
+    else:
+        _tracer = tracer_provider.get_tracer("analysis_api")
+
+
+@contextmanager
+def start_span(
+        name: str,
+        kind: trace.SpanKind = trace.SpanKind.INTERNAL,
+        context: Context | None = None,
+        attributes: dict[str, AttributeValue] | None = None
+) -> Iterator[trace.Span]:
+    """
+    Starts a span that is current for the duration of the context.
+
+    Exceptions raised within the context are recorded on the span, which is marked as failed.
+
+    Parameters
+    ----------
+    name : str
+        The name of the span.
+    kind : trace.SpanKind, optional
+        The kind of the span, by default trace.SpanKind.INTERNAL.
+    context : Context, optional
+        The context of the parent span, such as one extracted from the headers of an incoming request, by default the
+        current context.
+    attributes : dict[str, AttributeValue], optional
+        The attributes of the span, by default None.
+
+    Yields
+    ------
+    trace.Span
+        The span, which is not recording if no tracer provider is set.
+    """
+
+    with _tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes) as span:
+        yield span
+
+
+@contextmanager
+def request_stage(stage: str, **attributes: AttributeValue) -> Iterator[trace.Span]:
+    """
+    Times a stage of serving a request, both as a span and in the `request_stage_seconds` metric.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, such as storage_lookup or model_call, which is also the name of the span.
+    **attributes : AttributeValue
+        The attributes of the span.
+
+    Yields
+    ------
+    trace.Span
+        The span, so attributes only known once the stage has finished can be added to it.
+    """
+
+    with start_span(stage, attributes=attributes) as span, REQUEST_STAGE_SECONDS.labels(stage=stage).time():
+        yield span
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Exports finished spans to a JSONL file, one span per line, so traces can be inspected without a collector.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the file, which is appended to.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Parameters
+        ----------
+        path : Path
+            The path of the file, which is appended to.
+        """
+
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+
+        with self._lock:
+            if self._file.closed:
+                return SpanExportResult.FAILURE
+
+            self._file.write(lines)
+            self._file.flush()
+
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,400 @@
+"""
+Benchmark suite for the hot request paths, run offline with the fake model backend.
+
+Groups, selected with `--only`:
+- endpoints: POST /emotions/profile and /emotions/tags through the ASGI app, on storage hits and misses, with and
+  without the in-memory result cache
+- storage: StorageService.retrieve_profile and retrieve_tags against tables of each size in `--storage-sizes`
+- parsing: ModelService._parse_model_response for each response shape
+- models: construction of EmotionalProfileResponse from stored profile data
+
+Results are written as JSON, with the latency percentiles of each benchmark in microseconds. With `--compare`, the p50
+of each benchmark is compared with the same benchmark in an earlier results file, and the exit code is 1 if any is
+slower by more than `--threshold`, so regressions can be caught in CI rather than in production.
+
+Populated storage databases are kept in `--work-dir`, if given, and reused by later runs, as tables of 10M rows take
+minutes and several GB of disk to build.
+
+Usage: python -m benchmarks.hot_paths [--only GROUP ...] [--storage-sizes N,N,...] [--iterations N] [--work-dir PATH]
+                                      [--output PATH] [--compare PATH] [--threshold FRACTION]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import aiosqlite
+import httpx
+from loguru import logger
+
+from analysis_api.models import Emotion, EmotionalProfile, EmotionalProfileResponse
+from analysis_api.services.model_backends.base import text_response
+from analysis_api.services.model_service import ModelService
+from analysis_api.services.storage.storage_service import StorageService, StorageProfile, configure_connection, \
+    initialise_db
+
+GROUPS = ["endpoints", "storage", "parsing", "models"]
+PROMPTS_PATH = Path(__file__).resolve().parent.parent / "analysis_api" / "prompts"
+LYRICS = "I walked these streets alone tonight\nThe city lights were burning bright\n" * 10
+PROFILE = {emotion.value: round(1 / len(Emotion), 4) for emotion in Emotion}
+TAGS = LYRICS.replace("alone", '<span class="loneliness">alone</span>')
+
+
+def summarise(name: str, params: dict, seconds_per_op: list[float]) -> dict:
+    """
+    Summarises the measured time of each operation, or of each round of operations, of a benchmark.
+
+    Parameters
+    ----------
+    name : str
+        The name of the benchmark.
+    params : dict
+        The parameters the benchmark was run with, which together with its name identify it across runs.
+    seconds_per_op : list of float
+        The time each operation took, in seconds.
+
+    Returns
+    -------
+    dict
+        The benchmark's name, parameters, number of samples, latency percentiles and throughput.
+    """
+
+    quantiles = statistics.quantiles(seconds_per_op, n=100, method="inclusive")
+    mean = statistics.fmean(seconds_per_op)
+
+    return {
+        "name": name,
+        "params": params,
+        "samples": len(seconds_per_op),
+        "mean_us": round(mean * 1e6, 3),
+        "min_us": round(min(seconds_per_op) * 1e6, 3),
+        "p50_us": round(quantiles[49] * 1e6, 3),
+        "p95_us": round(quantiles[94] * 1e6, 3),
+        "p99_us": round(quantiles[98] * 1e6, 3),
+        "ops_per_second": round(1 / mean, 1) if mean else None
+    }
+
+
+def measure_sync(func: Callable[[], object], iterations: int, rounds: int = 50) -> list[float]:
+    """Returns the mean time per call of each round, as single calls are too fast to time on their own."""
+
+    number = max(iterations // rounds, 1)
+    return [total / number for total in timeit.Timer(func).repeat(repeat=rounds, number=number)]
+
+
+async def measure_async(func: Callable[[int], Awaitable[object]], iterations: int) -> list[float]:
+    """Returns the time of each call, which is passed the number of the call."""
+
+    durations = []
+
+    for i in range(iterations):
+        started = time.perf_counter()
+        await func(i)
+        durations.append(time.perf_counter() - started)
+
+    return durations
+
+
+def bench_parsing(iterations: int) -> list[dict]:
+    responses = {
+        "emotional_profile": text_response(json.dumps({"response": json.dumps(PROFILE)})),
+        "emotional_tags": text_response(json.dumps({"response": TAGS})),
+        "emotional_multi_tags": text_response(json.dumps({"response": {emotion: TAGS for emotion in PROFILE}}))
+    }
+
+    return [
+        summarise(
+            "model_service.parse_model_response",
+            {"response": shape},
+            measure_sync(lambda: ModelService._parse_model_response(response), iterations)
+        )
+        for shape, response in responses.items()
+    ]
+
+
+def bench_models(iterations: int) -> list[dict]:
+    def construct():
+        return EmotionalProfileResponse(track_id="1", emotional_profile=EmotionalProfile(**PROFILE), lyrics=LYRICS)
+
+    def validate():
+        data = {"track_id": "1", "emotional_profile": PROFILE, "lyrics": LYRICS}
+        return EmotionalProfileResponse.model_validate(data)
+
+    return [
+        summarise("emotional_profile_response", {"construction": "kwargs"}, measure_sync(construct, iterations)),
+        summarise("emotional_profile_response", {"construction": "model_validate"}, measure_sync(validate, iterations))
+    ]
+
+
+def _lyrics_hash(i: int) -> str:
+    return hashlib.sha256(f"lyrics-{i}".encode()).hexdigest()
+
+
+async def _populate(db_path: Path, rows: int):
+    # rows are inserted directly in large transactions, as going through StorageService would take hours at 10M rows
+    async with aiosqlite.connect(db_path) as db:
+        await initialise_db(db, storage_profile=StorageProfile())
+
+        async with db.execute("SELECT COUNT(*) FROM Profile;") as cursor:
+            existing = (await cursor.fetchone())[0]
+
+        emotions = [emotion.value for emotion in Emotion]
+        chunk_size = 50_000
+
+        for start in range(existing, rows, chunk_size):
+            hashes = [_lyrics_hash(i) for i in range(start, min(start + chunk_size, rows))]
+            await db.executemany(
+                f"INSERT INTO Profile VALUES (?{', ?' * len(emotions)});",
+                [(lyrics_hash, *PROFILE.values()) for lyrics_hash in hashes]
+            )
+            await db.executemany(
+                "INSERT INTO Tags VALUES (?, ?, ?);",
+                [(lyrics_hash, emotions[i % len(emotions)], TAGS) for i, lyrics_hash in enumerate(hashes, start)]
+            )
+            await db.commit()
+            print(f"Populated {min(start + chunk_size, rows):,} of {rows:,} rows in {db_path.name}", file=sys.stderr)
+
+
+async def bench_storage(sizes: list[int], iterations: int, work_dir: Path) -> list[dict]:
+    results = []
+    emotions = [emotion.value for emotion in Emotion]
+
+    for rows in sizes:
+        db_path = work_dir / f"storage_{rows}.db"
+        await _populate(db_path, rows)
+
+        async with aiosqlite.connect(db_path) as db:
+            await configure_connection(db, StorageProfile())
+            storage_service = StorageService(db)
+            keys = [random.randrange(rows) for _ in range(iterations)]
+
+            async def retrieve_profile(i: int):
+                assert await storage_service.retrieve_profile(_lyrics_hash(keys[i])) is not None
+
+            async def retrieve_tags(i: int):
+                key = keys[i]
+                assert await storage_service.retrieve_tags(_lyrics_hash(key), emotions[key % len(emotions)]) is not None
+
+            async def retrieve_profile_miss(i: int):
+                assert await storage_service.retrieve_profile(_lyrics_hash(rows + i)) is None
+
+            for name, func in [
+                ("storage.retrieve_profile", retrieve_profile),
+                ("storage.retrieve_tags", retrieve_tags),
+                ("storage.retrieve_profile_miss", retrieve_profile_miss)
+            ]:
+                results.append(summarise(name, {"rows": rows}, await measure_async(func, iterations)))
+
+    return results
+
+
+def _configure_app_environment(db_path: Path, result_cache: bool):
+    # the required settings get placeholder values, as the fake model backend makes no network calls
+    defaults = {
+        "GCP_PROJECT_ID": "benchmark",
+        "GCP_LOCATION": "benchmark",
+        "MODEL_NAME": "fake",
+        "MODEL_TEMP": "0",
+        "MODEL_TOP_P": "0.95",
+        "MODEL_MAX_OUTPUT_TOKENS": "1000",
+        "MODEL_PROMPTS_PATH": str(PROMPTS_PATH),
+        "MODEL_EMOTIONAL_PROFILE_PROMPT_FILE_NAME": "emotional_profile_prompt.txt",
+        "MODEL_EMOTIONAL_TAGGING_PROMPT_FILE_NAME": "emotional_tagging_prompt.txt"
+    }
+
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    os.environ["MODEL_BACKEND"] = "fake"
+    os.environ.pop("MODEL_RECORD_PATH", None)
+    os.environ["DB_PATH"] = str(db_path)
+    os.environ["CACHE_MAX_ENTRIES"] = "10000" if result_cache else "0"
+
+
+async def bench_endpoints(iterations: int, work_dir: Path) -> list[dict]:
+    from analysis_api.main import app
+
+    results = []
+
+    for result_cache in (True, False):
+        db_path = work_dir / f"endpoints_{'cache' if result_cache else 'no_cache'}.db"
+        db_path.unlink(missing_ok=True)
+        _configure_app_environment(db_path, result_cache)
+
+        async with app.router.lifespan_context(app):
+            # request logs are still formatted and written, but not to the terminal
+            logger.remove()
+            logger.add(open(os.devnull, "w"), format="{time} {level} {message}", level="INFO")
+
+            transport = httpx.ASGITransport(app=app)
+
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                hit_tracks = 100
+
+                async def post(path: str, body: dict):
+                    res = await client.post(path, json=body)
+                    assert res.status_code == 200, res.text
+
+                def profile_body(i: int) -> dict:
+                    return {"track_id": str(i), "lyrics": f"{LYRICS}{i}"}
+
+                def tags_body(i: int) -> dict:
+                    return {"track_id": str(i), "lyrics": f"{LYRICS}{i}", "emotion": "joy"}
+
+                # tracks beyond the hit tracks are new on each request, so are misses
+                new_tracks = itertools.count(hit_tracks)
+
+                for i in range(hit_tracks):
+                    await post("/emotions/profile", profile_body(i))
+                    await post("/emotions/tags", tags_body(i))
+
+                params = {"result_cache": result_cache}
+
+                for name, path, body in [
+                    ("endpoint.profile", "/emotions/profile", profile_body),
+                    ("endpoint.tags", "/emotions/tags", tags_body)
+                ]:
+                    hits = await measure_async(lambda i: post(path, body(i % hit_tracks)), iterations)
+                    misses = await measure_async(lambda i: post(path, body(next(new_tracks))), iterations)
+                    results.append(summarise(name, params | {"storage": "hit"}, hits))
+                    results.append(summarise(name, params | {"storage": "miss"}, misses))
+
+    return results
+
+
+def _key(result: dict) -> str:
+    return json.dumps([result["name"], result["params"]], sort_keys=True)
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """
+    Compares the p50 of each benchmark with the same benchmark in a baseline.
+
+    Parameters
+    ----------
+    results : list of dict
+        The results of this run.
+    baseline : list of dict
+        The results of an earlier run.
+    threshold : float
+        The fraction by which a benchmark's p50 may grow before it counts as a regression.
+
+    Returns
+    -------
+    list of dict
+        The change in p50 of each benchmark in both runs, and whether it is a regression.
+    """
+
+    baseline_by_key = {_key(result): result for result in baseline}
+    comparison = []
+
+    for result in results:
+        previous = baseline_by_key.get(_key(result))
+
+        if previous is None or not previous["p50_us"]:
+            continue
+
+        change = result["p50_us"] / previous["p50_us"] - 1
+        comparison.append({
+            "name": result["name"],
+            "params": result["params"],
+            "baseline_p50_us": previous["p50_us"],
+            "p50_us": result["p50_us"],
+            "change": round(change, 4),
+            "regression": change > threshold
+        })
+
+    return comparison
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+async def run(args: argparse.Namespace, work_dir: Path) -> list[dict]:
+    results = []
+
+    # the service prints on some paths, which is part of their cost, but is kept off the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if "parsing" in args.only:
+            results += bench_parsing(args.iterations * 10)
+
+        if "models" in args.only:
+            results += bench_models(args.iterations * 10)
+
+        if "storage" in args.only:
+            results += await bench_storage(args.storage_sizes, args.iterations, work_dir)
+
+        if "endpoints" in args.only:
+            results += await bench_endpoints(args.iterations, work_dir)
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument(
+        "--storage-sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+        help="Rows in the storage tables, by default 10000,100000,1000000. Add 10000000 for the largest size."
+    )
+    parser.add_argument("--iterations", type=int, default=1000, help="Calls timed per benchmark, by default 1000.")
+    parser.add_argument("--work-dir", type=Path, help="Keeps populated databases here. Defaults to a temporary one.")
+    parser.add_argument("--output", type=Path, help="Write the results to a JSON file as well as stdout.")
+    parser.add_argument("--compare", type=Path, help="A results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed p50 slowdown, by default 0.1.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or Path(temp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = asyncio.run(run(args, work_dir))
+
+    report = {"metadata": _metadata(), "results": results}
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())["results"]
+        report["comparison"] = compare(results, baseline, args.threshold)
+
+    output = json.dumps(report, indent=2)
+
+    if args.output is not None:
+        args.output.write_text(output)
+
+    print(output)
+
+    return 1 if any(change["regression"] for change in report.get("comparison", [])) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Micro-benchmark of the per-request cost of obtaining a ModelService.
+
+Compares building a ModelService on every request, as `get_model_service` used to, with looking up the prebuilt
+instance created at startup, as `get_model_service_provider` does now.
+
+Usage: python -m benchmarks.model_service_construction [--iterations N]
+"""
+
+import argparse
+import timeit
+
+from google import genai
+
+from analysis_api.services.data_service import MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA
+from analysis_api.services.model_backends.gemini import GeminiModelBackend
+from analysis_api.services.model_service import ModelService, PromptType
+
+PROMPT_TEMPLATE = "Analyse the emotions in the following lyrics." * 50
+
+
+def build_model_service(backend: GeminiModelBackend) -> ModelService:
+    return ModelService(
+        backend=backend,
+        model="gemini-2.0-flash",
+        prompt_template=PROMPT_TEMPLATE,
+        response_schema=MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    # the client is never used to make a request, so a placeholder API key is sufficient
+    backend = GeminiModelBackend(genai.Client(api_key="benchmark"))
+    model_services = {prompt_type: build_model_service(backend) for prompt_type in PromptType}
+
+    per_request = timeit.timeit(lambda: build_model_service(backend), number=args.iterations)
+    prebuilt = timeit.timeit(lambda: model_services[PromptType.EMOTIONAL_MULTI_TAGS], number=args.iterations)
+
+    print(f"{'build per request':<20}{per_request / args.iterations * 1e6:>10.2f} us/request")
+    print(f"{'prebuilt lookup':<20}{prebuilt / args.iterations * 1e6:>10.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Replays recorded model traffic against the service, with the model served from the recording.
+
+Record traffic by running the service with MODEL_RECORD_PATH set, then replay it with the replay model backend. Each
+distinct recorded prompt becomes the request that caused it, sent at its recorded start time divided by `--speedup`
+and answered by the model after its recorded latency divided by the same factor, so production load can be reproduced
+locally against the real storage and HTTP stack. Requests are sent in process through the ASGI app unless `--base-url`
+points at a running server, which should itself be started with MODEL_BACKEND=replay.
+
+The storage is empty at the start of a replay unless `--db-path` points at an existing database, so every request is a
+miss. Model settings other than the backend, such as the prompts, are read from the environment as for the API.
+
+Usage: python -m benchmarks.replay_traffic RECORDING [--speedup N] [--db-path PATH] [--base-url URL] [--output PATH]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from analysis_api.services.model_backends.replay import load_recording, RecordedResponse
+
+
+def _request_for_prompt(prompt: str, prompt_templates: dict[str, str]) -> tuple[str, dict] | None:
+    # the input each prompt was built from identifies the endpoint, as in DataService
+    for path, template in prompt_templates.items():
+        prefix = f"{template}\n"
+
+        if not prompt.startswith(prefix):
+            continue
+
+        model_input = prompt[len(prefix):]
+        track_id = hashlib.sha256(model_input.encode("utf-8")).hexdigest()[:16]
+
+        if path == "/emotions/profile":
+            return path, {"track_id": track_id, "lyrics": model_input}
+
+        emotions, _, lyrics = model_input.partition("\nLyrics: ")
+
+        if path == "/emotions/tags":
+            emotion = emotions.removeprefix("\nEmotion to Tag: ")
+            return path, {"track_id": track_id, "lyrics": lyrics, "emotion": emotion}
+
+        return path, {
+            "track_id": track_id,
+            "lyrics": lyrics,
+            "emotions": emotions.removeprefix("\nEmotions to Tag: ").split(", ")
+        }
+
+    return None
+
+
+def build_requests(
+        recorded: list[RecordedResponse],
+        prompt_templates: dict[str, str]
+) -> list[tuple[float, str, dict]]:
+    """
+    Rebuilds the requests that caused the recorded model calls.
+
+    Parameters
+    ----------
+    recorded : list of RecordedResponse
+        The recorded calls, which must include their prompts and start times.
+    prompt_templates : dict[str, str]
+        The prompt template used by each endpoint, keyed by its path.
+
+    Returns
+    -------
+    list of tuple[float, str, dict]
+        The time each request is sent, relative to the first, with its path and body, in the order they are sent.
+        Retries of a prompt are answered by the replayed model rather than sent again, so each prompt is sent once, or
+        once for each kind of call if it was both streamed and not. Streamed calls are sent to the streaming endpoint.
+    """
+
+    first_calls = {}
+
+    for call in sorted(recorded, key=lambda call: call.started_at or 0):
+        if call.prompt is not None and (call.prompt_hash, call.stream) not in first_calls:
+            first_calls[(call.prompt_hash, call.stream)] = call
+
+    requests = []
+    # longer templates are matched first, in case one template is a prefix of another
+    prompt_templates = dict(sorted(prompt_templates.items(), key=lambda item: len(item[1]), reverse=True))
+
+    for call in first_calls.values():
+        request = _request_for_prompt(call.prompt, prompt_templates)
+
+        if request is not None:
+            path, body = request
+            path = f"{path}/stream" if call.stream and path == "/emotions/tags" else path
+            requests.append((call.started_at or 0, path, body))
+
+    if not requests:
+        return []
+
+    start = requests[0][0]
+
+    return [(started_at - start, path, body) for started_at, path, body in requests]
+
+
+async def replay(client: httpx.AsyncClient, requests: list[tuple[float, str, dict]], speedup: float) -> dict:
+    """
+    Sends the requests at their recorded times, divided by the speedup, and summarises their latencies.
+
+    Parameters
+    ----------
+    client : httpx.AsyncClient
+        The client the requests are sent with.
+    requests : list of tuple[float, str, dict]
+        The time each request is sent, relative to the first, with its path and body.
+    speedup : float
+        The factor the recorded times are divided by.
+
+    Returns
+    -------
+    dict
+        The number of requests by status code, the achieved request rate and the latency percentiles in milliseconds.
+    """
+
+    started = time.perf_counter()
+    latencies = []
+    statuses = Counter()
+
+    async def send(offset: float, path: str, body: dict):
+        await asyncio.sleep(max(offset / speedup - (time.perf_counter() - started), 0))
+        request_started = time.perf_counter()
+
+        try:
+            res = await client.post(path, json=body, timeout=None)
+            statuses[str(res.status_code)] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+
+        latencies.append((time.perf_counter() - request_started) * 1000)
+
+    await asyncio.gather(*(send(*request) for request in requests))
+    elapsed = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+
+    return {
+        "requests": len(requests),
+        "statuses": dict(statuses),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(requests) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentiles[49], 2),
+            "p95": round(percentiles[94], 2),
+            "p99": round(percentiles[98], 2),
+            "max": round(max(latencies), 2)
+        } if latencies else None
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    os.environ["MODEL_BACKEND"] = "replay"
+    os.environ["MODEL_REPLAY_PATH"] = str(args.recording)
+    os.environ["MODEL_REPLAY_SPEEDUP"] = str(args.speedup)
+    os.environ.pop("MODEL_RECORD_PATH", None)
+
+    # imported once the environment is set, as the settings are read on startup
+    from analysis_api.main import app
+    from analysis_api.settings import Settings
+
+    settings = Settings()
+    prompt_templates = {}
+
+    for path, file_name in [
+        ("/emotions/profile", settings.model_emotional_profile_prompt_file_name),
+        ("/emotions/tags", settings.model_emotional_tagging_prompt_file_name),
+        ("/emotions/tags/multi", settings.model_emotional_multi_tagging_prompt_file_name)
+    ]:
+        prompt_templates[path] = (settings.model_prompts_path / file_name).read_text()
+
+    requests = build_requests(load_recording(args.recording), prompt_templates)
+
+    if args.base_url is not None:
+        async with httpx.AsyncClient(base_url=args.base_url) as client:
+            return await replay(client, requests, args.speedup)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DB_PATH"] = args.db_path or str(Path(directory) / "replay.db")
+        transport = httpx.ASGITransport(app=app)
+
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                return await replay(client, requests, args.speedup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("--speedup", type=float, default=10.0, help="By default 10.")
+    parser.add_argument("--db-path", help="Defaults to an empty temporary database.")
+    parser.add_argument("--base-url", help="Send requests to a running server instead.")
+    parser.add_argument("--output", type=Path, help="Write the summary to a JSON file as well as stdout.")
+    args = parser.parse_args()
+
+    summary = json.dumps(asyncio.run(run(args)), indent=2)
+
+    if args.output is not None:
+        args.output.write_text(summary)
+
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 from unittest.mock import Mock, AsyncMock
 
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
 
-from analysis_api.dependencies import get_data_service
+from analysis_api.dependencies import get_data_service, get_settings
 from analysis_api.main import app
-from analysis_api.models import Emotion, EmotionalProfileResponse, EmotionalProfile, EmotionalTagsResponse
-from analysis_api.services.data_service import DataService, DataServiceException
+from analysis_api.models import Emotion, EmotionalProfileResponse, EmotionalProfile, EmotionalTagsResponse, \
+    EmotionalProfileBatchResult
+from analysis_api.services.data_service import DataService, DataServiceException, DataServiceUnavailableException, \
+    DataServiceTimeoutException
+from analysis_api.settings import Settings
 
 
 @pytest.fixture
@@ -17,12 +22,17 @@ def mock_data_service() -> Mock:
 @pytest.fixture
 def client(mock_data_service) -> TestClient:
     app.dependency_overrides[get_data_service] = lambda: mock_data_service
+    app.dependency_overrides[get_settings] = lambda: Settings.model_construct(request_max_timeout_seconds=5)
     return TestClient(app)
 
 
 # -------------------- EMOTIONAL PROFILE -------------------- #
 # 1. Test /emotional-profile returns a 500 status code if a DataServiceException occurs.
 # 2. Test /emotional-profile returns expected response if successful.
+# 3. Test /emotional-profile returns a 503 status code if a DataServiceUnavailableException occurs.
+# 4. Test /emotional-profile returns a 504 status code if the deadline set by the X-Request-Timeout header expires.
+# 5. Test /emotional-profile returns a 400 status code if the X-Request-Timeout header is not a positive number.
+# 6. Test /emotional-profile returns a 504 status code if a DataServiceTimeoutException or TimeoutError occurs.
 @pytest.fixture
 def mock_emotional_profile_request() -> dict[str, str]:
     return {"track_id": "1", "lyrics": "Lyrics for track 1"}
@@ -98,9 +108,107 @@ def test_emotional_profile_data_returns_expected_response(
     }
 
 
+def test_emotional_profile_data_service_unavailable(client, mock_data_service, mock_emotional_profile_request):
+    mock_data_service.get_emotional_profile = AsyncMock(side_effect=DataServiceUnavailableException("Test"))
+
+    res = client.post(url="/emotions/profile", json=mock_emotional_profile_request)
+
+    assert res.status_code == 503
+    assert res.json() == {"detail": "Model service unavailable, only stored results can be served"}
+
+
+def test_emotional_profile_deadline_exceeded(client, mock_data_service, mock_emotional_profile_request):
+    async def get_emotional_profile(_):
+        await asyncio.sleep(10)
+
+    mock_data_service.get_emotional_profile = get_emotional_profile
+
+    res = client.post(
+        url="/emotions/profile",
+        json=mock_emotional_profile_request,
+        headers={"X-Request-Timeout": "0.05"}
+    )
+
+    assert res.status_code == 504 and res.json() == {"detail": "Request deadline exceeded"}
+
+
+@pytest.mark.parametrize("timeout", ["abc", "0", "-1", "nan"])
+def test_emotional_profile_invalid_timeout_header(client, mock_data_service, mock_emotional_profile_request, timeout):
+    res = client.post(
+        url="/emotions/profile",
+        json=mock_emotional_profile_request,
+        headers={"X-Request-Timeout": timeout}
+    )
+
+    assert res.status_code == 400
+    mock_data_service.get_emotional_profile.assert_not_called()
+
+
+@pytest.mark.parametrize("exception", [DataServiceTimeoutException("Test"), TimeoutError("Test")])
+def test_emotional_profile_model_timeout(client, mock_data_service, mock_emotional_profile_request, exception):
+    mock_data_service.get_emotional_profile = AsyncMock(side_effect=exception)
+
+    res = client.post(url="/emotions/profile", json=mock_emotional_profile_request)
+
+    assert res.status_code == 504 and res.json() == {"detail": "Request deadline exceeded"}
+
+
+# -------------------- EMOTIONAL PROFILES (BATCH) -------------------- #
+# 1. Test /emotions/profiles returns a 500 status code if a DataServiceException occurs.
+# 2. Test /emotions/profiles returns a 422 status code if the batch is empty.
+# 3. Test /emotions/profiles returns expected response if successful.
+def test_emotional_profiles_data_service_exception(client, mock_data_service, mock_emotional_profile_request):
+    mock_get_emotional_profiles = AsyncMock()
+    mock_get_emotional_profiles.side_effect = DataServiceException("Test")
+    mock_data_service.get_emotional_profiles = mock_get_emotional_profiles
+
+    res = client.post(url="/emotions/profiles", json=[mock_emotional_profile_request])
+
+    assert res.status_code == 500 and res.json() == {"detail": "Something went wrong"}
+
+
+def test_emotional_profiles_empty_batch(client):
+    res = client.post(url="/emotions/profiles", json=[])
+
+    assert res.status_code == 422
+
+
+def test_emotional_profiles_returns_expected_response(
+        client,
+        mock_data_service,
+        mock_emotional_profile_request,
+        mock_emotional_profile_response
+):
+    mock_get_emotional_profiles = AsyncMock()
+    mock_get_emotional_profiles.return_value = [
+        EmotionalProfileBatchResult(track_id="1", emotional_profile=mock_emotional_profile_response),
+        EmotionalProfileBatchResult(track_id="2", error="Failed to retrieve emotional profile")
+    ]
+    mock_data_service.get_emotional_profiles = mock_get_emotional_profiles
+
+    res = client.post(
+        url="/emotions/profiles",
+        json=[mock_emotional_profile_request, {"track_id": "2", "lyrics": "Lyrics for track 2"}]
+    )
+
+    assert res.status_code == 200 and res.json() == [
+        {
+            "track_id": "1",
+            "emotional_profile": mock_emotional_profile_response.model_dump(),
+            "error": None
+        },
+        {
+            "track_id": "2",
+            "emotional_profile": None,
+            "error": "Failed to retrieve emotional profile"
+        }
+    ]
+
+
 # -------------------- EMOTIONAL TAGS -------------------- #
 # 1. Test /emotional-tags returns a 500 status code if a DataServiceException occurs.
 # 2. Test /emotional-tags returns expected response if successful.
+# 3. Test /emotional-tags returns a 503 status code if a DataServiceUnavailableException occurs.
 @pytest.fixture
 def mock_emotional_tags_request() -> dict[str, str]:
     return {
@@ -146,3 +254,140 @@ def test_emotional_tags_data_returns_expected_response(
         "lyrics": """<span class="anger">I’ll hurt you</span>""",
         "emotion": "joy"
     }
+
+
+def test_emotional_tags_data_service_unavailable(client, mock_data_service, mock_emotional_tags_request):
+    mock_data_service.get_emotional_tags = AsyncMock(side_effect=DataServiceUnavailableException("Test"))
+
+    res = client.post(url="/emotions/tags", json=mock_emotional_tags_request)
+
+    assert res.status_code == 503
+    assert res.json() == {"detail": "Model service unavailable, only stored results can be served"}
+
+
+# -------------------- STREAM EMOTIONAL TAGS -------------------- #
+# 1. Test /emotions/tags/stream sends chunk events followed by a done event.
+# 2. Test /emotions/tags/stream sends an error event if a DataServiceException occurs.
+# 3. Test /emotions/tags/stream sends an error event if the deadline expires while waiting for the next chunk.
+def test_stream_emotional_tags_sends_events(
+        client,
+        mock_data_service,
+        mock_emotional_tags_request,
+        mock_emotional_tags_response
+):
+    async def stream_emotional_tags(_):
+        yield "<span "
+        yield """class="anger">I’ll hurt you</span>"""
+        yield mock_emotional_tags_response
+
+    mock_data_service.stream_emotional_tags = stream_emotional_tags
+
+    res = client.post(url="/emotions/tags/stream", json=mock_emotional_tags_request)
+
+    assert res.status_code == 200 and res.headers["content-type"].startswith("text/event-stream")
+    assert res.text == (
+        'event: chunk\ndata: {"lyrics": "<span "}\n\n'
+        'event: chunk\ndata: {"lyrics": "class=\\"anger\\">I\\u2019ll hurt you</span>"}\n\n'
+        'event: done\ndata: {"track_id": "1", "lyrics": "<span class=\\"anger\\">I\\u2019ll hurt you</span>", '
+        '"emotion": "joy"}\n\n'
+    )
+
+
+def test_stream_emotional_tags_data_service_exception(client, mock_data_service, mock_emotional_tags_request):
+    async def stream_emotional_tags(_):
+        yield "<span "
+        raise DataServiceException("Test")
+
+    mock_data_service.stream_emotional_tags = stream_emotional_tags
+
+    res = client.post(url="/emotions/tags/stream", json=mock_emotional_tags_request)
+
+    assert res.status_code == 200
+    assert res.text == (
+        'event: chunk\ndata: {"lyrics": "<span "}\n\n'
+        'event: error\ndata: {"detail": "Something went wrong"}\n\n'
+    )
+
+
+def test_stream_emotional_tags_deadline_exceeded(client, mock_data_service, mock_emotional_tags_request):
+    async def stream_emotional_tags(_):
+        yield "<span "
+        await asyncio.sleep(10)
+
+    mock_data_service.stream_emotional_tags = stream_emotional_tags
+
+    res = client.post(
+        url="/emotions/tags/stream",
+        json=mock_emotional_tags_request,
+        headers={"X-Request-Timeout": "0.05"}
+    )
+
+    assert res.status_code == 200 and res.text == (
+        'event: chunk\ndata: {"lyrics": "<span "}\n\n'
+        'event: error\ndata: {"detail": "Request deadline exceeded", "status_code": 504}\n\n'
+    )
+
+
+# -------------------- MULTI EMOTIONAL TAGS -------------------- #
+# 1. Test /emotions/tags/multi returns a 500 status code if a DataServiceException occurs.
+# 2. Test /emotions/tags/multi returns a 422 status code if no emotions are given.
+# 3. Test /emotions/tags/multi returns expected response if successful.
+@pytest.fixture
+def mock_multi_emotional_tags_request() -> dict:
+    return {
+        "track_id": "1",
+        "lyrics": "Lyrics for track 1",
+        "emotions": ["joy", "anger"]
+    }
+
+
+def test_multi_emotional_tags_data_service_exception(client, mock_data_service, mock_multi_emotional_tags_request):
+    mock_get_multi_emotional_tags = AsyncMock()
+    mock_get_multi_emotional_tags.side_effect = DataServiceException("Test")
+    mock_data_service.get_multi_emotional_tags = mock_get_multi_emotional_tags
+
+    res = client.post(url="/emotions/tags/multi", json=mock_multi_emotional_tags_request)
+
+    assert res.status_code == 500 and res.json() == {"detail": "Something went wrong"}
+
+
+def test_multi_emotional_tags_no_emotions(client, mock_multi_emotional_tags_request):
+    mock_multi_emotional_tags_request["emotions"] = []
+
+    res = client.post(url="/emotions/tags/multi", json=mock_multi_emotional_tags_request)
+
+    assert res.status_code == 422
+
+
+def test_multi_emotional_tags_returns_expected_response(
+        client,
+        mock_data_service,
+        mock_multi_emotional_tags_request
+):
+    mock_get_multi_emotional_tags = AsyncMock()
+    mock_get_multi_emotional_tags.return_value = [
+        EmotionalTagsResponse(track_id="1", lyrics="""<span class="joy">Hello</span>""", emotion=Emotion.JOY),
+        EmotionalTagsResponse(track_id="1", lyrics="""<span class="anger">Goodbye</span>""", emotion=Emotion.ANGER)
+    ]
+    mock_data_service.get_multi_emotional_tags = mock_get_multi_emotional_tags
+
+    res = client.post(url="/emotions/tags/multi", json=mock_multi_emotional_tags_request)
+
+    assert res.status_code == 200 and res.json() == [
+        {"track_id": "1", "lyrics": """<span class="joy">Hello</span>""", "emotion": "joy"},
+        {"track_id": "1", "lyrics": """<span class="anger">Goodbye</span>""", "emotion": "anger"}
+    ]
+
+
+
+# -------------------- METRICS -------------------- #
+# 1. Test /metrics exposes request latency labelled by the route template and status code.
+def test_metrics_route_latency(client, mock_multi_emotional_tags_request):
+    mock_multi_emotional_tags_request["emotions"] = []
+    client.post(url="/emotions/tags/multi", json=mock_multi_emotional_tags_request)
+
+    res = client.get("/metrics")
+
+    assert res.status_code == 200
+    assert 'http_request_seconds_count{method="POST",route="/emotions/tags/multi",status="422"}' in res.text
+    assert "thread_pool_queue_depth" in res.text
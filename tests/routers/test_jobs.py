@@ -0,0 +1,76 @@
+from unittest.mock import Mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from analysis_api.dependencies import get_job_service
+from analysis_api.main import app
+from analysis_api.models import PrecomputeJob, JobStatus, MAX_PRECOMPUTE_JOB_SIZE
+from analysis_api.services.job_service import JobService
+
+
+@pytest.fixture
+def mock_job_service() -> Mock:
+    return Mock(spec=JobService)
+
+
+@pytest.fixture
+def client(mock_job_service) -> TestClient:
+    app.dependency_overrides[get_job_service] = lambda: mock_job_service
+    return TestClient(app)
+
+
+@pytest.fixture
+def mock_precompute_job() -> PrecomputeJob:
+    return PrecomputeJob(job_id="1", status=JobStatus.RUNNING, total=3, completed=1, failed=1)
+
+
+# -------------------- PRECOMPUTE JOBS -------------------- #
+# 1. Test /jobs/precompute submits the job and returns it with a 202 status code.
+# 2. Test /jobs/precompute returns a 422 status code if there are no tracks or too many tracks.
+# 3. Test /jobs/{job_id} returns the job if it is known.
+# 4. Test /jobs/{job_id} returns a 404 status code if the job is not known.
+def test_submit_precompute_job(client, mock_job_service, mock_precompute_job):
+    mock_job_service.submit.return_value = mock_precompute_job
+
+    res = client.post(
+        url="/jobs/precompute",
+        json={"tracks": [{"track_id": "1", "lyrics": "Lyrics"}], "tag_dominant_emotions": 2}
+    )
+
+    assert res.status_code == 202 and res.json()["job_id"] == "1"
+    request = mock_job_service.submit.call_args.args[0]
+    assert [track.track_id for track in request.tracks] == ["1"] and request.tag_dominant_emotions == 2
+
+
+@pytest.mark.parametrize("track_count", [0, MAX_PRECOMPUTE_JOB_SIZE + 1])
+def test_submit_precompute_job_invalid_size(client, mock_job_service, track_count):
+    tracks = [{"track_id": str(i), "lyrics": "Lyrics"} for i in range(track_count)]
+
+    res = client.post(url="/jobs/precompute", json={"tracks": tracks})
+
+    assert res.status_code == 422
+    mock_job_service.submit.assert_not_called()
+
+
+def test_get_job(client, mock_job_service, mock_precompute_job):
+    mock_job_service.get.return_value = mock_precompute_job
+
+    res = client.get(url="/jobs/1")
+
+    assert res.status_code == 200 and res.json() == {
+        "job_id": "1",
+        "status": "running",
+        "total": 3,
+        "completed": 1,
+        "failed": 1,
+        "error": None
+    }
+
+
+def test_get_job_not_found(client, mock_job_service):
+    mock_job_service.get.return_value = None
+
+    res = client.get(url="/jobs/unknown")
+
+    assert res.status_code == 404 and res.json() == {"detail": "Job not found: unknown"}
@@ -0,0 +1,162 @@
+import aiosqlite
+import pytest
+import pytest_asyncio
+from google.genai import types
+
+from analysis_api.models import EmotionalProfileRequest
+from analysis_api.services.batch_prediction import BatchPredictionService, LocalBatchPredictionBackend, \
+    BatchPredictionException
+from analysis_api.services.data_service import MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA
+from analysis_api.services.model_backends.base import api_error
+from analysis_api.services.model_backends.fake import FakeModelBackend
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_service import ModelService, PromptType, TokenBudgetExhaustedException
+from analysis_api.services.storage.storage_service import initialise_db, StorageService
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
+
+
+# 1. Test that refresh_profiles stores a profile for each distinct set of lyrics and maps every track to it.
+# 2. Test that refresh_profiles only requests profiles that are not already stored.
+# 3. Test that refresh_profiles counts failed requests without storing them.
+# 4. Test that refresh_tags stores the tags for the dominant emotions of each track with a stored profile.
+# 5. Test that refresh_tags only requests tags that are not already stored.
+# 6. Test that refresh_profiles submits no job once the daily token budget is used up.
+# 7. Test that LocalBatchPredictionBackend.wait raises BatchPredictionException for a job that was not submitted.
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Creates an in-memory SQLite database for testing."""
+
+    db = await aiosqlite.connect(":memory:")
+    await initialise_db(db)
+
+    yield db
+
+    await db.close()
+
+
+@pytest.fixture
+def storage_service(db) -> StorageService:
+    return StorageService(db)
+
+
+@pytest.fixture
+def model_services() -> dict[PromptType, ModelService]:
+    return {
+        prompt_type: ModelService(
+            backend=FakeModelBackend(prompt_type),
+            model="fake",
+            prompt_template=f"{prompt_type.value} prompt",
+            response_schema=(
+                MULTI_EMOTIONAL_TAGS_RESPONSE_SCHEMA if prompt_type is PromptType.EMOTIONAL_MULTI_TAGS else None
+            )
+        )
+        for prompt_type in PromptType
+    }
+
+
+@pytest.fixture
+def backend(tmp_path) -> LocalBatchPredictionBackend:
+    return LocalBatchPredictionBackend(tmp_path)
+
+
+@pytest.fixture
+def batch_prediction_service(backend, model_services, storage_service) -> BatchPredictionService:
+    return BatchPredictionService(backend, model_services, storage_service, write_batch_size=2)
+
+
+def tracks(count: int, distinct_lyrics: int | None = None) -> list[EmotionalProfileRequest]:
+    distinct_lyrics = distinct_lyrics or count
+    return [EmotionalProfileRequest(track_id=str(i), lyrics=f"Lyrics {i % distinct_lyrics}") for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_refresh_profiles_stores_profiles(batch_prediction_service, storage_service):
+    stats = await batch_prediction_service.refresh_profiles(tracks(6, distinct_lyrics=3))
+
+    assert (stats.already_stored, stats.requested, stats.stored, stats.failed) == (0, 3, 3, 0)
+
+    profiles = await storage_service.retrieve_profiles([hash_lyrics(f"Lyrics {i}") for i in range(3)])
+    assert len(profiles) == 3
+
+    for i in range(6):
+        assert await storage_service.retrieve_track_lyrics_hash(str(i)) == hash_lyrics(f"Lyrics {i % 3}")
+
+
+@pytest.mark.asyncio
+async def test_refresh_profiles_skips_stored_profiles(batch_prediction_service, backend):
+    await batch_prediction_service.refresh_profiles(tracks(2))
+
+    stats = await batch_prediction_service.refresh_profiles(tracks(3))
+
+    assert (stats.already_stored, stats.requested, stats.stored, stats.failed) == (2, 1, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_refresh_profiles_counts_failures(batch_prediction_service, model_services, storage_service):
+    backend = model_services[PromptType.EMOTIONAL_PROFILE].backend
+    agenerate_content = backend.agenerate_content
+
+    async def fail_for_lyrics_0(model, contents, config):
+        if contents[0].parts[0].text.endswith("Lyrics 0"):
+            raise api_error(500, "Internal error")
+
+        return await agenerate_content(model=model, contents=contents, config=config)
+
+    backend.agenerate_content = fail_for_lyrics_0
+
+    stats = await batch_prediction_service.refresh_profiles(tracks(3))
+
+    assert (stats.already_stored, stats.requested, stats.stored, stats.failed) == (0, 3, 2, 1)
+    assert await storage_service.retrieve_track_lyrics_hash("0") is None
+    assert await storage_service.retrieve_track_lyrics_hash("1") == hash_lyrics("Lyrics 1")
+
+
+@pytest.mark.asyncio
+async def test_refresh_tags_stores_dominant_emotional_tags(batch_prediction_service, storage_service):
+    await batch_prediction_service.refresh_profiles(tracks(3))
+
+    stats = await batch_prediction_service.refresh_tags(tracks(3), dominant_emotions=2)
+
+    assert (stats.already_stored, stats.requested, stats.stored, stats.failed) == (0, 6, 6, 0)
+
+    for i in range(3):
+        lyrics_hash = hash_lyrics(f"Lyrics {i}")
+        profile = (await storage_service.retrieve_profiles([lyrics_hash]))[lyrics_hash]
+        dominant = sorted(profile, key=profile.get, reverse=True)[:2]
+
+        assert await storage_service.retrieve_tags_for_emotions(lyrics_hash, dominant) == {
+            emotion: f"Lyrics {i}" for emotion in dominant
+        }
+
+
+@pytest.mark.asyncio
+async def test_refresh_tags_skips_stored_tags(batch_prediction_service):
+    await batch_prediction_service.refresh_profiles(tracks(3))
+    await batch_prediction_service.refresh_tags(tracks(2), dominant_emotions=1)
+
+    stats = await batch_prediction_service.refresh_tags(tracks(3), dominant_emotions=2)
+
+    assert (stats.already_stored, stats.requested, stats.stored, stats.failed) == (2, 4, 4, 0)
+
+
+@pytest.mark.asyncio
+async def test_refresh_profiles_token_budget_used_up(batch_prediction_service, model_services, tmp_path):
+    usage_tracker = TokenUsageTracker(daily_token_budget=100)
+    usage_tracker.record(
+        UsageKey(endpoint="profile"),
+        types.GenerateContentResponseUsageMetadata(prompt_token_count=100, total_token_count=100)
+    )
+    model_services[PromptType.EMOTIONAL_PROFILE].usage_tracker = usage_tracker
+
+    with pytest.raises(TokenBudgetExhaustedException):
+        await batch_prediction_service.refresh_profiles(tracks(3))
+
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_local_backend_unknown_job(backend):
+    with pytest.raises(BatchPredictionException, match="Unknown batch prediction job"):
+        await backend.wait("unknown")
@@ -0,0 +1,119 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from analysis_api.services.storage.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+# 1. Test that get returns None and counts a miss if the key is not cached.
+# 2. Test that get returns the cached value and counts a hit.
+# 3. Test that set evicts the least recently used entry when max_entries is reached.
+# 4. Test that set evicts entries when max_bytes would be exceeded.
+# 5. Test that values larger than max_bytes are not cached.
+# 6. Test that entries expire after ttl_seconds.
+# 7. Test that set replaces an existing entry without counting an eviction.
+# 8. Test that hits, misses, evictions and expirations are exported as Prometheus metrics.
+def test_get_miss():
+    cache = LRUCache(max_entries=2, max_bytes=1024)
+
+    assert cache.get("key") is None
+    assert cache.misses == 1 and cache.hits == 0
+
+
+def test_get_hit():
+    cache = LRUCache(max_entries=2, max_bytes=1024)
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    assert cache.hits == 1 and cache.misses == 0
+
+
+def test_set_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, max_bytes=1024)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+
+    cache.set("c", "3")
+
+    assert cache.get("b") is None and cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.evictions == 1 and len(cache) == 2
+
+
+def test_set_evicts_to_stay_within_max_bytes():
+    value = "x" * 100
+    cache = LRUCache(max_entries=10, max_bytes=LRUCache._estimate_size(value) * 2)
+    cache.set("a", value)
+    cache.set("b", value)
+
+    cache.set("c", value)
+
+    assert cache.get("a") is None and len(cache) == 2 and cache.size_bytes <= cache.max_bytes
+    assert cache.evictions == 1
+
+
+def test_set_value_larger_than_max_bytes_not_cached():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+
+    cache.set("key", "x" * 100)
+
+    assert cache.get("key") is None and cache.size_bytes == 0
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=5, clock=clock)
+    cache.set("key", "value")
+
+    clock.now = 4.9
+    assert cache.get("key") == "value"
+
+    clock.now = 5
+    assert cache.get("key") is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_set_replaces_existing_entry():
+    cache = LRUCache(max_entries=1, max_bytes=1024)
+    cache.set("key", "old")
+
+    cache.set("key", "new")
+
+    assert cache.get("key") == "new" and cache.evictions == 0 and len(cache) == 1
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_counts_exported(clock):
+    cache = LRUCache(max_entries=1, max_bytes=10_000, ttl_seconds=10, clock=clock)
+    before = {
+        "hit": sample("result_cache_lookups_total", result="hit"),
+        "miss": sample("result_cache_lookups_total", result="miss"),
+        "evicted": sample("result_cache_removals_total", reason="evicted"),
+        "expired": sample("result_cache_removals_total", reason="expired")
+    }
+
+    cache.get("a")
+    cache.set("a", "value")
+    cache.get("a")
+    cache.set("b", "value")
+    clock.now = 20
+    cache.get("b")
+
+    assert sample("result_cache_lookups_total", result="hit") - before["hit"] == 1
+    assert sample("result_cache_lookups_total", result="miss") - before["miss"] == 2
+    assert sample("result_cache_removals_total", reason="evicted") - before["evicted"] == 1
+    assert sample("result_cache_removals_total", reason="expired") - before["expired"] == 1
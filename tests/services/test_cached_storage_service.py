@@ -0,0 +1,169 @@
+from unittest.mock import AsyncMock
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+
+from analysis_api.services.storage.cache import LRUCache
+from analysis_api.services.storage.cached_storage_service import CachedStorageService
+from analysis_api.services.storage.storage_service import initialise_db, StorageService
+
+DB_PATH = ":memory:"
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Creates an in-memory SQLite database for testing."""
+
+    db = await aiosqlite.connect(DB_PATH)
+    await initialise_db(db)
+
+    yield db
+
+    await db.close()
+
+
+@pytest.fixture
+def cache() -> LRUCache:
+    return LRUCache(max_entries=100, max_bytes=1024 * 1024)
+
+
+@pytest.fixture
+def storage_service(db, cache) -> CachedStorageService:
+    return CachedStorageService(db, cache=cache)
+
+
+@pytest.fixture
+def mock_emotional_profile() -> dict[str, float]:
+    return {
+        "joy": 0.1,
+        "sadness": 0.1,
+        "anger": 0.2,
+        "fear": 0.05,
+        "love": 0.1,
+        "hope": 0,
+        "nostalgia": 0.03,
+        "loneliness": 0.02,
+        "confidence": 0.1,
+        "despair": 0.05,
+        "excitement": 0.1,
+        "mystery": 0,
+        "defiance": 0.05,
+        "gratitude": 0.1,
+        "spirituality": 0
+    }
+
+
+# 1. Test that a stored profile is served from the cache without querying the database.
+# 2. Test that a profile retrieved from the database is cached.
+# 3. Test that mutating a retrieved profile does not mutate the cached profile.
+# 4. Test that retrieve_profiles only queries the database for uncached tracks.
+# 5. Test that stored tags are served from the cache without querying the database.
+# 6. Test that retrieve_tags_for_emotions only queries the database for uncached emotions.
+# 7. Test that misses are not cached.
+# 8. Test that a stored track's lyrics hash is served from the cache without querying the database.
+# 9. Test that retrieve_tracks_lyrics_hashes only queries the database for uncached tracks.
+@pytest.mark.asyncio
+async def test_stored_profile_served_from_cache(storage_service, db, mock_emotional_profile):
+    await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
+    db.execute = AsyncMock(side_effect=aiosqlite.OperationalError)
+
+    assert await storage_service.retrieve_profile("1") == mock_emotional_profile
+
+
+@pytest.mark.asyncio
+async def test_retrieved_profile_cached(storage_service, db, cache, mock_emotional_profile):
+    await StorageService(db).store_profile(lyrics_hash="1", profile=mock_emotional_profile)
+
+    assert await storage_service.retrieve_profile("1") == mock_emotional_profile
+    assert cache.get(("profile", "1")) == mock_emotional_profile
+
+
+@pytest.mark.asyncio
+async def test_retrieved_profile_copied(storage_service, mock_emotional_profile):
+    await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
+
+    profile = await storage_service.retrieve_profile("1")
+    profile["joy"] = 1
+
+    assert (await storage_service.retrieve_profile("1"))["joy"] == mock_emotional_profile["joy"]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_profiles_only_queries_uncached(storage_service, db, mock_emotional_profile):
+    await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
+    await StorageService(db).store_profile(lyrics_hash="2", profile=mock_emotional_profile)
+    execute = db.execute
+    queried_params = []
+
+    async def spy_execute(query, params=None):
+        queried_params.append(list(params))
+        return await execute(query, params)
+
+    db.execute = spy_execute
+
+    profiles = await storage_service.retrieve_profiles(["1", "2", "3"])
+
+    assert profiles == {"1": mock_emotional_profile, "2": mock_emotional_profile}
+    assert queried_params == [["2", "3"]]
+
+
+@pytest.mark.asyncio
+async def test_stored_tags_served_from_cache(storage_service, db):
+    await storage_service.store_tags(lyrics_hash="1", emotion="joy", tags="tags")
+    db.execute = AsyncMock(side_effect=aiosqlite.OperationalError)
+
+    assert await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy") == "tags"
+
+
+@pytest.mark.asyncio
+async def test_retrieve_tags_for_emotions_only_queries_uncached(storage_service, db):
+    await storage_service.store_tags(lyrics_hash="1", emotion="joy", tags="joy tags")
+    await StorageService(db).store_tags(lyrics_hash="1", emotion="anger", tags="anger tags")
+    execute = db.execute
+    queried_params = []
+
+    async def spy_execute(query, params=None):
+        queried_params.append(list(params))
+        return await execute(query, params)
+
+    db.execute = spy_execute
+
+    tags = await storage_service.retrieve_tags_for_emotions(lyrics_hash="1", emotions=["joy", "anger", "love"])
+
+    assert tags == {"joy": "joy tags", "anger": "anger tags"}
+    assert queried_params == [["1", "anger", "love"]]
+
+
+@pytest.mark.asyncio
+async def test_misses_not_cached(storage_service, cache):
+    assert await storage_service.retrieve_profile("1") is None
+    assert await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_stored_track_served_from_cache(storage_service, db):
+    await storage_service.store_track(track_id="1", lyrics_hash="a")
+    db.execute = AsyncMock(side_effect=aiosqlite.OperationalError)
+
+    assert await storage_service.retrieve_track_lyrics_hash("1") == "a"
+
+
+@pytest.mark.asyncio
+async def test_retrieve_tracks_lyrics_hashes_only_queries_uncached(storage_service, db):
+    await storage_service.store_tracks({"1": "a"})
+    await StorageService(db).store_track(track_id="2", lyrics_hash="b")
+    execute = db.execute
+    queried_params = []
+
+    async def spy_execute(query, params=None):
+        queried_params.append(list(params))
+        return await execute(query, params)
+
+    db.execute = spy_execute
+
+    lyrics_hashes = await storage_service.retrieve_tracks_lyrics_hashes(["1", "2", "3"])
+
+    assert lyrics_hashes == {"1": "a", "2": "b"}
+    assert queried_params == [["2", "3"]]
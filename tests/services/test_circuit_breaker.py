@@ -0,0 +1,103 @@
+from analysis_api.services.circuit_breaker import CircuitBreaker, CircuitState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def open_circuit_breaker(clock: FakeClock) -> CircuitBreaker:
+    circuit_breaker = CircuitBreaker(
+        failure_rate_threshold=0.5,
+        minimum_calls=4,
+        window_size=4,
+        open_seconds=10,
+        clock=clock
+    )
+
+    for _ in range(4):
+        assert circuit_breaker.allow_request()
+        circuit_breaker.record_failure()
+
+    return circuit_breaker
+
+
+# 1. Test that the circuit breaker stays closed until the minimum number of calls is reached.
+# 2. Test that the circuit breaker stays closed while the failure rate is below the threshold.
+# 3. Test that the circuit breaker opens once the failure rate reaches the threshold and rejects calls.
+# 4. Test that the circuit breaker half-opens after open_seconds and lets a single probe through.
+# 5. Test that a successful probe closes the circuit breaker.
+# 6. Test that a failed probe opens the circuit breaker again.
+# 7. Test that an ignored probe lets another probe through.
+def test_closed_below_minimum_calls():
+    circuit_breaker = CircuitBreaker(minimum_calls=4)
+
+    for _ in range(3):
+        circuit_breaker.record_failure()
+
+    assert circuit_breaker.state is CircuitState.CLOSED
+
+
+def test_closed_below_threshold():
+    circuit_breaker = CircuitBreaker(failure_rate_threshold=0.75, minimum_calls=4, window_size=4)
+
+    for success in [True, True, True, False, True, False]:
+        circuit_breaker.record_success() if success else circuit_breaker.record_failure()
+
+    assert circuit_breaker.state is CircuitState.CLOSED
+
+
+def test_opens_at_threshold():
+    circuit_breaker = open_circuit_breaker(FakeClock())
+
+    assert circuit_breaker.state is CircuitState.OPEN
+    assert not circuit_breaker.allow_request()
+
+
+def test_half_opens_after_open_seconds():
+    clock = FakeClock()
+    circuit_breaker = open_circuit_breaker(clock)
+    clock.now = 10
+
+    assert circuit_breaker.state is CircuitState.HALF_OPEN
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+
+
+def test_successful_probe_closes():
+    clock = FakeClock()
+    circuit_breaker = open_circuit_breaker(clock)
+    clock.now = 10
+
+    circuit_breaker.allow_request()
+    circuit_breaker.record_success()
+
+    assert circuit_breaker.state is CircuitState.CLOSED
+    assert circuit_breaker.allow_request()
+
+
+def test_failed_probe_opens():
+    clock = FakeClock()
+    circuit_breaker = open_circuit_breaker(clock)
+    clock.now = 10
+
+    circuit_breaker.allow_request()
+    circuit_breaker.record_failure()
+
+    assert circuit_breaker.state is CircuitState.OPEN
+    clock.now = 19
+    assert not circuit_breaker.allow_request()
+
+
+def test_ignored_probe_releases_probe():
+    clock = FakeClock()
+    circuit_breaker = open_circuit_breaker(clock)
+    clock.now = 10
+
+    circuit_breaker.allow_request()
+    circuit_breaker.record_ignored()
+
+    assert circuit_breaker.allow_request()
@@ -0,0 +1,137 @@
+import asyncio
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+from prometheus_client import REGISTRY
+
+from analysis_api.services.storage.connection_pool import ConnectionPool, ConnectionPoolException
+from analysis_api.services.storage.storage_service import initialise_db, StorageService, StorageProfile
+
+
+@pytest_asyncio.fixture
+async def connection_pool(tmp_path):
+    pool = ConnectionPool(db_path=str(tmp_path / "test.db"), size=2)
+    await pool.open()
+    await initialise_db(pool.writer)
+
+    yield pool
+
+    await pool.close()
+
+
+# 1. Test that ConnectionPool raises ConnectionPoolException if size is less than 1.
+# 2. Test that reader and writer raise ConnectionPoolException if the pool is not open.
+# 3. Test that reader connections are returned to the pool and reused.
+# 4. Test that reader waits for a connection when all connections are in use.
+# 5. Test that reader connections are read-only.
+# 6. Test that writes through the writer are visible to readers.
+# 7. Test that health_check returns True for an open pool and False for a closed pool.
+# 8. Test that the storage profile is applied to every connection.
+# 9. Test that the time spent waiting for a reader connection is recorded.
+def test_connection_pool_invalid_size():
+    with pytest.raises(ConnectionPoolException, match="Pool size must be at least 1"):
+        ConnectionPool(db_path="test.db", size=0)
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_not_open():
+    pool = ConnectionPool(db_path="test.db")
+
+    with pytest.raises(ConnectionPoolException, match="Connection pool is not open"):
+        _ = pool.writer
+
+    with pytest.raises(ConnectionPoolException, match="Connection pool is not open"):
+        async with pool.reader():
+            pass
+
+
+@pytest.mark.asyncio
+async def test_reader_connections_reused(connection_pool):
+    borrowed = set()
+
+    for _ in range(4):
+        async with connection_pool.reader() as conn:
+            borrowed.add(id(conn))
+
+    assert len(borrowed) <= connection_pool.size
+
+
+@pytest.mark.asyncio
+async def test_reader_waits_when_pool_exhausted(connection_pool):
+    async with connection_pool.reader(), connection_pool.reader():
+        waiter = asyncio.create_task(connection_pool.reader().__aenter__())
+        await asyncio.sleep(0.01)
+
+        assert not waiter.done()
+
+    conn = await asyncio.wait_for(waiter, timeout=1)
+
+    assert isinstance(conn, aiosqlite.Connection)
+
+
+@pytest.mark.asyncio
+async def test_reader_connections_read_only(connection_pool):
+    async with connection_pool.reader() as conn:
+        with pytest.raises(aiosqlite.OperationalError):
+            await conn.execute("INSERT INTO Tags (lyrics_hash, emotion, tags) VALUES ('1', 'joy', 'tags');")
+
+
+@pytest.mark.asyncio
+async def test_writes_visible_to_readers(connection_pool):
+    async with connection_pool.reader() as conn:
+        storage_service = StorageService(conn, write_db=connection_pool.writer)
+        await storage_service.store_tags(lyrics_hash="1", emotion="joy", tags="tags")
+
+        assert await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy") == "tags"
+
+
+@pytest.mark.asyncio
+async def test_health_check(tmp_path):
+    pool = ConnectionPool(db_path=str(tmp_path / "test.db"), size=1)
+    await pool.open()
+
+    assert await pool.health_check() is True
+
+    await pool.close()
+
+    assert await pool.health_check() is False
+
+
+@pytest.mark.asyncio
+async def test_storage_profile_applied_to_connections(tmp_path):
+    pool = ConnectionPool(
+        db_path=str(tmp_path / "test.db"),
+        size=2,
+        storage_profile=StorageProfile(busy_timeout_ms=1234)
+    )
+    await pool.open()
+    busy_timeouts = []
+
+    async with pool.writer.execute("PRAGMA busy_timeout;") as cursor:
+        busy_timeouts.append((await cursor.fetchone())[0])
+
+    async with pool.reader() as first, pool.reader() as second:
+        for conn in [first, second]:
+            async with conn.execute("PRAGMA busy_timeout;") as cursor:
+                busy_timeouts.append((await cursor.fetchone())[0])
+
+    await pool.close()
+
+    assert busy_timeouts == [1234, 1234, 1234]
+
+
+@pytest.mark.asyncio
+async def test_reader_wait_recorded(connection_pool):
+    waits = REGISTRY.get_sample_value("db_connection_wait_seconds_count") or 0.0
+    fast_waits = REGISTRY.get_sample_value("db_connection_wait_seconds_bucket", {"le": "0.005"}) or 0.0
+
+    async with connection_pool.reader(), connection_pool.reader():
+        waiter = asyncio.create_task(connection_pool.reader().__aenter__())
+        await asyncio.sleep(0.02)
+
+    await asyncio.wait_for(waiter, timeout=1)
+
+    assert REGISTRY.get_sample_value("db_connection_wait_seconds_count") == waits + 3
+    # only the waiter had to wait for a connection to be returned
+    assert REGISTRY.get_sample_value("db_connection_wait_seconds_bucket", {"le": "0.005"}) == fast_waits + 2
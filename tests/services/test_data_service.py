@@ -1,13 +1,21 @@
+import asyncio
 import json
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, call
 
 import pytest
+from prometheus_client import REGISTRY
 
 from analysis_api.models import EmotionalProfileRequest, EmotionalProfileResponse, EmotionalProfile, \
-    EmotionalTagsRequest, Emotion, EmotionalTagsResponse
-from analysis_api.services.data_service import DataService, DataServiceException
-from analysis_api.services.model_service import ModelService, ModelServiceException
+    EmotionalTagsRequest, Emotion, EmotionalTagsResponse, EmotionalProfileBatchResult, MultiEmotionalTagsRequest
+from analysis_api.services.data_service import DataService, DataServiceException, DataServiceUnavailableException, \
+    DataServiceTimeoutException
+from analysis_api.services.deadline import Deadline
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.model_service import ModelService, ModelServiceException, PromptType, \
+    ModelServiceUnavailableException
 from analysis_api.services.storage.storage_service import StorageService, StorageServiceException
+from analysis_api.services.token_usage import UsageKey
 
 
 @pytest.fixture
@@ -17,14 +25,134 @@ def mock_model_service() -> Mock:
 
 @pytest.fixture
 def mock_storage_service() -> Mock:
-    return AsyncMock(spec=StorageService)
+    mock_storage_service = AsyncMock(spec=StorageService)
+    mock_storage_service.retrieve_track_lyrics_hash.return_value = None
+    mock_storage_service.retrieve_tracks_lyrics_hashes.return_value = {}
+    return mock_storage_service
 
 
 @pytest.fixture
-def data_service(mock_model_service, mock_storage_service) -> DataService:
-    return DataService(model_service=mock_model_service, storage_service=mock_storage_service)
+def mock_model_service_provider(mock_model_service) -> Mock:
+    return Mock(return_value=mock_model_service)
 
 
+@pytest.fixture
+def data_service(mock_model_service_provider, mock_storage_service) -> DataService:
+    return DataService(model_service_provider=mock_model_service_provider, storage_service=mock_storage_service)
+
+
+# 1. Test that each method uses the model service for its prompt.
+# 2. Test that the model service is not resolved when results are in storage.
+@pytest.mark.asyncio
+async def test_model_service_selected_by_prompt_type(mock_storage_service):
+    model_services = {prompt_type: AsyncMock(spec=ModelService) for prompt_type in PromptType}
+    model_services[PromptType.EMOTIONAL_PROFILE].agenerate_response.return_value = "{}"
+    model_services[PromptType.EMOTIONAL_TAGS].agenerate_response.return_value = "tags"
+    model_services[PromptType.EMOTIONAL_MULTI_TAGS].agenerate_response.return_value = {"joy": "tags"}
+    mock_storage_service.retrieve_profile.return_value = None
+    mock_storage_service.retrieve_tags.return_value = None
+    mock_storage_service.retrieve_tags_for_emotions.return_value = {}
+    data_service = DataService(model_service_provider=model_services.get, storage_service=mock_storage_service)
+
+    await data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics")
+    await data_service._get_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics", emotion="joy")
+    await data_service._get_multi_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics", emotions=["joy"])
+
+    for model_service in model_services.values():
+        model_service.agenerate_response.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_model_service_not_resolved_on_storage_hit(
+        data_service,
+        mock_model_service_provider,
+        mock_storage_service
+):
+    mock_storage_service.retrieve_profile.return_value = {"joy": 1}
+    mock_storage_service.retrieve_tags.return_value = "tags"
+    mock_storage_service.retrieve_tags_for_emotions.return_value = {"joy": "tags"}
+
+    await data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics")
+    await data_service._get_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics", emotion="joy")
+    await data_service._get_multi_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics", emotions=["joy"])
+    _ = [item async for item in data_service.stream_emotional_tags(
+        EmotionalTagsRequest(track_id="1", lyrics="Lyrics", emotion=Emotion.JOY)
+    )]
+
+    mock_model_service_provider.assert_not_called()
+
+
+# -------------------- TRACK LYRICS HASH -------------------- #
+# 1. Test that _record_track stores the lyrics hash of a new track.
+# 2. Test that _record_track does not store the lyrics hash if it is unchanged.
+# 3. Test that _record_track stores the new lyrics hash if the lyrics have changed.
+# 4. Test that tracks with the same lyrics share a stored analysis.
+# 5. Test that _record_tracks looks up all tracks at once and stores only the new and changed tracks together.
+# 6. Test that _record_tracks does not store anything if no track has changed.
+@pytest.mark.asyncio
+async def test__record_track_new_track(data_service, mock_storage_service):
+    await data_service._record_track(track_id="1", lyrics_hash="a")
+
+    mock_storage_service.store_track.assert_called_once_with(track_id="1", lyrics_hash="a")
+
+
+@pytest.mark.asyncio
+async def test__record_track_unchanged(data_service, mock_storage_service):
+    mock_storage_service.retrieve_track_lyrics_hash.return_value = "a"
+
+    await data_service._record_track(track_id="1", lyrics_hash="a")
+
+    mock_storage_service.store_track.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test__record_track_lyrics_changed(data_service, mock_storage_service):
+    mock_storage_service.retrieve_track_lyrics_hash.return_value = "a"
+
+    await data_service._record_track(track_id="1", lyrics_hash="b")
+
+    mock_storage_service.store_track.assert_called_once_with(track_id="1", lyrics_hash="b")
+
+
+@pytest.mark.asyncio
+async def test_tracks_with_same_lyrics_share_analysis(data_service, mock_model_service, mock_storage_service):
+    mock_storage_service.retrieve_tags.return_value = "tags"
+
+    await data_service.get_emotional_tags(EmotionalTagsRequest(track_id="1", lyrics="Same lyrics", emotion=Emotion.JOY))
+    await data_service.get_emotional_tags(
+        EmotionalTagsRequest(track_id="2", lyrics="  Same   lyrics\r\n", emotion=Emotion.JOY)
+    )
+
+    assert mock_storage_service.retrieve_tags.call_args_list == [
+        call(lyrics_hash=hash_lyrics("Same lyrics"), emotion="joy"),
+        call(lyrics_hash=hash_lyrics("Same lyrics"), emotion="joy")
+    ]
+    assert mock_storage_service.store_track.call_args_list == [
+        call(track_id="1", lyrics_hash=hash_lyrics("Same lyrics")),
+        call(track_id="2", lyrics_hash=hash_lyrics("Same lyrics"))
+    ]
+    mock_model_service.agenerate_response.assert_not_called()
+
+
+
+@pytest.mark.asyncio
+async def test__record_tracks(data_service, mock_storage_service):
+    mock_storage_service.retrieve_tracks_lyrics_hashes.return_value = {"1": "a", "2": "a"}
+
+    await data_service._record_tracks({"1": "a", "2": "b", "3": "c"})
+
+    mock_storage_service.retrieve_tracks_lyrics_hashes.assert_called_once_with(["1", "2", "3"])
+    mock_storage_service.store_tracks.assert_called_once_with({"2": "b", "3": "c"})
+
+
+@pytest.mark.asyncio
+async def test__record_tracks_unchanged(data_service, mock_storage_service):
+    mock_storage_service.retrieve_tracks_lyrics_hashes.return_value = {"1": "a"}
+
+    await data_service._record_tracks({"1": "a"})
+
+    mock_storage_service.store_tracks.assert_not_called()
+
 # -------------------- EMOTIONAL PROFILE -------------------- #
 @pytest.fixture
 def mock_emotional_profile_data() -> dict[str, float]:
@@ -64,11 +192,11 @@ async def test__get_emotional_profile_data_data_in_storage(
     mock_retrieve_item.return_value = mock_emotional_profile_data
     mock_storage_service.retrieve_profile = mock_retrieve_item
 
-    data = await data_service._get_emotional_profile_data(track_id="1", lyrics="Lyrics for track 1")
+    data = await data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics for track 1")
 
     assert data == mock_emotional_profile_data
     mock_storage_service.retrieve_profile.assert_called_once_with("1")
-    mock_model_service.generate_response.assert_not_called()
+    mock_model_service.agenerate_response.assert_not_called()
 
 
 # 2. Test that _get_emotional_profile_data calls model if data not in storage.
@@ -82,20 +210,82 @@ async def test__get_emotional_profile_data_data_not_in_storage(
     mock_retrieve_profile = AsyncMock()
     mock_retrieve_profile.return_value = None
     mock_storage_service.retrieve_profile = mock_retrieve_profile
-    mock_generate_response = Mock()
+    mock_generate_response = AsyncMock()
     mock_generate_response.return_value = json.dumps(mock_emotional_profile_data)
-    mock_model_service.generate_response = mock_generate_response
+    mock_model_service.agenerate_response = mock_generate_response
     lyrics = "Lyrics for track 1"
 
-    data = await data_service._get_emotional_profile_data(track_id="1", lyrics=lyrics)
+    data = await data_service._get_emotional_profile_data(lyrics_hash="1", lyrics=lyrics)
 
     assert data == mock_emotional_profile_data
     mock_storage_service.retrieve_profile.assert_called_once_with("1")
-    mock_model_service.generate_response.assert_called_once_with(lyrics)
-    mock_storage_service.store_profile.assert_called_once_with(track_id="1", profile=mock_emotional_profile_data)
+    mock_model_service.agenerate_response.assert_called_once_with(
+        lyrics,
+        priority=Priority.INTERACTIVE,
+        usage_key=UsageKey(endpoint="profile")
+    )
+    mock_storage_service.store_profile.assert_called_once_with(lyrics_hash="1", profile=mock_emotional_profile_data)
+
+
+# 3. Test that concurrent _get_emotional_profile_data calls for the same track share one model call and write.
+@pytest.mark.asyncio
+async def test__get_emotional_profile_data_concurrent_misses_coalesced(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_retrieve_profile = AsyncMock()
+    mock_retrieve_profile.return_value = None
+    mock_storage_service.retrieve_profile = mock_retrieve_profile
+    mock_generate_response = AsyncMock()
+    mock_generate_response.return_value = json.dumps(mock_emotional_profile_data)
+    mock_model_service.agenerate_response = mock_generate_response
+
+    results = await asyncio.gather(
+        *(data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics for track 1") for _ in range(5))
+    )
 
+    assert results == [mock_emotional_profile_data] * 5
+    mock_model_service.agenerate_response.assert_called_once()
+    mock_storage_service.store_profile.assert_called_once()
 
-# 3. Test that get_emotional_profile raises a DataServiceException if a StorageServiceException occurs.
+
+# 4. Test that a call at interactive priority does not join a call at batch priority for the same track, so it is not
+# held back with it.
+@pytest.mark.asyncio
+async def test__get_emotional_profile_data_priorities_not_coalesced(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_storage_service.retrieve_profile.return_value = None
+
+    async def agenerate_response(_, priority, **kwargs):
+        # batch calls are held back, as by the daily token budget under the queue policy
+        if priority is Priority.BATCH:
+            await asyncio.Event().wait()
+        return json.dumps(mock_emotional_profile_data)
+
+    mock_model_service.agenerate_response.side_effect = agenerate_response
+
+    batch_call = asyncio.create_task(
+        data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics", priority=Priority.BATCH)
+    )
+    await asyncio.sleep(0)
+
+    async with Deadline(1).scope():
+        result = await data_service._get_emotional_profile_data(lyrics_hash="1", lyrics="Lyrics")
+
+    assert result == mock_emotional_profile_data
+    assert mock_model_service.agenerate_response.call_count == 2
+
+    batch_call.cancel()
+    await asyncio.wait((batch_call,))
+
+
+# 5. Test that get_emotional_profile raises a DataServiceException if a StorageServiceException occurs.
 @pytest.mark.asyncio
 async def test_get_emotional_profile_storage_failure(data_service, mock_emotional_profile_request):
     mock__get_emotional_profile_data = AsyncMock()
@@ -109,7 +299,7 @@ async def test_get_emotional_profile_storage_failure(data_service, mock_emotiona
         await data_service.get_emotional_profile(mock_emotional_profile_request)
 
 
-# 4. Test that get_emotional_profile raises a DataServiceException if a ModelServiceException occurs.
+# 6. Test that get_emotional_profile raises a DataServiceException if a ModelServiceException occurs.
 @pytest.mark.asyncio
 async def test_get_emotional_profile_model_failure(data_service, mock_emotional_profile_request):
     mock__get_emotional_profile_data = AsyncMock()
@@ -123,7 +313,7 @@ async def test_get_emotional_profile_model_failure(data_service, mock_emotional_
         await data_service.get_emotional_profile(mock_emotional_profile_request)
 
 
-# 5. Test that get_emotional_profile raises a DataServiceException if data validation fails.
+# 7. Test that get_emotional_profile raises a DataServiceException if data validation fails.
 @pytest.mark.parametrize(
     "missing_emotion",
     [
@@ -160,7 +350,7 @@ async def test_get_emotional_profile_data_validation_failure(
         await data_service.get_emotional_profile(mock_emotional_profile_request)
 
 
-# 6. Test that get_emotional_profile returns expected emotional profile.
+# 8. Test that get_emotional_profile returns expected emotional profile.
 @pytest.mark.asyncio
 async def test_get_emotional_profile_data_returns_expected_data(
         data_service,
@@ -195,6 +385,253 @@ async def test_get_emotional_profile_data_returns_expected_data(
         )
     )
 
+
+# 9. Test that get_emotional_profile raises a DataServiceUnavailableException if the model service is unavailable.
+@pytest.mark.asyncio
+async def test_get_emotional_profile_model_unavailable(data_service, mock_emotional_profile_request):
+    mock__get_emotional_profile_data = AsyncMock()
+    mock__get_emotional_profile_data.side_effect = ModelServiceUnavailableException("Test")
+    data_service._get_emotional_profile_data = mock__get_emotional_profile_data
+
+    with pytest.raises(DataServiceUnavailableException, match="Model service unavailable"):
+        await data_service.get_emotional_profile(mock_emotional_profile_request)
+
+
+# 10. Test that get_emotional_profile raises a DataServiceTimeoutException if the model call times out.
+@pytest.mark.asyncio
+async def test_get_emotional_profile_model_timeout(data_service, mock_emotional_profile_request):
+    data_service._get_emotional_profile_data = AsyncMock(side_effect=TimeoutError("Test"))
+
+    with pytest.raises(DataServiceTimeoutException, match="Model call timed out"):
+        await data_service.get_emotional_profile(mock_emotional_profile_request)
+
+
+# 11. Test that a request joining a model call started by a request with a shorter deadline gets the result, and that
+# the model call is bounded by the longer deadline.
+@pytest.mark.asyncio
+async def test_get_emotional_profile_joined_call_not_bounded_by_first_deadline(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data,
+        mock_emotional_profile_request
+):
+    mock_storage_service.retrieve_profile.return_value = None
+    deadlines = []
+
+    async def agenerate_response(*args, **kwargs):
+        # bounded by the request deadline, as the model service bounds each model call
+        deadline = Deadline.current()
+        deadlines.append(deadline)
+        async with asyncio.timeout(deadline.remaining() if deadline is not None else None):
+            await asyncio.sleep(0.1)
+        return json.dumps(mock_emotional_profile_data)
+
+    mock_model_service.agenerate_response.side_effect = agenerate_response
+
+    async def get_emotional_profile(timeout_seconds: float) -> EmotionalProfileResponse:
+        async with Deadline(timeout_seconds).scope():
+            return await data_service.get_emotional_profile(mock_emotional_profile_request)
+
+    short, long = await asyncio.gather(get_emotional_profile(0.02), get_emotional_profile(5), return_exceptions=True)
+
+    assert isinstance(short, TimeoutError)
+    assert long.emotional_profile == EmotionalProfile(**mock_emotional_profile_data)
+    mock_model_service.agenerate_response.assert_called_once()
+    assert deadlines[0] is not None and deadlines[0].remaining() > 1
+
+
+# 12. Test that a model call is cancelled once every request waiting on it has run out of time.
+@pytest.mark.asyncio
+async def test_get_emotional_profile_model_call_cancelled_with_requests(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_request
+):
+    mock_storage_service.retrieve_profile.return_value = None
+    cancelled = asyncio.Event()
+
+    async def agenerate_response(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mock_model_service.agenerate_response.side_effect = agenerate_response
+
+    async def get_emotional_profile(timeout_seconds: float) -> EmotionalProfileResponse:
+        async with Deadline(timeout_seconds).scope():
+            return await data_service.get_emotional_profile(mock_emotional_profile_request)
+
+    results = await asyncio.gather(get_emotional_profile(0.01), get_emotional_profile(0.02), return_exceptions=True)
+
+    assert all(isinstance(result, TimeoutError) for result in results)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert data_service.single_flight.in_flight == 0
+
+
+# -------------------- EMOTIONAL PROFILES (BATCH) -------------------- #
+# 1. Test that get_emotional_profiles raises a DataServiceException if the bulk storage lookup fails.
+# 2. Test that get_emotional_profiles only calls the model for tracks not in storage.
+# 3. Test that get_emotional_profiles reports a per-track error without failing the batch.
+# 4. Test that get_emotional_profiles limits the number of concurrent model calls.
+# 5. Test that get_emotional_profiles reports a model call timing out as a per-track error.
+# 6. Test that get_emotional_profiles records the tracks with a single lookup and write.
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_storage_failure(data_service, mock_storage_service):
+    mock_storage_service.retrieve_profiles.side_effect = StorageServiceException("Test")
+
+    with pytest.raises(DataServiceException, match="Failed to retrieve emotional profiles"):
+        await data_service.get_emotional_profiles([EmotionalProfileRequest(track_id="1", lyrics="Lyrics")])
+
+
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_only_misses_call_model(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_storage_service.retrieve_profiles.return_value = {
+        hash_lyrics("Lyrics for track 1"): mock_emotional_profile_data
+    }
+    mock_storage_service.retrieve_profile.return_value = None
+    mock_model_service.agenerate_response.return_value = json.dumps(mock_emotional_profile_data)
+    requests = [
+        EmotionalProfileRequest(track_id="1", lyrics="Lyrics for track 1"),
+        EmotionalProfileRequest(track_id="2", lyrics="Lyrics for track 2")
+    ]
+
+    results = await data_service.get_emotional_profiles(requests)
+
+    expected_profile = EmotionalProfile(**mock_emotional_profile_data)
+    assert results == [
+        EmotionalProfileBatchResult(
+            track_id="1",
+            emotional_profile=EmotionalProfileResponse(
+                track_id="1",
+                lyrics="Lyrics for track 1",
+                emotional_profile=expected_profile
+            )
+        ),
+        EmotionalProfileBatchResult(
+            track_id="2",
+            emotional_profile=EmotionalProfileResponse(
+                track_id="2",
+                lyrics="Lyrics for track 2",
+                emotional_profile=expected_profile
+            )
+        )
+    ]
+    mock_storage_service.retrieve_profiles.assert_called_once_with(
+        [hash_lyrics("Lyrics for track 1"), hash_lyrics("Lyrics for track 2")]
+    )
+    mock_model_service.agenerate_response.assert_called_once_with(
+        "Lyrics for track 2",
+        priority=Priority.BATCH,
+        usage_key=UsageKey(endpoint="profile")
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_per_track_error(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_storage_service.retrieve_profiles.return_value = {
+        hash_lyrics("Lyrics for track 1"): mock_emotional_profile_data
+    }
+    mock_storage_service.retrieve_profile.return_value = None
+    mock_model_service.agenerate_response.side_effect = ModelServiceException("Test")
+    requests = [
+        EmotionalProfileRequest(track_id="1", lyrics="Lyrics for track 1"),
+        EmotionalProfileRequest(track_id="2", lyrics="Lyrics for track 2")
+    ]
+
+    results = await data_service.get_emotional_profiles(requests)
+
+    assert results[0].emotional_profile is not None and results[0].error is None
+    assert results[1] == EmotionalProfileBatchResult(track_id="2", error="Failed to retrieve emotional profile")
+
+
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_bounded_concurrency(
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    data_service = DataService(
+        model_service_provider=Mock(return_value=mock_model_service),
+        storage_service=mock_storage_service,
+        batch_max_concurrency=2
+    )
+    mock_storage_service.retrieve_profiles.return_value = {}
+    mock_storage_service.retrieve_profile.return_value = None
+    in_flight = 0
+    max_in_flight = 0
+
+    async def agenerate_response(_, priority, **kwargs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return json.dumps(mock_emotional_profile_data)
+
+    mock_model_service.agenerate_response.side_effect = agenerate_response
+    requests = [EmotionalProfileRequest(track_id=str(i), lyrics=f"Lyrics for track {i}") for i in range(6)]
+
+    results = await data_service.get_emotional_profiles(requests)
+
+    assert all(result.error is None for result in results)
+    assert max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_per_track_timeout(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_storage_service.retrieve_profiles.return_value = {
+        hash_lyrics("Lyrics for track 1"): mock_emotional_profile_data
+    }
+    mock_storage_service.retrieve_profile.return_value = None
+    mock_model_service.agenerate_response.side_effect = TimeoutError("Test")
+    requests = [
+        EmotionalProfileRequest(track_id="1", lyrics="Lyrics for track 1"),
+        EmotionalProfileRequest(track_id="2", lyrics="Lyrics for track 2")
+    ]
+
+    results = await data_service.get_emotional_profiles(requests)
+
+    assert results[0].emotional_profile is not None and results[0].error is None
+    assert results[1] == EmotionalProfileBatchResult(track_id="2", error="Model call timed out")
+
+
+@pytest.mark.asyncio
+async def test_get_emotional_profiles_records_tracks_together(
+        data_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    lyrics_hash = hash_lyrics("Lyrics")
+    mock_storage_service.retrieve_profiles.return_value = {lyrics_hash: mock_emotional_profile_data}
+    requests = [EmotionalProfileRequest(track_id=str(i), lyrics="Lyrics") for i in range(3)]
+
+    await data_service.get_emotional_profiles(requests)
+
+    mock_storage_service.retrieve_tracks_lyrics_hashes.assert_called_once_with(["0", "1", "2"])
+    mock_storage_service.store_tracks.assert_called_once_with({"0": lyrics_hash, "1": lyrics_hash, "2": lyrics_hash})
+    mock_storage_service.retrieve_track_lyrics_hash.assert_not_called()
+    mock_storage_service.store_track.assert_not_called()
+
+
 # -------------------- EMOTIONAL TAGS -------------------- #
 @pytest.fixture
 def mock_emotional_tags_data() -> str:
@@ -218,11 +655,11 @@ async def test__get_emotional_tags_data_data_in_storage(
     mock_retrieve_tags.return_value = mock_emotional_tags_data
     mock_storage_service.retrieve_tags = mock_retrieve_tags
 
-    data = await data_service._get_emotional_tags_data(track_id="1", lyrics="Lyrics for track 1", emotion="joy")
+    data = await data_service._get_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics for track 1", emotion="joy")
 
     assert data == mock_emotional_tags_data
-    mock_storage_service.retrieve_tags.assert_called_once_with(track_id="1", emotion="joy")
-    mock_model_service.generate_response.assert_not_called()
+    mock_storage_service.retrieve_tags.assert_called_once_with(lyrics_hash="1", emotion="joy")
+    mock_model_service.agenerate_response.assert_not_called()
 
 
 # 2. Test that _get_emotional_tags_data calls model if data not in storage.
@@ -236,26 +673,56 @@ async def test__get_emotional_tags_data_data_not_in_storage(
     mock_retrieve_tags = AsyncMock()
     mock_retrieve_tags.return_value = None
     mock_storage_service.retrieve_tags = mock_retrieve_tags
-    mock_generate_response = Mock()
+    mock_generate_response = AsyncMock()
     mock_generate_response.return_value = mock_emotional_tags_data
-    mock_model_service.generate_response = mock_generate_response
-    track_id = "1"
+    mock_model_service.agenerate_response = mock_generate_response
+    lyrics_hash = "1"
     lyrics = "Lyrics for track 1"
     emotion = "joy"
 
-    data = await data_service._get_emotional_tags_data(track_id=track_id, lyrics=lyrics, emotion=emotion)
+    data = await data_service._get_emotional_tags_data(lyrics_hash=lyrics_hash, lyrics=lyrics, emotion=emotion)
 
     assert data == mock_emotional_tags_data
-    mock_storage_service.retrieve_tags.assert_called_once_with(track_id=track_id, emotion=emotion)
-    mock_model_service.generate_response.assert_called_once_with(f"\nEmotion to Tag: {emotion}\nLyrics: {lyrics}")
+    mock_storage_service.retrieve_tags.assert_called_once_with(lyrics_hash=lyrics_hash, emotion=emotion)
+    mock_model_service.agenerate_response.assert_called_once_with(
+        f"\nEmotion to Tag: {emotion}\nLyrics: {lyrics}",
+        usage_key=UsageKey(endpoint="tags", emotion=emotion)
+    )
     mock_storage_service.store_tags.assert_called_once_with(
-        track_id=track_id,
+        lyrics_hash=lyrics_hash,
         emotion=emotion,
         tags=mock_emotional_tags_data
     )
 
 
-# 3. Test that get_emotional_tags raises a DataServiceException if a ModelServiceException occurs.
+# 3. Test that concurrent _get_emotional_tags_data calls for the same track and emotion share one model call and write.
+@pytest.mark.asyncio
+async def test__get_emotional_tags_data_concurrent_misses_coalesced(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_tags_data
+):
+    mock_retrieve_tags = AsyncMock()
+    mock_retrieve_tags.return_value = None
+    mock_storage_service.retrieve_tags = mock_retrieve_tags
+    mock_generate_response = AsyncMock()
+    mock_generate_response.return_value = mock_emotional_tags_data
+    mock_model_service.agenerate_response = mock_generate_response
+
+    results = await asyncio.gather(
+        *(
+            data_service._get_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics for track 1", emotion="joy")
+            for _ in range(5)
+        )
+    )
+
+    assert results == [mock_emotional_tags_data] * 5
+    mock_model_service.agenerate_response.assert_called_once()
+    mock_storage_service.store_tags.assert_called_once()
+
+
+# 4. Test that get_emotional_tags raises a DataServiceException if a ModelServiceException occurs.
 @pytest.mark.asyncio
 async def test_get_emotional_tags_storage_failure(data_service, mock_emotional_tags_request):
     mock__get_emotional_tags_data = AsyncMock()
@@ -269,7 +736,7 @@ async def test_get_emotional_tags_storage_failure(data_service, mock_emotional_t
         await data_service.get_emotional_tags(mock_emotional_tags_request)
 
 
-# 4. Test that get_emotional_tags raises a DataServiceException if a StorageServiceException occurs.
+# 5. Test that get_emotional_tags raises a DataServiceException if a StorageServiceException occurs.
 @pytest.mark.asyncio
 async def test_get_emotional_tags_model_failure(data_service, mock_emotional_tags_request):
     mock__get_emotional_tags_data = AsyncMock()
@@ -283,7 +750,7 @@ async def test_get_emotional_tags_model_failure(data_service, mock_emotional_tag
         await data_service.get_emotional_tags(mock_emotional_tags_request)
 
 
-# 5. Test that get_emotional_tags raises a DataServiceException if data validation fails.
+# 6. Test that get_emotional_tags raises a DataServiceException if data validation fails.
 @pytest.mark.asyncio
 async def test_get_emotional_tags_data_validation_failure(data_service, mock_emotional_tags_request):
     mock__get_emotional_tags_data = AsyncMock()
@@ -294,7 +761,7 @@ async def test_get_emotional_tags_data_validation_failure(data_service, mock_emo
         await data_service.get_emotional_tags(mock_emotional_tags_request)
 
 
-# 6. Test that get_emotional_tags returns expected emotional tags.
+# 7. Test that get_emotional_tags returns expected emotional tags.
 @pytest.mark.asyncio
 async def test_get_emotional_tags_data_returns_expected_data(
         data_service,
@@ -312,3 +779,232 @@ async def test_get_emotional_tags_data_returns_expected_data(
         lyrics=mock_emotional_tags_data,
         emotion=Emotion.JOY
     )
+
+
+
+# -------------------- STREAM EMOTIONAL TAGS -------------------- #
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+# 1. Test that stream_emotional_tags yields stored tags without calling the model.
+# 2. Test that stream_emotional_tags yields model chunks and stores the cleaned full result.
+# 3. Test that stream_emotional_tags raises a DataServiceException if a ModelServiceException occurs.
+@pytest.mark.asyncio
+async def test_stream_emotional_tags_in_storage(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_tags_request,
+        mock_emotional_tags_data
+):
+    mock_storage_service.retrieve_tags.return_value = mock_emotional_tags_data
+
+    items = [item async for item in data_service.stream_emotional_tags(mock_emotional_tags_request)]
+
+    assert items == [
+        mock_emotional_tags_data,
+        EmotionalTagsResponse(track_id="1", lyrics=mock_emotional_tags_data, emotion=Emotion.JOY)
+    ]
+    mock_model_service.agenerate_response_stream.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stream_emotional_tags_not_in_storage(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_tags_request
+):
+    mock_storage_service.retrieve_tags.return_value = None
+    mock_model_service.agenerate_response_stream = Mock(
+        return_value=async_iter(['"<span class=\\"joy\\">', 'Lyrics</span> for track 1"'])
+    )
+
+    items = [item async for item in data_service.stream_emotional_tags(mock_emotional_tags_request)]
+
+    expected_tags = '<span class="joy">Lyrics</span> for track 1'
+    assert items == [
+        '"<span class=\\"joy\\">',
+        'Lyrics</span> for track 1"',
+        EmotionalTagsResponse(track_id="1", lyrics=expected_tags, emotion=Emotion.JOY)
+    ]
+    mock_model_service.agenerate_response_stream.assert_called_once_with(
+        "\nEmotion to Tag: joy\nLyrics: Lyrics for track 1",
+        usage_key=UsageKey(endpoint="tags_stream", emotion="joy")
+    )
+    mock_storage_service.store_tags.assert_called_once_with(
+        lyrics_hash=hash_lyrics("Lyrics for track 1"),
+        emotion="joy",
+        tags=expected_tags
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_emotional_tags_model_failure(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_tags_request
+):
+    async def failing_stream(_, **kwargs):
+        yield "chunk"
+        raise ModelServiceException("Test")
+
+    mock_storage_service.retrieve_tags.return_value = None
+    mock_model_service.agenerate_response_stream = failing_stream
+
+    with pytest.raises(DataServiceException, match="Failed to stream emotional tags for track_id: 1"):
+        _ = [item async for item in data_service.stream_emotional_tags(mock_emotional_tags_request)]
+
+    mock_storage_service.store_tags.assert_not_called()
+
+
+# -------------------- MULTI EMOTIONAL TAGS -------------------- #
+@pytest.fixture
+def mock_multi_emotional_tags_request() -> MultiEmotionalTagsRequest:
+    return MultiEmotionalTagsRequest(
+        track_id="1",
+        lyrics="Lyrics for track 1",
+        emotions=[Emotion.JOY, Emotion.ANGER, Emotion.LOVE]
+    )
+
+
+# 1. Test that _get_multi_emotional_tags_data does not call model if all emotions in storage.
+@pytest.mark.asyncio
+async def test__get_multi_emotional_tags_data_all_in_storage(data_service, mock_model_service, mock_storage_service):
+    stored_tags = {"joy": "joy tags", "anger": "anger tags"}
+    mock_storage_service.retrieve_tags_for_emotions.return_value = stored_tags
+
+    data = await data_service._get_multi_emotional_tags_data(
+        lyrics_hash="1",
+        lyrics="Lyrics",
+        emotions=["joy", "anger"]
+    )
+
+    assert data == stored_tags
+    mock_model_service.agenerate_response.assert_not_called()
+
+
+# 2. Test that _get_multi_emotional_tags_data makes one model call for the missing emotions and stores each of them.
+@pytest.mark.asyncio
+async def test__get_multi_emotional_tags_data_missing_emotions(data_service, mock_model_service, mock_storage_service):
+    mock_storage_service.retrieve_tags_for_emotions.return_value = {"joy": "joy tags"}
+    mock_model_service.agenerate_response.return_value = {"anger": "anger tags", "love": "love tags"}
+
+    data = await data_service._get_multi_emotional_tags_data(
+        lyrics_hash="1",
+        lyrics="Lyrics",
+        emotions=["joy", "anger", "love"]
+    )
+
+    assert data == {"joy": "joy tags", "anger": "anger tags", "love": "love tags"}
+    mock_model_service.agenerate_response.assert_called_once_with(
+        "\nEmotions to Tag: anger, love\nLyrics: Lyrics",
+        priority=Priority.INTERACTIVE,
+        usage_key=UsageKey(endpoint="multi_tags", emotions=("anger", "love"))
+    )
+    assert mock_storage_service.store_tags.call_args_list == [
+        call(lyrics_hash="1", emotion="anger", tags="anger tags"),
+        call(lyrics_hash="1", emotion="love", tags="love tags")
+    ]
+
+
+# 3. Test that _get_multi_emotional_tags_data raises ModelServiceException if the response is missing an emotion.
+@pytest.mark.asyncio
+async def test__get_multi_emotional_tags_data_incomplete_response(
+        data_service,
+        mock_model_service,
+        mock_storage_service
+):
+    mock_storage_service.retrieve_tags_for_emotions.return_value = {}
+    mock_model_service.agenerate_response.return_value = {"anger": "anger tags"}
+
+    with pytest.raises(ModelServiceException, match="Model response is missing tags for emotions"):
+        await data_service._get_multi_emotional_tags_data(lyrics_hash="1", lyrics="Lyrics", emotions=["anger", "love"])
+
+    mock_storage_service.store_tags.assert_not_called()
+
+
+# 4. Test that get_multi_emotional_tags raises a DataServiceException if a ModelServiceException occurs.
+@pytest.mark.asyncio
+async def test_get_multi_emotional_tags_model_failure(data_service, mock_multi_emotional_tags_request):
+    mock__get_multi_emotional_tags_data = AsyncMock()
+    mock__get_multi_emotional_tags_data.side_effect = ModelServiceException("Test")
+    data_service._get_multi_emotional_tags_data = mock__get_multi_emotional_tags_data
+
+    with pytest.raises(
+            DataServiceException,
+            match="Failed to retrieve emotional tags for track_id: 1, lyrics: Lyrics for track 1"
+    ):
+        await data_service.get_multi_emotional_tags(mock_multi_emotional_tags_request)
+
+
+# 5. Test that get_multi_emotional_tags returns a response per emotion in the order requested.
+@pytest.mark.asyncio
+async def test_get_multi_emotional_tags_returns_expected_data(data_service, mock_multi_emotional_tags_request):
+    mock__get_multi_emotional_tags_data = AsyncMock()
+    mock__get_multi_emotional_tags_data.return_value = {"love": "love tags", "joy": "joy tags", "anger": "anger tags"}
+    data_service._get_multi_emotional_tags_data = mock__get_multi_emotional_tags_data
+
+    res = await data_service.get_multi_emotional_tags(mock_multi_emotional_tags_request)
+
+    assert res == [
+        EmotionalTagsResponse(track_id="1", lyrics="joy tags", emotion=Emotion.JOY),
+        EmotionalTagsResponse(track_id="1", lyrics="anger tags", emotion=Emotion.ANGER),
+        EmotionalTagsResponse(track_id="1", lyrics="love tags", emotion=Emotion.LOVE)
+    ]
+
+
+# -------------------- METRICS -------------------- #
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+# 1. Test that storage lookups are counted as hits or misses, per result, and that each stage is timed.
+# 2. Test that each profile looked up for a batch request with hits and misses is counted once.
+@pytest.mark.asyncio
+async def test_storage_lookups_and_stages_recorded(data_service, mock_model_service, mock_storage_service):
+    mock_storage_service.retrieve_tags_for_emotions.return_value = {"joy": "joy tags"}
+    mock_model_service.agenerate_response.return_value = {"anger": "anger tags", "love": "love tags"}
+    hits = sample("storage_lookups_total", kind="tags", result="hit")
+    misses = sample("storage_lookups_total", kind="tags", result="miss")
+    stages = {
+        stage: sample("request_stage_seconds_count", stage=stage)
+        for stage in ["storage_lookup", "response_validation"]
+    }
+
+    await data_service.get_multi_emotional_tags(
+        MultiEmotionalTagsRequest(track_id="1", lyrics="Lyrics", emotions=[Emotion.JOY, Emotion.ANGER, Emotion.LOVE])
+    )
+
+    assert sample("storage_lookups_total", kind="tags", result="hit") == hits + 1
+    assert sample("storage_lookups_total", kind="tags", result="miss") == misses + 2
+    # the track's lyrics hash and its tags are both looked up
+    assert sample("request_stage_seconds_count", stage="storage_lookup") == stages["storage_lookup"] + 2
+    assert sample("request_stage_seconds_count", stage="response_validation") == stages["response_validation"] + 1
+
+
+@pytest.mark.asyncio
+async def test_storage_lookups_counted_once_for_batch(
+        data_service,
+        mock_model_service,
+        mock_storage_service,
+        mock_emotional_profile_data
+):
+    mock_storage_service.retrieve_profiles.return_value = {
+        hash_lyrics("Lyrics for track 1"): mock_emotional_profile_data
+    }
+    mock_storage_service.retrieve_profile.return_value = None
+    mock_model_service.agenerate_response.return_value = json.dumps(mock_emotional_profile_data)
+    hits = sample("storage_lookups_total", kind="profile", result="hit")
+    misses = sample("storage_lookups_total", kind="profile", result="miss")
+
+    await data_service.get_emotional_profiles([
+        EmotionalProfileRequest(track_id="1", lyrics="Lyrics for track 1"),
+        EmotionalProfileRequest(track_id="2", lyrics="Lyrics for track 2")
+    ])
+
+    assert sample("storage_lookups_total", kind="profile", result="hit") == hits + 1
+    assert sample("storage_lookups_total", kind="profile", result="miss") == misses + 1
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from analysis_api.services.deadline import Deadline, without_deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# 1. Test that remaining counts down with the clock and stops at 0 once the deadline has expired.
+# 2. Test that current returns None outside a scope and the deadline inside it, including in tasks started within it.
+# 3. Test that scope raises TimeoutError and cancels the work if the deadline expires.
+# 4. Test that scope lets work that finishes in time complete.
+# 5. Test that without_deadline hides the deadline from the work, and from tasks it starts, but not from the caller.
+# 6. Test that extend moves the deadline later, but never earlier, including for a scope already enforcing it.
+# 7. Test that extend lifts the deadline if given no time, so current no longer reports it.
+def test_remaining():
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+
+    clock.now = 4
+    assert deadline.remaining() == 6 and not deadline.expired
+
+    clock.now = 12
+    assert deadline.remaining() == 0 and deadline.expired
+
+
+@pytest.mark.asyncio
+async def test_current():
+    deadline = Deadline(10)
+
+    assert Deadline.current() is None
+
+    async with deadline.scope():
+        assert Deadline.current() is deadline
+        assert await asyncio.ensure_future(asyncio.sleep(0, result=Deadline.current())) is deadline
+
+    assert Deadline.current() is None
+
+
+@pytest.mark.asyncio
+async def test_scope_expires():
+    cancelled = False
+
+    async def work():
+        nonlocal cancelled
+
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    with pytest.raises(TimeoutError):
+        async with Deadline(0.01).scope():
+            await work()
+
+    assert cancelled
+    assert Deadline.current() is None
+
+
+@pytest.mark.asyncio
+async def test_scope_completes_in_time():
+    async with Deadline(10).scope():
+        result = await asyncio.sleep(0, result="done")
+
+    assert result == "done"
+
+
+@pytest.mark.asyncio
+async def test_without_deadline():
+    async def current() -> Deadline | None:
+        await asyncio.sleep(0)
+        return Deadline.current()
+
+    deadline = Deadline(10)
+
+    async with deadline.scope():
+        assert await without_deadline(current()) is None
+        assert await asyncio.ensure_future(without_deadline(current())) is None
+        assert Deadline.current() is deadline
+
+
+@pytest.mark.asyncio
+async def test_extend():
+    deadline = Deadline(0.01)
+
+    async with deadline.scope():
+        deadline.extend(0.001)
+        deadline.extend(5)
+        await asyncio.sleep(0.05)
+
+    assert 4 < deadline.remaining() < 5
+
+
+@pytest.mark.asyncio
+async def test_extend_lifts_deadline():
+    deadline = Deadline(0.01)
+
+    async with deadline.scope():
+        deadline.extend(None)
+        await asyncio.sleep(0.05)
+
+        assert Deadline.current() is None
@@ -0,0 +1,170 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from analysis_api.models import PrecomputeJobRequest, EmotionalProfileBatchResult, EmotionalProfileResponse, \
+    EmotionalProfile, JobStatus, Emotion
+from analysis_api.services.data_service import DataService, DataServiceException
+from analysis_api.services.job_service import JobService
+from analysis_api.services.model_limiter import Priority
+
+
+def profile_result(track_id: str, **proportions: float) -> EmotionalProfileBatchResult:
+    emotional_profile = {emotion.value: 0 for emotion in Emotion} | proportions
+    return EmotionalProfileBatchResult(
+        track_id=track_id,
+        emotional_profile=EmotionalProfileResponse(
+            track_id=track_id,
+            lyrics="Lyrics",
+            emotional_profile=EmotionalProfile(**emotional_profile)
+        )
+    )
+
+
+@pytest.fixture
+def mock_data_service() -> Mock:
+    mock = Mock(spec=DataService)
+    mock.batch_max_concurrency = 2
+
+    async def get_emotional_profiles(requests):
+        return [profile_result(request.track_id, joy=0.5, anger=0.3, love=0.2) for request in requests]
+
+    mock.get_emotional_profiles = AsyncMock(side_effect=get_emotional_profiles)
+    mock.get_multi_emotional_tags = AsyncMock()
+    return mock
+
+
+@pytest.fixture
+def job_service(mock_data_service) -> JobService:
+    @asynccontextmanager
+    async def data_service_factory():
+        yield mock_data_service
+
+    return JobService(data_service_factory=data_service_factory, chunk_size=2)
+
+
+def precompute_job_request(track_count: int, tag_dominant_emotions: int = 0) -> PrecomputeJobRequest:
+    return PrecomputeJobRequest(
+        tracks=[{"track_id": str(i), "lyrics": "Lyrics"} for i in range(track_count)],
+        tag_dominant_emotions=tag_dominant_emotions
+    )
+
+
+async def wait_for_job(job_service: JobService):
+    await asyncio.gather(*job_service._tasks)
+
+
+# 1. Test that submit returns a queued job that can be retrieved by its ID.
+# 2. Test that a job processes its tracks in chunks and reports them as completed.
+# 3. Test that tracks with an error in their result are reported as failed.
+# 4. Test that a job stores emotional tags for the dominant emotions at batch priority if requested.
+# 5. Test that a job fails if the stored profiles cannot be retrieved.
+# 6. Test that jobs beyond max_concurrent_jobs are queued until a running job finishes.
+# 7. Test that only the most recent max_retained_jobs finished jobs are kept.
+# 8. Test that stop cancels jobs that have not finished.
+@pytest.mark.asyncio
+async def test_submit(job_service):
+    job = job_service.submit(precompute_job_request(3))
+
+    assert job.status == JobStatus.QUEUED and job.total == 3
+    assert job_service.get(job.job_id) is job
+    assert job_service.get("unknown") is None
+
+    await wait_for_job(job_service)
+
+
+@pytest.mark.asyncio
+async def test_job_processes_tracks_in_chunks(job_service, mock_data_service):
+    job = job_service.submit(precompute_job_request(5))
+    await wait_for_job(job_service)
+
+    assert job.status == JobStatus.COMPLETED and job.completed == 5 and job.failed == 0
+    assert [len(c.args[0]) for c in mock_data_service.get_emotional_profiles.call_args_list] == [2, 2, 1]
+    mock_data_service.get_multi_emotional_tags.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_job_reports_failed_tracks(job_service, mock_data_service):
+    mock_data_service.get_emotional_profiles.side_effect = lambda requests: [
+        EmotionalProfileBatchResult(track_id=request.track_id, error="Failed") for request in requests
+    ]
+
+    job = job_service.submit(precompute_job_request(3))
+    await wait_for_job(job_service)
+
+    assert job.status == JobStatus.COMPLETED and job.completed == 0 and job.failed == 3
+
+
+@pytest.mark.asyncio
+async def test_job_stores_dominant_emotional_tags(job_service, mock_data_service):
+    job = job_service.submit(precompute_job_request(1, tag_dominant_emotions=2))
+    await wait_for_job(job_service)
+
+    assert job.status == JobStatus.COMPLETED and job.completed == 1
+    request = mock_data_service.get_multi_emotional_tags.call_args.args[0]
+    assert request.emotions == [Emotion.JOY, Emotion.ANGER]
+    assert mock_data_service.get_multi_emotional_tags.call_args.kwargs == {"priority": Priority.BATCH}
+
+
+@pytest.mark.asyncio
+async def test_job_fails_if_stored_profiles_cannot_be_retrieved(job_service, mock_data_service):
+    mock_data_service.get_emotional_profiles.side_effect = DataServiceException("Test")
+
+    job = job_service.submit(precompute_job_request(3))
+    await wait_for_job(job_service)
+
+    assert job.status == JobStatus.FAILED and job.error == "Failed to retrieve stored emotional profiles"
+
+
+@pytest.mark.asyncio
+async def test_jobs_queued_beyond_max_concurrent_jobs(job_service, mock_data_service):
+    release = asyncio.Event()
+
+    async def get_emotional_profiles(requests):
+        await release.wait()
+        return [profile_result(request.track_id, joy=1) for request in requests]
+
+    mock_data_service.get_emotional_profiles.side_effect = get_emotional_profiles
+
+    first_job = job_service.submit(precompute_job_request(1))
+    second_job = job_service.submit(precompute_job_request(1))
+    await asyncio.sleep(0)
+
+    assert first_job.status == JobStatus.RUNNING and second_job.status == JobStatus.QUEUED
+
+    release.set()
+    await wait_for_job(job_service)
+
+    assert first_job.status == second_job.status == JobStatus.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_evicted(job_service):
+    job_service.max_retained_jobs = 1
+
+    first_job = job_service.submit(precompute_job_request(1))
+    await wait_for_job(job_service)
+    second_job = job_service.submit(precompute_job_request(1))
+    await wait_for_job(job_service)
+    job_service.submit(precompute_job_request(1))
+
+    assert job_service.get(first_job.job_id) is None
+    assert job_service.get(second_job.job_id) is second_job
+
+    await wait_for_job(job_service)
+
+
+@pytest.mark.asyncio
+async def test_stop(job_service, mock_data_service):
+    async def get_emotional_profiles(_):
+        await asyncio.Event().wait()
+
+    mock_data_service.get_emotional_profiles.side_effect = get_emotional_profiles
+
+    job = job_service.submit(precompute_job_request(1))
+    await asyncio.sleep(0)
+    await job_service.stop()
+
+    assert job.status == JobStatus.FAILED and job.error == "Job was cancelled"
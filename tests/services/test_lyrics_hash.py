@@ -0,0 +1,26 @@
+from analysis_api.services.lyrics_hash import normalise_lyrics, hash_lyrics
+
+
+# 1. Test that normalise_lyrics collapses whitespace and removes blank lines.
+# 2. Test that normalise_lyrics converts lyrics to NFC form.
+# 3. Test that normalise_lyrics preserves case.
+# 4. Test that hash_lyrics returns the same hash for lyrics that differ only in formatting.
+# 5. Test that hash_lyrics returns different hashes for different lyrics.
+def test_normalise_lyrics_whitespace():
+    assert normalise_lyrics("  Hello\tthere  \r\n\r\n\nGeneral   Kenobi \n") == "Hello there\nGeneral Kenobi"
+
+
+def test_normalise_lyrics_unicode():
+    assert normalise_lyrics("Cafe\u0301") == "Caf\u00e9"
+
+
+def test_normalise_lyrics_preserves_case():
+    assert normalise_lyrics("I WILL hurt you") == "I WILL hurt you"
+
+
+def test_hash_lyrics_formatting_ignored():
+    assert hash_lyrics("Hello there\nGeneral Kenobi") == hash_lyrics("Hello  there\r\n\r\nGeneral Kenobi\n")
+
+
+def test_hash_lyrics_different_lyrics():
+    assert hash_lyrics("Hello there") != hash_lyrics("Hello here")
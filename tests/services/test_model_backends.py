@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+from dataclasses import asdict
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from google import genai
+from google.genai import errors
+
+from analysis_api.main import create_model_backends
+from analysis_api.services.model_backends.base import api_error
+from analysis_api.models import Emotion, EmotionalProfile
+from analysis_api.services.model_backends.fake import FakeModelBackend
+from analysis_api.services.model_backends.gemini import GeminiModelBackend
+from analysis_api.services.model_backends.replay import ReplayModelBackend, hash_prompt, RecordingModelBackend, \
+    RecordingWriter, RecordedResponse, load_recording
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
+from analysis_api.services.model_service import ModelService, PromptType, ModelServiceException, RetryPolicy
+from analysis_api.settings import Settings
+
+
+CONTENTS = ModelService._generate_contents("\nLyrics: Lyrics")
+
+
+def fake_model_service(prompt_type: PromptType, **kwargs) -> ModelService:
+    return ModelService(backend=FakeModelBackend(prompt_type, **kwargs), model="fake", prompt_template="")
+
+
+# 1. Test that the fake emotional profile is a valid profile that is the same for the same lyrics.
+# 2. Test that the fake emotional tags are the lyrics, for one emotion or for every emotion.
+# 3. Test that the fake response is streamed in several chunks.
+# 4. Test that the fake injects errors at the given rate, which are retried by the model service.
+# 5. Test that the replay backend serves the recorded response to a prompt, and fails for unrecorded prompts.
+# 6. Test that the Gemini backend delegates to the GenAI client.
+# 7. Test that create_model_backends builds the backend selected in the settings.
+# 8. Test that calls recorded by the recording backend, including failures and streams, are replayed in order.
+# 9. Test that the replay backend reproduces recorded latencies, divided by the speedup.
+# 10. Test that create_model_backends records the calls to the selected backend if a recording path is set.
+# 11. Test that the fake reports token counts with its responses, including with the last chunk of a stream.
+# 12. Test that the replay backend serves streamed and unary calls for the same prompt from their own recordings.
+@pytest.mark.asyncio
+async def test_emotional_profile():
+    model_service = fake_model_service(PromptType.EMOTIONAL_PROFILE)
+
+    profile = json.loads(await model_service.agenerate_response("Lyrics"))
+
+    assert EmotionalProfile(**profile)
+    assert json.loads(await model_service.agenerate_response("Lyrics")) == profile
+    assert json.loads(model_service.generate_response("Other lyrics")) != profile
+
+
+@pytest.mark.asyncio
+async def test_emotional_tags():
+    tags = await fake_model_service(PromptType.EMOTIONAL_TAGS).agenerate_response(
+        "\nEmotion to Tag: joy\nLyrics: Lyrics"
+    )
+    multi_tags = await fake_model_service(PromptType.EMOTIONAL_MULTI_TAGS).agenerate_response(
+        "\nEmotions to Tag: joy, anger\nLyrics: Lyrics"
+    )
+
+    assert tags == "Lyrics"
+    assert multi_tags == {emotion.value: "Lyrics" for emotion in Emotion}
+
+
+@pytest.mark.asyncio
+async def test_stream():
+    model_service = fake_model_service(PromptType.EMOTIONAL_TAGS)
+
+    chunks = [chunk async for chunk in model_service.agenerate_response_stream("\nLyrics: Some lyrics to tag")]
+
+    assert len(chunks) > 1 and "".join(chunks) == "Some lyrics to tag"
+
+
+@pytest.mark.asyncio
+async def test_fake_error_injection():
+    failing = fake_model_service(PromptType.EMOTIONAL_TAGS, error_rate=1.0, error_code=503)
+
+    with pytest.raises(ModelServiceException, match="503"):
+        await failing.agenerate_response("\nLyrics: Lyrics")
+
+    # with a fixed seed, the same calls fail on every run, so some of them need a retry
+    flaky = fake_model_service(PromptType.EMOTIONAL_TAGS, error_rate=0.5, seed=1)
+    flaky.retry_policy = RetryPolicy(max_attempts=10, initial_backoff_seconds=0)
+    flaky.backend.agenerate_content = AsyncMock(wraps=flaky.backend.agenerate_content)
+
+    for _ in range(5):
+        assert await flaky.agenerate_response("\nLyrics: Lyrics") == "Lyrics"
+
+    assert flaky.backend.agenerate_content.await_count > 5
+
+
+@pytest.mark.asyncio
+async def test_replay(tmp_path):
+    model_service = ModelService(backend=Mock(), model="fake", prompt_template="Prompt")
+    contents = model_service._generate_contents("Prompt\nLyrics")
+    recording_path = tmp_path / "recording.jsonl"
+    recording_path.write_text(json.dumps({"prompt_hash": hash_prompt(contents), "text": '{"response": "Tag"}'}) + "\n")
+    model_service.backend = ReplayModelBackend(recording_path)
+
+    assert await model_service.agenerate_response("Lyrics") == "Tag"
+    assert model_service.generate_response("Lyrics") == "Tag"
+    chunks = [chunk async for chunk in model_service.agenerate_response_stream("Lyrics")]
+    assert "".join(chunks) == '{"response": "Tag"}'
+
+    with pytest.raises(errors.ClientError, match="No recorded unary response"):
+        await model_service.backend.agenerate_content(
+            model="fake",
+            contents=model_service._generate_contents("Prompt\nOther lyrics"),
+            config=model_service.config
+        )
+
+
+@pytest.mark.asyncio
+async def test_gemini():
+    client = Mock(spec=genai.Client)
+    client.aio.models.generate_content = AsyncMock(return_value=Mock(text='{"response": "Tag"}'))
+    model_service = ModelService(backend=GeminiModelBackend(client), model="gemini", prompt_template="")
+
+    assert await model_service.agenerate_response("Lyrics") == "Tag"
+    assert client.aio.models.generate_content.call_args.kwargs["model"] == "gemini"
+
+
+def fake_settings(**kwargs) -> Settings:
+    return Settings.model_construct(
+        **{
+            "model_backend": "fake",
+            "model_fake_latency_seconds": 0.0,
+            "model_fake_latency_jitter_seconds": 0.0,
+            "model_fake_error_rate": 0.0,
+            "model_fake_error_code": 503,
+            "model_replay_path": None,
+            "model_replay_speedup": 1.0,
+            "model_record_path": None,
+            "model_record_prompts": True
+        } | kwargs
+    )
+
+
+@pytest.mark.parametrize("model_backend, backend_type", [("fake", FakeModelBackend), ("replay", ReplayModelBackend)])
+def test_create_model_backends(tmp_path, model_backend, backend_type):
+    recording_path = tmp_path / "recording.jsonl"
+    recording_path.touch()
+    settings = fake_settings(model_backend=model_backend, model_replay_path=recording_path)
+
+    model_backends = create_model_backends(settings, genai_client=None)
+
+    assert set(model_backends) == set(PromptType)
+    assert all(isinstance(backend, backend_type) for backend in model_backends.values())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("file_name", ["recording.jsonl", "recording.jsonl.gz"])
+async def test_record_and_replay(tmp_path, file_name):
+    recording_path = tmp_path / file_name
+    fake = FakeModelBackend(PromptType.EMOTIONAL_TAGS)
+    response = await fake.agenerate_content("", CONTENTS, None)
+    fake.agenerate_content = AsyncMock(side_effect=[api_error(503, "Unavailable"), response])
+    writer = RecordingWriter(recording_path)
+    model_service = fake_model_service(PromptType.EMOTIONAL_TAGS)
+    model_service.backend = RecordingModelBackend(fake, writer)
+    model_service.retry_policy = RetryPolicy(max_attempts=2, initial_backoff_seconds=0)
+
+    assert await model_service.agenerate_response("\nLyrics: Lyrics") == "Lyrics"
+    chunks = [chunk async for chunk in model_service.agenerate_response_stream("\nLyrics: Streamed")]
+    assert "".join(chunks) == "Streamed"
+    model_service.backend.close()
+
+    recorded = load_recording(recording_path)
+    assert [(call.error_code, call.text is None) for call in recorded] == [(503, True), (None, False), (None, False)]
+    assert [call.stream for call in recorded] == [False, False, True]
+    assert all(call.prompt is not None and call.started_at is not None for call in recorded)
+
+    model_service.backend = ReplayModelBackend(recording_path, speedup=None)
+    model_service.backend.agenerate_content = AsyncMock(wraps=model_service.backend.agenerate_content)
+
+    assert await model_service.agenerate_response("\nLyrics: Lyrics") == "Lyrics"
+    assert model_service.backend.agenerate_content.await_count == 2
+    chunks = [chunk async for chunk in model_service.agenerate_response_stream("\nLyrics: Streamed")]
+    assert "".join(chunks) == "Streamed"
+
+
+@pytest.mark.asyncio
+async def test_replay_latency(tmp_path):
+    recording_path = tmp_path / "recording.jsonl"
+    recorded = RecordedResponse(prompt_hash=hash_prompt(CONTENTS), text='{"response": "Tag"}', latency_seconds=1.0)
+    recording_path.write_text(json.dumps(asdict(recorded)) + "\n")
+    backend = ReplayModelBackend(recording_path, speedup=10)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(backend.agenerate_content("", CONTENTS, None) for _ in range(3)))
+
+    assert 0.09 < time.perf_counter() - started < 0.5
+
+
+def test_create_model_backends_recording(tmp_path):
+    recording_path = tmp_path / "recording.jsonl"
+    settings = fake_settings(model_record_path=recording_path, model_record_prompts=False)
+
+    model_backends = create_model_backends(settings, genai_client=None)
+    model_backends[PromptType.EMOTIONAL_TAGS].generate_content("", CONTENTS, None)
+    model_backends[PromptType.EMOTIONAL_PROFILE].generate_content("", CONTENTS, None)
+
+    for backend in model_backends.values():
+        assert isinstance(backend, RecordingModelBackend)
+        backend.close()
+
+    recorded = load_recording(recording_path)
+    assert len(recorded) == 2 and all(call.prompt is None for call in recorded)
+
+
+@pytest.mark.asyncio
+async def test_fake_reports_token_usage():
+    backend = FakeModelBackend(PromptType.EMOTIONAL_TAGS)
+    tracker = TokenUsageTracker()
+    model_service = ModelService(backend=backend, model="fake", prompt_template="", usage_tracker=tracker)
+
+    response = await backend.agenerate_content(model="fake", contents=CONTENTS, config=None)
+    chunks = [chunk async for chunk in await backend.agenerate_content_stream(model="fake", contents=CONTENTS, config=None)]
+
+    assert response.usage_metadata.prompt_token_count > 0
+    assert response.usage_metadata.total_token_count == (
+        response.usage_metadata.prompt_token_count + response.usage_metadata.candidates_token_count
+    )
+    assert [chunk.usage_metadata is not None for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+
+    await model_service.agenerate_response("\nEmotion to Tag: joy\nLyrics: Lyrics", usage_key=UsageKey("tags", "joy"))
+
+    assert tracker.tokens_used_today > 0
+
+
+@pytest.mark.asyncio
+async def test_replay_by_call_kind(tmp_path):
+    recording_path = tmp_path / "recording.jsonl"
+    recording_path.write_text("".join(
+        json.dumps(asdict(RecordedResponse(prompt_hash=hash_prompt(CONTENTS), text=text, stream=stream))) + "\n"
+        for text, stream in [('{"response": "Streamed"}', True), ('{"response": "Unary"}', False)]
+    ))
+    backend = ReplayModelBackend(recording_path, speedup=None)
+
+    response = await backend.agenerate_content("", CONTENTS, None)
+    chunks = [chunk.text async for chunk in await backend.agenerate_content_stream("", CONTENTS, None)]
+
+    assert response.text == '{"response": "Unary"}'
+    assert "".join(chunks) == '{"response": "Streamed"}'
+    assert backend.generate_content("", CONTENTS, None).text == '{"response": "Unary"}'
+
+    recording_path.write_text(
+        json.dumps(asdict(RecordedResponse(prompt_hash=hash_prompt(CONTENTS), text="Unary", stream=False))) + "\n"
+    )
+
+    with pytest.raises(errors.ClientError, match="No recorded streamed response"):
+        await ReplayModelBackend(recording_path).agenerate_content_stream("", CONTENTS, None)
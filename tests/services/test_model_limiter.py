@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from analysis_api.services.model_limiter import ModelCallLimiter, Priority
+
+
+async def hold_slot(limiter: ModelCallLimiter, priority: Priority, order: list[str], name: str, release: asyncio.Event):
+    async with limiter.slot(priority):
+        order.append(name)
+        await release.wait()
+
+
+# 1. Test that ModelCallLimiter raises ValueError if max_concurrency is less than 1.
+# 2. Test that no more than max_concurrency slots are held at once.
+# 3. Test that waiting interactive calls are given a slot before waiting batch calls.
+# 4. Test that waiting calls with the same priority are given a slot in the order they arrived.
+# 5. Test that a cancelled waiter does not take a slot.
+# 6. Test that queue_depth counts the calls waiting for a slot.
+def test_model_call_limiter_invalid_max_concurrency():
+    with pytest.raises(ValueError, match="max_concurrency must be at least 1"):
+        ModelCallLimiter(max_concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_slots_bounded():
+    limiter = ModelCallLimiter(max_concurrency=2)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def call():
+        nonlocal in_flight, max_in_flight
+        async with limiter.slot():
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert max_in_flight == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_before_batch():
+    limiter = ModelCallLimiter(max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+    release.set()
+
+    async with limiter.slot():
+        batch = asyncio.create_task(hold_slot(limiter, Priority.BATCH, order, "batch", release))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(hold_slot(limiter, Priority.INTERACTIVE, order, "interactive", release))
+        await asyncio.sleep(0)
+
+    await asyncio.gather(batch, interactive)
+
+    assert order == ["interactive", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_same_priority_fifo():
+    limiter = ModelCallLimiter(max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+    release.set()
+
+    async with limiter.slot():
+        tasks = []
+        for name in ["first", "second", "third"]:
+            tasks.append(asyncio.create_task(hold_slot(limiter, Priority.BATCH, order, name, release)))
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*tasks)
+
+    assert order == ["first", "second", "third"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_take_slot():
+    limiter = ModelCallLimiter(max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+    release.set()
+
+    async with limiter.slot():
+        cancelled = asyncio.create_task(hold_slot(limiter, Priority.INTERACTIVE, order, "cancelled", release))
+        waiting = asyncio.create_task(hold_slot(limiter, Priority.INTERACTIVE, order, "waiting", release))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+    await waiting
+
+    assert order == ["waiting"]
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_depth():
+    limiter = ModelCallLimiter(max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+
+    holder = asyncio.create_task(hold_slot(limiter, Priority.INTERACTIVE, order, "holder", release))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(hold_slot(limiter, Priority.BATCH, order, str(i), release))
+        for i in range(3)
+    ]
+    await asyncio.sleep(0)
+
+    assert limiter.in_flight == 1
+    assert limiter.queue_depth == 3
+
+    release.set()
+    await asyncio.gather(holder, *waiters)
+
+    assert limiter.queue_depth == 0
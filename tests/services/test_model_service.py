@@ -1,12 +1,18 @@
+import asyncio
 import json
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
+import httpx
 import pytest
-import requests
-from google import genai
 from google.genai import types, errors
 
-from analysis_api.services.model_service import ModelService, ModelServiceException
+from analysis_api.services.model_limiter import ModelCallLimiter, Priority
+from analysis_api.services.circuit_breaker import CircuitBreaker
+from analysis_api.services.deadline import Deadline
+from analysis_api.services.model_backends.base import ModelBackend, api_error as backend_api_error
+from analysis_api.services.model_service import ModelService, ModelServiceException, DEFAULT_RESPONSE_SCHEMA, \
+    RetryPolicy, ModelServiceUnavailableException, TokenBudgetExhaustedException
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
 
 
 # 1. Test that generate_response raises ModelServiceException if response.text not valid JSON.
@@ -15,11 +21,39 @@ from analysis_api.services.model_service import ModelService, ModelServiceExcept
 # 4. Test that generate_response raises ModelServiceException if Model API errors occurs.
 # 5. Test that generate_response returns expected string.
 # 6. Test that generate_response returns expected JSON.
+# 7. Test that agenerate_response raises ModelServiceException if response.text not valid JSON.
+# 8. Test that agenerate_response raises ModelServiceException if Model API errors occurs.
+# 9. Test that agenerate_response returns expected response using the async client.
+# 10. Test that the content config uses the default response schema unless one is given.
+# 11. Test that agenerate_response_stream yields each chunk of the response as plain text.
+# 12. Test that agenerate_response_stream raises ModelServiceException if Model API errors occurs.
+# 13. Test that agenerate_response waits for a slot from the limiter before calling the model.
+# 14. Test that agenerate_response retries retryable errors and returns the response of a successful retry.
+# 15. Test that agenerate_response does not retry errors that are not retryable.
+# 16. Test that agenerate_response_stream retries an error raised before the first chunk.
+# 17. Test that RetryPolicy.retry_delay does not retry non-retryable errors or beyond max_attempts.
+# 18. Test that RetryPolicy.retry_delay bounds the jittered backoff.
+# 19. Test that RetryPolicy.retry_delay waits at least as long as the Retry-After header.
+# 20. Test that RetryPolicy.retry_delay does not retry past the deadline.
+# 21. Test that agenerate_response raises ModelServiceUnavailableException without calling the model if the circuit
+#     breaker is open.
+# 22. Test that agenerate_response records server errors, but not client errors, as circuit breaker failures.
+# 23. Test that agenerate_response bounds the model call by the time left before the request deadline.
+# 24. Test that agenerate_response raises TimeoutError without calling the model if the request deadline has expired.
+# 25. Test that agenerate_response does not retry if the backoff would outlast the request deadline.
+# 26. Test that batch_request builds a request with the prompt and generation settings, which batch_input recovers the
+#     input data from.
+# 27. Test that batch_input raises ModelServiceException if the request was not built with the prompt.
+# 28. Test that parse_batch_response returns the parsed response, and raises ModelServiceException if it has no text.
+# 29. Test that agenerate_response records the token usage of the response under the usage key.
+# 30. Test that agenerate_response raises TokenBudgetExhaustedException without calling the model if the daily token
+#     budget is used up, unless the call is interactive.
+# 31. Test that agenerate_response records model calls that time out as circuit breaker failures.
 
 
 @pytest.fixture
-def mock_client() -> Mock:
-    return Mock(spec=genai.Client)
+def mock_backend() -> Mock:
+    return Mock(spec=ModelBackend)
 
 
 @pytest.fixture
@@ -39,10 +73,25 @@ def mock_generate_content() -> Mock:
 
 
 @pytest.fixture
-def model_service(mock_client, mock__generate_contents, mock_generate_content) -> ModelService:
-    ms = ModelService(client=mock_client, model="", prompt_template="")
+def mock_agenerate_content() -> AsyncMock:
+    mock = AsyncMock()
+    mock_response = Mock()
+    mock_response.text = ""
+    mock.return_value = mock_response
+    return mock
+
+
+@pytest.fixture
+def model_service(
+        mock_backend,
+        mock__generate_contents,
+        mock_generate_content,
+        mock_agenerate_content
+) -> ModelService:
+    ms = ModelService(backend=mock_backend, model="", prompt_template="")
     ms._generate_contents = mock__generate_contents
-    ms.client.models.generate_content = mock_generate_content
+    ms.backend.generate_content = mock_generate_content
+    ms.backend.agenerate_content = mock_agenerate_content
     return ms
 
 
@@ -68,8 +117,7 @@ def test_generate_response_no_response_key_in_json(model_service, mock_generate_
 
 
 def test_generate_response_api_error(model_service, mock_generate_content):
-    mock_response = Mock(spec=requests.Response)
-    mock_generate_content.side_effect = errors.APIError(code=500, response=mock_response)
+    mock_generate_content.side_effect = api_error(500)
 
     with pytest.raises(ModelServiceException, match="Model API error"):
         model_service.generate_response("")
@@ -80,3 +128,300 @@ def test_generate_response_returns_expected_response(model_service, mock_generat
     mock_generate_content.return_value.text = json.dumps({"response": expected_response})
 
     assert model_service.generate_response("") == expected_response
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_invalid_json(model_service, mock_agenerate_content):
+    mock_agenerate_content.return_value.text = "invalid JSON"
+
+    with pytest.raises(ModelServiceException, match="res.text is not valid JSON"):
+        await model_service.agenerate_response("")
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_api_error(model_service, mock_agenerate_content):
+    mock_agenerate_content.side_effect = api_error(500)
+
+    with pytest.raises(ModelServiceException, match="Model API error"):
+        await model_service.agenerate_response("")
+
+
+@pytest.mark.parametrize("expected_response", ["string", {"key": "value"}])
+@pytest.mark.asyncio
+async def test_agenerate_response_returns_expected_response(
+        model_service,
+        mock_generate_content,
+        mock_agenerate_content,
+        expected_response
+):
+    mock_agenerate_content.return_value.text = json.dumps({"response": expected_response})
+
+    assert await model_service.agenerate_response("") == expected_response
+    mock_agenerate_content.assert_awaited_once()
+    mock_generate_content.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "response_schema, expected_schema",
+    [
+        (None, DEFAULT_RESPONSE_SCHEMA),
+        (
+            {"type": "OBJECT", "properties": {"response": {"type": "OBJECT"}}},
+            {"type": "OBJECT", "properties": {"response": {"type": "OBJECT"}}}
+        )
+    ]
+)
+def test_config_response_schema(mock_backend, response_schema, expected_schema):
+    ms = ModelService(backend=mock_backend, model="", prompt_template="", response_schema=response_schema)
+
+    assert ms.config.response_schema == expected_schema
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_stream_yields_chunks(model_service):
+    chunks = [Mock(text="<span "), Mock(text=None), Mock(text='class="joy">Hello</span>')]
+    mock_generate_content_stream = AsyncMock(return_value=async_iter(chunks))
+    model_service.backend.agenerate_content_stream = mock_generate_content_stream
+
+    result = [chunk async for chunk in model_service.agenerate_response_stream("")]
+
+    assert result == ["<span ", 'class="joy">Hello</span>']
+    config = mock_generate_content_stream.call_args.kwargs["config"]
+    assert config.response_mime_type == "text/plain" and config.response_schema is None
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_stream_api_error(model_service):
+    model_service.backend.agenerate_content_stream = AsyncMock(side_effect=api_error(500))
+
+    with pytest.raises(ModelServiceException, match="Model API error"):
+        _ = [chunk async for chunk in model_service.agenerate_response_stream("")]
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_waits_for_limiter(model_service, mock_agenerate_content):
+    mock_agenerate_content.return_value.text = '{"response": "Test response"}'
+    model_service.limiter = ModelCallLimiter(max_concurrency=1)
+
+    async with model_service.limiter.slot():
+        task = asyncio.create_task(model_service.agenerate_response(""))
+        await asyncio.sleep(0.01)
+
+        mock_agenerate_content.assert_not_called()
+
+    assert await task == "Test response"
+    mock_agenerate_content.assert_called_once()
+
+
+def api_error(code: int, headers: dict | None = None) -> errors.APIError:
+    return backend_api_error(code, "Test", headers)
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_retries_retryable_error(model_service, mock_agenerate_content):
+    response = Mock(text='{"response": "Test response"}')
+    mock_agenerate_content.side_effect = [api_error(429), api_error(503), response]
+    model_service.retry_policy = RetryPolicy(max_attempts=3, initial_backoff_seconds=0)
+
+    assert await model_service.agenerate_response("") == "Test response"
+    assert mock_agenerate_content.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_does_not_retry_non_retryable_error(model_service, mock_agenerate_content):
+    mock_agenerate_content.side_effect = api_error(400)
+    model_service.retry_policy = RetryPolicy(max_attempts=3, initial_backoff_seconds=0)
+
+    with pytest.raises(ModelServiceException, match="Model API error"):
+        await model_service.agenerate_response("")
+
+    assert mock_agenerate_content.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_stream_retries_before_first_chunk(model_service):
+    mock_generate_content_stream = AsyncMock(side_effect=[api_error(503), async_iter([Mock(text="Hello")])])
+    model_service.backend.agenerate_content_stream = mock_generate_content_stream
+    model_service.retry_policy = RetryPolicy(max_attempts=2, initial_backoff_seconds=0)
+
+    result = [chunk async for chunk in model_service.agenerate_response_stream("")]
+
+    assert result == ["Hello"]
+    assert mock_generate_content_stream.await_count == 2
+
+
+def test_retry_delay_not_retried():
+    retry_policy = RetryPolicy(max_attempts=3)
+
+    assert retry_policy.retry_delay(api_error(400), attempt=1, elapsed_seconds=0) is None
+    assert retry_policy.retry_delay(api_error(503), attempt=3, elapsed_seconds=0) is None
+
+
+def test_retry_delay_backoff_bounded():
+    retry_policy = RetryPolicy(max_attempts=10, initial_backoff_seconds=1, max_backoff_seconds=3, backoff_multiplier=2)
+
+    delays = [retry_policy.retry_delay(api_error(503), attempt=attempt, elapsed_seconds=0) for attempt in range(1, 6)]
+
+    assert all(0 <= delay <= bound for delay, bound in zip(delays, [1, 2, 3, 3, 3]))
+
+
+def test_retry_delay_honours_retry_after():
+    retry_policy = RetryPolicy(max_backoff_seconds=0.1)
+
+    assert retry_policy.retry_delay(api_error(429, {"Retry-After": "5"}), attempt=1, elapsed_seconds=0) == 5
+
+
+def test_retry_delay_deadline():
+    retry_policy = RetryPolicy(deadline_seconds=10)
+
+    assert retry_policy.retry_delay(api_error(429, {"Retry-After": "5"}), attempt=1, elapsed_seconds=6) is None
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_circuit_breaker_open(model_service, mock_agenerate_content):
+    model_service.circuit_breaker = Mock(spec=CircuitBreaker)
+    model_service.circuit_breaker.allow_request.return_value = False
+
+    with pytest.raises(ModelServiceUnavailableException, match="circuit breaker is open"):
+        await model_service.agenerate_response("")
+
+    mock_agenerate_content.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_records_circuit_breaker_outcome(model_service, mock_agenerate_content):
+    model_service.circuit_breaker = Mock(spec=CircuitBreaker)
+    model_service.circuit_breaker.allow_request.return_value = True
+    mock_agenerate_content.side_effect = [api_error(503), api_error(400)]
+
+    for _ in range(2):
+        with pytest.raises(ModelServiceException, match="Model API error"):
+            await model_service.agenerate_response("")
+
+    model_service.circuit_breaker.record_failure.assert_called_once()
+    model_service.circuit_breaker.record_ignored.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_bounded_by_deadline(model_service, mock_agenerate_content):
+    mock_agenerate_content.return_value = Mock(text='{"response": "Test response"}')
+
+    async with Deadline(10).scope():
+        await model_service.agenerate_response("")
+
+    config = mock_agenerate_content.call_args.kwargs["config"]
+    assert 9000 < config.http_options.timeout <= 10000
+    assert model_service.config.http_options is None
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_deadline_expired(model_service, mock_agenerate_content):
+    deadline = Deadline(10)
+    deadline.expires_at = 0
+
+    with pytest.raises(TimeoutError):
+        async with deadline.scope():
+            await model_service.agenerate_response("")
+
+    mock_agenerate_content.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_no_retry_past_deadline(model_service, mock_agenerate_content):
+    # the Retry-After header forces a backoff of at least 5 seconds, which does not fit in the time left
+    mock_agenerate_content.side_effect = [api_error(503, {"Retry-After": "5"}), Mock(text='{"response": "Test"}')]
+    model_service.retry_policy = RetryPolicy(max_attempts=3, initial_backoff_seconds=0)
+
+    with pytest.raises(ModelServiceException, match="Model API error"):
+        async with Deadline(1).scope():
+            await model_service.agenerate_response("")
+
+    assert mock_agenerate_content.await_count == 1
+
+
+def test_batch_request_round_trip(mock_backend):
+    model_service = ModelService(backend=mock_backend, model="", prompt_template="Prompt", response_schema={"a": 1})
+
+    request = model_service.batch_request("Lyrics")
+
+    assert request["contents"] == [{"role": "user", "parts": [{"text": "Prompt\nLyrics"}]}]
+    assert request["generationConfig"]["responseSchema"] == {"a": 1}
+    assert request["generationConfig"]["responseMimeType"] == "application/json"
+    assert len(request["safetySettings"]) == len(ModelService.SAFETY_SETTINGS)
+    assert model_service.batch_input(json.loads(json.dumps(request))) == "Lyrics"
+
+
+def test_batch_input_prompt_mismatch(mock_backend):
+    model_service = ModelService(backend=mock_backend, model="", prompt_template="Prompt")
+    request = ModelService(backend=mock_backend, model="", prompt_template="Other").batch_request("Lyrics")
+
+    with pytest.raises(ModelServiceException):
+        model_service.batch_input(request)
+
+
+def test_parse_batch_response(mock_backend):
+    model_service = ModelService(backend=mock_backend, model="", prompt_template="")
+    response = {"candidates": [{"content": {"role": "model", "parts": [{"text": '{"response": {"joy": "Tag"}}'}]}}]}
+
+    assert model_service.parse_batch_response(response) == {"joy": "Tag"}
+
+    with pytest.raises(ModelServiceException):
+        model_service.parse_batch_response({"candidates": []})
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_records_token_usage(model_service, mock_agenerate_content):
+    usage_metadata = types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=100,
+        candidates_token_count=20,
+        total_token_count=120
+    )
+    mock_agenerate_content.return_value.text = '{"response": "Test response"}'
+    mock_agenerate_content.return_value.usage_metadata = usage_metadata
+    model_service.usage_tracker = Mock(spec=TokenUsageTracker)
+    model_service.usage_tracker.admit.return_value = True
+
+    await model_service.agenerate_response("", usage_key=UsageKey(endpoint="tags", emotion="joy"))
+
+    model_service.usage_tracker.record.assert_called_once_with(UsageKey(endpoint="tags", emotion="joy"), usage_metadata)
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_token_budget_exhausted(model_service, mock_agenerate_content):
+    mock_agenerate_content.return_value.text = '{"response": "Test response"}'
+    mock_agenerate_content.return_value.usage_metadata = None
+    model_service.usage_tracker = TokenUsageTracker(daily_token_budget=100)
+    model_service.usage_tracker.record(
+        UsageKey(endpoint="profile"),
+        types.GenerateContentResponseUsageMetadata(total_token_count=100)
+    )
+
+    with pytest.raises(TokenBudgetExhaustedException):
+        await model_service.agenerate_response("", priority=Priority.BATCH)
+
+    mock_agenerate_content.assert_not_called()
+
+    assert await model_service.agenerate_response("", priority=Priority.INTERACTIVE) == "Test response"
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("Timed out"), TimeoutError("Timed out")])
+@pytest.mark.asyncio
+async def test_agenerate_response_records_timeout_as_circuit_breaker_failure(
+        model_service,
+        mock_agenerate_content,
+        error
+):
+    model_service.circuit_breaker = Mock(spec=CircuitBreaker)
+    model_service.circuit_breaker.allow_request.return_value = True
+    mock_agenerate_content.side_effect = error
+
+    with pytest.raises(TimeoutError):
+        await model_service.agenerate_response("")
+
+    model_service.circuit_breaker.record_failure.assert_called_once()
+    model_service.circuit_breaker.record_ignored.assert_not_called()
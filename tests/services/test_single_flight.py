@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from analysis_api.services.deadline import Deadline
+from analysis_api.services.single_flight import SingleFlight
+
+
+# 1. Test that concurrent calls with the same key share a single execution.
+# 2. Test that concurrent calls with different keys run independently.
+# 3. Test that an exception is raised to every caller sharing the call.
+# 4. Test that the key is released once the call completes.
+# 5. Test that cancelling one caller does not cancel the shared call for the others.
+# 6. Test that the shared call is cancelled and its key released once every caller has been cancelled.
+# 7. Test that the shared call runs under the latest deadline of its callers, not the first caller's deadline.
+# 8. Test that the shared call has no deadline if any caller has none.
+
+
+@pytest.fixture
+def single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+@pytest.mark.asyncio
+async def test_do_same_key_shares_execution(single_flight):
+    calls = 0
+    release = asyncio.Event()
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    tasks = [asyncio.create_task(single_flight.do("key", work)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert calls == 1 and results == ["result"] * 5
+
+
+@pytest.mark.asyncio
+async def test_do_different_keys_run_independently(single_flight):
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key
+
+    results = await asyncio.gather(*(single_flight.do(key, lambda key=key: work(key)) for key in ["a", "b"]))
+
+    assert sorted(calls) == ["a", "b"] and results == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_do_exception_raised_to_all_callers(single_flight):
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        raise ValueError("Test")
+
+    tasks = [asyncio.create_task(single_flight.do("key", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_do_releases_key_after_completion(single_flight):
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    first = await single_flight.do("key", work)
+    second = await single_flight.do("key", work)
+
+    assert first == 1 and second == 2 and single_flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_do_cancelled_caller_does_not_cancel_shared_call(single_flight):
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "result"
+
+    cancelled_caller = asyncio.create_task(single_flight.do("key", work))
+    other_caller = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+
+    cancelled_caller.cancel()
+    release.set()
+
+    assert await other_caller == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled_caller
+
+
+@pytest.mark.asyncio
+async def test_do_cancelled_callers_cancel_shared_call(single_flight):
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    callers = [asyncio.create_task(single_flight.do("key", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    callers[0].cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+
+    callers[1].cancel()
+    await asyncio.wait(callers)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+    assert single_flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_do_shared_call_runs_under_latest_deadline(single_flight):
+    async def work():
+        await asyncio.sleep(0.05)
+        return Deadline.current().remaining()
+
+    async def do(timeout_seconds: float) -> float:
+        async with Deadline(timeout_seconds).scope():
+            return await single_flight.do("key", work)
+
+    first = asyncio.create_task(do(0.01))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(do(5))
+
+    with pytest.raises(TimeoutError):
+        await first
+
+    assert 4 < await second < 5
+
+
+@pytest.mark.asyncio
+async def test_do_shared_call_without_deadline_if_a_caller_has_none(single_flight):
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return Deadline.current()
+
+    async def do_with_deadline() -> Deadline | None:
+        async with Deadline(5).scope():
+            return await single_flight.do("key", work)
+
+    first = asyncio.create_task(do_with_deadline())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first is None and await second is None
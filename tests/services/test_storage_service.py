@@ -1,10 +1,12 @@
+import asyncio
 from unittest.mock import AsyncMock, Mock
 
 import aiosqlite
 import pytest
 import pytest_asyncio
 
-from analysis_api.services.storage.storage_service import initialise_db, StorageService, StorageServiceException
+from analysis_api.services.storage.storage_service import initialise_db, StorageService, StorageServiceException, \
+    StorageProfile
 
 DB_PATH = ":memory:"
 
@@ -47,9 +49,15 @@ async def test_initialise_db_creates_table():
 
         tags_column_names = {col[1] for col in tags_columns}
 
+        # Query database metadata to check if 'Track' table exists
+        async with db.execute("PRAGMA table_info(Track);") as cursor:
+            track_columns = await cursor.fetchall()
+
+        track_column_names = {col[1] for col in track_columns}
+
         assert (
             profile_column_names == {
-                "track_id",
+                "lyrics_hash",
                 "joy",
                 "sadness",
                 "anger",
@@ -66,12 +74,56 @@ async def test_initialise_db_creates_table():
                 "gratitude",
                 "spirituality"
             }
-            and tags_column_names == {"track_id", "emotion", "tags"}
+            and tags_column_names == {"lyrics_hash", "emotion", "tags"}
+            and track_column_names == {"track_id", "lyrics_hash"}
         )
 
 
+# 2. Test that initialise_db applies the storage profile if given.
+# 3. Test that initialise_db renames tables keyed by track_id and creates new tables.
+@pytest.mark.asyncio
+async def test_initialise_db_applies_storage_profile(tmp_path):
+    """Test that initialise_db sets the journal mode and connection settings of the storage profile."""
+
+    storage_profile = StorageProfile(journal_mode="WAL", synchronous="NORMAL", cache_size=-2000, busy_timeout_ms=1234)
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await initialise_db(db, storage_profile=storage_profile)
+
+        pragmas = {}
+        for pragma in ["journal_mode", "synchronous", "cache_size", "busy_timeout"]:
+            async with db.execute(f"PRAGMA {pragma};") as cursor:
+                pragmas[pragma] = (await cursor.fetchone())[0]
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "cache_size": -2000, "busy_timeout": 1234}
+
+
+@pytest.mark.asyncio
+async def test_initialise_db_renames_legacy_tables():
+    """Test that initialise_db keeps tables keyed by track_id under new names and creates the new tables."""
+
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.executescript("""
+            CREATE TABLE Profile (track_id TEXT PRIMARY KEY, joy REAL);
+            CREATE TABLE Tags (track_id TEXT, emotion TEXT, tags TEXT, PRIMARY KEY (track_id, emotion));
+            INSERT INTO Tags VALUES ('1', 'joy', 'tags');
+        """)
+
+        await initialise_db(db)
+        await initialise_db(db)
+
+        async with db.execute("SELECT * FROM Tags_v1;") as cursor:
+            legacy_tags = await cursor.fetchall()
+
+        async with db.execute("PRAGMA table_info(Profile);") as cursor:
+            profile_column_names = {col[1] for col in await cursor.fetchall()}
+
+    assert legacy_tags == [("1", "joy", "tags")]
+    assert "lyrics_hash" in profile_column_names and "track_id" not in profile_column_names
+
+
 # -------------------- STORE PROFILE -------------------- #
-# 1. Test that store_profile raises StorageServiceException if track_id already exists.
+# 1. Test that store_profile raises StorageServiceException if lyrics_hash already exists.
 # 2. Test that store_profile raises StorageServiceException if operational error occurs.
 # 3. Test that store_profile raises StorageServiceException if database error occurs.
 # 4. Test that store_profile stores profile in database.
@@ -100,7 +152,7 @@ def mock_emotional_profile() -> dict[str, float]:
 async def existing_profile(db, mock_emotional_profile) -> tuple[str, dict[str, float]]:
     insert_statement = f"""
         INSERT INTO Profile (
-            track_id, 
+            lyrics_hash, 
             joy, 
             sadness, 
             anger, 
@@ -120,23 +172,23 @@ async def existing_profile(db, mock_emotional_profile) -> tuple[str, dict[str, f
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
     """
 
-    track_id = "1"
+    lyrics_hash = "1"
 
-    await db.execute(insert_statement, (track_id, *mock_emotional_profile.values()))
+    await db.execute(insert_statement, (lyrics_hash, *mock_emotional_profile.values()))
     await db.commit()
 
-    return track_id, mock_emotional_profile
+    return lyrics_hash, mock_emotional_profile
 
 
 @pytest.mark.asyncio
-async def test_store_profile_track_id_already_exists(storage_service, existing_profile, mock_emotional_profile):
-    """Ensure StorageServiceException is raised on duplicate track ID."""
+async def test_store_profile_lyrics_hash_already_exists(storage_service, existing_profile, mock_emotional_profile):
+    """Ensure StorageServiceException is raised on duplicate lyrics hash."""
 
-    existing_track_id, existing_profile = existing_profile
+    existing_lyrics_hash, existing_profile = existing_profile
 
     # insert should fail due to primary key violation
-    with pytest.raises(StorageServiceException, match="Track ID '1' already exists."):
-        await storage_service.store_profile(track_id=existing_track_id, profile=mock_emotional_profile)
+    with pytest.raises(StorageServiceException, match="Lyrics hash '1' already exists."):
+        await storage_service.store_profile(lyrics_hash=existing_lyrics_hash, profile=mock_emotional_profile)
 
 
 @pytest.mark.asyncio
@@ -148,7 +200,7 @@ async def test_store_profile_operational_error(storage_service, db, mock_emotion
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Database operation failed"):
-        await storage_service.store_profile(track_id="1", profile=mock_emotional_profile)
+        await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
 
 
 @pytest.mark.asyncio
@@ -160,26 +212,26 @@ async def test_store_profile_database_error(storage_service, db, mock_emotional_
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Unexpected database error"):
-        await storage_service.store_profile(track_id="1", profile=mock_emotional_profile)
+        await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
 
 
 @pytest.mark.asyncio
 async def test_store_profile_adds_profile_to_db(storage_service, db, mock_emotional_profile):
     """Test that store profile adds profile to db"""
 
-    track_id = "1"
+    lyrics_hash = "1"
 
-    await storage_service.store_profile(track_id=track_id, profile=mock_emotional_profile)
+    await storage_service.store_profile(lyrics_hash=lyrics_hash, profile=mock_emotional_profile)
 
-    cursor = await db.execute(f"SELECT * FROM profile WHERE track_id = {track_id}")
+    cursor = await db.execute(f"SELECT * FROM profile WHERE lyrics_hash = {lyrics_hash}")
     row = await cursor.fetchone()
-    assert row == (track_id, *mock_emotional_profile.values())
+    assert row == (lyrics_hash, *mock_emotional_profile.values())
 
 
 # -------------------- RETRIEVE PROFILE -------------------- #
 # 1. Test that retrieve_profile raises StorageServiceException if operational error occurs.
 # 2. Test that retrieve_profile raises StorageServiceException if database error occurs.
-# 3. Test that retrieve_profile returns None if track_id not found.
+# 3. Test that retrieve_profile returns None if lyrics_hash not found.
 # 4. Test that retrieve_profile returns expected profile.
 @pytest.mark.asyncio
 async def test_retrieve_profile_operational_error(storage_service, db):
@@ -190,7 +242,7 @@ async def test_retrieve_profile_operational_error(storage_service, db):
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Database operation failed"):
-        await storage_service.retrieve_profile(track_id="1")
+        await storage_service.retrieve_profile(lyrics_hash="1")
 
 
 @pytest.mark.asyncio
@@ -202,7 +254,7 @@ async def test_retrieve_profile_database_error(storage_service, db):
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Unexpected database error"):
-        await storage_service.retrieve_profile(track_id="1")
+        await storage_service.retrieve_profile(lyrics_hash="1")
 
 
 @pytest.mark.asyncio
@@ -218,47 +270,88 @@ async def test_retrieve_profile_does_not_exist(storage_service):
 async def test_retrieve_profile_does_exist(storage_service, existing_profile):
     """Test retrieving profile for a track that does exist."""
 
-    existing_track_id, existing_profile = existing_profile
+    existing_lyrics_hash, existing_profile = existing_profile
 
-    retrieved_profile = await storage_service.retrieve_profile(existing_track_id)
+    retrieved_profile = await storage_service.retrieve_profile(existing_lyrics_hash)
 
     assert retrieved_profile == existing_profile, "Should return stored profile for stored track"
     
 
+# -------------------- RETRIEVE PROFILES -------------------- #
+# 1. Test that retrieve_profiles raises StorageServiceException if operational error occurs.
+# 2. Test that retrieve_profiles returns only the profiles that exist.
+# 3. Test that retrieve_profiles handles more lyrics hashs than fit in a single query.
+@pytest.mark.asyncio
+async def test_retrieve_profiles_operational_error(storage_service, db):
+    """Test retrieving profiles when a DB operational error occurs."""
+
+    mock_execute = AsyncMock()
+    mock_execute.side_effect = aiosqlite.OperationalError
+    db.execute = mock_execute
+
+    with pytest.raises(StorageServiceException, match="Database operation failed"):
+        await storage_service.retrieve_profiles(["1", "2"])
+
+
+@pytest.mark.asyncio
+async def test_retrieve_profiles_returns_existing_profiles(storage_service, existing_profile):
+    """Test retrieving profiles for a mix of stored and unknown tracks."""
+
+    existing_lyrics_hash, existing_profile = existing_profile
+
+    retrieved_profiles = await storage_service.retrieve_profiles([existing_lyrics_hash, "does_not_exist"])
+
+    assert retrieved_profiles == {existing_lyrics_hash: existing_profile}
+
+
+@pytest.mark.asyncio
+async def test_retrieve_profiles_many_lyrics_hashes(storage_service, mock_emotional_profile):
+    """Test retrieving more profiles than fit in a single query."""
+
+    lyrics_hashes = [str(i) for i in range(1200)]
+
+    for lyrics_hash in lyrics_hashes[::100]:
+        await storage_service.store_profile(lyrics_hash=lyrics_hash, profile=mock_emotional_profile)
+
+    retrieved_profiles = await storage_service.retrieve_profiles(lyrics_hashes)
+
+    assert retrieved_profiles == {lyrics_hash: mock_emotional_profile for lyrics_hash in lyrics_hashes[::100]}
+
+
 # -------------------- STORE TAGS -------------------- #
-# 1. Test that store_tags raises StorageServiceException if track_id already exists.
+# 1. Test that store_tags raises StorageServiceException if lyrics_hash already exists.
 # 2. Test that store_tags raises StorageServiceException if operational error occurs.
 # 3. Test that store_tags raises StorageServiceException if database error occurs.
 # 4. Test that store_tags stores tags in database.
 @pytest_asyncio.fixture
 async def existing_tags(db) -> tuple[str, str, str]:
-    track_id = "1"
+    lyrics_hash = "1"
     emotion = "anger"
     tags = """<span class="anger">I’ll hurt you</span>"""
 
     insert_statement = f"""
-        INSERT INTO Tags (track_id, emotion, tags)
+        INSERT INTO Tags (lyrics_hash, emotion, tags)
         VALUES (?, ?, ?);
     """
 
-    await db.execute(insert_statement, (track_id, emotion, tags))
+    await db.execute(insert_statement, (lyrics_hash, emotion, tags))
     await db.commit()
 
-    return track_id, emotion, tags
+    return lyrics_hash, emotion, tags
 
 
 @pytest.mark.asyncio
-async def test_store_tags_track_id_and_emotion_already_exist(storage_service, existing_tags):
-    """Ensure StorageServiceException is raised on duplicate track ID."""
+async def test_store_tags_lyrics_hash_and_emotion_already_exist(storage_service, existing_tags):
+    """Ensure StorageServiceException is raised on duplicate lyrics hash."""
 
-    existing_track_id, existing_emotion, _ = existing_tags
+    existing_lyrics_hash, existing_emotion, _ = existing_tags
 
     # insert should fail due to primary key violation
     with pytest.raises(
             StorageServiceException,
-            match=f"Entry already exists with track ID '{existing_track_id}' and emotion '{existing_emotion}'."
+            match=f"Entry already exists with lyrics hash '{existing_lyrics_hash}' and emotion '{existing_emotion}'."
     ):
-        await storage_service.store_tags(track_id=existing_track_id, emotion=existing_emotion, tags="Random tags")
+        await storage_service.store_tags(lyrics_hash=existing_lyrics_hash, emotion=existing_emotion, tags="Random tags")
 
 
 @pytest.mark.asyncio
@@ -271,7 +364,7 @@ async def test_store_tags_operational_error(storage_service, db):
 
     with pytest.raises(StorageServiceException, match="Database operation failed"):
         await storage_service.store_tags(
-            track_id="1",
+            lyrics_hash="1",
             emotion="joy",
             tags="""<span class="anger">I’ll hurt you</span>"""
         )
@@ -286,28 +379,28 @@ async def test_store_tags_database_error(storage_service, db):
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Unexpected database error"):
-        await storage_service.store_tags(track_id="1", emotion="joy", tags="Random tags")
+        await storage_service.store_tags(lyrics_hash="1", emotion="joy", tags="Random tags")
 
 
 @pytest.mark.asyncio
 async def test_store_tags_adds_tags_to_db(storage_service, db):
     """Test that store tags adds tags to db"""
 
-    track_id = "1"
+    lyrics_hash = "1"
     emotion = "anger"
     tags = """<span class="anger">I’ll hurt you</span>"""
 
-    await storage_service.store_tags(track_id=track_id, emotion=emotion, tags=tags)
+    await storage_service.store_tags(lyrics_hash=lyrics_hash, emotion=emotion, tags=tags)
 
-    cursor = await db.execute(f"SELECT * FROM Tags WHERE track_id = {track_id};")
+    cursor = await db.execute(f"SELECT * FROM Tags WHERE lyrics_hash = {lyrics_hash};")
     row = await cursor.fetchone()
-    assert row == (track_id, emotion, tags)
+    assert row == (lyrics_hash, emotion, tags)
 
 
 # -------------------- RETRIEVE TAGS -------------------- #
 # 1. Test that retrieve_tags raises StorageServiceException if operational error occurs.
 # 2. Test that retrieve_tags raises StorageServiceException if database error occurs.
-# 3. Test that retrieve_tags returns None if track_id not found.
+# 3. Test that retrieve_tags returns None if lyrics_hash not found.
 # 4. Test that retrieve_tags returns expected tags.
 @pytest.mark.asyncio
 async def test_retrieve_tags_operational_error(storage_service, db):
@@ -318,7 +411,7 @@ async def test_retrieve_tags_operational_error(storage_service, db):
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Database operation failed"):
-        await storage_service.retrieve_tags(track_id="1", emotion="joy")
+        await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy")
 
 
 @pytest.mark.asyncio
@@ -330,14 +423,14 @@ async def test_retrieve_tags_database_error(storage_service, db):
     db.execute = mock_execute
 
     with pytest.raises(StorageServiceException, match="Unexpected database error"):
-        await storage_service.retrieve_tags(track_id="1", emotion="joy")
+        await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy")
 
 
 @pytest.mark.asyncio
 async def test_retrieve_tags_does_not_exist(storage_service):
     """Test retrieving tags for a track that doesn't exist."""
 
-    retrieved_tags = await storage_service.retrieve_tags(track_id="does_not_exist", emotion="joy")
+    retrieved_tags = await storage_service.retrieve_tags(lyrics_hash="does_not_exist", emotion="joy")
 
     assert retrieved_tags is None, "Should return None for non-existent track"
 
@@ -346,8 +439,237 @@ async def test_retrieve_tags_does_not_exist(storage_service):
 async def test_retrieve_tags_does_exist(storage_service, existing_tags):
     """Test retrieving tags for a track that does exist."""
 
-    existing_track_id, existing_emotion, tags = existing_tags
+    existing_lyrics_hash, existing_emotion, tags = existing_tags
 
-    retrieved_tags = await storage_service.retrieve_tags(track_id=existing_track_id, emotion=existing_emotion)
+    retrieved_tags = await storage_service.retrieve_tags(lyrics_hash=existing_lyrics_hash, emotion=existing_emotion)
 
     assert retrieved_tags == tags, "Should return stored tags for stored track"
+
+
+
+# -------------------- RETRIEVE TAGS FOR EMOTIONS -------------------- #
+# 1. Test that retrieve_tags_for_emotions raises StorageServiceException if operational error occurs.
+# 2. Test that retrieve_tags_for_emotions returns only the emotions that exist for the track.
+@pytest.mark.asyncio
+async def test_retrieve_tags_for_emotions_operational_error(storage_service, db):
+    """Test retrieving tags for several emotions when a DB operational error occurs."""
+
+    mock_execute = AsyncMock()
+    mock_execute.side_effect = aiosqlite.OperationalError
+    db.execute = mock_execute
+
+    with pytest.raises(StorageServiceException, match="Database operation failed"):
+        await storage_service.retrieve_tags_for_emotions(lyrics_hash="1", emotions=["joy", "anger"])
+
+
+@pytest.mark.asyncio
+async def test_retrieve_tags_for_emotions_returns_existing_tags(storage_service, existing_tags):
+    """Test retrieving tags for a mix of stored and missing emotions."""
+
+    existing_lyrics_hash, existing_emotion, tags = existing_tags
+    await storage_service.store_tags(lyrics_hash="2", emotion="joy", tags="Other track")
+
+    retrieved_tags = await storage_service.retrieve_tags_for_emotions(
+        lyrics_hash=existing_lyrics_hash,
+        emotions=[existing_emotion, "joy"]
+    )
+
+    assert retrieved_tags == {existing_emotion: tags}
+
+
+
+# -------------------- TRACK -------------------- #
+# 1. Test that retrieve_track_lyrics_hash returns None if track_id not found.
+# 2. Test that store_track stores the lyrics hash and replaces it if the track already exists.
+# 3. Test that store_track raises StorageServiceException if operational error occurs.
+# 4. Test that store_tracks stores several lyrics hashes, replacing those of tracks that already exist.
+# 5. Test that retrieve_tracks_lyrics_hashes returns only the tracks that exist.
+# 6. Test that retrieve_tracks_lyrics_hashes raises StorageServiceException if operational error occurs.
+@pytest.mark.asyncio
+async def test_retrieve_track_lyrics_hash_does_not_exist(storage_service):
+    """Test retrieving the lyrics hash for a track that doesn't exist."""
+
+    assert await storage_service.retrieve_track_lyrics_hash("does_not_exist") is None
+
+
+@pytest.mark.asyncio
+async def test_store_track_replaces_lyrics_hash(storage_service):
+    """Test that store_track stores the lyrics hash and replaces it when the lyrics change."""
+
+    await storage_service.store_track(track_id="1", lyrics_hash="a")
+    first_lyrics_hash = await storage_service.retrieve_track_lyrics_hash("1")
+    await storage_service.store_track(track_id="1", lyrics_hash="b")
+
+    assert first_lyrics_hash == "a"
+    assert await storage_service.retrieve_track_lyrics_hash("1") == "b"
+
+
+@pytest.mark.asyncio
+async def test_store_track_operational_error(storage_service, db):
+    """Test storing a track when a DB operational error occurs."""
+
+    mock_execute = AsyncMock()
+    mock_execute.side_effect = aiosqlite.OperationalError
+    db.execute = mock_execute
+
+    with pytest.raises(StorageServiceException, match="Database operation failed"):
+        await storage_service.store_track(track_id="1", lyrics_hash="a")
+
+
+@pytest.mark.asyncio
+async def test_store_tracks(storage_service):
+    """Test that store_tracks stores several lyrics hashes and replaces them when the lyrics change."""
+
+    await storage_service.store_track(track_id="1", lyrics_hash="a")
+
+    await storage_service.store_tracks({"1": "b", "2": "c"})
+
+    assert await storage_service.retrieve_track_lyrics_hash("1") == "b"
+    assert await storage_service.retrieve_track_lyrics_hash("2") == "c"
+
+
+@pytest.mark.asyncio
+async def test_retrieve_tracks_lyrics_hashes(storage_service):
+    """Test retrieving the lyrics hashes of a mix of stored and unknown tracks."""
+
+    await storage_service.store_tracks({"1": "a", "2": "b"})
+
+    lyrics_hashes = await storage_service.retrieve_tracks_lyrics_hashes(["1", "2", "1", "does_not_exist"])
+
+    assert lyrics_hashes == {"1": "a", "2": "b"}
+
+
+@pytest.mark.asyncio
+async def test_retrieve_tracks_lyrics_hashes_operational_error(storage_service, db):
+    """Test retrieving the lyrics hashes of several tracks when a DB operational error occurs."""
+
+    mock_execute = AsyncMock()
+    mock_execute.side_effect = aiosqlite.OperationalError
+    db.execute = mock_execute
+
+    with pytest.raises(StorageServiceException, match="Database operation failed"):
+        await storage_service.retrieve_tracks_lyrics_hashes(["1"])
+
+
+# -------------------- STORE BULK -------------------- #
+# 1. Test that store_bulk stores profiles, tags and tracks.
+# 2. Test that store_bulk ignores profiles and tags that already exist.
+# 3. Test that store_bulk raises StorageServiceException and stores nothing if a database error occurs.
+# 4. Test that a failed store_bulk does not affect a concurrent write by another service sharing the write lock.
+@pytest.mark.asyncio
+async def test_store_bulk_stores_profiles_tags_and_tracks(storage_service, mock_emotional_profile):
+    """Test that store_bulk stores profiles, tags and tracks."""
+
+    await storage_service.store_bulk(
+        profiles={"1": mock_emotional_profile, "2": mock_emotional_profile},
+        tags={("1", "joy"): "joy tags", ("1", "anger"): "anger tags"},
+        tracks={"track-1": "1", "track-2": "1"}
+    )
+
+    assert await storage_service.retrieve_profiles(["1", "2"]) == {
+        "1": mock_emotional_profile,
+        "2": mock_emotional_profile
+    }
+    assert await storage_service.retrieve_tags_for_emotions(lyrics_hash="1", emotions=["joy", "anger"]) == {
+        "joy": "joy tags",
+        "anger": "anger tags"
+    }
+    assert await storage_service.retrieve_track_lyrics_hash("track-2") == "1"
+
+
+@pytest.mark.asyncio
+async def test_store_bulk_ignores_existing(storage_service, existing_profile, existing_tags, mock_emotional_profile):
+    """Test that store_bulk leaves existing entries unchanged."""
+
+    existing_lyrics_hash, _ = existing_profile
+    _, existing_emotion, tags = existing_tags
+    new_profile = {emotion: 0 for emotion in mock_emotional_profile}
+
+    await storage_service.store_bulk(
+        profiles={existing_lyrics_hash: new_profile},
+        tags={(existing_lyrics_hash, existing_emotion): "New tags"}
+    )
+
+    assert await storage_service.retrieve_profile(existing_lyrics_hash) == mock_emotional_profile
+    assert await storage_service.retrieve_tags(lyrics_hash=existing_lyrics_hash, emotion=existing_emotion) == tags
+
+
+@pytest.mark.asyncio
+async def test_store_bulk_database_error(storage_service, db, mock_emotional_profile):
+    """Test that store_bulk stores nothing when a DB operational error occurs."""
+
+    executemany = db.executemany
+    calls = 0
+
+    async def failing_executemany(statement, rows):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise aiosqlite.OperationalError
+        return await executemany(statement, rows)
+
+    db.executemany = failing_executemany
+
+    with pytest.raises(StorageServiceException, match="Database operation failed"):
+        await storage_service.store_bulk(profiles={"1": mock_emotional_profile}, tags={("1", "joy"): "tags"})
+
+    assert await storage_service.retrieve_profile("1") is None
+
+
+@pytest.mark.asyncio
+async def test_store_bulk_serialised_with_other_writers(db, mock_emotional_profile):
+    """Test that a concurrent write is neither committed nor rolled back by a failed store_bulk."""
+
+    write_lock = asyncio.Lock()
+    bulk_storage_service = StorageService(db, write_lock=write_lock)
+    track_storage_service = StorageService(db, write_lock=write_lock)
+    executemany = db.executemany
+    calls = 0
+
+    async def failing_executemany(statement, rows):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            await asyncio.sleep(0.01)
+            raise aiosqlite.OperationalError
+        return await executemany(statement, rows)
+
+    db.executemany = failing_executemany
+
+    bulk_task = asyncio.create_task(
+        bulk_storage_service.store_bulk(profiles={"1": mock_emotional_profile}, tags={("1", "joy"): "tags"})
+    )
+    await asyncio.sleep(0)
+    await track_storage_service.store_track(track_id="track-1", lyrics_hash="1")
+
+    with pytest.raises(StorageServiceException):
+        await bulk_task
+
+    assert await track_storage_service.retrieve_profile("1") is None
+    assert await track_storage_service.retrieve_track_lyrics_hash("track-1") == "1"
+
+
+# -------------------- MODEL USAGE -------------------- #
+# 1. Test that store_model_usage adds to the totals already stored for the day, endpoint and emotion.
+# 2. Test that retrieve_model_usage only returns the usage of the given day.
+@pytest.mark.asyncio
+async def test_store_model_usage_adds_to_totals(storage_service):
+    """Test that store_model_usage adds to the totals already stored."""
+
+    await storage_service.store_model_usage({("2026-01-01", "tags", "joy"): (1, 100, 20, 120)})
+    await storage_service.store_model_usage({("2026-01-01", "tags", "joy"): (2, 200, 40, 240)})
+
+    assert await storage_service.retrieve_model_usage("2026-01-01") == {("tags", "joy"): (3, 300, 60, 360)}
+
+
+@pytest.mark.asyncio
+async def test_retrieve_model_usage_by_day(storage_service):
+    """Test that retrieve_model_usage only returns the usage of the given day."""
+
+    await storage_service.store_model_usage({
+        ("2026-01-01", "profile", ""): (1, 100, 20, 120),
+        ("2026-01-02", "profile", ""): (1, 50, 10, 60)
+    })
+
+    assert await storage_service.retrieve_model_usage("2026-01-02") == {("profile", ""): (1, 50, 10, 60)}
+    assert await storage_service.retrieve_model_usage("2026-01-03") == {}
@@ -0,0 +1,206 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+from google.genai import types
+
+from analysis_api.services import token_usage
+from analysis_api.services.model_limiter import Priority
+from analysis_api.services.storage.storage_service import initialise_db, PROFILE_EMOTIONS, StorageService, \
+    StorageServiceException
+from analysis_api.services.storage.write_behind import WriteBehindWriter
+from analysis_api.services.token_usage import TokenUsageTracker, UsageKey
+
+
+def usage(prompt_tokens: int, output_tokens: int) -> types.GenerateContentResponseUsageMetadata:
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens
+    )
+
+
+@pytest_asyncio.fixture
+async def storage_service():
+    db = await aiosqlite.connect(":memory:")
+    await initialise_db(db)
+
+    yield StorageService(db)
+
+    await db.close()
+
+
+@pytest.fixture
+def today(monkeypatch) -> str:
+    monkeypatch.setattr(token_usage, "_today", lambda: "2026-01-01")
+    return "2026-01-01"
+
+
+# 1. Test that record adds the tokens of each call to the tokens used today, ignoring calls without usage metadata.
+# 2. Test that the tokens used today are reset when the day changes.
+# 3. Test that admit rejects non-interactive calls once the daily token budget is used up, but not interactive calls.
+# 4. Test that admit queues non-interactive calls once the daily token budget is used up if configured to.
+# 5. Test that flush writes the daily totals per endpoint and emotion, which start loads after a restart.
+# 6. Test that flush keeps the daily totals to retry later if the write fails.
+# 7. Test that flush and a failing write-behind batch on the same connection do not commit or roll back each other.
+# 8. Test that the tokens of a call that tagged several emotions are split evenly across them.
+# 9. Test that stop lets a write in progress finish rather than losing its totals, then writes the remaining totals.
+def test_record_counts_tokens_used_today(today):
+    tracker = TokenUsageTracker()
+
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+    tracker.record(UsageKey(endpoint="tags", emotion="joy"), usage(50, 10))
+    tracker.record(UsageKey(endpoint="tags", emotion="joy"), None)
+
+    assert tracker.tokens_used_today == 180
+
+
+def test_tokens_used_today_reset_on_new_day(monkeypatch, today):
+    tracker = TokenUsageTracker()
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+
+    monkeypatch.setattr(token_usage, "_today", lambda: "2026-01-02")
+
+    assert tracker.tokens_used_today == 0
+
+
+@pytest.mark.asyncio
+async def test_admit_rejects_non_interactive_calls_over_budget(today):
+    tracker = TokenUsageTracker(daily_token_budget=100)
+
+    assert await tracker.admit(Priority.BATCH)
+
+    tracker.record(UsageKey(endpoint="profile"), usage(80, 20))
+
+    assert tracker.budget_exhausted()
+    assert not await tracker.admit(Priority.BATCH)
+    assert await tracker.admit(Priority.INTERACTIVE)
+
+
+@pytest.mark.asyncio
+async def test_admit_queues_non_interactive_calls_over_budget(today):
+    tracker = TokenUsageTracker(daily_token_budget=100, on_budget_exhausted="queue")
+    tracker.record(UsageKey(endpoint="profile"), usage(80, 20))
+
+    task = asyncio.create_task(tracker.admit(Priority.BATCH))
+    await asyncio.sleep(0.01)
+
+    assert not task.done()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_daily_totals(storage_service, today):
+    tracker = TokenUsageTracker(storage_service=storage_service)
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+    tracker.record(UsageKey(endpoint="tags", emotion="joy"), usage(50, 10))
+    tracker.record(UsageKey(endpoint="tags", emotion="joy"), usage(50, 10))
+
+    await tracker.flush()
+
+    assert await storage_service.retrieve_model_usage(today) == {
+        ("profile", ""): (1, 100, 20, 120),
+        ("tags", "joy"): (2, 100, 20, 120)
+    }
+
+    restarted_tracker = TokenUsageTracker(storage_service=storage_service)
+    await restarted_tracker.start()
+    await restarted_tracker.stop()
+
+    assert restarted_tracker.tokens_used_today == 240
+
+
+@pytest.mark.asyncio
+async def test_flush_retains_totals_on_failure(today):
+    storage_service = Mock(spec=StorageService)
+    storage_service.store_model_usage = AsyncMock(side_effect=[StorageServiceException("error"), None])
+    tracker = TokenUsageTracker(storage_service=storage_service)
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+
+    await tracker.flush()
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+    await tracker.flush()
+
+    storage_service.store_model_usage.assert_awaited_with({(today, "profile", ""): (2, 200, 40, 240)})
+
+
+@pytest.mark.asyncio
+async def test_flush_serialised_with_write_behind(storage_service, today):
+    db = storage_service.db
+    write_lock = asyncio.Lock()
+    write_behind = WriteBehindWriter(
+        storage_service=StorageService(db, write_lock=write_lock),
+        max_batch_size=2,
+        flush_interval_seconds=60
+    )
+    tracker = TokenUsageTracker(storage_service=StorageService(db, write_lock=write_lock))
+    executemany = db.executemany
+
+    async def failing_executemany(statement, rows):
+        if "INTO Tags" in statement:
+            await asyncio.sleep(0.05)
+            raise aiosqlite.OperationalError
+        return await executemany(statement, rows)
+
+    db.executemany = failing_executemany
+    await write_behind.start()
+
+    await write_behind.enqueue_profile(lyrics_hash="1", profile={emotion: 0.1 for emotion in PROFILE_EMOTIONS})
+    await write_behind.enqueue_tags(lyrics_hash="1", emotion="joy", tags="tags")
+    await asyncio.sleep(0.01)
+
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+    await tracker.flush()
+    await write_behind.stop()
+
+    assert await storage_service.retrieve_profile("1") is None
+    assert await storage_service.retrieve_model_usage(today) == {("profile", ""): (1, 100, 20, 120)}
+
+
+@pytest.mark.asyncio
+async def test_record_splits_tokens_across_emotions(storage_service, today):
+    tracker = TokenUsageTracker(storage_service=storage_service)
+    tracker.record(UsageKey(endpoint="multi_tags", emotions=("joy", "anger", "love")), usage(100, 20))
+
+    await tracker.flush()
+
+    assert tracker.tokens_used_today == 120
+    assert await storage_service.retrieve_model_usage(today) == {
+        ("multi_tags", "joy"): (1, 34, 7, 40),
+        ("multi_tags", "anger"): (1, 33, 7, 40),
+        ("multi_tags", "love"): (1, 33, 6, 40)
+    }
+
+
+@pytest.mark.asyncio
+async def test_stop_during_flush(today):
+    writing = asyncio.Event()
+    release = asyncio.Event()
+    written = []
+
+    async def store_model_usage(usage_to_write):
+        writing.set()
+        await release.wait()
+        written.append(usage_to_write)
+
+    storage_service = Mock(spec=StorageService)
+    storage_service.retrieve_model_usage = AsyncMock(return_value={})
+    storage_service.store_model_usage = AsyncMock(side_effect=store_model_usage)
+    tracker = TokenUsageTracker(storage_service=storage_service, flush_interval_seconds=0.01)
+    await tracker.start()
+
+    tracker.record(UsageKey(endpoint="profile"), usage(100, 20))
+    await asyncio.wait_for(writing.wait(), timeout=1)
+    tracker.record(UsageKey(endpoint="profile"), usage(50, 10))
+
+    stop = asyncio.create_task(tracker.stop())
+    await asyncio.sleep(0.02)
+    release.set()
+    await stop
+
+    assert written == [{(today, "profile", ""): (1, 100, 20, 120)}, {(today, "profile", ""): (1, 50, 10, 60)}]
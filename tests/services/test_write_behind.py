@@ -0,0 +1,172 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+
+from analysis_api.services.storage.storage_service import initialise_db, StorageService, StorageServiceException
+from analysis_api.services.storage.write_behind import WriteBehindWriter
+
+DB_PATH = ":memory:"
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Creates an in-memory SQLite database for testing."""
+
+    db = await aiosqlite.connect(DB_PATH)
+    await initialise_db(db)
+
+    yield db
+
+    await db.close()
+
+
+@pytest_asyncio.fixture
+async def write_behind(db):
+    writer = WriteBehindWriter(storage_service=StorageService(db), max_batch_size=3, flush_interval_seconds=0.01)
+    await writer.start()
+
+    yield writer
+
+    await writer.stop()
+
+
+@pytest.fixture
+def mock_emotional_profile() -> dict[str, float]:
+    return {
+        "joy": 0.1,
+        "sadness": 0.1,
+        "anger": 0.2,
+        "fear": 0.05,
+        "love": 0.1,
+        "hope": 0,
+        "nostalgia": 0.03,
+        "loneliness": 0.02,
+        "confidence": 0.1,
+        "despair": 0.05,
+        "excitement": 0.1,
+        "mystery": 0,
+        "defiance": 0.05,
+        "gratitude": 0.1,
+        "spirituality": 0
+    }
+
+
+async def count_rows(db, table: str) -> int:
+    async with db.execute(f"SELECT COUNT(*) FROM {table};") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+# 1. Test that queued results are pending until written and then written to the database.
+# 2. Test that results are written in batches of at most max_batch_size.
+# 3. Test that stop writes all queued results.
+# 4. Test that a failed batch is dropped without stopping the writer.
+# 5. Test that StorageService queues inserts and serves pending results when a writer is given.
+# 6. Test that queued tracks are pending until written and then written to the database.
+# 7. Test that tracks stored together are queued and served from the pending tracks until written.
+@pytest.mark.asyncio
+async def test_queued_results_written(write_behind, db, mock_emotional_profile):
+    await write_behind.enqueue_profile(lyrics_hash="1", profile=mock_emotional_profile)
+    await write_behind.enqueue_tags(lyrics_hash="1", emotion="joy", tags="tags")
+
+    assert write_behind.pending_profile("1") == mock_emotional_profile
+    assert write_behind.pending_tags(lyrics_hash="1", emotion="joy") == "tags"
+
+    await asyncio.sleep(0.05)
+
+    assert write_behind.pending_profile("1") is None and write_behind.pending_tags("1", "joy") is None
+    assert await StorageService(db).retrieve_profile("1") == mock_emotional_profile
+    assert await StorageService(db).retrieve_tags(lyrics_hash="1", emotion="joy") == "tags"
+
+
+@pytest.mark.asyncio
+async def test_results_written_in_batches(db):
+    storage_service = StorageService(db)
+    storage_service.store_bulk = AsyncMock()
+    writer = WriteBehindWriter(storage_service=storage_service, max_batch_size=3, flush_interval_seconds=1)
+    await writer.start()
+
+    for i in range(7):
+        await writer.enqueue_tags(lyrics_hash=str(i), emotion="joy", tags="tags")
+
+    await writer.stop()
+
+    batch_sizes = [len(call.kwargs["tags"]) for call in storage_service.store_bulk.call_args_list]
+    assert batch_sizes == [3, 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue(db, mock_emotional_profile):
+    writer = WriteBehindWriter(storage_service=StorageService(db), max_batch_size=100, flush_interval_seconds=60)
+    await writer.start()
+
+    for i in range(10):
+        await writer.enqueue_profile(lyrics_hash=str(i), profile=mock_emotional_profile)
+
+    await writer.stop()
+
+    assert await count_rows(db, "Profile") == 10
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_dropped(db):
+    storage_service = StorageService(db)
+    storage_service.store_bulk = AsyncMock(side_effect=[StorageServiceException("Test"), None])
+    writer = WriteBehindWriter(storage_service=storage_service, max_batch_size=1, flush_interval_seconds=0)
+    await writer.start()
+
+    await writer.enqueue_tags(lyrics_hash="1", emotion="joy", tags="tags")
+    await writer.enqueue_tags(lyrics_hash="2", emotion="joy", tags="tags")
+    await writer.stop()
+
+    assert storage_service.store_bulk.await_count == 2
+    assert writer.pending_tags(lyrics_hash="1", emotion="joy") is None
+
+
+@pytest.mark.asyncio
+async def test_storage_service_uses_write_behind(write_behind, db, mock_emotional_profile):
+    storage_service = StorageService(db, write_behind=write_behind)
+
+    await storage_service.store_profile(lyrics_hash="1", profile=mock_emotional_profile)
+    await storage_service.store_tags(lyrics_hash="1", emotion="joy", tags="tags")
+
+    assert await count_rows(db, "Profile") == 0
+    assert await storage_service.retrieve_profile("1") == mock_emotional_profile
+    assert await storage_service.retrieve_profiles(["1"]) == {"1": mock_emotional_profile}
+    assert await storage_service.retrieve_tags(lyrics_hash="1", emotion="joy") == "tags"
+    assert await storage_service.retrieve_tags_for_emotions(lyrics_hash="1", emotions=["joy"]) == {"joy": "tags"}
+
+    await write_behind.stop()
+
+    assert await count_rows(db, "Profile") == 1 and await count_rows(db, "Tags") == 1
+
+
+@pytest.mark.asyncio
+async def test_queued_tracks_written(write_behind, db):
+    storage_service = StorageService(db, write_behind=write_behind)
+
+    await storage_service.store_track(track_id="1", lyrics_hash="a")
+
+    assert write_behind.pending_track("1") == "a"
+    assert await storage_service.retrieve_track_lyrics_hash("1") == "a"
+
+    await write_behind.stop()
+
+    assert write_behind.pending_track("1") is None
+    assert await StorageService(db).retrieve_track_lyrics_hash("1") == "a"
+
+
+@pytest.mark.asyncio
+async def test_queued_tracks_written_together(write_behind, db):
+    storage_service = StorageService(db, write_behind=write_behind)
+    await StorageService(db).store_track(track_id="2", lyrics_hash="b")
+
+    await storage_service.store_tracks({"1": "a", "2": "c"})
+
+    assert await storage_service.retrieve_tracks_lyrics_hashes(["1", "2", "3"]) == {"1": "a", "2": "c"}
+
+    await write_behind.stop()
+
+    assert await StorageService(db).retrieve_tracks_lyrics_hashes(["1", "2"]) == {"1": "a", "2": "c"}
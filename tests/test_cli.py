@@ -0,0 +1,212 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+
+from analysis_api import cli
+from analysis_api.cli import read_tracks, Checkpoint, load_checkpoint, save_checkpoint, backfill, main
+from analysis_api.models import Emotion
+from analysis_api.services.model_backends.fake import FakeModelBackend
+from analysis_api.services.lyrics_hash import hash_lyrics
+from analysis_api.services.model_service import ModelService, PromptType, ModelServiceException, \
+    TokenBudgetExhaustedException
+from analysis_api.services.storage.storage_service import initialise_db, StorageService, StorageProfile
+from analysis_api.services.token_usage import TokenUsageTracker
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Creates an in-memory SQLite database for testing."""
+
+    db = await aiosqlite.connect(":memory:")
+    await initialise_db(db)
+
+    yield db
+
+    await db.close()
+
+
+@pytest.fixture
+def storage_service(db) -> StorageService:
+    return StorageService(db)
+
+
+@pytest.fixture
+def model_service() -> ModelService:
+    return ModelService(backend=FakeModelBackend(PromptType.EMOTIONAL_PROFILE), model="fake", prompt_template="")
+
+
+PROFILE = {emotion.value: 0 for emotion in Emotion} | {"joy": 1}
+
+
+def track_records(count: int, distinct_lyrics: int | None = None) -> list[dict]:
+    distinct_lyrics = distinct_lyrics or count
+    return [{"track_id": str(i), "lyrics": f"Lyrics {i % distinct_lyrics}"} for i in range(count)]
+
+
+# 1. Test that read_tracks streams the records of a JSONL file, yielding invalid lines and lines that are not objects
+# as empty records.
+# 2. Test that read_tracks streams the records of a CSV file.
+# 3. Test that save_checkpoint and load_checkpoint round trip, and load_checkpoint returns an empty checkpoint without a
+# checkpoint file.
+# 4. Test that backfill generates and stores a profile for each distinct set of lyrics and maps every track to it.
+# 5. Test that backfill skips profiles that are already stored.
+# 6. Test that backfill counts invalid records and failed model calls without stopping.
+# 7. Test that backfill resumes after the records completed by a previous run, retrying those that failed.
+# 8. Test that backfill keeps failed records in the checkpoint, and removes the checkpoint once every record succeeds.
+# 9. Test that backfill stops once the daily token budget is used up, keeping the profiles already generated.
+# 10. Test that the backfill command stores profiles and token usage in the database using the fake model.
+# 11. Test that the batch-refresh command stores profiles, tags and token usage in the database using a local batch
+# prediction job.
+# 12. Test that the commands apply the storage profile from the settings unless the fake model is used.
+def test_read_tracks_jsonl(tmp_path):
+    path = tmp_path / "tracks.jsonl"
+    path.write_text('{"track_id": "1", "lyrics": "Lyrics"}\n\nnot json\n["1", "Lyrics"]\n')
+
+    assert list(read_tracks(path, "jsonl")) == [{"track_id": "1", "lyrics": "Lyrics"}, {}, {}]
+
+
+def test_read_tracks_csv(tmp_path):
+    path = tmp_path / "tracks.csv"
+    path.write_text('track_id,lyrics\n1,"Line one\nLine two"\n')
+
+    assert list(read_tracks(path, "csv")) == [{"track_id": "1", "lyrics": "Line one\nLine two"}]
+
+
+def test_checkpoint(tmp_path):
+    path = tmp_path / "tracks.jsonl.checkpoint"
+
+    assert load_checkpoint(path) == Checkpoint()
+
+    save_checkpoint(path, Checkpoint(records=500, failed=[3, 40]))
+
+    assert load_checkpoint(path) == Checkpoint(records=500, failed=[3, 40])
+
+
+@pytest.mark.asyncio
+async def test_backfill_stores_profiles(model_service, storage_service):
+    model_service.backend.agenerate_content = AsyncMock(
+        wraps=model_service.backend.agenerate_content
+    )
+
+    stats = await backfill(track_records(10, distinct_lyrics=4), model_service, storage_service, chunk_size=5)
+
+    assert (stats.records, stats.generated, stats.already_stored, stats.failed) == (10, 5, 5, 0)
+    assert model_service.backend.agenerate_content.await_count == 4
+    assert len(await storage_service.retrieve_profiles([hash_lyrics(f"Lyrics {i}") for i in range(4)])) == 4
+    assert await storage_service.retrieve_track_lyrics_hash("9") == hash_lyrics("Lyrics 1")
+
+
+@pytest.mark.asyncio
+async def test_backfill_skips_stored_profiles(model_service, storage_service):
+    await storage_service.store_profile(lyrics_hash=hash_lyrics("Lyrics 0"), profile=PROFILE)
+    model_service.agenerate_response = AsyncMock(wraps=model_service.agenerate_response)
+
+    stats = await backfill(track_records(2), model_service, storage_service)
+
+    assert (stats.generated, stats.already_stored) == (1, 1)
+    model_service.agenerate_response.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_backfill_counts_failures(model_service, storage_service):
+    model_service.agenerate_response = AsyncMock(side_effect=[ModelServiceException("Test"), json.dumps(PROFILE)])
+    records = [{"track_id": "1"}, *track_records(2)]
+
+    stats = await backfill(records, model_service, storage_service)
+
+    assert (stats.records, stats.generated, stats.failed) == (3, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint(tmp_path, model_service, storage_service):
+    checkpoint_path = tmp_path / "tracks.jsonl.checkpoint"
+    save_checkpoint(checkpoint_path, Checkpoint(records=3, failed=[1]))
+
+    stats = await backfill(track_records(5), model_service, storage_service, checkpoint_path=checkpoint_path)
+
+    assert (stats.records, stats.generated) == (5, 3)
+    assert await storage_service.retrieve_track_lyrics_hash("1") == hash_lyrics("Lyrics 1")
+    assert await storage_service.retrieve_track_lyrics_hash("2") is None
+
+
+@pytest.mark.asyncio
+async def test_backfill_checkpoints_failures(tmp_path, model_service, storage_service):
+    checkpoint_path = tmp_path / "tracks.jsonl.checkpoint"
+    records = [{"track_id": "0"}, *track_records(3)[1:]]
+
+    stats = await backfill(records, model_service, storage_service, chunk_size=2, checkpoint_path=checkpoint_path)
+
+    assert (stats.records, stats.generated, stats.failed) == (3, 2, 1)
+    assert load_checkpoint(checkpoint_path) == Checkpoint(records=3, failed=[0])
+
+    records[0] = track_records(1)[0]
+    stats = await backfill(records, model_service, storage_service, chunk_size=2, checkpoint_path=checkpoint_path)
+
+    assert (stats.records, stats.generated, stats.failed) == (3, 1, 0)
+    assert not checkpoint_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_backfill_stops_when_token_budget_used_up(tmp_path, model_service, storage_service):
+    model_service.usage_tracker = TokenUsageTracker(daily_token_budget=1)
+    checkpoint_path = tmp_path / "tracks.jsonl.checkpoint"
+
+    with pytest.raises(TokenBudgetExhaustedException):
+        await backfill(track_records(3), model_service, storage_service, concurrency=1, checkpoint_path=checkpoint_path)
+
+    assert await storage_service.retrieve_track_lyrics_hash("0") == hash_lyrics("Lyrics 0")
+    assert await storage_service.retrieve_track_lyrics_hash("1") is None
+    assert load_checkpoint(checkpoint_path) == Checkpoint()
+
+
+def test_main_backfill(tmp_path):
+    tracks_path = tmp_path / "tracks.jsonl"
+    tracks_path.write_text("".join(json.dumps(record) + "\n" for record in track_records(3)))
+    db_path = tmp_path / "db.sqlite"
+
+    assert main(["backfill", str(tracks_path), "--db-path", str(db_path), "--fake-model"]) == 0
+
+    assert not (tmp_path / "tracks.jsonl.checkpoint").exists()
+
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT endpoint, calls FROM ModelUsage").fetchall() == [("backfill_profile", 3)]
+
+    assert main(["backfill", str(tracks_path), "--db-path", str(db_path), "--fake-model", "--format", "jsonl"]) == 0
+
+
+def test_main_batch_refresh(tmp_path):
+    tracks_path = tmp_path / "tracks.csv"
+    tracks_path.write_text("track_id,lyrics\n1,Lyrics 1\n2,Lyrics 2\n")
+    db_path = tmp_path / "db.sqlite"
+    local_dir = tmp_path / "jobs"
+
+    args = ["batch-refresh", str(tracks_path), "--db-path", str(db_path), "--fake-model", "--local-dir", str(local_dir)]
+    assert main(args + ["--tag-dominant-emotions", "2"]) == 0
+
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM Track").fetchone()[0] == 2
+        assert db.execute("SELECT COUNT(*) FROM Tags").fetchone()[0] == 4
+        assert db.execute("SELECT SUM(calls) FROM ModelUsage WHERE endpoint = 'batch_profile'").fetchone()[0] == 2
+
+
+def test_main_storage_profile(tmp_path, monkeypatch):
+    tracks_path = tmp_path / "tracks.jsonl"
+    tracks_path.write_text("".join(json.dumps(record) + "\n" for record in track_records(1)))
+    settings_db_path = tmp_path / "settings.sqlite"
+    settings = SimpleNamespace(db_path=str(settings_db_path), storage_profile=StorageProfile(journal_mode="DELETE"))
+    monkeypatch.setattr(cli, "_settings", lambda: settings)
+    db_path = tmp_path / "db.sqlite"
+
+    assert main(["backfill", str(tracks_path), "--fake-model"]) == 0
+    assert main(["backfill", str(tracks_path), "--db-path", str(db_path), "--fake-model"]) == 0
+
+    with sqlite3.connect(settings_db_path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
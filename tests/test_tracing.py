@@ -0,0 +1,140 @@
+import json
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from fastapi.testclient import TestClient
+from google.genai import types
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from analysis_api.dependencies import get_data_service, get_settings
+from analysis_api.main import app, create_tracer_provider
+from analysis_api.models import Emotion, EmotionalTagsResponse
+from analysis_api.services.data_service import DataService
+from analysis_api.services.model_backends.base import ModelBackend, text_response
+from analysis_api.services.model_service import ModelService
+from analysis_api.settings import Settings
+from analysis_api.tracing import FileSpanExporter, request_stage, set_tracer_provider
+
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def span_exporter() -> InMemorySpanExporter:
+    span_exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    set_tracer_provider(tracer_provider)
+
+    yield span_exporter
+
+    set_tracer_provider(None)
+
+
+def tracing_settings(**kwargs) -> Settings:
+    return Settings.model_construct(
+        **{
+            "tracing_exporter": "none",
+            "tracing_otlp_endpoint": None,
+            "tracing_file_path": None,
+            "tracing_sample_ratio": 1.0,
+            "tracing_service_name": "themes-service"
+        } | kwargs
+    )
+
+
+# 1. Test that a request is traced as a server span in the caller's trace, with the spans recorded while serving it.
+# 2. Test that the model call span records the model name and token counts.
+# 3. Test that spans are not recorded without a tracer provider.
+# 4. Test that create_tracer_provider builds the exporter selected in the settings.
+# 5. Test that the file exporter writes one span per line.
+def test_request_traced_in_callers_trace(span_exporter):
+    async def get_emotional_tags(request):
+        with request_stage("storage_lookup"):
+            return EmotionalTagsResponse(track_id="1", lyrics="Lyrics", emotion=Emotion.JOY)
+
+    mock_data_service = Mock(spec=DataService)
+    mock_data_service.get_emotional_tags = get_emotional_tags
+    app.dependency_overrides[get_data_service] = lambda: mock_data_service
+    app.dependency_overrides[get_settings] = lambda: Settings.model_construct(request_max_timeout_seconds=5)
+
+    res = TestClient(app).post(
+        url="/emotions/tags",
+        json={"track_id": "1", "lyrics": "Lyrics", "emotion": "joy"},
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"}
+    )
+    app.dependency_overrides = {}
+
+    assert res.status_code == 200
+    spans = {span.name: span for span in span_exporter.get_finished_spans()}
+    server_span = spans["POST /emotions/tags"]
+    assert format(server_span.context.trace_id, "032x") == TRACE_ID
+    assert format(server_span.parent.span_id, "016x") == PARENT_SPAN_ID
+    assert server_span.attributes["http.route"] == "/emotions/tags"
+    assert server_span.attributes["http.response.status_code"] == 200
+    assert spans["storage_lookup"].parent.span_id == server_span.context.span_id
+
+
+@pytest.mark.asyncio
+async def test_model_call_span_attributes(span_exporter):
+    response = text_response('{"response": "Tag"}')
+    response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=10,
+        candidates_token_count=5,
+        total_token_count=15
+    )
+    backend = Mock(spec=ModelBackend)
+    backend.agenerate_content = AsyncMock(return_value=response)
+    model_service = ModelService(backend=backend, model="gemini", prompt_template="")
+
+    assert await model_service.agenerate_response("Lyrics") == "Tag"
+
+    spans = {span.name: span for span in span_exporter.get_finished_spans()}
+    assert dict(spans["model_call"].attributes) == {
+        "gen_ai.request.model": "gemini",
+        "gen_ai.usage.input_tokens": 10,
+        "gen_ai.usage.output_tokens": 5,
+        "gen_ai.usage.total_tokens": 15
+    }
+    assert "json_parsing" in spans
+
+
+def test_no_spans_without_tracer_provider():
+    with request_stage("storage_lookup") as span:
+        assert not span.is_recording()
+
+
+def test_create_tracer_provider(tmp_path):
+    assert create_tracer_provider(tracing_settings()) is None
+
+    with pytest.raises(ValueError, match="TRACING_FILE_PATH"):
+        create_tracer_provider(tracing_settings(tracing_exporter="file"))
+
+    trace_path = tmp_path / "traces.jsonl"
+    tracer_provider = create_tracer_provider(tracing_settings(tracing_exporter="file", tracing_file_path=trace_path))
+    set_tracer_provider(tracer_provider)
+
+    with request_stage("storage_lookup"):
+        pass
+
+    set_tracer_provider(None)
+    tracer_provider.shutdown()
+
+    spans = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["storage_lookup"]
+    assert spans[0]["resource"]["attributes"]["service.name"] == "themes-service"
+
+
+def test_file_span_exporter(tmp_path, span_exporter):
+    with request_stage("storage_lookup"), request_stage("storage_store"):
+        pass
+
+    file_span_exporter = FileSpanExporter(tmp_path / "traces.jsonl")
+    file_span_exporter.export(span_exporter.get_finished_spans())
+    file_span_exporter.shutdown()
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["storage_store", "storage_lookup"]